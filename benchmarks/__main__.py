@@ -0,0 +1,47 @@
+import argparse
+import sys
+from . import harness
+# Registers the benchmarks.
+from . import bench_utils, bench_synapse, bench_synapsis_utils, bench_chain, bench_sync, bench_codec  # noqa: F401
+
+
+def main(args: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Run the synapsis benchmarks.')
+    parser.add_argument('-k', '--filter', action='append', default=[],
+                        help='Only run benchmarks whose name contains this value. Can be repeated.')
+    parser.add_argument('--rtt', type=float, default=0.0,
+                        help='Round trip time in seconds injected into the fake Synapse service.')
+    parser.add_argument('-o', '--output', default=None, help='Path to write the results JSON to.')
+    parser.add_argument('-b', '--baseline', default=None, help='Path to a results JSON to compare against.')
+    parser.add_argument('-t', '--threshold', type=float, default=0.10,
+                        help='Allowed slowdown from the baseline as a fraction (default: 0.10).')
+    parser.add_argument('-l', '--list', action='store_true', help='List the benchmarks and exit.')
+    parsed = parser.parse_args(args)
+
+    if parsed.list:
+        for bench in harness.BENCHMARKS.values():
+            for param in bench.params:
+                print(bench.key(param))
+        return 0
+
+    results = harness.run(names=parsed.filter, context=harness.BenchmarkContext(rtt=parsed.rtt))
+
+    if parsed.output:
+        harness.save(parsed.output, results, harness.metadata(parsed.rtt))
+        print('Results saved to: {0}'.format(parsed.output))
+
+    if parsed.baseline:
+        baseline = harness.load(parsed.baseline)['results']
+        comparisons = harness.compare(results, baseline, parsed.threshold)
+        regressions = [c for c in comparisons if c['regression']]
+        print()
+        for c in comparisons:
+            print('{0:<60} {1:>8.2f}x {2}'.format(c['key'], c['ratio'], 'REGRESSION' if c['regression'] else ''))
+        if regressions:
+            print('{0} benchmark(s) regressed more than {1:.0%}.'.format(len(regressions), parsed.threshold))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
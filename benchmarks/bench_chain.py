@@ -0,0 +1,51 @@
+import asyncio
+from synapsis import Synapsis
+from .harness import benchmark
+
+CALLS = 10 ** 3
+DIRECT_CALLS = 10 ** 5
+
+
+@benchmark(unit='calls')
+def bench_direct(ctx, _):
+    def _run():
+        for _ in range(DIRECT_CALLS):
+            Synapsis.utils.first([1])
+
+    return _run, DIRECT_CALLS
+
+
+@benchmark(unit='calls')
+def bench_delegated(ctx, _):
+    def _run():
+        for _ in range(DIRECT_CALLS):
+            Synapsis.getUserProfile
+
+    return _run, DIRECT_CALLS
+
+
+@benchmark(unit='calls')
+def bench_chain_sync(ctx, _):
+    def _run():
+        for _ in range(CALLS):
+            Synapsis.Chain.utils.first([1]).Result()
+
+    return _run, CALLS
+
+
+@benchmark(unit='calls')
+def bench_chain_async(ctx, _):
+    async def _calls():
+        for _ in range(CALLS):
+            await Synapsis.Chain.utils.first([1])
+
+    return lambda: asyncio.run(_calls()), CALLS
+
+
+@benchmark(unit='calls')
+def bench_chain_pipe(ctx, _):
+    def _run():
+        for _ in range(CALLS):
+            Synapsis.Chain.utils.first([[1]]).Pipe.utils.first().Result()
+
+    return _run, CALLS
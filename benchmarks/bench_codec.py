@@ -0,0 +1,51 @@
+import hashlib
+import json
+from synapsis.core.codec import Codec
+from .harness import benchmark
+
+FILES = 1000
+
+
+def _file_handle_batch():
+    return {
+        'requestedFiles': [{
+            'fileHandleId': str(10 ** 8 + i),
+            'fileHandle': {
+                'id': str(10 ** 8 + i), 'etag': hashlib.md5(str(-i).encode()).hexdigest(),
+                'concreteType': 'org.sagebionetworks.repo.model.file.S3FileHandle', 'contentType': 'text/plain',
+                'contentMd5': hashlib.md5(str(i).encode()).hexdigest(), 'contentSize': i,
+                'fileName': 'file-{0}.txt'.format(i), 'status': 'AVAILABLE', 'isPreview': False,
+                'storageLocationId': 1, 'bucketName': 'proddata.sagebase.org',
+                'key': '3350396/{0}/file-{0}.txt'.format(i), 'createdBy': '3350396',
+                'createdOn': '2024-01-01T00:00:00.000Z'
+            },
+            'preSignedURL': 'https://proddata.sagebase.org/3350396/{0}/file-{0}.txt?X-Amz-Signature={1}'.format(
+                i, hashlib.sha256(str(i).encode()).hexdigest())
+        } for i in range(FILES)]
+    }
+
+
+@benchmark(params=Codec.available(), unit='files')
+def bench_loads(ctx, name):
+    codec = Codec.CODECS[name]()
+    data = json.dumps(_file_handle_batch()).encode()
+    return lambda: codec.loads(data), FILES
+
+
+@benchmark(params=Codec.available(), unit='files')
+def bench_dumps(ctx, name):
+    codec = Codec.CODECS[name]()
+    data = _file_handle_batch()
+    return lambda: codec.dumps(data), FILES
+
+
+@benchmark(unit='files')
+def bench_iter_items(ctx, _):
+    codec = Codec.CODECS['json']()
+    data = json.dumps(_file_handle_batch()).encode()
+
+    def _run():
+        for _ in codec.iter_items(data, key='requestedFiles'):
+            pass
+
+    return _run, FILES
@@ -0,0 +1,91 @@
+from synapsis.synapse import SynapsePermission, SynapseConcreteType
+from .harness import benchmark
+
+LOOKUPS = 10 ** 4
+
+
+@benchmark(params=['code', 'access_types', 'permission'], unit='lookups')
+def bench_permission_get(ctx, by):
+    values = {
+        'code': [p.code for p in SynapsePermission.ALL],
+        'access_types': [list(reversed(p.access_types)) for p in SynapsePermission.ALL],
+        'permission': list(SynapsePermission.ALL)
+    }[by]
+    values = (values * (LOOKUPS // len(values) + 1))[:LOOKUPS]
+
+    def _run():
+        for value in values:
+            SynapsePermission.get(value, None)
+
+    return _run, LOOKUPS
+
+
+@benchmark(params=['code', 'entity_type', 'dict', 'concrete_type'], unit='lookups')
+def bench_concrete_type_get(ctx, by):
+    values = {
+        'code': [c.code for c in SynapseConcreteType.ALL],
+        'entity_type': ['project', 'folder', 'file', 'table', 'link'],
+        'dict': [{'concreteType': c.code} for c in SynapseConcreteType.ALL],
+        'concrete_type': list(SynapseConcreteType.ALL)
+    }[by]
+    values = (values * (LOOKUPS // len(values) + 1))[:LOOKUPS]
+
+    def _run():
+        for value in values:
+            SynapseConcreteType.get(value)
+
+    return _run, LOOKUPS
+
+
+@benchmark(unit='acquires')
+def bench_rate_limiter_acquire(ctx, _):
+    from synapsis.core.rate_limiter import RateLimiter
+    limiter = RateLimiter()
+
+    def _run():
+        for _ in range(LOOKUPS):
+            limiter.acquire()
+            limiter.observe(200)
+
+    return _run, LOOKUPS
+
+
+@benchmark(params=['threads', 'scheduler'], unit='jobs', repeat=3)
+def bench_async_job_wait(ctx, mode):
+    import concurrent.futures
+    import time
+    from synapsis import Synapsis
+    from synapsis.core.async_job import AsyncJob
+    from synapsis.core.job_scheduler import JobScheduler
+    fake = ctx.fake_synapse
+    project = fake.create_project()
+    request = {'concreteType': 'org.sagebionetworks.repo.model.table.ViewColumnModelRequest',
+               'viewScope': {'scope': [project['id']], 'viewEntityType': 'entityview', 'viewTypeMask': 1}}
+    jobs = 200
+
+    def _fixed_sleep(job):
+        # How clients wait for a job without the scheduler: a thread per job that polls every 100ms.
+        job.start()
+        while True:
+            time.sleep(0.1)
+            response = job.poll()
+            if response is not None:
+                return response
+
+    def _run():
+        # Each job takes the server 1s.
+        fake.job_duration = 1.0
+        try:
+            if mode == 'threads':
+                with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+                    list(executor.map(_fixed_sleep, [AsyncJob(Synapsis.Synapse, '/column/view/scope', request)
+                                                     for _ in range(jobs)]))
+            else:
+                futures = [JobScheduler.shared().submit(AsyncJob(Synapsis.Synapse, '/column/view/scope', request))
+                           for _ in range(jobs)]
+                for future in futures:
+                    future.result()
+        finally:
+            fake.job_duration = 0
+
+    return _run, jobs
@@ -0,0 +1,349 @@
+import hashlib
+import json
+import uuid
+from synapsis import Synapsis
+from .harness import benchmark
+
+NAMES = 10 ** 5
+FILE_HANDLES = [1, 10, 100]
+
+
+@benchmark(params=['ascii', 'unicode'], unit='names')
+def bench_sanitize_entity_name(ctx, kind):
+    if kind == 'ascii':
+        names = ['file name (copy) #{0}.txt'.format(i) for i in range(NAMES)]
+    else:
+        names = ['fichier é ü ß {0} – ☃.txt'.format(i) for i in range(NAMES)]
+
+    def _run():
+        for name in names:
+            Synapsis.Utils.sanitize_entity_name(name)
+
+    return _run, NAMES
+
+
+@benchmark(params=['ascii', 'unicode'], unit='names')
+def bench_sanitize_entity_name_many(ctx, kind):
+    if kind == 'ascii':
+        names = [('syn{0}'.format(i % 100), 'file name (copy) #{0}.txt'.format(i)) for i in range(NAMES)]
+    else:
+        names = [('syn{0}'.format(i % 100), 'fichier é ü ß {0} – ☃.txt'.format(i)) for i in range(NAMES)]
+    return lambda: Synapsis.Utils.sanitize_entity_name_many(names), NAMES
+
+
+@benchmark(params=[2 ** 20, 2 ** 26], unit='bytes', repeat=3)
+def bench_md5sum(ctx, size):
+    path = ctx.temp_file(size)
+
+    def _run():
+        Synapsis.Utils.md5sum(path)
+
+    return _run, size
+
+
+def _fake_tree(ctx, files):
+    fake = ctx.fake_synapse
+    project = fake.create_project()
+    folder = fake.create_folder('folder', project)
+    return [fake.create_file('file-{0}.txt'.format(i), folder, content=b'x') for i in range(files)]
+
+
+@benchmark(unit='calls', repeat=10)
+def bench_get_bundle(ctx, _):
+    file = _fake_tree(ctx, 1)[0]
+    return lambda: Synapsis.Utils.get_bundle(file['id'], include_file_handles=True, include_annotations=True), 1
+
+
+@benchmark(params=FILE_HANDLES, unit='file handles', repeat=10)
+def bench_get_filehandles(ctx, count):
+    files = _fake_tree(ctx, count)
+    pairs = [(f['id'], f['dataFileHandleId']) for f in files]
+    return lambda: Synapsis.Utils.get_filehandles(pairs, include_pre_signed_urls=True), count
+
+
+@benchmark(unit='calls', repeat=10)
+def bench_get_bundle_with_metrics(ctx, _):
+    from synapsis.core import RequestMetrics
+    file = _fake_tree(ctx, 1)[0]
+    metrics = RequestMetrics()
+
+    def _run():
+        metrics.install(Synapsis.hooks)
+        try:
+            Synapsis.Utils.get_bundle(file['id'], include_file_handles=True, include_annotations=True)
+        finally:
+            metrics.uninstall(Synapsis.hooks)
+
+    return _run, 1
+
+
+@benchmark(params=['find_entity', 'index'], unit='names', repeat=3)
+def bench_find_entities(ctx, mode):
+    from synapsis.core import ChildIndex
+    files = _fake_tree(ctx, 100)
+    parent_id = files[0]['parentId']
+    names = [f['name'] for f in files]
+
+    def _run():
+        if mode == 'index':
+            index = ChildIndex(parent_id)
+            for name in names:
+                index.id_of(name)
+        else:
+            for name in names:
+                Synapsis.Synapse.findEntityId(name, parent=parent_id)
+
+    return _run, len(names)
+
+
+@benchmark(params=['entity', 'header'], unit='calls', repeat=10)
+def bench_find_entity(ctx, mode):
+    file = _fake_tree(ctx, 1)[0]
+    return lambda: Synapsis.Utils.find_entity(file['name'], parent=file['parentId'],
+                                              header_only=mode == 'header'), 1
+
+
+RECORDS = 10 ** 4
+
+
+def _file_handle_json(i):
+    return json.dumps({
+        'id': str(10 ** 8 + i), 'etag': str(uuid.uuid4()),
+        'concreteType': 'org.sagebionetworks.repo.model.file.S3FileHandle', 'contentType': 'text/plain',
+        'contentMd5': hashlib.md5(str(i).encode()).hexdigest(), 'contentSize': i, 'fileName': 'file-{0}.txt'.format(i),
+        'status': 'AVAILABLE', 'isPreview': False, 'storageLocationId': 1, 'bucketName': 'proddata.sagebase.org',
+        'key': '3350396/{0}/file-{1}.txt'.format(uuid.uuid4(), i), 'createdBy': '3350396',
+        'createdOn': '2024-01-01T00:00:00.000Z', 'previewId': str(10 ** 9 + i)
+    })
+
+
+@benchmark(params=['dict', 'record'], unit='file handles', memory=True)
+def bench_file_handle_memory(ctx, record_type):
+    from synapsis.core.records import FileHandle, convert
+    payloads = [_file_handle_json(i) for i in range(RECORDS)]
+    record_type = dict if record_type == 'dict' else FileHandle
+    return lambda: [convert(json.loads(p), record_type) for p in payloads], RECORDS
+
+
+@benchmark(params=['dict', 'record'], unit='file handles')
+def bench_file_handle_decode(ctx, record_type):
+    from synapsis.core.records import FileHandle, convert
+    payloads = [_file_handle_json(i) for i in range(RECORDS)]
+    record_type = dict if record_type == 'dict' else FileHandle
+    return lambda: [convert(json.loads(p), record_type) for p in payloads], RECORDS
+
+
+@benchmark(params=['dict', 'record'], unit='bundles', memory=True)
+def bench_bundle_memory(ctx, record_type):
+    from synapsis.core.records import Bundle
+    files = _fake_tree(ctx, 100)
+    record_type = dict if record_type == 'dict' else Bundle
+    return lambda: [Synapsis.Utils.get_bundle(f['id'], include_file_handles=True, include_annotations=True,
+                                              include_access_control_list=True, record_type=record_type)
+                    for f in files], len(files)
+
+
+@benchmark(params=['same', 'distinct'], unit='calls', repeat=3)
+def bench_get_bundle_concurrent(ctx, entities):
+    import concurrent.futures
+    files = _fake_tree(ctx, 32)
+    ids = [files[0]['id']] * len(files) if entities == 'same' else [f['id'] for f in files]
+
+    def _run():
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(ids)) as executor:
+            list(executor.map(Synapsis.Utils.get_bundle, ids))
+
+    return _run, len(ids)
+
+
+@benchmark(params=['get_entity_permission', 'audit'], unit='entities', repeat=3)
+def bench_audit_permissions(ctx, mode):
+    import os
+    fake = ctx.fake_synapse
+    project = fake.create_project()
+    entity_ids = [project['id']]
+    for i in range(10):
+        folder = fake.create_folder('folder-{0}'.format(i), project)
+        entity_ids.append(folder['id'])
+        entity_ids.extend(fake.create_file('file-{0}.txt'.format(j), folder, content=b'x')['id'] for j in range(10))
+    path = os.path.join(ctx.temp_dir(), 'audit.csv')
+
+    def _run():
+        if mode == 'audit':
+            Synapsis.Utils.audit_permissions(project['id'], [fake.user_id], path)
+        else:
+            for entity_id in entity_ids:
+                Synapsis.Utils.get_entity_permission(entity_id, fake.user_id)
+
+    return _run, len(entity_ids)
+
+
+@benchmark(params=['delete_skip_trash', 'delete_many_skip_trash'], unit='entities', repeat=3)
+def bench_delete_many(ctx, mode):
+    def _run():
+        # Each repeat deletes a new tree. Creating it in the fake does not add RTT.
+        ids = [f['id'] for f in _fake_tree(ctx, 100)]
+        if mode == 'delete_many_skip_trash':
+            Synapsis.Utils.delete_many_skip_trash(ids)
+        else:
+            for id in ids:
+                Synapsis.Utils.delete_skip_trash(id)
+
+    return _run, 100
+
+
+@benchmark(params=['get_bundle', 'broker'], unit='calls', repeat=3)
+def bench_bundle_broker(ctx, mode):
+    from synapsis.core import BundleBroker
+    files = _fake_tree(ctx, 10)
+    flags = [{'include_annotations': True}, {'include_permissions': True}, {'include_file_handles': True}]
+
+    def _run():
+        broker = BundleBroker() if mode == 'broker' else None
+        for f in files:
+            for include in flags:
+                Synapsis.Utils.get_bundle(f['id'], broker=broker, **include)
+
+    return _run, len(files) * len(flags)
+
+
+@benchmark(params=['get_bundle', 'get_version_bundles'], unit='versions', repeat=3)
+def bench_version_bundles(ctx, mode):
+    fake = ctx.fake_synapse
+    file = _fake_tree(ctx, 1)[0]
+    for i in range(49):
+        fake.create_file_version(file, content=b'x' if i % 2 else None)
+
+    def _run():
+        if mode == 'get_version_bundles':
+            list(Synapsis.Utils.get_version_bundles(file['id']))
+        else:
+            for version in range(1, 51):
+                Synapsis.Utils.get_bundle(file['id'], version=version, include_file_handles=True)
+
+    return _run, 50
+
+
+@benchmark(params=['store', 'set_annotations_many'], unit='entities', repeat=3)
+def bench_set_annotations_many(ctx, mode):
+    files = _fake_tree(ctx, 50)
+    counter = iter(range(1_000_000))
+
+    def _run():
+        value = next(counter)
+        if mode == 'set_annotations_many':
+            Synapsis.Utils.set_annotations_many({f['id']: {'run': value} for f in files})
+        else:
+            for f in files:
+                entity = Synapsis.get(f['id'], downloadFile=False)
+                entity['run'] = value
+                Synapsis.store(entity, forceVersion=False)
+
+    return _run, len(files)
+
+
+@benchmark(params=['get_bundle', 'list_entity_metadata'], unit='files', repeat=3)
+def bench_list_entity_metadata(ctx, mode):
+    fake = ctx.fake_synapse
+    files = _fake_tree(ctx, 200)
+    project_id = fake.__entity_path__(files[0]['id'])[1]['id']
+    for f in files:
+        fake.annotations[f['id']] = {'study': {'type': 'STRING', 'value': ['abc']}}
+
+    def _run():
+        if mode == 'list_entity_metadata':
+            list(Synapsis.Utils.list_entity_metadata(project_id))
+        else:
+            for f in files:
+                Synapsis.Utils.get_bundle(f['id'], include_annotations=True, include_file_handles=True)
+
+    return _run, len(files)
+
+
+@benchmark(params=[0, 2], unit='rows', repeat=3)
+def bench_query_table_batches(ctx, prefetch):
+    fake = ctx.fake_synapse
+    project = fake.create_project()
+    columns = [{'name': 'name', 'columnType': 'STRING'}, {'name': 'age', 'columnType': 'INTEGER'},
+               {'name': 'score', 'columnType': 'DOUBLE'}]
+    table = fake.create_table('table', project, columns, [['name-{0}'.format(i), i, i / 2] for i in range(20_000)])
+    sql = 'SELECT * FROM {0}'.format(table['id'])
+
+    def _run():
+        # Each page is a query job that takes the server 200ms.
+        fake.job_duration = 0.2
+        try:
+            for _ in Synapsis.Utils.query_table_batches(sql, format='numpy', prefetch=prefetch):
+                pass
+        finally:
+            fake.job_duration = 0
+
+    return _run, 20_000
+
+
+@benchmark(params=[1, 4], unit='rows', repeat=3)
+def bench_append_table_rows(ctx, workers):
+    fake = ctx.fake_synapse
+    project = fake.create_project()
+    columns = [{'name': 'name', 'columnType': 'STRING'}, {'name': 'age', 'columnType': 'INTEGER'},
+               {'name': 'score', 'columnType': 'DOUBLE'}]
+    table = fake.create_table('table', project, columns)
+    rows = [['name-{0}'.format(i), i, i / 2] for i in range(20_000)]
+
+    def _run():
+        # Each chunk is an append job that takes the server 200ms.
+        fake.job_duration = 0.2
+        try:
+            Synapsis.Utils.append_table_rows(table, rows, chunk_rows=1000, workers=workers)
+        finally:
+            fake.job_duration = 0
+
+    return _run, len(rows)
+
+
+@benchmark(params=['download', 'copy'], unit='files', repeat=3)
+def bench_migrate_storage(ctx, mode):
+    import concurrent.futures
+    import requests
+    from synapseclient.core.upload import multipart_upload
+    fake = ctx.fake_synapse
+    project = fake.create_project()
+    files = [fake.create_file('file-{0}.bin'.format(i), project, content=b'x' * 2 ** 21) for i in range(20)]
+    # Each run moves the files to a new storage location.
+    locations = iter(range(2, 1000))
+
+    def _download_and_upload(file, storage_location_id):
+        # How files are moved without migrate_storage: the bytes are downloaded and uploaded again.
+        entity = Synapsis.Synapse.restGET('/entity/{0}'.format(file['id']))
+        url = Synapsis.Utils.get_filehandles([(file['id'], entity['dataFileHandleId'])],
+                                             include_pre_signed_urls=True)[0]['preSignedURL']
+        content = requests.get(url).content
+        entity['dataFileHandleId'] = multipart_upload.multipart_upload_string(Synapsis.Synapse,
+                                                                              content.decode('utf-8'),
+                                                                              dest_file_name=file['name'],
+                                                                              storage_location_id=storage_location_id,
+                                                                              preview=False)
+        Synapsis.Synapse.restPUT('/entity/{0}'.format(file['id']), body=json.dumps(entity))
+
+    def _run():
+        storage_location_id = next(locations)
+        if mode == 'download':
+            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(lambda f: _download_and_upload(f, storage_location_id), files))
+        else:
+            Synapsis.Utils.migrate_storage(files, storage_location_id, workers=8)
+
+    return _run, len(files)
+
+
+@benchmark(params=[1, 8], unit='files', repeat=3)
+def bench_register_external_files(ctx, workers):
+    fake = ctx.fake_synapse
+    records = [('data/{0}/file-{1}.bin'.format(i % 10, i), 1024, 'md5-{0}'.format(i)) for i in range(500)]
+
+    def _run():
+        # Each run registers the objects in a new Project.
+        project = fake.create_project()
+        Synapsis.Utils.register_external_files(records, project, 5, bucket_name='bucket', workers=workers)
+
+    return _run, len(records)
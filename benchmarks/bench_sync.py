@@ -0,0 +1,29 @@
+from synapsis import Synapsis
+from .harness import benchmark
+
+FILES = 200
+
+
+@benchmark(params=[1, 8], unit='files', repeat=3)
+def bench_sync_up(ctx, workers):
+    fake = ctx.fake_synapse
+    local_dir = ctx.temp_dir(files=FILES, size=1024)
+
+    def _run():
+        project = fake.create_project()
+        Synapsis.Utils.sync_up(local_dir, project['id'], hash_workers=workers, upload_workers=workers)
+
+    return _run, FILES
+
+
+@benchmark(params=[1, 8], unit='files', repeat=3)
+def bench_sync_down(ctx, workers):
+    fake = ctx.fake_synapse
+    project = fake.create_project()
+    for i in range(FILES):
+        fake.create_file('file-{0}.bin'.format(i), project, content=b'x' * 1024)
+
+    def _run():
+        Synapsis.Utils.sync_down(project['id'], ctx.temp_dir(), resolve_workers=workers, download_workers=workers)
+
+    return _run, FILES
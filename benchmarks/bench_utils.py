@@ -0,0 +1,45 @@
+from synapsis.core import Utils
+from .harness import benchmark
+
+SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+
+
+def _items(size):
+    return [{'id': i, 'name': 'item-{0}'.format(i), 'group': i % 100} for i in range(size)]
+
+
+@benchmark(params=SIZES)
+def bench_find(ctx, size):
+    items = _items(size)
+    return lambda: Utils.find(items, key='id', value=size - 1), size
+
+
+@benchmark(params=SIZES)
+def bench_select(ctx, size):
+    items = _items(size)
+    return lambda: Utils.select(items, lambda i: i['group'] == 0), size
+
+
+@benchmark(params=SIZES)
+def bench_first(ctx, size):
+    items = _items(size)
+    return lambda: Utils.first(items, key='id', value=size - 1), size
+
+
+@benchmark(params=SIZES)
+def bench_last(ctx, size):
+    items = _items(size)
+    return lambda: Utils.last(items, key='id', value=0), size
+
+
+@benchmark(params=SIZES)
+def bench_map(ctx, size):
+    items = _items(size)
+    return lambda: Utils.map(items, key='name'), size
+
+
+@benchmark(params=SIZES)
+def bench_unique(ctx, size):
+    # 100 distinct values, Utils.unique is quadratic in the number of distinct values.
+    items = _items(size)
+    return lambda: Utils.unique(items, key='group'), size
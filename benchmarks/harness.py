@@ -0,0 +1,234 @@
+from __future__ import annotations
+import typing as t
+import datetime
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARKS: dict[str, Benchmark] = {}
+
+
+class Benchmark(object):
+    def __init__(self, name: str, func: t.Callable, params: list[t.Any], unit: str, repeat: int, group: str,
+                 memory: bool = False):
+        self.name = name
+        self.func = func
+        self.params = params
+        self.unit = unit
+        self.repeat = repeat
+        self.group = group
+        self.memory = memory
+
+    def key(self, param: t.Any) -> str:
+        return self.name if param is None else '{0}[{1}]'.format(self.name, param)
+
+
+def benchmark(name: t.Optional[str] = None,
+              params: t.Optional[list[t.Any]] = None,
+              unit: str = 'items',
+              repeat: int = 5,
+              memory: bool = False) -> t.Callable:
+    """
+    Registers a benchmark.
+
+    The decorated function is called with a BenchmarkContext and one of the params, and must return a tuple of
+    (callable, items). The callable is timed and items is the number of units it processes per call.
+
+    Memory benchmarks measure the bytes still allocated by the object the callable returns instead of timing it.
+
+    :param name: Name of the benchmark. Defaults to the function name.
+    :param params: Values to run the benchmark with (e.g., input sizes).
+    :param unit: Name of the unit processed by the benchmark.
+    :param repeat: Number of times to time the callable.
+    :param memory: True to measure the memory held by the callable's return value.
+    :return: Decorator
+    """
+
+    def _decorator(func: t.Callable) -> t.Callable:
+        bench_name = name or func.__name__.removeprefix('bench_')
+        group = func.__module__.rsplit('.', 1)[-1].removeprefix('bench_')
+        BENCHMARKS['{0}.{1}'.format(group, bench_name)] = Benchmark('{0}.{1}'.format(group, bench_name),
+                                                                    func,
+                                                                    params or [None],
+                                                                    unit,
+                                                                    repeat,
+                                                                    group,
+                                                                    memory)
+        return func
+
+    return _decorator
+
+
+class BenchmarkContext(object):
+    """Shared state for benchmarks. Starts a FakeSynapse and logs into it the first time it is needed."""
+
+    def __init__(self, rtt: float = 0.0):
+        self.rtt = rtt
+        self._fake_synapse = None
+        self._temp_files = []
+
+    @property
+    def fake_synapse(self):
+        if self._fake_synapse is None:
+            from synapsis import Synapsis
+            from synapsis.testing import FakeSynapse
+            self._fake_synapse = FakeSynapse().start()
+            Synapsis.configure(synapse_args=self._fake_synapse.synapse_args,
+                               authToken=self._fake_synapse.auth_token).login()
+        self._fake_synapse.latency = self.rtt
+        return self._fake_synapse
+
+    def temp_file(self, size: int) -> str:
+        """Creates a temp file with random content that is deleted when the context is closed."""
+        fd, path = tempfile.mkstemp(prefix='synapsis-bench-')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(os.urandom(size))
+        self._temp_files.append(path)
+        return path
+
+    def temp_dir(self, files: int = 0, size: int = 0) -> str:
+        """Creates a temp directory with files of random content that is deleted when the context is closed."""
+        path = tempfile.mkdtemp(prefix='synapsis-bench-')
+        for i in range(files):
+            with open(os.path.join(path, 'file-{0}.bin'.format(i)), mode='wb') as f:
+                f.write(os.urandom(size))
+        self._temp_files.append(path)
+        return path
+
+    def close(self) -> None:
+        for path in self._temp_files:
+            if os.path.isfile(path):
+                os.remove(path)
+            elif os.path.isdir(path):
+                shutil.rmtree(path)
+        self._temp_files.clear()
+        if self._fake_synapse is not None:
+            from synapsis import Synapsis
+            Synapsis.configure()
+            self._fake_synapse.stop()
+            self._fake_synapse = None
+
+
+def run(names: t.Optional[list[str]] = None, context: t.Optional[BenchmarkContext] = None,
+        log: t.Callable = print) -> dict:
+    """
+    Runs the registered benchmarks.
+
+    :param names: Only run benchmarks whose key contains one of these values.
+    :param context: The BenchmarkContext to run with.
+    :param log: Function to log progress with.
+    :return: dict of results keyed by benchmark key.
+    """
+    context = context or BenchmarkContext()
+    results = {}
+    try:
+        for bench in BENCHMARKS.values():
+            for param in bench.params:
+                key = bench.key(param)
+                if names and not any(n in key for n in names):
+                    continue
+                func, items = bench.func(context, param)
+                if bench.memory:
+                    results[key] = measure_memory(bench, param, func, items)
+                    log('{0:<60} {1:>12,}B {2:>16,.1f} B/{3}'.format(key, results[key]['bytes'],
+                                                                     results[key]['bytes_per_item'], bench.unit))
+                    continue
+                func()  # Warm up.
+                timings = []
+                for _ in range(bench.repeat):
+                    gc.collect()
+                    start = time.perf_counter()
+                    func()
+                    timings.append(time.perf_counter() - start)
+                median = statistics.median(timings)
+                results[key] = {
+                    'group': bench.group,
+                    'param': param,
+                    'unit': bench.unit,
+                    'items': items,
+                    'repeat': bench.repeat,
+                    'min_s': min(timings),
+                    'median_s': median,
+                    'per_second': items / median if median > 0 else None
+                }
+                log('{0:<60} {1:>12.6f}s {2:>16,.0f} {3}/s'.format(key, median, results[key]['per_second'] or 0,
+                                                                   bench.unit))
+    finally:
+        context.close()
+    return results
+
+
+def measure_memory(bench: Benchmark, param: t.Any, func: t.Callable, items: int) -> dict:
+    """Measures the bytes allocated by func() that are still held by its return value."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        retained = func()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del retained
+    return {
+        'group': bench.group,
+        'param': param,
+        'unit': bench.unit,
+        'items': items,
+        'bytes': size,
+        'bytes_per_item': size / items if items else None
+    }
+
+
+def metadata(rtt: float) -> dict:
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'rtt_s': rtt
+    }
+
+
+def save(path: str, results: dict, meta: dict) -> None:
+    with open(path, mode='w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
+
+
+def load(path: str) -> dict:
+    with open(path, mode='r') as f:
+        return json.load(f)
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[dict]:
+    """
+    Compares results against a baseline.
+
+    :param results: Results from run().
+    :param baseline: Results from a previous run().
+    :param threshold: Allowed slowdown (or memory growth) as a fraction of the baseline (e.g., 0.1 for 10%).
+    :return: List of comparisons.
+    """
+    comparisons = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        metric = 'bytes' if 'bytes' in result else 'median_s'
+        if base is None or not base.get(metric):
+            continue
+        ratio = result[metric] / base[metric]
+        comparisons.append({
+            'key': key,
+            'metric': metric,
+            'baseline': base[metric],
+            'current': result[metric],
+            'ratio': ratio,
+            'regression': ratio > 1 + threshold
+        })
+    return comparisons
@@ -1,6 +1,11 @@
 from .narg import Narg, none
 from .utils import Utils
-from .hooks import Hooks
+from .hooks import Hooks, RequestEvent
+from .request_metrics import RequestMetrics
 from .synapsis import Synapsis
 from .synapsis_utils import SynapsisUtils
-from . import cli, exceptions
+from .child_index import ChildIndex
+from .permission_audit import MembershipIndex
+from .bundle_broker import BundleBroker
+from .records import EntityHeader
+from . import cli, exceptions, records
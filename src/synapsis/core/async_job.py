@@ -0,0 +1,134 @@
+from __future__ import annotations
+import typing as t
+import random
+import re
+import threading
+import time
+from .codec import Codec
+from .exceptions import SynapsisError
+from .job_scheduler import JobScheduler
+
+if t.TYPE_CHECKING:
+    from ..synapse import Synapse
+
+
+class AsyncJob(object):
+    """
+    A Synapse asynchronous job (e.g., a table query).
+
+    The job is started with {uri}/async/start and its response is polled from {uri}/async/get/{token}. The first poll
+    is sent when the job is expected to finish (from the average duration of the last jobs of the same kind), then the
+    delay grows by BACKOFF (with jitter) up to max_delay, so short jobs are picked up quickly and long jobs are not
+    polled in a tight loop.
+
+    Jobs are waited on by the shared JobScheduler, which polls all the jobs of the process from one thread.
+
+    Usage:
+        response = AsyncJob(synapse, '/entity/syn123/table/query', request).start().wait()
+        future = JobScheduler.shared().submit(AsyncJob(synapse, '/entity/syn123/table/query', request).start())
+    """
+    MIN_DELAY: t.Final[float] = 0.05
+    MAX_DELAY: t.Final[float] = 2.0
+    BACKOFF: t.Final[float] = 1.5
+    JITTER: t.Final[float] = 0.2
+    # Weight of the last job when averaging the durations of the jobs of a kind.
+    DURATION_WEIGHT: t.Final[float] = 0.3
+    PROCESSING: t.Final[str] = 'PROCESSING'
+    FAILED: t.Final[str] = 'FAILED'
+    __durations__: t.ClassVar[dict[str, float]] = {}
+    __durations_lock__: t.ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self,
+                 synapse: Synapse,
+                 uri: str,
+                 request: dict,
+                 timeout: t.Optional[float] = None,
+                 max_delay: t.Optional[float] = None,
+                 endpoint: t.Optional[str] = None):
+        """
+        :param synapse: The Synapse client.
+        :param uri: The URI of the job without /async/start (e.g., /entity/syn123/table/query).
+        :param request: The job request body.
+        :param timeout: Seconds to wait for the job to finish. None to wait forever.
+        :param max_delay: Max seconds to wait between polls.
+        :param endpoint: The Synapse endpoint. None for the repo endpoint.
+        """
+        self.synapse = synapse
+        self.uri = uri
+        self.request = request
+        self.timeout = timeout
+        self.max_delay = max_delay or self.MAX_DELAY
+        self.endpoint = endpoint
+        self.token: str | None = None
+        self.polls: int = 0
+        self.__started_at__: float | None = None
+
+    @property
+    def kind(self) -> str:
+        """Gets the kind of the job (the URI without IDs)."""
+        return re.sub(r'syn\d+', '{id}', self.uri)
+
+    def start(self) -> AsyncJob:
+        """Starts the job."""
+        response = self.synapse.restPOST('{0}/async/start'.format(self.uri),
+                                         body=Codec.current().dumps(self.request),
+                                         endpoint=self.endpoint)
+        self.token = response['token']
+        self.__started_at__ = time.monotonic()
+        return self
+
+    def poll(self) -> dict | None:
+        """
+        Gets the job's response.
+
+        :return: The response or None if the job is still processing.
+        """
+        self.polls += 1
+        response = self.synapse.restGET('{0}/async/get/{1}'.format(self.uri, self.token), endpoint=self.endpoint)
+        state = response.get('jobState') if isinstance(response, dict) else None
+        if state == self.PROCESSING:
+            return None
+        elif state == self.FAILED:
+            raise SynapsisError('Asynchronous job {0} failed: {1}'.format(self.token, response.get('errorMessage')))
+        self.__finished__()
+        return response
+
+    def wait(self) -> dict:
+        """
+        Waits for the job to finish. The job is polled by the shared JobScheduler.
+
+        :return: The job's response.
+        """
+        return JobScheduler.shared().wait(self)
+
+    def first_delay(self) -> float:
+        """Gets the seconds to wait before the first poll: the rest of the time the last jobs of this kind took."""
+        return self.expected_duration() - (time.monotonic() - self.__started_at__)
+
+    def next_delay(self, delay: float) -> float:
+        """Gets the seconds to wait before the next poll from the last delay."""
+        return min(self.max_delay, max(self.MIN_DELAY, delay * self.BACKOFF))
+
+    def jitter(self, delay: float) -> float:
+        """Spreads a delay out so jobs started together are not polled together."""
+        return delay * random.uniform(1 - self.JITTER, 1 + self.JITTER)
+
+    def deadline(self) -> float | None:
+        """Gets the time.monotonic() the job times out at. None if it does not time out."""
+        return None if self.timeout is None else self.__started_at__ + self.timeout
+
+    def expected_duration(self) -> float:
+        """Gets the average seconds the last jobs of the same kind took to finish, 0 if none have finished."""
+        with self.__durations_lock__:
+            return min(self.max_delay, self.__durations__.get(self.kind, 0.0))
+
+    def __finished__(self) -> None:
+        # Jobs that were done on the first poll count as taking no time, so they are polled right away.
+        duration = 0.0 if self.polls == 1 else time.monotonic() - self.__started_at__
+        with self.__durations_lock__:
+            average = self.__durations__.get(self.kind)
+            self.__durations__[self.kind] = duration if average is None else \
+                average + self.DURATION_WEIGHT * (duration - average)
+
+    def __repr__(self):
+        return 'AsyncJob({0}, {1})'.format(self.uri, self.token)
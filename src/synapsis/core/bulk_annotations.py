@@ -0,0 +1,147 @@
+from __future__ import annotations
+import typing as t
+import synapseclient
+from synapseclient.annotations import Annotations, to_synapse_annotations
+from synapseclient.core.exceptions import SynapseHTTPError
+from .codec import Codec
+from .bundle_broker import BundleBroker
+from .pipeline import Pipeline
+
+if t.TYPE_CHECKING:
+    from .synapsis_utils import SynapsisUtils
+
+
+class AnnotationItem(object):
+    """An Entity whose annotations are being updated and what happened to it."""
+    __slots__ = ('position', 'id', 'values', 'status', 'etag', 'retries', 'error')
+
+    def __init__(self, position: int, id: str, values: dict):
+        self.position: int = position
+        self.id: str = id
+        self.values: dict = values
+        self.status: str | None = None
+        self.etag: str | None = None
+        self.retries: int = 0
+        self.error: Exception | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'etag': self.etag,
+            'retries': self.retries,
+            'error': self.error
+        }
+
+
+class BulkAnnotations(object):
+    """
+    Updates the annotations of many Entities concurrently.
+
+    The current annotations and etag of each Entity are read from its bundle, the new values are merged into them, and
+    only the annotations are sent (not the Entity). When an Entity was changed since its annotations were read (412),
+    its annotations are read again, the new values are merged again, and the update is retried.
+    """
+    UPDATED: t.Final[str] = 'updated'
+    UNCHANGED: t.Final[str] = 'unchanged'
+    FAILED: t.Final[str] = 'failed'
+    CONFLICT_STATUS: t.Final[int] = 412
+
+    def __init__(self,
+                 utils: SynapsisUtils,
+                 updates: t.Mapping[str, dict] | t.Iterable[tuple[synapseclient.Entity | str, dict]],
+                 replace: bool = False,
+                 workers: int = 8,
+                 max_retries: int = 5,
+                 queue_size: int = 100,
+                 progress: t.Optional[t.Callable[[str, int], None]] = None):
+        self.utils = utils
+        self.synapse = utils.__synapse__
+        self.updates = updates
+        self.replace = replace
+        self.workers = workers
+        self.max_retries = max_retries
+        self.queue_size = queue_size
+        self.progress = progress
+        self.__finished__: list[AnnotationItem] = []
+
+    def run(self) -> list[dict]:
+        self.__finished__ = []
+        items = Pipeline(queue_size=self.queue_size,
+                         progress=self.progress,
+                         on_error=self.__on_error__) \
+            .stage('update', self.__update__, workers=self.workers) \
+            .run(AnnotationItem(position, self.utils.id_of(entity), values)
+                 for position, (entity, values) in enumerate(self.__pairs__()))
+        items = self.__finished__ + items
+        items.sort(key=lambda i: i.position)
+        return [item.to_dict() for item in items]
+
+    def __pairs__(self) -> t.Iterable[tuple[synapseclient.Entity | str, dict]]:
+        # Entities are not hashable so they are passed as (entity, values) pairs, IDs can also be passed as a dict.
+        return self.updates.items() if isinstance(self.updates, t.Mapping) else self.updates
+
+    def merge(self, current: dict, values: dict) -> dict:
+        """
+        Merges values into annotations.
+
+        :param current: The annotations (Synapse annotations v2 JSON, e.g. {'key': {'type': 'STRING', 'value': []}}).
+        :param values: The values to set as Synapse annotations v2 JSON. None removes the key.
+        :return: The merged annotations.
+        """
+        merged = {} if self.replace else dict(current)
+        for key, value in values.items():
+            if value is None:
+                merged.pop(key, None)
+            else:
+                merged[key] = value
+        return merged
+
+    def __typed__(self, item: AnnotationItem, etag: str) -> dict:
+        """Converts the values (e.g., {'key': 'value', 'other': [1, 2]}) to Synapse annotations v2 JSON."""
+        typed = {}
+        values = {}
+        for key, value in item.values.items():
+            if value is None or (isinstance(value, dict) and 'type' in value and 'value' in value):
+                typed[key] = value
+            else:
+                values[key] = value
+        if values:
+            typed.update(to_synapse_annotations(Annotations(item.id, etag, values))['annotations'])
+        return typed
+
+    def __update__(self, item: AnnotationItem) -> AnnotationItem:
+        broker = BundleBroker.current()
+        bundle = self.utils.get_bundle(item.id, include_entity=False, include_annotations=True)
+        annotations = bundle['annotations']
+        values = self.__typed__(item, annotations['etag'])
+        while True:
+            current = annotations.get('annotations') or {}
+            merged = self.merge(current, values)
+            if merged == current:
+                item.status = self.UNCHANGED
+                item.etag = annotations['etag']
+                return item
+            body = {'id': item.id, 'etag': annotations['etag'], 'annotations': merged}
+            try:
+                response = self.synapse.restPUT('/entity/{0}/annotations2'.format(item.id),
+                                                body=Codec.current().dumps(body))
+            except SynapseHTTPError as ex:
+                if ex.response is None or ex.response.status_code != self.CONFLICT_STATUS or \
+                        item.retries >= self.max_retries:
+                    raise
+                # Changed since it was read, merge into the current annotations.
+                item.retries += 1
+                annotations = self.synapse.restGET('/entity/{0}/annotations2'.format(item.id))
+                continue
+            finally:
+                if broker is not None:
+                    broker.invalidate(item.id)
+            item.status = self.UPDATED
+            item.etag = response['etag']
+            return item
+
+    def __on_error__(self, stage: str, item: AnnotationItem, error: Exception) -> None:
+        item.status = self.FAILED
+        item.error = error
+        self.__finished__.append(item)
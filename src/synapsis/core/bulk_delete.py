@@ -0,0 +1,221 @@
+from __future__ import annotations
+import typing as t
+import concurrent.futures
+import contextvars
+import threading
+import synapseclient
+from synapseclient.core.exceptions import SynapseHTTPError
+from .codec import Codec
+from .journal import Journal
+from .pipeline import Pipeline
+from .rate_limiter import RateLimiter
+from .records import FileHandle
+from ..synapse import SynapseConcreteType
+
+if t.TYPE_CHECKING:
+    from .synapsis_utils import SynapsisUtils
+
+
+class BulkDelete(object):
+    """
+    Deletes many Entities, and everything under them, and skips the trash.
+
+    Planning:
+        - cascade: The given Entities are deleted, containers first. The service deletes the children of a container.
+        - leaves up: The trees are listed and the non-container Entities are deleted first, then the containers from
+                     the deepest level up, so no single request deletes a large tree.
+
+    Each phase is run by parallel workers and each deleted ID is written to the journal so a rerun skips it.
+    """
+    DELETED: t.Final[str] = 'deleted'
+    NOT_FOUND: t.Final[str] = 'not_found'
+    SKIPPED: t.Final[str] = 'skipped'
+    FAILED: t.Final[str] = 'failed'
+    INCLUDE_TYPES: t.Final[list[str]] = ['folder', 'file', 'table', 'link', 'entityview', 'dockerrepo',
+                                         'submissionview', 'dataset', 'materializedview']
+    CONTAINER_TYPES: t.Final[frozenset[str]] = frozenset([SynapseConcreteType.PROJECT_ENTITY.code,
+                                                          SynapseConcreteType.FOLDER_ENTITY.code])
+
+    def __init__(self,
+                 utils: SynapsisUtils,
+                 ids_or_root: list[synapseclient.Entity | str] | synapseclient.Entity | str,
+                 cascade: bool = True,
+                 keep_root: bool = False,
+                 dry_run: bool = False,
+                 journal: t.Optional[str] = None,
+                 workers: int = 8,
+                 max_rate: t.Optional[float] = None,
+                 queue_size: int = 100,
+                 progress: t.Optional[t.Callable[[str, int], None]] = None):
+        self.utils = utils
+        self.synapse = utils.__synapse__
+        if not isinstance(ids_or_root, (list, tuple, set)):
+            ids_or_root = [ids_or_root]
+        self.ids: list[str] = list(dict.fromkeys(utils.id_of(id) for id in ids_or_root))
+        self.cascade = cascade
+        self.keep_root = keep_root
+        self.dry_run = dry_run
+        self.journal_path = journal
+        self.workers = max(1, workers)
+        self.limiter: RateLimiter | None = RateLimiter(rate=max_rate) if max_rate else None
+        self.queue_size = queue_size
+        self.progress = progress
+        self.__lock__ = threading.Lock()
+        self.__counts__: dict[str, int] = {}
+        self.__failed__: list[dict] = []
+        self.__journal__: Journal | None = None
+
+    def run(self) -> dict:
+        """
+        Deletes the Entities or, in a dry run, reports what would be deleted.
+
+        :return: dict with: deleted, not_found, skipped (in the journal), failed (list of dicts with id and error),
+                 and requests. Dry runs return: entities, containers, files, bytes, types (count by type),
+                 and requests (the number of delete requests that would be sent).
+        """
+        self.__journal__ = Journal(self.journal_path, read_only=self.dry_run)
+        try:
+            roots = self.__roots__()
+            if self.dry_run:
+                return self.__report__(roots)
+            phases = self.__plan__(roots)
+            for phase in phases:
+                Pipeline(queue_size=self.queue_size, progress=self.progress, on_error=self.__on_error__) \
+                    .stage('delete', self.__delete__, workers=self.workers) \
+                    .run(phase)
+            return {
+                self.DELETED: self.__counts__.get(self.DELETED, 0),
+                self.NOT_FOUND: self.__counts__.get(self.NOT_FOUND, 0),
+                self.SKIPPED: self.__counts__.get(self.SKIPPED, 0),
+                self.FAILED: self.__failed__,
+                'requests': sum(len(phase) for phase in phases)
+            }
+        finally:
+            self.__journal__.close()
+
+    def __roots__(self) -> list[tuple[str, str]]:
+        """Gets the (id, type) of the given Entities that are not in the journal and exist."""
+        roots = []
+        ids = [id for id in self.ids if id not in self.__journal__]
+        self.__count__(self.SKIPPED, len(self.ids) - len(ids))
+        for id, header in zip(ids, self.utils.get_entity_headers(ids)):
+            if header is None:
+                self.__count__(self.NOT_FOUND)
+                self.__journal__.add(id)
+            else:
+                roots.append((header.id, header.type))
+        return roots
+
+    def __plan__(self, roots: list[tuple[str, str]]) -> list[list[str]]:
+        """Gets the IDs to delete in phases. The IDs in a phase are deleted in parallel."""
+        if self.cascade:
+            targets = self.__children__(roots) if self.keep_root else roots
+            # Containers first so their descendants are not deleted one by one.
+            targets = sorted(targets, key=lambda e: e[1] not in self.CONTAINER_TYPES)
+            return [[id for id, _ in targets]]
+
+        levels = self.__levels__(roots)
+        if self.keep_root:
+            levels = levels[1:]
+        leaves = [id for level in levels for id, type in level if type not in self.CONTAINER_TYPES]
+        containers = [[id for id, type in level if type in self.CONTAINER_TYPES] for level in reversed(levels)]
+        return [phase for phase in [leaves] + containers if phase]
+
+    def __children__(self, parents: list[tuple[str, str]]) -> list[tuple[str, str]]:
+        """Lists the children of the containers in parallel."""
+        containers = [id for id, type in parents if type in self.CONTAINER_TYPES]
+        children = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, self.__list__, id) for id in containers]
+            for future in futures:
+                children.extend(future.result())
+        return children
+
+    def __list__(self, parent_id: str) -> list[tuple[str, str]]:
+        request = {'parentId': parent_id, 'includeTypes': self.INCLUDE_TYPES, 'sortBy': 'NAME', 'sortDirection': 'ASC'}
+        # A dry run gets the size of the files from the listing instead of reading each file handle.
+        if self.dry_run:
+            request['includeSumFileSizes'] = True
+        children = []
+        while True:
+            response = self.synapse.restPOST('/entity/children', body=Codec.current().dumps(request))
+            if 'sumFileSizesBytes' in response and 'nextPageToken' not in request:
+                self.__count__('bytes', int(response['sumFileSizesBytes'] or 0))
+            children.extend((child['id'], child['type'])
+                            for child in response['page'] if child['id'] not in self.__journal__)
+            if not response.get('nextPageToken'):
+                return children
+            request['nextPageToken'] = response['nextPageToken']
+
+    def __levels__(self, roots: list[tuple[str, str]]) -> list[list[tuple[str, str]]]:
+        """Lists the trees one level at a time. The first level is the roots."""
+        levels = [roots]
+        while True:
+            children = self.__children__(levels[-1])
+            if not children:
+                return levels
+            levels.append(children)
+
+    def __delete__(self, id: str) -> None:
+        if id in self.__journal__:
+            self.__count__(self.SKIPPED)
+            return None
+        if self.limiter is not None:
+            self.limiter.acquire()
+        try:
+            self.utils.delete_skip_trash(id)
+            status = self.DELETED
+        except SynapseHTTPError as ex:
+            if ex.response is None or ex.response.status_code != 404:
+                raise
+            # Already deleted (e.g., by a cascading delete).
+            status = self.NOT_FOUND
+        self.__journal__.add(id)
+        self.__count__(status)
+        return None
+
+    def __on_error__(self, stage: str, id: str, error: Exception) -> None:
+        with self.__lock__:
+            self.__failed__.append({'id': id, 'error': error})
+
+    def __count__(self, status: str, count: int = 1) -> None:
+        with self.__lock__:
+            self.__counts__[status] = self.__counts__.get(status, 0) + count
+
+    def __report__(self, roots: list[tuple[str, str]]) -> dict:
+        levels = self.__levels__(roots)
+        kept = levels[0] if self.keep_root else []
+        entities = [entity for level in levels for entity in level if entity not in kept]
+        types = {}
+        for _, type in entities:
+            types[type] = types.get(type, 0) + 1
+        file_ids = [id for id, type in entities if type == SynapseConcreteType.FILE_ENTITY.code]
+        # The files in the trees were summed by the listing, only the Files that were given are read.
+        size = self.__counts__.get('bytes', 0)
+        root_file_ids = [] if self.keep_root else \
+            [id for id, type in roots if type == SynapseConcreteType.FILE_ENTITY.code]
+        if root_file_ids:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(contextvars.copy_context().run, self.utils.get_filehandle, id,
+                                           record_type=FileHandle) for id in root_file_ids]
+                for future in futures:
+                    file_handle = future.result()
+                    if file_handle is not None:
+                        size += file_handle.content_size or 0
+        containers = sum(1 for _, type in entities if type in self.CONTAINER_TYPES)
+        if not self.cascade:
+            requests = len(entities)
+        elif self.keep_root:
+            requests = len(levels[1]) if len(levels) > 1 else 0
+        else:
+            requests = len(roots)
+        return {
+            'dry_run': True,
+            'entities': len(entities),
+            'containers': containers,
+            'files': len(file_ids),
+            'bytes': size,
+            'types': types,
+            'requests': requests,
+            self.NOT_FOUND: self.__counts__.get(self.NOT_FOUND, 0)
+        }
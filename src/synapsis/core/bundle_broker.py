@@ -0,0 +1,196 @@
+from __future__ import annotations
+import typing as t
+import contextvars
+import copy
+import threading
+import time
+from .single_flight import SingleFlight
+
+CURRENT_BROKER: t.Final[contextvars.ContextVar[BundleBroker | None]] = contextvars.ContextVar('synapsis_bundle_broker',
+                                                                                             default=None)
+# The tokens of the `with BundleBroker():` blocks entered in the current context, innermost last.
+BROKER_TOKENS: t.Final[contextvars.ContextVar[tuple[contextvars.Token, ...]]] = contextvars.ContextVar(
+    'synapsis_bundle_broker_tokens', default=())
+
+
+class BundleRequest(object):
+    __slots__ = ('flags', 'sent', 'event', 'bundle', 'error')
+
+    def __init__(self, flags: frozenset[str]):
+        self.flags: frozenset[str] = flags
+        self.sent: bool = False
+        self.event: threading.Event = threading.Event()
+        self.bundle: dict | None = None
+        self.error: BaseException | None = None
+
+
+class BundleBroker(object):
+    """
+    Merges the bundle2 requests for the same Entity into one request with the union of the include flags.
+
+    Requests for an Entity that arrive while a request for it is waiting to be sent are merged into it, and requests
+    that arrive while it is in flight wait for it if it includes their flags. The bundles are cached for the life of
+    the broker so later requests for a subset of the flags are answered from the cache. With learn_flags, the flags
+    requested for one Entity are also requested for the next ones. Use a broker for a unit of work and call
+    invalidate() after changing an Entity.
+
+    Usage:
+        with BundleBroker():
+            # One bundle2 request for both calls.
+            Synapsis.Utils.get_bundle('syn123', include_annotations=True)
+            Synapsis.Utils.get_bundle('syn123', include_annotations=True, include_file_handles=True)
+    """
+    # The bundle key set by each include flag.
+    FLAG_KEYS: t.Final[dict[str, str]] = {
+        'includeEntity': 'entity',
+        'includeAnnotations': 'annotations',
+        'includePermissions': 'permissions',
+        'includeEntityPath': 'path',
+        'includeHasChildren': 'hasChildren',
+        'includeAccessControlList': 'accessControlList',
+        'includeFileHandles': 'fileHandles',
+        'includeTableBundle': 'tableBundle',
+        'includeRootWikiId': 'rootWikiId',
+        'includeBenefactorACL': 'benefactorAcl',
+        'includeDOIAssociation': 'doiAssociation',
+        'includeFileName': 'fileName',
+        'includeThreadCount': 'threadCount',
+        'includeRestrictionInformation': 'restrictionInformation'
+    }
+
+    def __init__(self, window: float = 0.0, learn_flags: bool = False):
+        """
+        :param window: Seconds to wait before sending a request so concurrent requests for the same Entity can be
+                       merged into it. 0 to send it right away.
+        :param learn_flags: True to also request the flags that were requested for other Entities, so code that gets
+                            each Entity's bundle with different flags in turn sends one request per Entity. Every
+                            request in the broker then includes all the flags, e.g. ACLs and file handles.
+        """
+        self.window = window
+        self.learn_flags = learn_flags
+        self.__flags__: frozenset[str] = frozenset()
+        self.__lock__ = threading.Lock()
+        self.__bundles__: dict[tuple[str, int | None], tuple[frozenset[str], dict]] = {}
+        self.__requests__: dict[tuple[str, int | None], BundleRequest] = {}
+        self.__stats__: dict[str, int] = {'requests': 0, 'merged': 0, 'cached': 0}
+
+    @classmethod
+    def current(cls) -> BundleBroker | None:
+        """Gets the broker of the current `with BundleBroker():` block."""
+        return CURRENT_BROKER.get()
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """
+        Gets the counters.
+
+            - requests: Number of bundle2 requests sent.
+            - merged: Number of calls that were merged into a request of another call.
+            - cached: Number of calls answered from the cache.
+        :return: dict
+        """
+        with self.__lock__:
+            return dict(self.__stats__)
+
+    def invalidate(self, entity_id: t.Optional[str] = None) -> None:
+        """
+        Drops the cached bundles.
+
+        :param entity_id: The Entity to drop the bundles (all versions) of. None to drop all the bundles.
+        """
+        with self.__lock__:
+            if entity_id is None:
+                self.__bundles__.clear()
+            else:
+                for key in [key for key in self.__bundles__ if key[0] == entity_id]:
+                    del self.__bundles__[key]
+
+    def get(self,
+            entity_id: str,
+            version: int | None,
+            flags: t.Iterable[str],
+            fetch: t.Callable[[frozenset[str]], dict]) -> dict:
+        """
+        Gets a bundle.
+
+        :param entity_id: The ID of the Entity.
+        :param version: The version or None for the current version.
+        :param flags: The include flags that are set (e.g., includeAnnotations).
+        :param fetch: Called with the include flags to send the bundle2 request.
+        :return: The bundle with only the keys for flags.
+        """
+        key = (entity_id, version)
+        flags = frozenset(flags)
+        while True:
+            with self.__lock__:
+                cached = self.__bundles__.get(key)
+                if cached is not None and flags <= cached[0]:
+                    self.__stats__['cached'] += 1
+                    return self.__subset__(cached[1], flags)
+                if self.learn_flags:
+                    self.__flags__ |= flags
+                request = self.__requests__.get(key)
+                if request is None:
+                    # Include the cached flags so the new bundle is a superset of the cached one.
+                    request = self.__requests__[key] = BundleRequest(flags | self.__flags__ |
+                                                                     (cached[0] if cached else frozenset()))
+                    leader = True
+                elif not request.sent:
+                    request.flags |= flags | self.__flags__
+                    self.__stats__['merged'] += 1
+                    leader = False
+                elif flags <= request.flags:
+                    self.__stats__['merged'] += 1
+                    leader = False
+                else:
+                    leader = None
+
+            if leader is None:
+                # The request in flight does not have all the flags, wait for it and request the union.
+                request.event.wait()
+                continue
+            if leader:
+                self.__send__(key, request, fetch)
+                if request.error is not None:
+                    raise request.error
+            else:
+                request.event.wait()
+                if request.error is not None:
+                    # Each waiter raises its own copy so concurrent raises do not change each other's traceback.
+                    raise SingleFlight.__copy_error__(request.error)
+            return self.__subset__(request.bundle, flags)
+
+    def __send__(self, key: tuple[str, int | None], request: BundleRequest, fetch: t.Callable) -> None:
+        if self.window > 0:
+            time.sleep(self.window)
+        with self.__lock__:
+            request.sent = True
+            self.__stats__['requests'] += 1
+        try:
+            request.bundle = fetch(request.flags)
+        except BaseException as ex:
+            request.error = ex
+        finally:
+            with self.__lock__:
+                if request.error is None:
+                    self.__bundles__[key] = (request.flags, request.bundle)
+                del self.__requests__[key]
+            request.event.set()
+
+    def __subset__(self, bundle: dict, flags: frozenset[str]) -> dict:
+        """Copies the keys of the bundle for flags (and the keys not set by a flag, e.g. entityType)."""
+        excluded = {bundle_key for flag, bundle_key in self.FLAG_KEYS.items() if flag not in flags}
+        return {key: copy.deepcopy(value) for key, value in bundle.items() if key not in excluded}
+
+    def __enter__(self) -> BundleBroker:
+        # The token is kept in the context so threads that enter the same broker do not reset each other's blocks.
+        BROKER_TOKENS.set(BROKER_TOKENS.get() + (CURRENT_BROKER.set(self),))
+        return self
+
+    def __exit__(self, *exc) -> None:
+        tokens = BROKER_TOKENS.get()
+        BROKER_TOKENS.set(tokens[:-1])
+        CURRENT_BROKER.reset(tokens[-1])
+
+    def __repr__(self):
+        return 'BundleBroker({0} bundles)'.format(len(self.__bundles__))
@@ -0,0 +1,129 @@
+from __future__ import annotations
+import typing as t
+import threading
+import synapseclient
+from synapseclient.core.utils import id_of
+from ..synapse import Synapse
+
+
+class ChildIndex(object):
+    """
+    An in-memory index of the children of a Project or Folder keyed by name.
+
+    The children are listed once (one request per page) instead of one findEntityId request per name.
+
+    Usage:
+        index = ChildIndex('syn123')
+        header = index.get('file.txt')
+        entity = Synapsis.Utils.find_entity('file.txt', index=index)
+    """
+    DEFAULT_INCLUDE_TYPES: t.Final[list[str]] = ['folder', 'file', 'table', 'link', 'entityview', 'dockerrepo',
+                                                 'submissionview', 'dataset', 'materializedview']
+
+    def __init__(self,
+                 parent: synapseclient.Entity | str,
+                 synapse: t.Optional[Synapse] = None,
+                 include_types: t.Optional[list[str]] = None,
+                 load: bool = True):
+        """
+        :param parent: The Project or Folder to index.
+        :param synapse: The Synapse client to list the children with. Defaults to Synapsis.Synapse.
+        :param include_types: The entity types to index. Defaults to all types.
+        :param load: True to list the children now, otherwise they are listed on first access.
+        """
+        self.parent_id: str = id_of(parent)
+        self.include_types: list[str] = list(include_types or self.DEFAULT_INCLUDE_TYPES)
+        self.__synapse__: Synapse | None = synapse
+        self.__lock__ = threading.RLock()
+        self.__children__: dict[str, dict] | None = None
+        self.__newest__: str | None = None
+        if load:
+            self.refresh(full=True)
+
+    @property
+    def synapse(self) -> Synapse:
+        if self.__synapse__ is None:
+            from .. import Synapsis
+            return Synapsis.Synapse
+        return self.__synapse__
+
+    @property
+    def children(self) -> dict[str, dict]:
+        """Gets the entity headers keyed by name."""
+        with self.__lock__:
+            if self.__children__ is None:
+                self.refresh(full=True)
+            return self.__children__
+
+    def get(self, name: str, default: t.Any = None) -> dict | t.Any:
+        """Gets the entity header for a child by name."""
+        return self.children.get(name, default)
+
+    def id_of(self, name: str) -> str | None:
+        """Gets the ID of a child by name."""
+        header = self.get(name)
+        return header['id'] if header else None
+
+    def names(self) -> list[str]:
+        return list(self.children.keys())
+
+    def refresh(self, full: bool = False) -> t.Self:
+        """
+        Updates the index.
+
+        :param full: True to list all the children again. Otherwise only the children created since the newest
+                     indexed child are listed, renamed, moved, and deleted children are not updated.
+        :return: Self
+        """
+        with self.__lock__:
+            if full or self.__children__ is None:
+                children = {}
+                newest = None
+                for child in self.synapse.getChildren(self.parent_id, includeTypes=self.include_types):
+                    children[child['name']] = child
+                    if newest is None or child['createdOn'] > newest:
+                        newest = child['createdOn']
+                self.__children__ = children
+                self.__newest__ = newest
+            else:
+                newest = self.__newest__
+                for child in self.synapse.getChildren(self.parent_id,
+                                                      includeTypes=self.include_types,
+                                                      sortBy='CREATED_ON',
+                                                      sortDirection='DESC'):
+                    if newest is not None and child['createdOn'] < newest:
+                        break
+                    self.__put__(child)
+        return self
+
+    def add(self, header: dict) -> None:
+        """Adds or replaces a child (e.g., after creating it). Must have 'name' and 'id'."""
+        with self.__lock__:
+            if self.__children__ is None:
+                self.refresh(full=True)
+            self.__put__(header)
+
+    def remove(self, name: str) -> dict | None:
+        """Removes a child by name."""
+        with self.__lock__:
+            return self.children.pop(name, None)
+
+    def __put__(self, header: dict) -> None:
+        self.__children__[header['name']] = header
+        created_on = header.get('createdOn')
+        if created_on and (self.__newest__ is None or created_on > self.__newest__):
+            self.__newest__ = created_on
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.children
+
+    def __len__(self) -> int:
+        return len(self.children)
+
+    def __iter__(self) -> t.Iterator[dict]:
+        return iter(list(self.children.values()))
+
+    def __repr__(self):
+        return 'ChildIndex({0}, {1} children)'.format(self.parent_id,
+                                                      'not loaded' if self.__children__ is None else
+                                                      len(self.__children__))
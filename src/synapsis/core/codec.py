@@ -0,0 +1,176 @@
+from __future__ import annotations
+import typing as t
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+
+class Codec(object):
+    """
+    Encodes and decodes JSON for the Synapse REST calls.
+
+    The default codec uses orjson or ujson when installed, otherwise the stdlib json module.
+
+    Usage:
+        body = Codec.current().dumps({'id': 'syn123'})
+        data = Codec.current().loads(response.content)
+        Codec.use('json')
+    """
+    NAME: t.ClassVar[str] = 'json'
+    # Higher is preferred when the codec is available.
+    PRIORITY: t.ClassVar[int] = 0
+    CODECS: t.ClassVar[dict[str, type[Codec]]] = {}
+    __CURRENT__: t.ClassVar[Codec | None] = None
+    # Used to walk large responses one value at a time.
+    __DECODER__: t.Final[json.JSONDecoder] = json.JSONDecoder()
+    __WHITESPACE__: t.Final[str] = ' \t\n\r'
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        Codec.CODECS[cls.NAME] = cls
+
+    @classmethod
+    def available(cls) -> list[str]:
+        """Gets the names of the codecs that can be used, fastest first."""
+        codecs = sorted(cls.CODECS.values(), key=lambda c: c.PRIORITY, reverse=True)
+        return [codec.NAME for codec in codecs if codec.is_available()]
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+
+    @classmethod
+    def current(cls) -> Codec:
+        """Gets the codec in use."""
+        if Codec.__CURRENT__ is None:
+            Codec.use(None)
+        return Codec.__CURRENT__
+
+    @classmethod
+    def use(cls, codec: t.Optional[str | Codec] = None) -> Codec:
+        """
+        Sets the codec to use.
+
+        :param codec: The name of a codec (e.g., 'orjson', 'ujson', 'json') or a Codec. None to use the fastest
+                      available codec.
+        :return: The codec.
+        """
+        if codec is None:
+            codec = cls.available()[0]
+        if isinstance(codec, str):
+            codec_type = cls.CODECS.get(codec)
+            if codec_type is None or not codec_type.is_available():
+                raise ValueError('JSON codec not available: {0}. Available: {1}'.format(codec, cls.available()))
+            codec = codec_type()
+        if not isinstance(codec, Codec):
+            raise ValueError('Invalid JSON codec: {0}'.format(codec))
+        Codec.__CURRENT__ = codec
+        return codec
+
+    def dumps(self, obj: t.Any) -> str | bytes:
+        """Encodes obj as compact JSON. Non-ASCII text is escaped or UTF-8 encoded so it can be sent as is."""
+        return json.dumps(obj, separators=(',', ':'))
+
+    def loads(self, data: str | bytes) -> t.Any:
+        """Decodes JSON."""
+        return json.loads(data)
+
+    def iter_items(self, data: str | bytes, key: t.Optional[str] = None) -> t.Iterator[t.Any]:
+        """
+        Decodes the items of a JSON array one at a time instead of building the whole list.
+
+        :param data: JSON with an array at the top level, or an object with an array under key.
+        :param key: The key of the array in the top level object. None if the array is at the top level.
+        :return: Iterator of the decoded items.
+        """
+        text = data.decode('utf-8') if isinstance(data, (bytes, bytearray)) else data
+        decode = self.__DECODER__.raw_decode
+        pos = self.__skip__(text, 0)
+        if key is not None:
+            pos = self.__find_key__(text, pos, key)
+            if pos is None:
+                return
+        if text[pos:pos + 1] != '[':
+            raise ValueError('Expected a JSON array at: {0}'.format(pos))
+        pos = self.__skip__(text, pos + 1)
+        if text[pos:pos + 1] == ']':
+            return
+        while True:
+            item, pos = decode(text, pos)
+            yield item
+            pos = self.__skip__(text, pos)
+            char = text[pos:pos + 1]
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError('Expected "," or "]" at: {0}'.format(pos))
+            pos = self.__skip__(text, pos + 1)
+
+    def __find_key__(self, text: str, pos: int, key: str) -> int | None:
+        """Gets the position of the value for key in the object at pos, skipping the other values."""
+        decode = self.__DECODER__.raw_decode
+        if text[pos:pos + 1] != '{':
+            raise ValueError('Expected a JSON object at: {0}'.format(pos))
+        pos = self.__skip__(text, pos + 1)
+        while text[pos:pos + 1] not in ('}', ''):
+            name, pos = decode(text, pos)
+            pos = self.__skip__(text, pos)
+            if text[pos:pos + 1] != ':':
+                raise ValueError('Expected ":" at: {0}'.format(pos))
+            pos = self.__skip__(text, pos + 1)
+            if name == key:
+                return pos
+            _, pos = decode(text, pos)
+            pos = self.__skip__(text, pos)
+            if text[pos:pos + 1] == ',':
+                pos = self.__skip__(text, pos + 1)
+        return None
+
+    def __skip__(self, text: str, pos: int) -> int:
+        while pos < len(text) and text[pos] in self.__WHITESPACE__:
+            pos += 1
+        return pos
+
+    def __repr__(self):
+        return '{0}({1})'.format(type(self).__name__, self.NAME)
+
+
+class UjsonCodec(Codec):
+    NAME: t.ClassVar[str] = 'ujson'
+    PRIORITY: t.ClassVar[int] = 1
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return ujson is not None
+
+    def dumps(self, obj: t.Any) -> bytes:
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode('utf-8')
+
+    def loads(self, data: str | bytes) -> t.Any:
+        return ujson.loads(data)
+
+
+class OrjsonCodec(Codec):
+    NAME: t.ClassVar[str] = 'orjson'
+    PRIORITY: t.ClassVar[int] = 2
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return orjson is not None
+
+    def dumps(self, obj: t.Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def loads(self, data: str | bytes) -> t.Any:
+        return orjson.loads(data)
+
+
+Codec.CODECS[Codec.NAME] = Codec
@@ -0,0 +1,145 @@
+from __future__ import annotations
+import typing as t
+import uuid
+import synapseclient
+from .async_job import AsyncJob
+from .codec import Codec
+from .tables import TableQuery
+from ..synapse import SynapseConcreteType
+
+if t.TYPE_CHECKING:
+    import pyarrow
+    from .synapsis_utils import SynapsisUtils
+
+ENTITY_VIEW: t.Final[str] = 'org.sagebionetworks.repo.model.table.EntityView'
+VIEW_COLUMN_MODEL_REQUEST: t.Final[str] = 'org.sagebionetworks.repo.model.table.ViewColumnModelRequest'
+LIST_WRAPPER: t.Final[str] = 'org.sagebionetworks.repo.model.ListWrapper'
+
+
+class EntityViewListing(object):
+    """
+    Lists the metadata of the Entities in a Project or Folder with one paged query of an Entity View.
+
+    A temporary View is created with the Project or Folder as its scope (Views only include the direct children of a
+    Folder, so the Folders under a Folder are added to the scope), queried a page at a time, and deleted.
+    """
+    # EntityView.viewTypeMask bits.
+    VIEW_TYPE_MASKS: t.Final[dict[str, int]] = {
+        'file': 0x01,
+        'project': 0x02,
+        'table': 0x04,
+        'folder': 0x08,
+        'entityview': 0x10,
+        'dockerrepo': 0x20
+    }
+    DEFAULT_COLUMNS: t.Final[list[str]] = ['id', 'name', 'type', 'parentId', 'dataFileMD5Hex', 'dataFileSizeBytes']
+    RECORDS: t.Final[str] = 'records'
+    ARROW: t.Final[str] = 'arrow'
+    FORMATS: t.Final[list[str]] = [RECORDS, ARROW]
+
+    def __init__(self,
+                 utils: SynapsisUtils,
+                 container: synapseclient.Entity | str,
+                 include_types: t.Optional[list[str]] = None,
+                 columns: t.Optional[list[str]] = None,
+                 annotations: bool = True,
+                 view: t.Optional[synapseclient.Entity | str] = None,
+                 keep_view: bool = False,
+                 page_size: t.Optional[int] = None,
+                 format: str = RECORDS,
+                 timeout: t.Optional[float] = None):
+        if format not in self.FORMATS:
+            raise ValueError('Invalid format: {0}. Must be one of: {1}'.format(format, ', '.join(self.FORMATS)))
+        include_types = include_types or ['file']
+        invalid_types = [name for name in include_types if name not in self.VIEW_TYPE_MASKS]
+        if invalid_types:
+            raise ValueError('Invalid include_types: {0}'.format(', '.join(invalid_types)))
+        self.utils = utils
+        self.synapse = utils.__synapse__
+        self.container_id = utils.id_of(container)
+        self.view_type_mask = sum(self.VIEW_TYPE_MASKS[name] for name in set(include_types))
+        self.columns = columns or list(self.DEFAULT_COLUMNS)
+        self.__columns_set__ = columns is not None
+        self.annotations = annotations
+        self.view_id: str | None = utils.id_of(view) if view else None
+        self.keep_view = keep_view
+        self.page_size = page_size
+        self.format = format
+        self.timeout = timeout
+        self.query: TableQuery | None = None
+
+    def run(self) -> t.Iterator[dict | pyarrow.RecordBatch]:
+        created = self.view_id is None
+        if created:
+            self.view_id, names = self.__create_view__()
+        else:
+            names = self.columns if self.__columns_set__ else None
+        try:
+            select = ', '.join('"{0}"'.format(name.replace('"', '""')) for name in names) if names else '*'
+            self.query = TableQuery(self.synapse,
+                                    'SELECT {0} FROM {1}'.format(select, self.view_id),
+                                    page_size=self.page_size,
+                                    timeout=self.timeout)
+            if self.format == self.ARROW:
+                yield from self.query.arrow_batches()
+            else:
+                yield from self.query.records()
+        finally:
+            if created and not self.keep_view:
+                self.utils.delete_skip_trash(self.view_id)
+
+    def scope(self) -> list[str]:
+        """Gets the IDs of the containers to scope the View to."""
+        container = self.synapse.restGET('/entity/{0}'.format(self.container_id))
+        if not SynapseConcreteType.get(container).is_folder:
+            return [self.container_id]
+        scope = []
+        pending = [self.container_id]
+        while pending:
+            folder_id = pending.pop()
+            scope.append(folder_id)
+            pending.extend(child['id'] for child in self.synapse.getChildren(folder_id, includeTypes=['folder']))
+        return scope
+
+    def __create_view__(self) -> tuple[str, list[str]]:
+        """
+        Creates the View.
+
+        :return: The ID of the View and the names of its columns.
+        """
+        scope = self.scope()
+        default_columns = self.synapse.restGET(
+            '/column/tableview/defaults?viewEntityType=entityview&viewTypeMask={0}'.format(self.view_type_mask))['list']
+        default_names = {c['name'] for c in default_columns}
+        invalid_columns = [name for name in self.columns if name not in default_names]
+        if invalid_columns:
+            raise ValueError('Invalid columns: {0}'.format(', '.join(invalid_columns)))
+        columns = sorted((c for c in default_columns if c['name'] in self.columns),
+                         key=lambda c: self.columns.index(c['name']))
+        if self.annotations:
+            columns.extend(c for c in self.__annotation_columns__(scope) if c['name'] not in default_names)
+        columns = self.synapse.restPOST('/column/batch',
+                                        body=Codec.current().dumps({'concreteType': LIST_WRAPPER,
+                                                                    'list': columns}))['list']
+        view = self.synapse.restPOST('/entity', body=Codec.current().dumps({
+            'name': 'synapsis-view-{0}'.format(uuid.uuid4().hex),
+            'parentId': self.container_id,
+            'concreteType': ENTITY_VIEW,
+            'scopeIds': scope,
+            'viewTypeMask': self.view_type_mask,
+            'columnIds': [c['id'] for c in columns]
+        }))
+        return view['id'], [c['name'] for c in columns]
+
+    def __annotation_columns__(self, scope: list[str]) -> t.Iterator[dict]:
+        """Gets the column models for the annotations of the Entities in the scope."""
+        request = {
+            'concreteType': VIEW_COLUMN_MODEL_REQUEST,
+            'viewScope': {'scope': scope, 'viewEntityType': 'entityview', 'viewTypeMask': self.view_type_mask}
+        }
+        while True:
+            response = AsyncJob(self.synapse, '/column/view/scope', request, timeout=self.timeout).start().wait()
+            yield from response.get('results') or []
+            if not response.get('nextPageToken'):
+                return
+            request = {**request, 'nextPageToken': response['nextPageToken']}
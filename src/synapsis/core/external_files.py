@@ -0,0 +1,305 @@
+from __future__ import annotations
+import typing as t
+import collections
+import mimetypes
+import threading
+import synapseclient
+from synapseclient.core.exceptions import SynapseHTTPError
+from .child_index import ChildIndex
+from .codec import Codec
+from .exceptions import SynapsisError
+from .journal import Journal
+from .pipeline import Pipeline
+from .single_flight import SingleFlight
+from ..synapse import SynapseConcreteType
+
+if t.TYPE_CHECKING:
+    from .synapsis_utils import SynapsisUtils
+
+
+class ExternalFileItem(object):
+    """An object in a bucket being registered as a File and what happened to it."""
+    __slots__ = ('key', 'size', 'md5', 'content_type', 'folders', 'name', 'parent_id', 'file_handle_id', 'status',
+                 'error')
+
+    def __init__(self, key: str, size: int, md5: str | None, content_type: str | None = None):
+        self.key: str = key
+        self.size: int = size
+        self.md5: str | None = md5
+        self.content_type: str | None = content_type
+        self.folders: tuple[str, ...] = ()
+        self.name: str | None = None
+        self.parent_id: str | None = None
+        self.file_handle_id: str | None = None
+        self.status: str | None = None
+        self.error: Exception | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            'key': self.key,
+            'status': self.status,
+            'error': self.error
+        }
+
+
+class ExternalFileRegistrar(object):
+    """
+    Registers objects that are already in an S3 bucket or object store as File Entities without uploading them.
+
+    Stages:
+        - folder: Creates the missing Folders for the path of each key (once per Folder), and skips the keys that
+                  already have a File in an existing Folder.
+        - file_handle: Creates the external file handles.
+        - create: Creates the File Entities.
+
+    Synapse does not have bulk create endpoints for file handles or entities, so each file handle and File is created
+    by one of the concurrent workers of its stage. A File that already exists with the name of a key is only counted
+    as existing if its file handle points to the same object. Otherwise the key failed, e.g., when two keys have the
+    same name once sanitized.
+
+    The records are streamed and the registered keys are written to the journal but not kept, so a rerun skips them (the
+    keys read from the journal of a previous run are kept). The journal starts with the parent, prefix, bucket, and
+    storage location, and a rerun with different ones raises a SynapsisError. Only the IDs of the Folders and the
+    children of the most recently used existing Folders are kept, so keys should be in order (as listed from a bucket)
+    for each existing Folder to be listed once.
+    """
+    REGISTERED: t.Final[str] = 'registered'
+    EXISTS: t.Final[str] = 'exists'
+    SKIPPED: t.Final[str] = 'skipped'
+    FAILED: t.Final[str] = 'failed'
+    CONFLICT_STATUS: t.Final[int] = 409
+    # Max number of existing Folders whose children are kept.
+    FOLDER_INDEX_CACHE_SIZE: t.Final[int] = 16
+
+    def __init__(self,
+                 utils: SynapsisUtils,
+                 records: t.Iterable[tuple | dict],
+                 parent: synapseclient.Entity | str,
+                 storage_location_id: int | str,
+                 bucket_name: t.Optional[str] = None,
+                 prefix: t.Optional[str] = None,
+                 journal: t.Optional[str] = None,
+                 workers: int = 8,
+                 queue_size: int = 1000,
+                 replace_char: str = '_',
+                 progress: t.Optional[t.Callable[[str, int], None]] = None):
+        if storage_location_id is None:
+            raise ValueError('storage_location_id is required.')
+        self.utils = utils
+        self.synapse = utils.__synapse__
+        self.records = records
+        self.parent_id = utils.id_of(parent)
+        self.storage_location_id = int(storage_location_id)
+        self.bucket_name = bucket_name
+        self.prefix = prefix or ''
+        self.journal_path = journal
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.replace_char = replace_char
+        self.progress = progress
+        self.__lock__ = threading.Lock()
+        self.__single_flight__ = SingleFlight()
+        self.__listings__ = SingleFlight()
+        # The Folder IDs keyed by path, and whether the Folder existed before the run.
+        self.__folders__: dict[tuple[str, ...], tuple[str, bool]] = {}
+        # The indexes of the children of the most recently used existing Folders keyed by Folder ID.
+        self.__indexes__: collections.OrderedDict[str, ChildIndex] = collections.OrderedDict()
+        self.__counts__: dict[str, int] = {}
+        self.__failed__: list[ExternalFileItem] = []
+        self.__journal__: Journal | None = None
+
+    def run(self) -> dict:
+        """
+        Registers the objects.
+
+        :return: Dict with the number of Files registered, Files that already existed (exists), keys skipped from the
+                 journal (skipped), and Folders created (folders), and the keys that failed (failed) as a list of dicts
+                 with: key, status, and error.
+        """
+        self.__folders__ = {}
+        self.__indexes__ = collections.OrderedDict()
+        self.__counts__ = {self.REGISTERED: 0, self.EXISTS: 0, self.SKIPPED: 0, 'folders': 0}
+        self.__failed__ = []
+        # Each key is added once, so the added keys are not kept.
+        self.__journal__ = Journal(self.journal_path, keep_added=False, header={
+            'parent': self.parent_id,
+            'prefix': self.prefix,
+            'bucket_name': self.bucket_name,
+            'storage_location_id': self.storage_location_id
+        })
+        try:
+            Pipeline(queue_size=self.queue_size,
+                     progress=self.progress,
+                     on_error=self.__on_error__) \
+                .stage('folder', self.__folder__, workers=self.workers) \
+                .stage('file_handle', self.__create_file_handle__, workers=self.workers) \
+                .stage('create', self.__create_file__, workers=self.workers) \
+                .run(self.__items__())
+        finally:
+            self.__journal__.close()
+        return {**self.__counts__, 'failed': [item.to_dict() for item in self.__failed__]}
+
+    def __items__(self) -> t.Iterator[ExternalFileItem]:
+        for record in self.records:
+            if isinstance(record, dict):
+                item = ExternalFileItem(record['key'], int(record['size']), record.get('md5'),
+                                        content_type=record.get('content_type'))
+            else:
+                key, size, md5 = record
+                item = ExternalFileItem(key, int(size), md5)
+            if item.key in self.__journal__:
+                self.__finish__(item, self.SKIPPED)
+            else:
+                yield item
+
+    def __folder__(self, item: ExternalFileItem) -> ExternalFileItem | None:
+        if not item.key.startswith(self.prefix):
+            raise SynapsisError('Key is not under the prefix: {0}'.format(self.prefix))
+        names = [self.utils.sanitize_entity_name(name, replace_char=self.replace_char)
+                 for name in item.key[len(self.prefix):].split('/') if name]
+        if not names or item.key.endswith('/'):
+            raise SynapsisError('Key does not name a file: {0}'.format(item.key))
+        item.folders, item.name = tuple(names[:-1]), names[-1]
+        item.parent_id, existed = self.__ensure_folder__(item.folders)
+
+        # The children of Folders created by this run do not need to be listed.
+        remote = self.__index__(item.parent_id).get(item.name) if existed else None
+        if remote is not None:
+            if not SynapseConcreteType.get(remote['type']).is_file:
+                raise SynapsisError('A non-file entity named: {0} already exists in: {1}'.format(item.name,
+                                                                                                 item.parent_id))
+            self.__check_existing__(item, remote['id'])
+            self.__journal__.add(item.key)
+            return self.__finish__(item, self.EXISTS)
+        return item
+
+    def __ensure_folder__(self, path: tuple[str, ...]) -> tuple[str, bool]:
+        """Gets the ID of the Folder for a path, and whether it existed, creating it if needed."""
+        folder = self.__folders__.get(path)
+        if folder is not None:
+            return folder
+        # Concurrent items in the same Folder wait for the call that creates it.
+        return self.__single_flight__.do(path, lambda: self.__resolve_folder__(path))
+
+    def __index__(self, folder_id: str) -> ChildIndex:
+        """Gets the index of the children of an existing Folder, listing them if they are not cached."""
+        index = self.__cached_index__(folder_id)
+        if index is not None:
+            return index
+        # Concurrent items in the same Folder wait for the call that lists it.
+        return self.__listings__.do(folder_id, lambda: self.__list__(folder_id))
+
+    def __cached_index__(self, folder_id: str) -> ChildIndex | None:
+        with self.__lock__:
+            index = self.__indexes__.get(folder_id)
+            if index is not None:
+                self.__indexes__.move_to_end(folder_id)
+            return index
+
+    def __list__(self, folder_id: str) -> ChildIndex:
+        index = self.__cached_index__(folder_id)
+        if index is not None:
+            return index
+        index = ChildIndex(folder_id, synapse=self.synapse)
+        with self.__lock__:
+            self.__indexes__[folder_id] = index
+            while len(self.__indexes__) > self.FOLDER_INDEX_CACHE_SIZE:
+                self.__indexes__.popitem(last=False)
+        return index
+
+    def __resolve_folder__(self, path: tuple[str, ...]) -> tuple[str, bool]:
+        folder = self.__folders__.get(path)
+        if folder is not None:
+            return folder
+        if not path:
+            folder = (self.parent_id, True)
+        else:
+            parent_id, existed = self.__ensure_folder__(path[:-1])
+            name = path[-1]
+            remote = self.__index__(parent_id).get(name) if existed else None
+            if remote is None:
+                entity = self.synapse.restPOST('/entity', body=Codec.current().dumps({
+                    'concreteType': SynapseConcreteType.FOLDER_ENTITY.code,
+                    'name': name,
+                    'parentId': parent_id
+                }))
+                self.__count__('folders')
+                folder = (entity['id'], False)
+            elif SynapseConcreteType.get(remote['type']).is_folder:
+                folder = (remote['id'], True)
+            else:
+                raise SynapsisError('A non-folder entity named: {0} already exists in: {1}'.format(name, parent_id))
+        self.__folders__[path] = folder
+        return folder
+
+    def __check_existing__(self, item: ExternalFileItem, entity_id: str) -> None:
+        """Raises if the existing File with the name of the item is not for the object of the item."""
+        file_handle = self.utils.get_filehandle(entity_id) or {}
+        if self.bucket_name is not None:
+            same = (file_handle.get('bucketName'), file_handle.get('key')) == (self.bucket_name, item.key)
+        else:
+            same = (file_handle.get('storageLocationId'), file_handle.get('fileKey')) == \
+                   (self.storage_location_id, item.key)
+        if not same:
+            raise SynapsisError('A File named: {0} for a different object already exists in: {1}'.format(
+                item.name, item.parent_id))
+
+    def __create_file_handle__(self, item: ExternalFileItem) -> ExternalFileItem:
+        file_name = item.key.rsplit('/', 1)[-1]
+        body = {
+            'fileName': file_name,
+            'contentSize': item.size,
+            'contentMd5': item.md5,
+            'contentType': item.content_type or mimetypes.guess_type(file_name, strict=False)[0] or
+                           'application/octet-stream',
+            'storageLocationId': self.storage_location_id
+        }
+        if self.bucket_name is not None:
+            uri = '/externalFileHandle/s3'
+            body.update(concreteType=SynapseConcreteType.S3_FILE_HANDLE.code, bucketName=self.bucket_name,
+                        key=item.key)
+        else:
+            uri = '/externalFileHandle'
+            body.update(concreteType=SynapseConcreteType.EXTERNAL_OBJECT_STORE_FILE_HANDLE.code, fileKey=item.key)
+        file_handle = self.synapse.restPOST(uri, body=Codec.current().dumps(body),
+                                            endpoint=self.synapse.fileHandleEndpoint)
+        item.file_handle_id = file_handle['id']
+        return item
+
+    def __create_file__(self, item: ExternalFileItem) -> None:
+        try:
+            self.synapse.restPOST('/entity', body=Codec.current().dumps({
+                'concreteType': SynapseConcreteType.FILE_ENTITY.code,
+                'name': item.name,
+                'parentId': item.parent_id,
+                'dataFileHandleId': item.file_handle_id
+            }))
+            status = self.REGISTERED
+        except SynapseHTTPError as ex:
+            if ex.response is None or ex.response.status_code != self.CONFLICT_STATUS:
+                raise
+            # Created since its Folder was listed, by a previous run or by another key with the same name.
+            entity_id = self.synapse.restPOST('/entity/child', body=Codec.current().dumps({
+                'parentId': item.parent_id,
+                'entityName': item.name
+            }))['id']
+            self.__check_existing__(item, entity_id)
+            status = self.EXISTS
+        self.__journal__.add(item.key)
+        # The items are counted, not kept.
+        return self.__finish__(item, status)
+
+    def __count__(self, name: str) -> None:
+        with self.__lock__:
+            self.__counts__[name] += 1
+
+    def __finish__(self, item: ExternalFileItem, status: str) -> None:
+        item.status = status
+        self.__count__(status)
+        return None
+
+    def __on_error__(self, stage: str, item: ExternalFileItem, error: Exception) -> None:
+        item.status = self.FAILED
+        item.error = error
+        with self.__lock__:
+            self.__failed__.append(item)
@@ -1,31 +1,308 @@
 from __future__ import annotations
 import typing as t
+import asyncio
+import concurrent.futures
+import inspect
+import logging
+import threading
+import time
+
+LOGGER: t.Final[logging.Logger] = logging.getLogger(__name__)
+
+
+class RequestEvent(object):
+    """
+    Details of a REST call made through Synapsis.Synapse. Passed to the request hooks as 'request'.
+
+    Calls that joined an identical call in flight (see coalesce_requests) are not sent. They are only passed to the
+    AFTER_REQUEST hooks, with shared=True, the status or error of the call they joined, and the time they waited.
+    """
+    __slots__ = ('method', 'uri', 'endpoint', 'helper', 'status', 'latency', 'request_bytes', 'response_bytes',
+                 'attempt', 'error', 'shared')
+
+    def __init__(self,
+                 method: str,
+                 uri: str,
+                 endpoint: str,
+                 helper: t.Optional[str] = None,
+                 request_bytes: int = 0):
+        self.method: str = method
+        self.uri: str = uri
+        self.endpoint: str = endpoint
+        self.helper: str | None = helper
+        self.status: int | None = None
+        self.latency: float | None = None
+        self.request_bytes: int = request_bytes
+        self.response_bytes: int = 0
+        self.attempt: int = 1
+        self.error: Exception | None = None
+        self.shared: bool = False
+
+    def __repr__(self):
+        return 'RequestEvent({0} {1}, status={2}, attempt={3}, helper={4}, shared={5})'.format(
+            self.method, self.uri, self.status, self.attempt, self.helper, self.shared)
+
+
+class HookEntry(object):
+    """A function registered for a hook and how it is dispatched."""
+    __slots__ = ('func', 'dispatch', 'is_coroutine', 'name')
+
+    def __init__(self, func: t.Callable, dispatch: str):
+        self.func: t.Callable = func
+        self.dispatch: str = dispatch
+        self.is_coroutine: bool = inspect.iscoroutinefunction(func)
+        self.name: str = getattr(func, '__qualname__', None) or repr(func)
 
 
 class Hooks:
     AFTER_LOGIN: t.Final[str] = 'AFTER_LOGIN'
-    ALL_HOOKS: t.Final[list[str]] = [AFTER_LOGIN]
+    BEFORE_REQUEST: t.Final[str] = 'BEFORE_REQUEST'
+    AFTER_REQUEST: t.Final[str] = 'AFTER_REQUEST'
+    ON_RETRY: t.Final[str] = 'ON_RETRY'
+    ALL_HOOKS: t.Final[list[str]] = [AFTER_LOGIN, BEFORE_REQUEST, AFTER_REQUEST, ON_RETRY]
+    REQUEST_HOOKS: t.Final[list[str]] = [BEFORE_REQUEST, AFTER_REQUEST, ON_RETRY]
+
+    # Call the hook in the calling thread. Coroutines are scheduled on the running loop if there is one in the
+    # calling thread, otherwise they are run to completion. Errors raised by the hooks that run in the calling thread
+    # are raised to the caller, errors raised by the other hooks are logged.
+    INLINE: t.Final[str] = 'INLINE'
+    # Call the hook on a background thread.
+    BACKGROUND: t.Final[str] = 'BACKGROUND'
+    # Schedule the hook on the running event loop (e.g., the loop awaiting Synapsis.Chain), otherwise BACKGROUND.
+    LOOP: t.Final[str] = 'LOOP'
+    ALL_DISPATCHES: t.Final[list[str]] = [INLINE, BACKGROUND, LOOP]
+
+    BACKGROUND_WORKERS: t.Final[int] = 4
 
     def __init__(self):
-        self.__hooks__ = {}
+        self.__hooks__: dict[str, list[HookEntry]] = {}
+        self.__stats__: dict[tuple[str, str], dict] = {}
+        self.__stats_lock__ = threading.Lock()
+        self.__executor__: concurrent.futures.ThreadPoolExecutor | None = None
+        self.__pending__: set = set()
+        self.__loop__: asyncio.AbstractEventLoop | None = None
+
+    def after_login(self, func: t.Callable, dispatch: str = INLINE):
+        self.__add_hook__(self.AFTER_LOGIN, func, dispatch=dispatch)
+
+    def before_request(self, func: t.Callable, dispatch: str = INLINE):
+        """Called with hook= and request=RequestEvent before each REST call is sent."""
+        self.__add_hook__(self.BEFORE_REQUEST, func, dispatch=dispatch)
+
+    def after_request(self, func: t.Callable, dispatch: str = INLINE):
+        """
+        Called with hook= and request=RequestEvent after each REST call completes or fails, and after each call that
+        shared the response of an identical call in flight (request.shared is True).
+        """
+        self.__add_hook__(self.AFTER_REQUEST, func, dispatch=dispatch)
+
+    def on_retry(self, func: t.Callable, dispatch: str = INLINE):
+        """Called with hook= and request=RequestEvent before each retry of a REST call."""
+        self.__add_hook__(self.ON_RETRY, func, dispatch=dispatch)
 
-    def after_login(self, func: t.Callable):
-        self.__add_hook__(self.AFTER_LOGIN, func)
+    def has_hook(self, *hooks: str) -> bool:
+        """Gets if any functions are registered for any of the hooks."""
+        for hook in hooks:
+            if self.__hooks__.get(hook):
+                return True
+        return False
+
+    def remove(self, hook: str, func: t.Callable):
+        entries = self.__hooks__.get(hook, [])
+        for entry in entries:
+            if entry.func == func:
+                entries.remove(entry)
+                break
+        if not entries:
+            self.__hooks__.pop(hook, None)
 
     def clear(self):
         self.__hooks__.clear()
 
-    def __add_hook__(self, hook: str, func: t.Callable):
+    @property
+    def stats(self) -> dict[str, dict[str, dict]]:
+        """
+        Gets the execution stats for each hook function keyed by hook then function name.
+
+            - calls: Number of times the function was called.
+            - errors: Number of times the function raised an error.
+            - total_s: Total seconds spent in the function.
+            - max_s: Longest call in seconds.
+        :return: dict
+        """
+        result = {}
+        with self.__stats_lock__:
+            for (hook, name), stats in self.__stats__.items():
+                result.setdefault(hook, {})[name] = dict(stats)
+        return result
+
+    def reset_stats(self) -> None:
+        with self.__stats_lock__:
+            self.__stats__.clear()
+
+    def bind_loop(self, loop: t.Optional[asyncio.AbstractEventLoop] = None) -> None:
+        """
+        Sets the event loop LOOP hooks are scheduled on when they are called from another thread.
+
+        :param loop: The loop. Defaults to the running loop in the calling thread, if any.
+        :return: None
+        """
+        if loop is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+        self.__loop__ = loop
+
+    def wait(self, timeout: t.Optional[float] = None) -> bool:
+        """
+        Waits for the BACKGROUND and LOOP hooks (and the INLINE coroutine hooks scheduled on a loop) that have been
+        dispatched to finish.
+
+        Must not be called from the event loop the hooks are scheduled on.
+
+        :param timeout: Max seconds to wait.
+        :return: True if all the hooks finished.
+        """
+        done, not_done = concurrent.futures.wait(list(self.__pending__), timeout=timeout)
+        return len(not_done) == 0
+
+    def shutdown(self) -> None:
+        """Waits for the background hooks and stops the background executor."""
+        if self.__executor__ is not None:
+            self.__executor__.shutdown(wait=True)
+            self.__executor__ = None
+
+    def __add_hook__(self, hook: str, func: t.Callable, dispatch: str = INLINE):
         if hook not in self.ALL_HOOKS:
             raise ValueError('Invalid hook: {0}. Must be one of: {1}.'.format(hook, ', '.join(self.ALL_HOOKS)))
+        if dispatch not in self.ALL_DISPATCHES:
+            raise ValueError(
+                'Invalid dispatch: {0}. Must be one of: {1}.'.format(dispatch, ', '.join(self.ALL_DISPATCHES)))
 
         if hook not in self.__hooks__:
             self.__hooks__[hook] = []
 
-        if func not in self.__hooks__[hook]:
-            self.__hooks__[hook].append(func)
+        if not any(entry.func == func for entry in self.__hooks__[hook]):
+            self.__hooks__[hook].append(HookEntry(func, dispatch))
+
+    def __call_hook__(self, hook, **kwargs):
+        entries = self.__hooks__.get(hook)
+        if not entries:
+            return
+        for entry in tuple(entries):
+            if entry.dispatch == self.INLINE:
+                if entry.is_coroutine:
+                    loop = self.__running_loop__()
+                    if loop is not None:
+                        self.__track_task__(loop.create_task(self.__run_async__(entry, hook, kwargs)))
+                    else:
+                        asyncio.run(self.__run_async__(entry, hook, kwargs, raise_errors=True))
+                else:
+                    self.__run__(entry, hook, kwargs, raise_errors=True)
+            elif entry.dispatch == self.LOOP and self.__schedule_on_loop__(entry, hook, kwargs):
+                pass
+            else:
+                self.__track__(self.__background__().submit(self.__run_in_thread__, entry, hook, kwargs))
+
+    def __run__(self, entry: HookEntry, hook: str, kwargs: dict, raise_errors: bool = False) -> None:
+        """Calls a sync hook. Errors are raised to the caller if raise_errors, otherwise they are logged."""
+        start = time.perf_counter()
+        try:
+            entry.func(hook=hook, **kwargs)
+        except Exception as ex:
+            self.__record__(entry, hook, time.perf_counter() - start, ex, raised=raise_errors)
+            if raise_errors:
+                raise
+            return
+        self.__record__(entry, hook, time.perf_counter() - start, None)
+
+    async def __run_async__(self, entry: HookEntry, hook: str, kwargs: dict, raise_errors: bool = False) -> None:
+        start = time.perf_counter()
+        try:
+            await entry.func(hook=hook, **kwargs)
+        except Exception as ex:
+            self.__record__(entry, hook, time.perf_counter() - start, ex, raised=raise_errors)
+            if raise_errors:
+                raise
+            return
+        self.__record__(entry, hook, time.perf_counter() - start, None)
+
+    def __run_tracked__(self, future: concurrent.futures.Future, entry: HookEntry, hook: str, kwargs: dict) -> None:
+        try:
+            self.__run__(entry, hook, kwargs)
+        finally:
+            future.set_result(None)
+
+    def __run_in_thread__(self, entry: HookEntry, hook: str, kwargs: dict) -> None:
+        if entry.is_coroutine:
+            asyncio.run(self.__run_async__(entry, hook, kwargs))
+        else:
+            self.__run__(entry, hook, kwargs)
+
+    def __schedule_on_loop__(self, entry: HookEntry, hook: str, kwargs: dict) -> bool:
+        loop = self.__running_loop__()
+        if loop is not None:
+            if entry.is_coroutine:
+                self.__track_task__(loop.create_task(self.__run_async__(entry, hook, kwargs)))
+            else:
+                loop.call_soon(self.__run_tracked__, self.__tracked__(), entry, hook, kwargs)
+            return True
+
+        loop = self.__loop__
+        if loop is None or loop.is_closed() or not loop.is_running():
+            return False
+        if entry.is_coroutine:
+            self.__track__(asyncio.run_coroutine_threadsafe(self.__run_async__(entry, hook, kwargs), loop))
+        else:
+            loop.call_soon_threadsafe(self.__run_tracked__, self.__tracked__(), entry, hook, kwargs)
+        return True
+
+    def __record__(self,
+                   entry: HookEntry,
+                   hook: str,
+                   elapsed: float,
+                   error: Exception | None,
+                   raised: bool = False) -> None:
+        # Errors that are not raised to the caller (e.g., from hooks that were not called inline) are logged.
+        if error is not None and not raised:
+            LOGGER.error('Error calling {0} hook {1}: {2}'.format(hook, entry.name, error), exc_info=error)
+        with self.__stats_lock__:
+            stats = self.__stats__.get((hook, entry.name))
+            if stats is None:
+                stats = self.__stats__[(hook, entry.name)] = {'calls': 0, 'errors': 0, 'total_s': 0.0, 'max_s': 0.0}
+            stats['calls'] += 1
+            stats['total_s'] += elapsed
+            if elapsed > stats['max_s']:
+                stats['max_s'] = elapsed
+            if error is not None:
+                stats['errors'] += 1
+
+    def __background__(self) -> concurrent.futures.ThreadPoolExecutor:
+        if self.__executor__ is None:
+            self.__executor__ = concurrent.futures.ThreadPoolExecutor(max_workers=self.BACKGROUND_WORKERS,
+                                                                      thread_name_prefix='synapsis-hooks')
+        return self.__executor__
+
+    def __track__(self, future: concurrent.futures.Future) -> None:
+        # Keeps a reference to the future until it is done.
+        self.__pending__.add(future)
+        future.add_done_callback(self.__pending__.discard)
+
+    def __tracked__(self) -> concurrent.futures.Future:
+        """Gets a new tracked future for a callback scheduled on a loop. The callback resolves it."""
+        future = concurrent.futures.Future()
+        self.__track__(future)
+        return future
+
+    def __track_task__(self, task: asyncio.Task) -> None:
+        # Tasks cannot be waited on from other threads, so a future is resolved when the task is done.
+        future = self.__tracked__()
+        task.add_done_callback(lambda _: future.set_result(None))
 
-    def __call_hook__(self, hook):
-        funcs = self.__hooks__.get(hook, [])
-        for func in funcs:
-            func(hook=hook)
+    @staticmethod
+    def __running_loop__() -> asyncio.AbstractEventLoop | None:
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            return None
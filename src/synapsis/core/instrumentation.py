@@ -0,0 +1,55 @@
+from __future__ import annotations
+import typing as t
+import contextvars
+import functools
+import inspect
+
+CURRENT_HELPER: t.Final[contextvars.ContextVar[str | None]] = contextvars.ContextVar('synapsis_current_helper',
+                                                                                     default=None)
+
+
+def current_helper() -> str | None:
+    """Gets the name of the outermost synapsis helper currently executing."""
+    return CURRENT_HELPER.get()
+
+
+def helper(func: t.Callable) -> t.Callable:
+    """
+    Decorates a synapsis helper so REST calls made while it runs are attributed to it (see RequestEvent.helper).
+
+    Nested helpers are attributed to the outermost helper.
+    """
+    name = func.__qualname__
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def _generator_wrapper(*args, **kwargs):
+            generator = func(*args, **kwargs)
+            try:
+                while True:
+                    token = CURRENT_HELPER.set(name) if CURRENT_HELPER.get() is None else None
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        if token is not None:
+                            CURRENT_HELPER.reset(token)
+                    yield item
+            finally:
+                # Closing the wrapper closes the helper's generator so its cleanup runs now.
+                generator.close()
+
+        return _generator_wrapper
+
+    @functools.wraps(func)
+    def _wrapper(*args, **kwargs):
+        if CURRENT_HELPER.get() is not None:
+            return func(*args, **kwargs)
+        token = CURRENT_HELPER.set(name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            CURRENT_HELPER.reset(token)
+
+    return _wrapper
@@ -0,0 +1,211 @@
+from __future__ import annotations
+import typing as t
+import asyncio
+import concurrent.futures
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from .exceptions import SynapsisError
+from .rate_limiter import RateLimiter
+
+if t.TYPE_CHECKING:
+    from .async_job import AsyncJob
+
+
+class ScheduledJob(object):
+    """A job being polled, when to poll it next, and the future to resolve."""
+    __slots__ = ('job', 'future', 'context', 'delay', 'due', 'deadline')
+
+    def __init__(self, job: AsyncJob, future: concurrent.futures.Future, context: contextvars.Context,
+                 delay: float, due: float, deadline: float | None):
+        self.job: AsyncJob = job
+        self.future: concurrent.futures.Future = future
+        self.context: contextvars.Context = context
+        self.delay: float = delay
+        self.due: float = due
+        self.deadline: float | None = deadline
+
+
+class JobScheduler(object):
+    """
+    Polls many Synapse asynchronous jobs from one scheduler thread.
+
+    Each job is polled when it is expected to finish and then with a growing, jittered delay (see AsyncJob). The
+    scheduler keeps the jobs ordered by the time of their next poll and sends the due polls on a few poll workers, at
+    most max_poll_rate polls per second across all the jobs. Hundreds of jobs can be waited on without a thread each,
+    and the number of status calls is bounded no matter how many jobs are running.
+
+    A single scheduler is shared by the process (JobScheduler.shared()).
+
+    Usage:
+        future = JobScheduler.shared().submit(AsyncJob(synapse, '/entity/syn123/table/query', request).start())
+        response = future.result()
+        response = await JobScheduler.shared().wait_async(job)
+    """
+    __SHARED__: t.ClassVar[JobScheduler | None] = None
+    __SHARED_LOCK__: t.Final[threading.Lock] = threading.Lock()
+
+    def __init__(self, max_poll_rate: float = 50.0, poll_workers: int = 8):
+        """
+        :param max_poll_rate: Max number of polls per second across all the jobs.
+        :param poll_workers: Max number of polls sent at a time.
+        """
+        if max_poll_rate <= 0:
+            raise ValueError('max_poll_rate must be greater than 0.')
+        self.max_poll_rate = max_poll_rate
+        self.poll_workers = max(1, poll_workers)
+        self.__limiter__ = RateLimiter(rate=max_poll_rate, burst=self.poll_workers, max_rate=max_poll_rate)
+        self.__condition__ = threading.Condition()
+        self.__poll_slots__ = threading.BoundedSemaphore(self.poll_workers)
+        # Heap of (due, sequence, ScheduledJob). The sequence keeps jobs that are due at the same time in order.
+        self.__heap__: list[tuple[float, int, ScheduledJob]] = []
+        self.__sequence__ = itertools.count()
+        self.__executor__: concurrent.futures.ThreadPoolExecutor | None = None
+        self.__thread__: threading.Thread | None = None
+        self.__polling__: int = 0
+        self.__polls__: int = 0
+        self.__finished__: int = 0
+        self.__closed__: bool = False
+
+    @classmethod
+    def shared(cls) -> JobScheduler:
+        """Gets the scheduler shared by the process."""
+        if JobScheduler.__SHARED__ is None:
+            with JobScheduler.__SHARED_LOCK__:
+                if JobScheduler.__SHARED__ is None:
+                    JobScheduler.__SHARED__ = cls()
+        return JobScheduler.__SHARED__
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """
+        Gets the counters.
+
+            - pending: Number of jobs waiting for their next poll.
+            - polling: Number of polls being sent.
+            - polls: Number of polls sent.
+            - finished: Number of jobs that finished, failed, or timed out.
+        :return: dict
+        """
+        with self.__condition__:
+            return {
+                'pending': len(self.__heap__),
+                'polling': self.__polling__,
+                'polls': self.__polls__,
+                'finished': self.__finished__
+            }
+
+    def submit(self, job: AsyncJob) -> concurrent.futures.Future:
+        """
+        Polls a job until it finishes. The job is started if it has not been started.
+
+        :param job: The job.
+        :return: Future of the job's response.
+        """
+        if self.__closed__:
+            raise SynapsisError('JobScheduler is closed.')
+        if job.token is None:
+            job.start()
+        future = concurrent.futures.Future()
+        # Polled in the caller's context so the polls are counted with the caller's requests.
+        delay = job.first_delay()
+        self.__schedule__(ScheduledJob(job,
+                                       future,
+                                       contextvars.copy_context(),
+                                       delay,
+                                       time.monotonic() + job.jitter(delay),
+                                       job.deadline()))
+        return future
+
+    def wait(self, job: AsyncJob) -> dict:
+        """Waits for a job to finish and gets its response."""
+        return self.submit(job).result()
+
+    async def wait_async(self, job: AsyncJob) -> dict:
+        """Waits for a job to finish, without blocking the event loop, and gets its response."""
+        if job.token is None:
+            await asyncio.to_thread(job.start)
+        return await asyncio.wrap_future(self.submit(job))
+
+    def close(self) -> None:
+        """Stops the scheduler thread. The pending jobs are cancelled."""
+        with self.__condition__:
+            self.__closed__ = True
+            pending = [entry for _, _, entry in self.__heap__]
+            self.__heap__.clear()
+            self.__condition__.notify_all()
+        for entry in pending:
+            entry.future.cancel()
+        if self.__executor__ is not None:
+            self.__executor__.shutdown(wait=False)
+
+    def __schedule__(self, entry: ScheduledJob) -> None:
+        with self.__condition__:
+            if self.__closed__:
+                entry.future.cancel()
+                return
+            heapq.heappush(self.__heap__, (entry.due, next(self.__sequence__), entry))
+            if self.__thread__ is None:
+                self.__executor__ = concurrent.futures.ThreadPoolExecutor(max_workers=self.poll_workers,
+                                                                          thread_name_prefix='synapsis-job-poll')
+                self.__thread__ = threading.Thread(target=self.__run__, name='synapsis-job-scheduler', daemon=True)
+                self.__thread__.start()
+            self.__condition__.notify()
+
+    def __run__(self) -> None:
+        while True:
+            with self.__condition__:
+                while not self.__closed__ and (not self.__heap__ or self.__heap__[0][0] > time.monotonic()):
+                    timeout = self.__heap__[0][0] - time.monotonic() if self.__heap__ else None
+                    self.__condition__.wait(timeout)
+                if self.__closed__:
+                    return
+                _, _, entry = heapq.heappop(self.__heap__)
+            if entry.future.cancelled():
+                continue
+            self.__poll_slots__.acquire()
+            self.__limiter__.acquire()
+            with self.__condition__:
+                self.__polling__ += 1
+                self.__polls__ += 1
+            self.__executor__.submit(self.__poll__, entry)
+
+    def __poll__(self, entry: ScheduledJob) -> None:
+        job = entry.job
+        try:
+            response = entry.context.run(job.poll)
+        except Exception as ex:
+            self.__resolve__(entry, exception=ex)
+            return
+        finally:
+            self.__poll_slots__.release()
+            with self.__condition__:
+                self.__polling__ -= 1
+        if response is not None:
+            self.__resolve__(entry, response=response)
+            return
+        entry.delay = job.next_delay(entry.delay)
+        now = time.monotonic()
+        if entry.deadline is not None and now + entry.delay > entry.deadline:
+            self.__resolve__(entry, exception=SynapsisError(
+                'Timed out waiting for asynchronous job: {0}'.format(job.token)))
+            return
+        entry.due = now + job.jitter(entry.delay)
+        self.__schedule__(entry)
+
+    def __resolve__(self, entry: ScheduledJob, response: t.Optional[dict] = None,
+                    exception: t.Optional[Exception] = None) -> None:
+        with self.__condition__:
+            self.__finished__ += 1
+        if entry.future.cancelled():
+            return
+        try:
+            if exception is not None:
+                entry.future.set_exception(exception)
+            else:
+                entry.future.set_result(response)
+        except concurrent.futures.InvalidStateError:
+            # Cancelled while it was being polled.
+            pass
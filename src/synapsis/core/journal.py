@@ -0,0 +1,97 @@
+from __future__ import annotations
+import typing as t
+import json
+import os
+import threading
+from .exceptions import SynapsisError
+
+
+class Journal(object):
+    """
+    An append-only file of the keys of the items that were done, so a rerun can skip them.
+
+    A journal can start with a header line that describes what the keys mean (e.g., the parameters of the run).
+    Opening an existing journal with a different header raises an error instead of skipping the wrong items.
+
+    Usage:
+        journal = Journal('/path/to/journal.txt')
+        if 'syn123' not in journal:
+            delete('syn123')
+            journal.add('syn123')
+    """
+    HEADER_PREFIX: t.Final[str] = '#'
+
+    def __init__(self,
+                 path: t.Optional[str] = None,
+                 read_only: bool = False,
+                 header: t.Optional[dict] = None,
+                 keep_added: bool = True):
+        """
+        :param path: Path of the journal file. Created if it does not exist. None to only keep the keys in memory.
+        :param read_only: True to read the keys from the file but not write to it.
+        :param header: JSON serializable dict written as the first line of a new journal. An existing journal must
+                       have the same header.
+        :param keep_added: False to write the added keys to the file without keeping them in memory, for runs that
+                           add each key once. The keys read from the file are always kept.
+        """
+        self.path = path
+        self.keep_added = keep_added
+        self.__lock__ = threading.Lock()
+        self.__keys__: set[str] = set()
+        self.__added__: int = 0
+        self.__file__ = None
+        header_line = None if header is None else self.HEADER_PREFIX + json.dumps(header, sort_keys=True)
+        has_header = False
+        if path is not None:
+            if os.path.isfile(path):
+                with open(path, encoding='utf-8') as f:
+                    for number, line in enumerate(f):
+                        line = line.strip()
+                        if number == 0 and line.startswith(self.HEADER_PREFIX):
+                            has_header = True
+                            self.__check_header__(line, header_line)
+                        elif line:
+                            if number == 0:
+                                self.__check_header__(None, header_line)
+                            self.__keys__.add(line)
+            if not read_only:
+                self.__file__ = open(path, 'a', encoding='utf-8')
+                if header_line is not None and not has_header and not self.__keys__:
+                    self.__write__(header_line)
+
+    def __check_header__(self, line: str | None, header_line: str | None) -> None:
+        if header_line is not None and line != header_line:
+            raise SynapsisError('The journal: {0} was written for a different run. Expected: {1}, found: {2}'.format(
+                self.path, header_line[len(self.HEADER_PREFIX):],
+                'no header' if line is None else line[len(self.HEADER_PREFIX):]))
+
+    def __write__(self, line: str) -> None:
+        # Flushed on each write so a rerun after a crash skips everything that was done.
+        self.__file__.write(line + '\n')
+        self.__file__.flush()
+
+    def add(self, key: str) -> None:
+        with self.__lock__:
+            if self.keep_added:
+                if key in self.__keys__:
+                    return
+                self.__keys__.add(key)
+            else:
+                self.__added__ += 1
+            if self.__file__ is not None:
+                self.__write__(key)
+
+    def close(self) -> None:
+        with self.__lock__:
+            if self.__file__ is not None:
+                self.__file__.close()
+                self.__file__ = None
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__keys__
+
+    def __iter__(self) -> t.Iterator[str]:
+        return iter(self.__keys__)
+
+    def __len__(self) -> int:
+        return len(self.__keys__) + self.__added__
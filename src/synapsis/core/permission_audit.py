@@ -0,0 +1,348 @@
+from __future__ import annotations
+import typing as t
+import concurrent.futures
+import contextvars
+import csv
+import numbers
+import queue
+import threading
+import synapseclient
+from synapseclient.core.exceptions import SynapseHTTPError
+from .exceptions import SynapsisError
+from .single_flight import SingleFlight
+from ..synapse import SynapsePermission, SynapseConcreteType
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+if t.TYPE_CHECKING:
+    from .synapsis_utils import SynapsisUtils
+
+
+class AuditPrincipal(object):
+    """A user or team audited by PermissionAudit."""
+    __slots__ = ('id', 'name', 'is_team', 'principal_ids')
+
+    def __init__(self, id: int, name: str | None, is_team: bool, principal_ids: frozenset[int]):
+        self.id: int = id
+        self.name: str | None = name
+        self.is_team: bool = is_team
+        # The ACL principals whose access applies to this principal (itself, its teams, and the public groups).
+        self.principal_ids: frozenset[int] = principal_ids
+
+    def to_dict(self) -> dict:
+        return {'id': self.id, 'name': self.name, 'is_team': self.is_team}
+
+    def __repr__(self):
+        return 'AuditPrincipal({0}, {1})'.format(self.id, self.name)
+
+
+class MembershipIndex(object):
+    """
+    Caches which principals are teams, the teams of each user, and the members of each team.
+
+    Each team and user is only requested once.
+
+    Usage:
+        index = MembershipIndex(Synapsis.Synapse)
+        index.is_team(3412345)
+        index.teams_of(1234567)
+        index.members_of(3412345)
+    """
+
+    def __init__(self, synapse):
+        self.synapse = synapse
+        self.__lock__ = threading.Lock()
+        self.__teams__: dict[int, dict | None] = {}
+        self.__teams_of__: dict[int, frozenset[int]] = {}
+        self.__members_of__: dict[int, tuple[dict, ...]] = {}
+
+    def team(self, principal_id: int | str) -> dict | None:
+        """Gets the Team JSON for a principal or None if the principal is not a team."""
+        principal_id = int(principal_id)
+        with self.__lock__:
+            if principal_id in self.__teams__:
+                return self.__teams__[principal_id]
+        try:
+            team = self.synapse.restGET('/team/{0}'.format(principal_id))
+        except SynapseHTTPError as ex:
+            if ex.response is None or ex.response.status_code != 404:
+                raise
+            team = None
+        with self.__lock__:
+            self.__teams__[principal_id] = team
+        return team
+
+    def is_team(self, principal_id: int | str) -> bool:
+        return self.team(principal_id) is not None
+
+    def teams_of(self, user_id: int | str) -> frozenset[int]:
+        """Gets the IDs of the teams a user is a member of."""
+        user_id = int(user_id)
+        with self.__lock__:
+            if user_id in self.__teams_of__:
+                return self.__teams_of__[user_id]
+        team_ids = frozenset(int(team['id'])
+                             for team in self.synapse._GET_paginated('/user/{0}/team'.format(user_id), limit=50))
+        with self.__lock__:
+            self.__teams_of__[user_id] = team_ids
+        return team_ids
+
+    def members_of(self, team_id: int | str) -> tuple[dict, ...]:
+        """Gets the members (UserGroupHeader JSON) of a team."""
+        team_id = int(team_id)
+        with self.__lock__:
+            if team_id in self.__members_of__:
+                return self.__members_of__[team_id]
+        members = tuple(member['member'] for member in self.synapse.getTeamMembers(team_id))
+        with self.__lock__:
+            self.__members_of__[team_id] = members
+        return members
+
+
+class PermissionAudit(object):
+    """
+    Writes the effective permission of each principal on each Entity in a Project or Folder.
+
+    The tree is listed by parallel workers and the Entities are grouped by benefactor so each ACL is fetched once. The
+    permissions are computed locally from the ACLs and the principals' team memberships, and the rows are streamed to
+    the file as they are listed so the memory used does not grow with the number of Entities.
+    """
+    PUBLIC_ID: t.Final[int] = 273949
+    AUTHENTICATED_USERS_ID: t.Final[int] = 273948
+    CSV: t.Final[str] = 'csv'
+    PARQUET: t.Final[str] = 'parquet'
+    ENTITY_COLUMNS: t.Final[tuple[str, ...]] = ('id', 'name', 'type', 'parent_id', 'benefactor_id')
+    INCLUDE_TYPES: t.Final[list[str]] = ['folder', 'file', 'table', 'link', 'entityview', 'dockerrepo',
+                                         'submissionview', 'dataset', 'materializedview']
+    CONTAINER_TYPES: t.Final[frozenset[str]] = frozenset([SynapseConcreteType.PROJECT_ENTITY.code,
+                                                          SynapseConcreteType.FOLDER_ENTITY.code])
+    __DONE__: t.Final[object] = object()
+
+    def __init__(self,
+                 utils: SynapsisUtils,
+                 root: synapseclient.Entity | str,
+                 principals: list[synapseclient.UserProfile | synapseclient.Team | str | numbers.Number],
+                 path: str,
+                 format: t.Optional[str] = None,
+                 expand_teams: bool = False,
+                 list_workers: int = 8,
+                 queue_size: int = 1000,
+                 batch_size: int = 10000,
+                 membership_index: t.Optional[MembershipIndex] = None,
+                 progress: t.Optional[t.Callable[[int], None]] = None):
+        if format is None:
+            format = self.PARQUET if str(path).lower().endswith('.parquet') else self.CSV
+        if format not in (self.CSV, self.PARQUET):
+            raise ValueError('Invalid format: {0}'.format(format))
+        if format == self.PARQUET and pyarrow is None:
+            raise SynapsisError('pyarrow is required to write Parquet files: pip install synapsis[parquet]')
+        self.utils = utils
+        self.synapse = utils.__synapse__
+        self.root_id: str = utils.id_of(root)
+        self.principals = principals
+        self.path = path
+        self.format: str = format
+        self.expand_teams = expand_teams
+        self.list_workers = max(1, list_workers)
+        self.queue_size = queue_size
+        self.batch_size = max(1, batch_size)
+        self.membership_index: MembershipIndex = membership_index or MembershipIndex(self.synapse)
+        self.progress = progress
+        self.__audited__: list[AuditPrincipal] = []
+        self.__codes__: dict[str, tuple[str, ...]] = {}
+        self.__codes_flight__ = SingleFlight()
+        self.__stop__ = threading.Event()
+
+    def run(self) -> dict:
+        """
+        Lists the tree and writes the matrix.
+
+        :return: dict with: path, format, entities, benefactors, and principals.
+        """
+        self.__audited__ = self.__resolve_principals__()
+        columns = list(self.ENTITY_COLUMNS) + [str(principal.id) for principal in self.__audited__]
+        writer = self.__open_writer__(columns)
+        count = 0
+        try:
+            for row in self.__walk__():
+                writer(row)
+                count += 1
+                if self.progress:
+                    self.progress(count)
+        finally:
+            writer(None)
+        return {
+            'path': self.path,
+            'format': self.format,
+            'entities': count,
+            'benefactors': len(self.__codes__),
+            'principals': [principal.to_dict() for principal in self.__audited__]
+        }
+
+    def permission_of(self,
+                      resource_access: list[dict],
+                      principal: AuditPrincipal) -> SynapsePermission:
+        """Gets the highest entity permission granted to a principal by an ACL's resourceAccess."""
+        access_types = set()
+        for access in resource_access:
+            if int(access['principalId']) in principal.principal_ids:
+                access_types.update(access['accessType'])
+        for permission in reversed(SynapsePermission.ENTITY_PERMISSIONS):
+            if access_types.issuperset(permission.access_types):
+                return permission
+        return SynapsePermission.NO_PERMISSION
+
+    def __resolve_principals__(self) -> list[AuditPrincipal]:
+        resolved = {}
+        for principal in self.principals:
+            for audited in self.__resolve_principal__(principal):
+                resolved.setdefault(audited.id, audited)
+        if not resolved:
+            raise SynapsisError('At least one principal is required.')
+        return list(resolved.values())
+
+    def __resolve_principal__(self, principal) -> list[AuditPrincipal]:
+        index = self.membership_index
+        if isinstance(principal, synapseclient.UserProfile):
+            user_id, name, team = int(principal['ownerId']), principal.get('userName'), None
+        elif isinstance(principal, synapseclient.Team):
+            user_id, name, team = int(principal['id']), principal.get('name'), principal
+        elif isinstance(principal, str) and not principal.isdigit():
+            profile = self.synapse.getUserProfile(principal)
+            user_id, name, team = int(profile['ownerId']), profile.get('userName'), None
+        else:
+            user_id = int(self.utils.id_of(principal))
+            team = index.team(user_id)
+            name = team['name'] if team else None
+
+        if team is None:
+            return [self.__individual__(user_id, name)]
+        if self.expand_teams:
+            return [self.__individual__(member['ownerId'], member.get('userName'))
+                    for member in index.members_of(user_id)]
+        return [AuditPrincipal(user_id, name, True, frozenset([user_id, self.PUBLIC_ID]))]
+
+    def __individual__(self, user_id: int | str, name: str | None) -> AuditPrincipal:
+        user_id = int(user_id)
+        principal_ids = {user_id, self.PUBLIC_ID, self.AUTHENTICATED_USERS_ID}
+        principal_ids.update(self.membership_index.teams_of(user_id))
+        return AuditPrincipal(user_id, name, False, frozenset(principal_ids))
+
+    def __codes_of__(self, benefactor_id: str) -> tuple[str, ...]:
+        """Gets the permission code of each principal for a benefactor. The ACL is fetched once per benefactor."""
+        codes = self.__codes__.get(benefactor_id)
+        if codes is None:
+            codes = self.__codes_flight__.do(benefactor_id, lambda: self.__fetch_codes__(benefactor_id))
+        return codes
+
+    def __fetch_codes__(self, benefactor_id: str) -> tuple[str, ...]:
+        codes = self.__codes__.get(benefactor_id)
+        if codes is None:
+            acl = self.synapse.restGET('/entity/{0}/acl'.format(benefactor_id))
+            resource_access = acl.get('resourceAccess', [])
+            codes = tuple(self.permission_of(resource_access, principal).code for principal in self.__audited__)
+            self.__codes__[benefactor_id] = codes
+        return codes
+
+    def __walk__(self) -> t.Iterator[tuple]:
+        """Yields a row for the root and each Entity under it, in the order they are listed."""
+        root = self.synapse.restGET('/entity/{0}'.format(self.root_id))
+        benefactor_id = self.synapse.restGET('/entity/{0}/benefactor'.format(self.root_id))['id']
+        yield self.__row__(root['id'], root['name'], root['concreteType'], root.get('parentId'), benefactor_id)
+        if root['concreteType'] not in self.CONTAINER_TYPES:
+            return
+
+        rows = queue.Queue(maxsize=self.queue_size)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.list_workers)
+        pending = 1
+        executor.submit(contextvars.copy_context().run, self.__list__, root['id'], rows)
+        try:
+            while pending:
+                item = rows.get()
+                if item is self.__DONE__:
+                    pending -= 1
+                elif isinstance(item, BaseException):
+                    raise item
+                else:
+                    row, is_container = item
+                    if is_container:
+                        pending += 1
+                        executor.submit(contextvars.copy_context().run, self.__list__, row[0], rows)
+                    yield row
+        finally:
+            self.__stop__.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+            # Unblock the workers waiting to put rows.
+            while True:
+                try:
+                    rows.get_nowait()
+                except queue.Empty:
+                    break
+
+    def __list__(self, parent_id: str, rows: queue.Queue) -> None:
+        try:
+            for child in self.synapse.getChildren(parent_id, includeTypes=self.INCLUDE_TYPES):
+                if self.__stop__.is_set():
+                    return
+                benefactor_id = 'syn{0}'.format(child['benefactorId'])
+                row = self.__row__(child['id'], child['name'], child['type'], parent_id, benefactor_id)
+                if not self.__put__(rows, (row, child['type'] in self.CONTAINER_TYPES)):
+                    return
+            self.__put__(rows, self.__DONE__)
+        except Exception as ex:
+            self.__put__(rows, ex)
+
+    def __put__(self, rows: queue.Queue, item: t.Any) -> bool:
+        while not self.__stop__.is_set():
+            try:
+                rows.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def __row__(self, id: str, name: str, type: str, parent_id: str | None, benefactor_id: str) -> tuple:
+        return (id, name, type, parent_id, benefactor_id) + self.__codes_of__(benefactor_id)
+
+    def __open_writer__(self, columns: list[str]) -> t.Callable[[tuple | None], None]:
+        """Opens the file and returns a function that writes a row, or closes the file when called with None."""
+        if self.format == self.PARQUET:
+            return self.__parquet_writer__(columns)
+
+        file = open(self.path, 'w', newline='', encoding='utf-8')
+        writer = csv.writer(file)
+        writer.writerow(columns)
+
+        def write(row: tuple | None) -> None:
+            if row is None:
+                file.close()
+            else:
+                writer.writerow(row)
+
+        return write
+
+    def __parquet_writer__(self, columns: list[str]) -> t.Callable[[tuple | None], None]:
+        schema = pyarrow.schema([(column, pyarrow.string()) for column in columns])
+        writer = pyarrow.parquet.ParquetWriter(self.path, schema)
+        batch = []
+
+        def flush() -> None:
+            if batch:
+                writer.write_table(pyarrow.Table.from_pylist([dict(zip(columns, row)) for row in batch],
+                                                             schema=schema))
+                batch.clear()
+
+        def write(row: tuple | None) -> None:
+            if row is None:
+                flush()
+                writer.close()
+            else:
+                batch.append(row)
+                if len(batch) >= self.batch_size:
+                    flush()
+
+        return write
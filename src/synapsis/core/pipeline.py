@@ -0,0 +1,192 @@
+from __future__ import annotations
+import typing as t
+import contextvars
+import queue
+import threading
+import time
+
+
+class PipelineStage(object):
+    __slots__ = ('name', 'func', 'workers', 'batch_size', 'batch_wait')
+
+    def __init__(self, name: str, func: t.Callable, workers: int, batch_size: int | None, batch_wait: float):
+        self.name: str = name
+        self.func: t.Callable = func
+        self.workers: int = max(1, workers)
+        self.batch_size: int | None = batch_size
+        self.batch_wait: float = batch_wait
+
+
+class Pipeline(object):
+    """
+    Runs items through stages of worker threads connected by bounded queues.
+
+    Each stage function is called with an item and returns the item to pass to the next stage, or None to drop it.
+    Batch stages are called with a list of items and return the list of items to pass to the next stage.
+    Items returned by the last stage are collected and returned by run().
+
+    Usage:
+        results = Pipeline(queue_size=100) \\
+            .stage('hash', hash_item, workers=4) \\
+            .stage('upload', upload_item, workers=4) \\
+            .stage('create', create_items, batch_size=50) \\
+            .run(scan())
+    """
+    __DONE__: t.Final[object] = object()
+
+    def __init__(self,
+                 queue_size: int = 100,
+                 progress: t.Optional[t.Callable[[str, int], None]] = None,
+                 on_error: t.Optional[t.Callable[[str, t.Any, Exception], None]] = None,
+                 source_name: str = 'source'):
+        """
+        :param queue_size: Max number of items waiting between two stages.
+        :param progress: Called with (stage name, number of items completed by the stage) each time a stage
+                         completes an item. Called from the worker threads.
+        :param on_error: Called with (stage name, item, error) when a stage raises. The item is dropped. If not set,
+                         the pipeline stops and run() raises the first error.
+        :param source_name: The stage name reported to progress for items read from the source.
+        """
+        self.queue_size = queue_size
+        self.progress = progress
+        self.on_error = on_error
+        self.source_name = source_name
+        self.__stages__: list[PipelineStage] = []
+        self.__counts__: dict[str, int] = {}
+        self.__lock__ = threading.Lock()
+
+    def stage(self,
+              name: str,
+              func: t.Callable,
+              workers: int = 1,
+              batch_size: t.Optional[int] = None,
+              batch_wait: float = 0) -> t.Self:
+        """
+        Adds a stage.
+
+        :param name: Name of the stage.
+        :param func: Function to call with each item, or each list of items for batch stages.
+        :param workers: Number of threads to run the stage on.
+        :param batch_size: Max number of items to pass to func at once. None to pass one item at a time.
+        :param batch_wait: Max seconds to wait for a batch to fill once it has an item.
+        :return: Self
+        """
+        self.__stages__.append(PipelineStage(name, func, workers, batch_size, batch_wait))
+        return self
+
+    def run(self, source: t.Iterable) -> list:
+        """
+        Runs the items from source through the stages. The source is read from the calling thread.
+
+        :param source: The items.
+        :return: The items returned by the last stage.
+        """
+        stages = self.__stages__
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in stages]
+        results = []
+        errors = []
+        abort = threading.Event()
+        threads = []
+        self.__counts__ = {}
+
+        for index, stage in enumerate(stages):
+            next_stage = stages[index + 1] if index + 1 < len(stages) else None
+            out_queue = queues[index + 1] if next_stage else None
+            remaining = [stage.workers]
+            for number in range(stage.workers):
+                # Each thread runs in a copy of the caller's context (e.g., the current synapsis helper).
+                context = contextvars.copy_context()
+                thread = threading.Thread(target=context.run,
+                                          args=(self.__work__, stage, queues[index], out_queue, next_stage,
+                                                remaining, results, errors, abort),
+                                          name='synapsis-{0}-{1}'.format(stage.name, number),
+                                          daemon=True)
+                threads.append(thread)
+                thread.start()
+
+        try:
+            if stages:
+                for item in source:
+                    if abort.is_set():
+                        break
+                    queues[0].put(item)
+                    self.__report__(self.source_name)
+            else:
+                results.extend(source)
+        except BaseException as ex:
+            errors.append(ex)
+            abort.set()
+        finally:
+            for _ in range(stages[0].workers if stages else 0):
+                queues[0].put(self.__DONE__)
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0]
+        return results
+
+    def __work__(self,
+                 stage: PipelineStage,
+                 in_queue: queue.Queue,
+                 out_queue: queue.Queue | None,
+                 next_stage: PipelineStage | None,
+                 remaining: list[int],
+                 results: list,
+                 errors: list,
+                 abort: threading.Event) -> None:
+        done = False
+        while not done:
+            item = in_queue.get()
+            if item is self.__DONE__:
+                break
+            if stage.batch_size:
+                items = [item]
+                deadline = time.monotonic() + stage.batch_wait
+                while len(items) < stage.batch_size:
+                    try:
+                        item = in_queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is self.__DONE__:
+                        done = True
+                        break
+                    items.append(item)
+                item = items
+
+            # Keep draining the queue after an error so upstream stages do not block.
+            if abort.is_set():
+                continue
+
+            try:
+                output = stage.func(item)
+            except Exception as ex:
+                if self.on_error is None:
+                    errors.append(ex)
+                    abort.set()
+                else:
+                    for failed in (item if stage.batch_size else [item]):
+                        self.on_error(stage.name, failed, ex)
+                continue
+
+            outputs = (output or []) if stage.batch_size else ([] if output is None else [output])
+            for output_item in outputs:
+                if out_queue is None:
+                    with self.__lock__:
+                        results.append(output_item)
+                else:
+                    out_queue.put(output_item)
+            self.__report__(stage.name, len(item) if stage.batch_size else 1)
+
+        with self.__lock__:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last and out_queue is not None:
+            for _ in range(next_stage.workers):
+                out_queue.put(self.__DONE__)
+
+    def __report__(self, name: str, count: int = 1) -> None:
+        with self.__lock__:
+            total = self.__counts__[name] = self.__counts__.get(name, 0) + count
+        if self.progress is not None:
+            self.progress(name, total)
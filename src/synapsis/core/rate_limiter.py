@@ -0,0 +1,217 @@
+from __future__ import annotations
+import typing as t
+import datetime
+import email.utils
+import threading
+import time
+
+
+class RateLimiter(object):
+    """
+    Limits the rate of requests with a token bucket that adapts to throttling (AIMD).
+
+    Requests are not limited until the service throttles. Each throttled response (429 or 503) cuts the rate
+    (multiplicative decrease, at most once per cooldown) and empties the bucket so waiting workers do not stampede
+    the service. A Retry-After pauses all requests until it passes. Each successful response raises the rate by about
+    `increase` requests per second, every second (additive increase).
+
+    A single limiter is shared by all the Synapse REST calls in the process (RateLimiter.shared()).
+
+    Usage:
+        limiter = RateLimiter(rate=10)
+        limiter.acquire()
+        response = send()
+        limiter.observe(response.status_code, response.headers.get('Retry-After'))
+    """
+    THROTTLE_STATUS_CODES: t.Final[frozenset[int]] = frozenset([429, 503])
+    __SHARED__: t.ClassVar[RateLimiter | None] = None
+    __SHARED_LOCK__: t.Final[threading.Lock] = threading.Lock()
+
+    def __init__(self,
+                 rate: t.Optional[float] = None,
+                 burst: int = 10,
+                 min_rate: float = 1.0,
+                 max_rate: t.Optional[float] = None,
+                 increase: float = 1.0,
+                 decrease: float = 0.5,
+                 cooldown: float = 1.0):
+        """
+        :param rate: Requests per second. None to not limit until throttled.
+        :param burst: Max number of requests that can be sent at once.
+        :param min_rate: The rate is never cut below this.
+        :param max_rate: The rate is never raised above this. None for no max.
+        :param increase: Requests per second to add to the rate for each second of successful requests.
+        :param decrease: Fraction to multiply the rate by when throttled.
+        :param cooldown: Min seconds between rate cuts, so a burst of throttled responses only cuts the rate once.
+        """
+        if rate is not None and rate <= 0:
+            raise ValueError('rate must be greater than 0.')
+        if not 0 < decrease < 1:
+            raise ValueError('decrease must be between 0 and 1.')
+        self.initial_rate = rate
+        self.burst = max(1, burst)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.__lock__ = threading.Lock()
+        self.reset()
+
+    @classmethod
+    def shared(cls) -> RateLimiter:
+        """Gets the limiter shared by the process."""
+        if RateLimiter.__SHARED__ is None:
+            with RateLimiter.__SHARED_LOCK__:
+                if RateLimiter.__SHARED__ is None:
+                    RateLimiter.__SHARED__ = cls()
+        return RateLimiter.__SHARED__
+
+    @property
+    def rate(self) -> float | None:
+        """Gets the current rate in requests per second. None if not limited."""
+        return self.__rate__
+
+    @property
+    def stats(self) -> dict[str, t.Any]:
+        """
+        Gets the current state and counters.
+
+            - rate: Current requests per second. None if not limited.
+            - observed_rate: Requests per second acquired in the last second.
+            - waiting: Number of requests waiting to be sent (queue depth).
+            - paused_s: Seconds until a Retry-After pause ends.
+            - acquired: Number of requests sent.
+            - throttled: Number of throttled responses.
+            - decreases: Number of times the rate was cut.
+            - waited_s: Total seconds requests waited.
+        :return: dict
+        """
+        with self.__lock__:
+            now = time.monotonic()
+            return {
+                'rate': self.__rate__,
+                'observed_rate': self.__observed_rate__,
+                'waiting': self.__waiting__,
+                'paused_s': max(0.0, self.__paused_until__ - now),
+                'acquired': self.__acquired__,
+                'throttled': self.__throttled__,
+                'decreases': self.__decreases__,
+                'waited_s': self.__waited_s__
+            }
+
+    def reset(self) -> None:
+        """Resets the rate and the counters."""
+        with self.__lock__:
+            now = time.monotonic()
+            self.__rate__: float | None = self.initial_rate
+            # Theoretical arrival time of the next request (GCRA form of the token bucket).
+            self.__tat__: float = now
+            self.__paused_until__: float = 0.0
+            self.__last_decrease__: float = float('-inf')
+            self.__window_start__: float = now
+            self.__window_count__: int = 0
+            self.__observed_rate__: float = 0.0
+            self.__waiting__: int = 0
+            self.__acquired__: int = 0
+            self.__throttled__: int = 0
+            self.__decreases__: int = 0
+            self.__waited_s__: float = 0.0
+
+    def acquire(self) -> float:
+        """
+        Waits until a request can be sent.
+
+        :return: Seconds waited.
+        """
+        with self.__lock__:
+            now = time.monotonic()
+            self.__acquired__ += 1
+            self.__count__(now)
+            start = max(now, self.__paused_until__)
+            if self.__rate__ is not None:
+                interval = 1.0 / self.__rate__
+                tat = max(self.__tat__, start)
+                start = max(start, tat - (self.burst - 1) * interval)
+                self.__tat__ = tat + interval
+            wait = start - now
+            if wait <= 0:
+                return 0.0
+            self.__waiting__ += 1
+            self.__waited_s__ += wait
+
+        try:
+            time.sleep(wait)
+        finally:
+            with self.__lock__:
+                self.__waiting__ -= 1
+        return wait
+
+    def observe(self, status: int, retry_after: t.Optional[str | float] = None) -> None:
+        """
+        Adapts the rate to a response.
+
+        :param status: The HTTP status code of the response.
+        :param retry_after: The Retry-After header of the response.
+        """
+        if status in self.THROTTLE_STATUS_CODES:
+            self.throttled(retry_after)
+        elif status < 500:
+            self.succeeded()
+
+    def succeeded(self) -> None:
+        with self.__lock__:
+            if self.__rate__ is not None:
+                rate = self.__rate__ + self.increase / self.__rate__
+                self.__rate__ = rate if self.max_rate is None else min(self.max_rate, rate)
+
+    def throttled(self, retry_after: t.Optional[str | float] = None) -> None:
+        with self.__lock__:
+            now = time.monotonic()
+            self.__throttled__ += 1
+            if now - self.__last_decrease__ >= self.cooldown:
+                self.__last_decrease__ = now
+                self.__decreases__ += 1
+                current = self.__rate__
+                if current is None:
+                    current = self.__observed_rate__ or self.__window_rate__(now) or self.min_rate
+                rate = max(self.min_rate, current * self.decrease)
+                self.__rate__ = rate if self.max_rate is None else min(self.max_rate, rate)
+            delay = self.parse_retry_after(retry_after)
+            if delay:
+                self.__paused_until__ = max(self.__paused_until__, now + delay)
+            # Empty the bucket so the waiting requests are spread out at the new rate.
+            interval = 1.0 / self.__rate__
+            self.__tat__ = max(self.__tat__, max(now, self.__paused_until__) + (self.burst - 1) * interval)
+
+    @staticmethod
+    def parse_retry_after(value: t.Optional[str | float]) -> float | None:
+        """Gets the seconds to wait from a Retry-After header (seconds or an HTTP date)."""
+        if value is None or value == '':
+            return None
+        try:
+            return max(0.0, float(value))
+        except (TypeError, ValueError):
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+        return max(0.0, (retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+    def __count__(self, now: float) -> None:
+        elapsed = now - self.__window_start__
+        if elapsed >= 1.0:
+            self.__observed_rate__ = self.__window_count__ / elapsed
+            self.__window_start__ = now
+            self.__window_count__ = 0
+        self.__window_count__ += 1
+
+    def __window_rate__(self, now: float) -> float:
+        elapsed = now - self.__window_start__
+        return self.__window_count__ / elapsed if elapsed > 0 else 0.0
+
+    def __repr__(self):
+        return 'RateLimiter(rate={0})'.format(self.__rate__)
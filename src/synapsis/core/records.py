@@ -0,0 +1,272 @@
+from __future__ import annotations
+import typing as t
+import json
+import sys
+from .codec import Codec
+
+
+class Record(object):
+    """
+    Base class for compact records built from Synapse JSON payloads.
+
+    The commonly used fields are stored in __slots__ and the rest are kept as compact JSON that is only decoded when
+    accessed, so a record uses a fraction of the memory of the JSON dict. Records can also be read like the JSON dict
+    (e.g., record['contentMd5'] or record.get('contentMd5')).
+
+    Subclasses list their attributes in __slots__ and set:
+        FIELDS: The JSON key for each attribute.
+        RECORDS: The Record type of attributes that hold nested objects (or lists of them).
+        INTERN: Attributes whose strings are repeated across records (e.g., types and statuses) and are interned.
+        KEEP_EXTRA: False to discard the JSON keys not in FIELDS.
+    """
+    __slots__ = ('__extra__',)
+    FIELDS: t.ClassVar[dict[str, str]] = {}
+    RECORDS: t.ClassVar[dict[str, type[Record]]] = {}
+    INTERN: t.ClassVar[frozenset[str]] = frozenset()
+    KEEP_EXTRA: t.ClassVar[bool] = True
+    __KEYS__: t.ClassVar[dict[str, str]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.__KEYS__ = {key: attr for attr, key in cls.FIELDS.items()}
+
+    def __init__(self, **kwargs):
+        for attr in self.FIELDS:
+            setattr(self, attr, kwargs.get(attr))
+        self.__extra__ = None
+
+    @classmethod
+    def from_json(cls, data: t.Mapping) -> t.Self:
+        """Creates the record from a JSON dict. Missing keys are set to None."""
+        record = cls.__new__(cls)
+        for attr, key in cls.FIELDS.items():
+            setattr(record, attr, cls.__decode__(attr, data.get(key)))
+        extra = None
+        if cls.KEEP_EXTRA:
+            keys = cls.__KEYS__
+            rest = {key: value for key, value in data.items() if key not in keys}
+            if rest:
+                # Encoded with the stdlib, some fast codecs over-allocate the bytes they return.
+                extra = json.dumps(rest, separators=(',', ':')).encode()
+        record.__extra__ = extra
+        return record
+
+    @classmethod
+    def __decode__(cls, attr: str, value: t.Any) -> t.Any:
+        if value is None:
+            return None
+        record_type = cls.RECORDS.get(attr)
+        if record_type is not None:
+            if isinstance(value, list):
+                return [record_type.from_json(v) for v in value]
+            return record_type.from_json(value)
+        if attr in cls.INTERN:
+            if isinstance(value, str):
+                return sys.intern(value)
+            elif isinstance(value, list):
+                return tuple(sys.intern(v) if isinstance(v, str) else v for v in value)
+        return value
+
+    @property
+    def extra(self) -> dict:
+        """Gets the JSON keys that are not in FIELDS."""
+        return Codec.current().loads(self.__extra__) if self.__extra__ is not None else {}
+
+    def to_dict(self) -> dict:
+        """Gets the record as a JSON dict."""
+        data = {}
+        for attr, key in self.FIELDS.items():
+            value = getattr(self, attr)
+            if value is None:
+                continue
+            if isinstance(value, Record):
+                value = value.to_dict()
+            elif isinstance(value, (list, tuple)):
+                value = [v.to_dict() if isinstance(v, Record) else v for v in value]
+            data[key] = value
+        data.update(self.extra)
+        return data
+
+    def get(self, key: str, default: t.Any = None) -> t.Any:
+        """Gets a value by its JSON key."""
+        attr = self.__KEYS__.get(key)
+        if attr is not None:
+            value = getattr(self, attr)
+            return default if value is None else value
+        return self.extra.get(key, default)
+
+    def __getitem__(self, key: str) -> t.Any:
+        attr = self.__KEYS__.get(key)
+        if attr is not None:
+            return getattr(self, attr)
+        return self.extra[key]
+
+    def __contains__(self, key: str) -> bool:
+        attr = self.__KEYS__.get(key)
+        if attr is not None:
+            return getattr(self, attr) is not None
+        return key in self.extra
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.__extra__ == other.__extra__ and \
+            all(getattr(self, attr) == getattr(other, attr) for attr in self.FIELDS)
+
+    def __repr__(self):
+        return '{0}({1})'.format(type(self).__name__,
+                                 ', '.join('{0}={1!r}'.format(attr, getattr(self, attr)) for attr in self.FIELDS))
+
+
+def convert(data: t.Any, record_type: type) -> t.Any:
+    """
+    Converts JSON dicts to records.
+
+    :param data: A JSON dict, list of JSON dicts, or None.
+    :param record_type: dict to return the data as is, otherwise the Record type to convert to.
+    :return: The data, record, list of records, or None.
+    """
+    if record_type is dict or data is None:
+        return data
+    if not (isinstance(record_type, type) and issubclass(record_type, Record)):
+        raise ValueError('Invalid record_type: {0}'.format(record_type))
+    if isinstance(data, list):
+        return [d if isinstance(d, record_type) else record_type.from_json(d) for d in data]
+    return data if isinstance(data, record_type) else record_type.from_json(data)
+
+
+class EntityHeader(Record):
+    """
+    The id, name, type, etag, and version of an Entity.
+
+    Built from an Entity's JSON or from an EntityHeader (e.g., /entity/header, /entity/children, /entity/{id}/path).
+    EntityHeaders do not include the etag or parentId so those are None when built from one.
+    """
+    __slots__ = ('id', 'name', 'type', 'etag', 'version_number', 'parent_id')
+    FIELDS: t.ClassVar[dict[str, str]] = {
+        'id': 'id',
+        'name': 'name',
+        'type': 'type',
+        'etag': 'etag',
+        'version_number': 'versionNumber',
+        'parent_id': 'parentId'
+    }
+    INTERN: t.ClassVar[frozenset[str]] = frozenset(['type'])
+    KEEP_EXTRA: t.ClassVar[bool] = False
+
+    @classmethod
+    def from_json(cls, data: t.Mapping) -> t.Self:
+        record = super().from_json(data)
+        if record.type is None and data.get('concreteType') is not None:
+            # Entity JSON has the concreteType instead of the type.
+            record.type = sys.intern(data.get('concreteType'))
+        return record
+
+
+class FileHandle(Record):
+    """A FileHandle (e.g., from /entity/{id}/filehandles or /fileHandle/batch)."""
+    __slots__ = ('id', 'etag', 'concrete_type', 'content_type', 'content_md5', 'content_size', 'file_name', 'status',
+                 'is_preview', 'storage_location_id', 'bucket_name', 'key', 'created_by', 'created_on')
+    FIELDS: t.ClassVar[dict[str, str]] = {
+        'id': 'id',
+        'etag': 'etag',
+        'concrete_type': 'concreteType',
+        'content_type': 'contentType',
+        'content_md5': 'contentMd5',
+        'content_size': 'contentSize',
+        'file_name': 'fileName',
+        'status': 'status',
+        'is_preview': 'isPreview',
+        'storage_location_id': 'storageLocationId',
+        'bucket_name': 'bucketName',
+        'key': 'key',
+        'created_by': 'createdBy',
+        'created_on': 'createdOn'
+    }
+    INTERN: t.ClassVar[frozenset[str]] = frozenset(['concrete_type', 'content_type', 'status', 'bucket_name',
+                                                    'created_by'])
+
+
+class FileHandleResult(Record):
+    """A requested file from /fileHandle/batch."""
+    __slots__ = ('file_handle_id', 'file_handle', 'pre_signed_url', 'preview_pre_signed_url', 'failure_code')
+    FIELDS: t.ClassVar[dict[str, str]] = {
+        'file_handle_id': 'fileHandleId',
+        'file_handle': 'fileHandle',
+        'pre_signed_url': 'preSignedURL',
+        'preview_pre_signed_url': 'previewPreSignedURL',
+        'failure_code': 'failureCode'
+    }
+    RECORDS: t.ClassVar[dict[str, type[Record]]] = {'file_handle': FileHandle}
+    INTERN: t.ClassVar[frozenset[str]] = frozenset(['failure_code'])
+
+
+class ResourceAccess(Record):
+    """A principal's access types in an ACL. The access types are stored as a tuple."""
+    __slots__ = ('principal_id', 'access_type')
+    FIELDS: t.ClassVar[dict[str, str]] = {
+        'principal_id': 'principalId',
+        'access_type': 'accessType'
+    }
+    INTERN: t.ClassVar[frozenset[str]] = frozenset(['access_type'])
+
+
+class AccessControlList(Record):
+    """An Entity or Team ACL."""
+    __slots__ = ('id', 'etag', 'creation_date', 'resource_access')
+    FIELDS: t.ClassVar[dict[str, str]] = {
+        'id': 'id',
+        'etag': 'etag',
+        'creation_date': 'creationDate',
+        'resource_access': 'resourceAccess'
+    }
+    RECORDS: t.ClassVar[dict[str, type[Record]]] = {'resource_access': ResourceAccess}
+
+
+class Bundle(Record):
+    """
+    An EntityBundle from /entity/{id}/bundle2.
+
+    The entity is kept as a dict. The annotations, permissions, path, and other less used parts are in extra.
+    """
+    __slots__ = ('entity', 'entity_type', 'file_handles', 'access_control_list', 'benefactor_acl', 'has_children',
+                 'file_name')
+    FIELDS: t.ClassVar[dict[str, str]] = {
+        'entity': 'entity',
+        'entity_type': 'entityType',
+        'file_handles': 'fileHandles',
+        'access_control_list': 'accessControlList',
+        'benefactor_acl': 'benefactorAcl',
+        'has_children': 'hasChildren',
+        'file_name': 'fileName'
+    }
+    RECORDS: t.ClassVar[dict[str, type[Record]]] = {
+        'file_handles': FileHandle,
+        'access_control_list': AccessControlList,
+        'benefactor_acl': AccessControlList
+    }
+    INTERN: t.ClassVar[frozenset[str]] = frozenset(['entity_type'])
+
+
+class UserGroupHeader(Record):
+    """A user or team header (e.g., a TeamMember's member)."""
+    __slots__ = ('owner_id', 'user_name', 'first_name', 'last_name', 'is_individual')
+    FIELDS: t.ClassVar[dict[str, str]] = {
+        'owner_id': 'ownerId',
+        'user_name': 'userName',
+        'first_name': 'firstName',
+        'last_name': 'lastName',
+        'is_individual': 'isIndividual'
+    }
+
+
+class TeamMember(Record):
+    """A member of a Team."""
+    __slots__ = ('team_id', 'member', 'is_admin')
+    FIELDS: t.ClassVar[dict[str, str]] = {
+        'team_id': 'teamId',
+        'member': 'member',
+        'is_admin': 'isAdmin'
+    }
+    RECORDS: t.ClassVar[dict[str, type[Record]]] = {'member': UserGroupHeader}
+    INTERN: t.ClassVar[frozenset[str]] = frozenset(['team_id'])
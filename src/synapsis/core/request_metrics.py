@@ -0,0 +1,105 @@
+from __future__ import annotations
+import typing as t
+import bisect
+import threading
+from .hooks import Hooks, RequestEvent
+
+
+class RequestMetrics(object):
+    """
+    Aggregates the request hooks into per-helper counters and latency histograms.
+
+    Calls that shared the response of an identical call in flight were not sent, so they are counted in 'shared'
+    and not in the requests, bytes, or latencies.
+
+    Usage:
+        metrics = RequestMetrics().install(Synapsis.hooks)
+        ...
+        metrics.export()
+    """
+    DEFAULT_BUCKETS: t.Final[tuple[float, ...]] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    NO_HELPER: t.Final[str] = '<none>'
+
+    def __init__(self, buckets: t.Optional[t.Iterable[float]] = None):
+        """
+        :param buckets: Upper bounds, in seconds, of the latency histogram buckets.
+        """
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets or self.DEFAULT_BUCKETS))
+        self.__lock__ = threading.Lock()
+        self.__helpers__: dict[str, dict] = {}
+
+    def install(self, hooks: Hooks) -> t.Self:
+        hooks.after_request(self.__after_request__)
+        hooks.on_retry(self.__on_retry__)
+        return self
+
+    def uninstall(self, hooks: Hooks) -> t.Self:
+        hooks.remove(Hooks.AFTER_REQUEST, self.__after_request__)
+        hooks.remove(Hooks.ON_RETRY, self.__on_retry__)
+        return self
+
+    def record(self, request: RequestEvent) -> None:
+        """Records a completed request."""
+        index = bisect.bisect_left(self.buckets, request.latency or 0.0)
+        with self.__lock__:
+            stats = self.__stats__(request.helper)
+            if request.shared:
+                stats['shared'] += 1
+                return
+            stats['requests'] += 1
+            if request.error is not None or (request.status or 0) >= 400:
+                stats['errors'] += 1
+            stats['latency_s'] += request.latency or 0.0
+            stats['request_bytes'] += request.request_bytes
+            stats['response_bytes'] += request.response_bytes
+            stats['histogram'][index] += 1
+
+    def export(self) -> dict[str, dict]:
+        """
+        Gets the metrics keyed by helper name. Requests made outside a synapsis helper are keyed by NO_HELPER.
+
+        The histogram is keyed by the bucket upper bound (cumulative counts, 'inf' for the last bucket).
+        """
+        bounds = [str(b) for b in self.buckets] + ['inf']
+        with self.__lock__:
+            result = {}
+            for name, stats in self.__helpers__.items():
+                result[name] = {k: v for k, v in stats.items() if k != 'histogram'}
+                result[name]['histogram'] = dict(zip(bounds, self.__cumulative__(stats['histogram'])))
+            return result
+
+    def reset(self) -> None:
+        with self.__lock__:
+            self.__helpers__.clear()
+
+    def __stats__(self, name: str | None) -> dict:
+        name = name or self.NO_HELPER
+        stats = self.__helpers__.get(name)
+        if stats is None:
+            stats = self.__helpers__[name] = {
+                'requests': 0,
+                'errors': 0,
+                'retries': 0,
+                'shared': 0,
+                'latency_s': 0.0,
+                'request_bytes': 0,
+                'response_bytes': 0,
+                'histogram': [0] * (len(self.buckets) + 1)
+            }
+        return stats
+
+    @staticmethod
+    def __cumulative__(counts: list[int]) -> list[int]:
+        total = 0
+        result = []
+        for count in counts:
+            total += count
+            result.append(total)
+        return result
+
+    def __after_request__(self, hook: str, request: RequestEvent) -> None:
+        self.record(request)
+
+    def __on_retry__(self, hook: str, request: RequestEvent) -> None:
+        with self.__lock__:
+            self.__stats__(request.helper)['retries'] += 1
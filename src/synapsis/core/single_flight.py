@@ -0,0 +1,102 @@
+from __future__ import annotations
+import typing as t
+import copy
+import threading
+
+
+class SingleFlightCall(object):
+    __slots__ = ('generation', 'event', 'result', 'error')
+
+    def __init__(self, generation: int):
+        self.generation: int = generation
+        self.event: threading.Event = threading.Event()
+        self.result: t.Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight(object):
+    """
+    Shares the result of an in-flight call with concurrent callers of the same key.
+
+    The first caller of a key runs the call, callers of the same key that arrive before it returns wait for it and get
+    its result (or a copy of its error, so each caller raises its own exception). Calling invalidate() (e.g., when a
+    write starts) stops new callers from joining calls that are already in flight.
+
+    Usage:
+        single_flight = SingleFlight()
+        result = single_flight.do(('GET', '/entity/syn123'), lambda: get('/entity/syn123'))
+    """
+
+    def __init__(self):
+        self.__lock__ = threading.Lock()
+        self.__calls__: dict[t.Hashable, SingleFlightCall] = {}
+        self.__generation__: int = 0
+        self.__stats__: dict[str, int] = {'calls': 0, 'shared': 0}
+
+    @property
+    def stats(self) -> dict[str, int]:
+        """
+        Gets the counters.
+
+            - calls: Number of calls that were run.
+            - shared: Number of callers that got the result of a call run by another caller.
+            - in_flight: Number of calls running now.
+        :return: dict
+        """
+        with self.__lock__:
+            return {**self.__stats__, 'in_flight': len(self.__calls__)}
+
+    def reset_stats(self) -> None:
+        with self.__lock__:
+            self.__stats__.update(calls=0, shared=0)
+
+    def invalidate(self) -> None:
+        """Stops new callers from joining the calls in flight."""
+        with self.__lock__:
+            self.__generation__ += 1
+
+    def do(self, key: t.Hashable, func: t.Callable[[], t.Any]) -> t.Any:
+        """
+        Runs func or waits for the call in flight for key.
+
+        :param key: Identifies the call.
+        :param func: The call to run.
+        :return: The result of func.
+        """
+        with self.__lock__:
+            call = self.__calls__.get(key)
+            if call is not None and call.generation == self.__generation__:
+                self.__stats__['shared'] += 1
+                leader = False
+            else:
+                call = self.__calls__[key] = SingleFlightCall(self.__generation__)
+                self.__stats__['calls'] += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise self.__copy_error__(call.error)
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as ex:
+            call.error = ex
+            raise
+        finally:
+            with self.__lock__:
+                if self.__calls__.get(key) is call:
+                    del self.__calls__[key]
+            call.event.set()
+        return call.result
+
+    @staticmethod
+    def __copy_error__(error: BaseException) -> BaseException:
+        # The caller's traceback is added to the copy, the leader's exception is not changed.
+        try:
+            copied = copy.copy(error)
+        except Exception:
+            return error
+        copied.__cause__ = error.__cause__
+        return copied
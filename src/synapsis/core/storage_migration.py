@@ -0,0 +1,181 @@
+from __future__ import annotations
+import typing as t
+import synapseclient
+from synapseclient.core.exceptions import SynapseHTTPError
+from .codec import Codec
+from .exceptions import SynapsisError
+from .journal import Journal
+from .pipeline import Pipeline
+from ..synapse import SynapseConcreteType
+from ..synapse.multipart import Multipart
+
+if t.TYPE_CHECKING:
+    from .synapsis_utils import SynapsisUtils
+
+
+class MigrationItem(object):
+    """A File being moved to another storage location and what happened to it."""
+    __slots__ = ('position', 'id', 'entity', 'file_handle', 'new_file_handle_id', 'status', 'retries', 'error')
+
+    def __init__(self, position: int, id: str):
+        self.position: int = position
+        self.id: str = id
+        self.entity: dict | None = None
+        self.file_handle: dict | None = None
+        self.new_file_handle_id: str | None = None
+        self.status: str | None = None
+        self.retries: int = 0
+        self.error: Exception | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'file_handle_id': self.file_handle['id'] if self.file_handle else None,
+            'new_file_handle_id': self.new_file_handle_id,
+            'version': self.entity.get('versionNumber') if self.entity else None,
+            'error': self.error
+        }
+
+
+class StorageMigration(object):
+    """
+    Moves the files of File Entities to another storage location without downloading them.
+
+    The Entities are read, their file handles are read in batches, and each file handle that is not in the destination
+    storage location is copied there by a multipart upload-copy. The storage service copies the parts (UploadPartCopy
+    on pre-signed URLs), a few parts at a time, so no bytes pass through the client. Each Entity is then updated to the
+    new file handle, which creates a new version.
+
+    The ID of each Entity that was moved (or was already in the destination) is written to the journal so a rerun
+    skips it. A rerun also resumes the copies that were interrupted, since Synapse keeps the parts that were copied.
+    The journal starts with the destination storage location, and a rerun to a different one raises a SynapsisError
+    instead of skipping the Files that were moved to the first one.
+    """
+    MIGRATED: t.Final[str] = 'migrated'
+    UNCHANGED: t.Final[str] = 'unchanged'
+    SKIPPED: t.Final[str] = 'skipped'
+    FAILED: t.Final[str] = 'failed'
+    CONFLICT_STATUS: t.Final[int] = 412
+    FILE_HANDLE_BATCH_SIZE: t.Final[int] = 100
+
+    def __init__(self,
+                 utils: SynapsisUtils,
+                 entities: t.Iterable[synapseclient.Entity | str],
+                 dest_storage_location: int | str,
+                 journal: t.Optional[str] = None,
+                 workers: int = 8,
+                 part_workers: int = 4,
+                 part_size: t.Optional[int] = None,
+                 max_retries: int = 3,
+                 queue_size: int = 100,
+                 progress: t.Optional[t.Callable[[str, int], None]] = None):
+        self.utils = utils
+        self.synapse = utils.__synapse__
+        self.entities = entities
+        self.dest_storage_location = int(dest_storage_location)
+        self.journal_path = journal
+        self.workers = max(1, workers)
+        self.part_workers = max(1, part_workers)
+        self.part_size = part_size
+        self.max_retries = max_retries
+        self.queue_size = queue_size
+        self.progress = progress
+        self.__finished__: list[MigrationItem] = []
+        self.__journal__: Journal | None = None
+
+    def run(self) -> list[dict]:
+        """
+        Moves the files.
+
+        :return: List of dicts with: id, status (migrated, unchanged, skipped, or failed), file_handle_id,
+                 new_file_handle_id, version, and error.
+        """
+        self.__finished__ = []
+        self.__journal__ = Journal(self.journal_path, header={'dest_storage_location': self.dest_storage_location})
+        try:
+            items = Pipeline(queue_size=self.queue_size,
+                             progress=self.progress,
+                             on_error=self.__on_error__) \
+                .stage('read', self.__read__, workers=self.workers) \
+                .stage('resolve', self.__resolve__, batch_size=self.FILE_HANDLE_BATCH_SIZE, batch_wait=0.05) \
+                .stage('copy', self.__copy__, workers=self.workers) \
+                .stage('update', self.__update__, workers=self.workers) \
+                .run(MigrationItem(position, self.utils.id_of(entity))
+                     for position, entity in enumerate(self.entities))
+        finally:
+            self.__journal__.close()
+        items = self.__finished__ + items
+        items.sort(key=lambda i: i.position)
+        return [item.to_dict() for item in items]
+
+    def __read__(self, item: MigrationItem) -> MigrationItem | None:
+        if item.id in self.__journal__:
+            return self.__finish__(item, self.SKIPPED)
+        item.entity = self.synapse.restGET('/entity/{0}'.format(item.id))
+        if not SynapseConcreteType.get(item.entity).is_file:
+            raise SynapsisError('Not a File: {0}'.format(item.id))
+        return item
+
+    def __resolve__(self, items: list[MigrationItem]) -> list[MigrationItem]:
+        """Reads the file handles of a batch of Files."""
+        results = self.utils.get_filehandles([(item.id, item.entity['dataFileHandleId']) for item in items])
+        resolved = []
+        for item, result in zip(items, results):
+            if result.get('failureCode'):
+                self.__on_error__('resolve', item, SynapsisError('Could not get the file handle of: {0}: {1}'.format(
+                    item.id, result['failureCode'])))
+                continue
+            item.file_handle = result['fileHandle']
+            if int(item.file_handle.get('storageLocationId') or 0) == self.dest_storage_location:
+                self.__journal__.add(item.id)
+                self.__finish__(item, self.UNCHANGED)
+            else:
+                resolved.append(item)
+        return resolved
+
+    def __copy__(self, item: MigrationItem) -> MigrationItem:
+        file_handle = item.file_handle
+        part_size = self.part_size or Multipart.part_size(None, file_handle.get('contentSize') or 0)
+        association = {
+            'fileHandleId': file_handle['id'],
+            'associateObjectId': item.id,
+            'associateObjectType': 'FileEntity'
+        }
+        item.new_file_handle_id = Multipart.copy(self.synapse,
+                                                 association,
+                                                 file_handle['fileName'],
+                                                 part_size,
+                                                 self.dest_storage_location,
+                                                 max_threads=self.part_workers)
+        return item
+
+    def __update__(self, item: MigrationItem) -> MigrationItem:
+        entity = item.entity
+        while True:
+            body = {**entity, 'dataFileHandleId': item.new_file_handle_id}
+            try:
+                item.entity = self.synapse.restPUT('/entity/{0}'.format(item.id), body=Codec.current().dumps(body))
+                break
+            except SynapseHTTPError as ex:
+                if ex.response is None or ex.response.status_code != self.CONFLICT_STATUS or \
+                        item.retries >= self.max_retries:
+                    raise
+                item.retries += 1
+                entity = self.synapse.restGET('/entity/{0}'.format(item.id))
+                # Do not replace a file that was changed since it was copied.
+                if str(entity.get('dataFileHandleId')) != str(item.file_handle['id']):
+                    raise SynapsisError('The file of: {0} was changed while it was being moved.'.format(item.id))
+        self.__journal__.add(item.id)
+        item.status = self.MIGRATED
+        return item
+
+    def __finish__(self, item: MigrationItem, status: str) -> None:
+        item.status = status
+        self.__finished__.append(item)
+        return None
+
+    def __on_error__(self, stage: str, item: MigrationItem, error: Exception) -> None:
+        item.status = self.FAILED
+        item.error = error
+        self.__finished__.append(item)
@@ -4,19 +4,26 @@ from ..synapse import Synapse, SynapseUtils, SynapsePermission, SynapseConcreteT
 from .utils import Utils
 from .synapsis_utils import SynapsisUtils
 from .hooks import Hooks
+from .narg import none
 from dotchain import DotChain
 import synapseclient
 import numbers
+import inspect
+import time
 
 
 class Synapsis(object):
+    __DELEGATION_STAT_KEYS__: t.Final[tuple[str, ...]] = ('lookups', 'hits', 'misses', 'resolve_ns')
+
     def __init__(self):
         self._hooks: Hooks = Hooks()
-        self._synapse: Synapse = Synapse()
+        self._synapse: Synapse = Synapse(hooks=self._hooks)
         self._synapse_utils: SynapseUtils = SynapseUtils(self._synapse)
         self._synapsis_utils: SynapsisUtils = SynapsisUtils(self._synapse)
+        self.__delegates__: dict[str, t.Callable] = {}
+        self.__delegation_stats__: dict[str, int] = dict.fromkeys(self.__DELEGATION_STAT_KEYS__, 0)
 
-    Chain: TSynapsis = property(lambda self: DotChain(data=self).With(self))
+    Chain: TSynapsis = property(lambda self: self.__chain__())
     Permissions: t.Type[SynapsePermission] = property(lambda self: SynapsePermission)
     ConcreteTypes: t.Type[SynapseConcreteType] = property(lambda self: SynapseConcreteType)
     Synapse: Synapse = property(lambda self: self._synapse)
@@ -27,12 +34,14 @@ class Synapsis(object):
 
     def configure(self, synapse_args: dict = {}, **login_args: dict) -> t.Self:
         self.Synapse.__configure__(synapse_args=synapse_args, **login_args)
+        self.clear_delegates()
         return self
 
     def logged_in(self) -> bool:
         return self.Synapse.__logged_in__()
 
     def login(self) -> t.Self:
+        self.clear_delegates()
         self.Synapse.__login__(hooks=self.hooks)
         return self
 
@@ -59,10 +68,62 @@ class Synapsis(object):
         """
         return self.Utils.is_synapse_id(value, exists=exists)
 
+    @property
+    def delegation_stats(self) -> dict[str, int]:
+        """
+        Gets the counters for attributes delegated to Synapsis.Synapse.
+
+            - lookups: Number of attributes resolved through Synapsis.
+            - hits: Lookups served from the bound method cache.
+            - misses: Lookups resolved on Synapsis.Synapse.
+            - resolve_ns: Total nanoseconds spent resolving misses.
+        :return: dict
+        """
+        return dict(self.__delegation_stats__)
+
+    def clear_delegates(self, reset_stats: bool = False) -> None:
+        """
+        Clears the bound method cache used to delegate attributes to Synapsis.Synapse.
+
+        :param reset_stats: True to also reset the delegation_stats counters.
+        :return: None
+        """
+        self.__delegates__.clear()
+        if reset_stats:
+            self.__delegation_stats__.update(dict.fromkeys(self.__DELEGATION_STAT_KEYS__, 0))
+
+    def __chain__(self) -> DotChain:
+        # Hooks dispatched with Hooks.LOOP are scheduled on the loop awaiting the chain.
+        self._hooks.bind_loop()
+        return DotChain(data=self).With(self)
+
     def __getattr__(self, item):
-        if hasattr(self.Synapse, item):
-            return getattr(self.Synapse, item)
-        raise AttributeError('Synapsis cannot find attribute: {0}'.format(item))
+        delegates = self.__dict__.get('__delegates__')
+        if delegates is None:
+            raise AttributeError('Synapsis cannot find attribute: {0}'.format(item))
+
+        stats = self.__delegation_stats__
+        stats['lookups'] += 1
+        synapse = self._synapse
+        delegate = delegates.get(item)
+        if delegate is not None:
+            # Attributes set on the instance (e.g., by mock.patch.object) or replaced on the class win over the cache.
+            if item not in synapse.__dict__ and getattr(type(synapse), item, None) is delegate.__func__:
+                stats['hits'] += 1
+                return delegate
+            del delegates[item]
+
+        stats['misses'] += 1
+        start = time.perf_counter_ns()
+        attr = getattr(synapse, item, none)
+        stats['resolve_ns'] += time.perf_counter_ns() - start
+        if attr is none:
+            raise AttributeError('Synapsis cannot find attribute: {0}'.format(item))
+
+        # Only bound methods are cached, data attributes (e.g., credentials) can change between calls.
+        if inspect.ismethod(attr) and attr.__self__ is synapse:
+            delegates[item] = attr
+        return attr
 
 
 TSynapsis = t.TypeVar('TSynapsis', Synapsis, Synapse)
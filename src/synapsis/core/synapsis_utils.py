@@ -1,22 +1,50 @@
 from __future__ import annotations
 import typing as t
 import itertools
-import json
+import collections
+import concurrent.futures
+import contextvars
+import functools
 import string
 import unicodedata
 import hashlib
 import numbers
 import re
 from . import Utils
+from .codec import Codec
 from .exceptions import SynapsisError
+from .instrumentation import helper
+from .sync import SyncUp, SyncDown
+from .child_index import ChildIndex
+from .permission_audit import PermissionAudit, MembershipIndex
+from .bulk_delete import BulkDelete
+from .bundle_broker import BundleBroker
+from .bulk_annotations import BulkAnnotations
+from .entity_view import EntityViewListing
+from .tables import TableQuery
+from .table_writer import TableWriter
+from .storage_migration import StorageMigration
+from .external_files import ExternalFileRegistrar
+from .records import Record, EntityHeader, Bundle, FileHandle, FileHandleResult, TeamMember, convert
 from ..synapse import Synapse, SynapsePermission
 from ..synapse.synapse_permission import PermissionCode, AccessTypes
 import synapseclient
 from synapseclient.core.utils import id_of
 from synapseclient.core.exceptions import SynapseFileNotFoundError, SynapseHTTPError, SynapseAuthenticationError
 
+if t.TYPE_CHECKING:
+    import numpy
+    import pyarrow
+
 
 class SynapsisUtils(object):
+    # Max number of versions to list per /entity/{id}/version request.
+    VERSION_PAGE_SIZE: t.Final[int] = 100
+    # Max number of the most recently yielded file handles get_version_bundles shares with later versions.
+    VERSION_FILE_HANDLE_CACHE_SIZE: t.Final[int] = 16
+    # Max number of references to send in one /entity/header request.
+    ENTITY_HEADER_BATCH_SIZE: t.Final[int] = 100
+
     def __init__(self, synapse: Synapse):
         self.__synapse__ = synapse
 
@@ -31,6 +59,7 @@ class SynapsisUtils(object):
         """
         return id_of(obj)
 
+    @helper
     def is_synapse_id(self,
                       value: str,
                       exists: bool = False
@@ -63,25 +92,121 @@ class SynapsisUtils(object):
                 return is_id
         return False
 
+    @helper
     def find_entity(self,
                     name: str,
                     parent: t.Optional[synapseclient.Entity | str] = None,
+                    index: t.Optional[ChildIndex] = None,
+                    header_only: bool = False,
                     **get_kwargs: t.Optional[dict]
-                    ) -> str | None:
+                    ) -> synapseclient.Entity | EntityHeader | None:
         """
         Find an Entity given its name and parent.
 
         :param name: Name of the entity to find
         :param parent: An Entity object or the ID of an entity as a string. Omit if searching for a Project by name.
+        :param index: ChildIndex of the parent to find the name in instead of querying Synapse.
+        :param header_only: True to return an EntityHeader instead of the Entity. The Entity is not constructed and
+                            files are not downloaded. When an index is used the header comes from the index and has no
+                            etag.
         :param get_kwargs: Keyword args for Synapse.get().
-        :return: The Entity or None.
+        :return: The Entity, EntityHeader, or None.
         """
-        id = self.__synapse__.findEntityId(name, parent=parent)
+        if index is not None:
+            self.__check_index__(index, parent)
+            if header_only:
+                header = index.get(name)
+                return EntityHeader.from_json(header) if header else None
+            id = index.id_of(name)
+        else:
+            id = self.__synapse__.findEntityId(name, parent=parent)
         if id:
+            if header_only:
+                return self.get_entity_header(id)
             return self.__synapse__.get(id, **get_kwargs)
         else:
             return None
 
+    @helper
+    def find_entities(self,
+                      names: list[str],
+                      parent: t.Optional[synapseclient.Entity | str] = None,
+                      index: t.Optional[ChildIndex] = None,
+                      max_workers: t.Optional[int] = 8,
+                      header_only: bool = False,
+                      **get_kwargs: t.Optional[dict]
+                      ) -> list[synapseclient.Entity | EntityHeader | None]:
+        """
+        Find Entities given their names and parent.
+
+        The children of the parent are listed once and the Entities are fetched concurrently.
+
+        :param names: Names of the entities to find.
+        :param parent: An Entity object or the ID of an entity as a string.
+        :param index: ChildIndex of the parent. Created if not set.
+        :param max_workers: Max number of Entities to get at once.
+        :param header_only: True to return the EntityHeaders from the index instead of getting the Entities.
+                            The headers have no etag.
+        :param get_kwargs: Keyword args for Synapse.get().
+        :return: List of the Entity, EntityHeader, or None for each name.
+        """
+        if index is None:
+            index = ChildIndex(parent, synapse=self.__synapse__)
+        else:
+            self.__check_index__(index, parent)
+
+        if header_only:
+            return [EntityHeader.from_json(header) if header else None for header in map(index.get, names)]
+
+        ids = [index.id_of(name) for name in names]
+        results = [None] * len(names)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = {executor.submit(contextvars.copy_context().run, self.__synapse__.get, id, **get_kwargs): pos
+                       for pos, id in enumerate(ids) if id}
+            for future in concurrent.futures.as_completed(futures):
+                results[futures[future]] = future.result()
+        return results
+
+    @helper
+    def get_entity_header(self,
+                          entity: synapseclient.Entity | str
+                          ) -> EntityHeader:
+        """
+        Gets the id, name, type, etag, and version of an Entity without constructing the Entity or downloading files.
+
+        :param entity: The Entity or ID.
+        :return: EntityHeader
+        """
+        return EntityHeader.from_json(self.__synapse__.restGET('/entity/{0}'.format(self.id_of(entity))))
+
+    @helper
+    def get_entity_headers(self,
+                           entities: list[synapseclient.Entity | str]
+                           ) -> list[EntityHeader | None]:
+        """
+        Gets the EntityHeaders of many Entities, batched into /entity/header requests.
+
+        The headers have no etag.
+
+        :param entities: The Entities or IDs.
+        :return: List of the EntityHeader or None (not found or no access) for each entity.
+        """
+        ids = [self.id_of(entity) for entity in entities]
+        unique_ids = list(dict.fromkeys(ids))
+        headers = {}
+        for start in range(0, len(unique_ids), self.ENTITY_HEADER_BATCH_SIZE):
+            batch = unique_ids[start:start + self.ENTITY_HEADER_BATCH_SIZE]
+            body = {'references': [{'targetId': id} for id in batch]}
+            response = self.__synapse__.restPOST('/entity/header', body=Codec.current().dumps(body))
+            for header in response.get('results', []):
+                headers[header['id']] = EntityHeader.from_json(header)
+        return [headers.get(id) for id in ids]
+
+    def __check_index__(self, index: ChildIndex, parent: synapseclient.Entity | str | None) -> None:
+        if parent is not None and self.id_of(parent) != index.parent_id:
+            raise SynapsisError('ChildIndex is for: {0} not: {1}'.format(index.parent_id, self.id_of(parent)))
+
+    @helper
     def delete_skip_trash(self,
                           entity: synapseclient.Entity | str
                           ) -> None:
@@ -93,6 +218,45 @@ class SynapsisUtils(object):
         """
         self.__synapse__.restDELETE(uri='/entity/{0}?skipTrashCan=true'.format(self.id_of(entity)))
 
+    @helper
+    def delete_many_skip_trash(self,
+                               ids_or_root: list[synapseclient.Entity | str] | synapseclient.Entity | str,
+                               cascade: bool = True,
+                               keep_root: bool = False,
+                               dry_run: bool = False,
+                               journal: t.Optional[str] = None,
+                               workers: t.Optional[int] = 8,
+                               max_rate: t.Optional[float] = None,
+                               progress: t.Optional[t.Callable[[str, int], None]] = None
+                               ) -> dict:
+        """
+        Deletes many Entities, and everything under them, and skips the trash. This permanently deletes the Entities.
+
+        :param ids_or_root: The Entities or IDs to delete, or a Project or Folder to delete.
+        :param cascade: True to delete the containers and let the service delete their children. False to list the
+                        trees and delete the Entities from the leaves up.
+        :param keep_root: True to delete everything under the given containers but not the containers.
+        :param dry_run: True to report what would be deleted (counts by type and the size of the files) without
+                        deleting anything.
+        :param journal: Path of a file the deleted IDs are written to. IDs in the file are skipped on a rerun.
+        :param workers: Number of threads that send the delete requests.
+        :param max_rate: Max number of delete requests per second. None for no limit (other than the shared
+                         RateLimiter).
+        :param progress: Called with ('delete', count) as the Entities are deleted.
+        :return: dict with: deleted, not_found, skipped, failed (list of dicts with id and error), and requests.
+                 Dry runs return: entities, containers, files, bytes, types, and requests.
+        """
+        return BulkDelete(self,
+                          ids_or_root,
+                          cascade=cascade,
+                          keep_root=keep_root,
+                          dry_run=dry_run,
+                          journal=journal,
+                          workers=workers,
+                          max_rate=max_rate,
+                          progress=progress).run()
+
+    @helper
     def get_bundle(self,
                    entity: synapseclient.Entity | str,
                    version: t.Optional[int] = None,
@@ -109,12 +273,17 @@ class SynapsisUtils(object):
                    include_doi_association: t.Optional[bool] = False,
                    include_file_name: t.Optional[bool] = False,
                    include_thread_count: t.Optional[bool] = False,
-                   include_restriction_information: t.Optional[bool] = False
-                   ) -> dict:
+                   include_restriction_information: t.Optional[bool] = False,
+                   record_type: t.Optional[type[dict | Bundle]] = dict,
+                   broker: t.Optional[BundleBroker] = None
+                   ) -> dict | Bundle:
         """
         Gets the bundle for an Entity.
 
-        :return: dict
+        :param record_type: dict to return the JSON or Bundle to return a compact record.
+        :param broker: BundleBroker to merge the request with other requests for the Entity and answer it from the
+                       bundles already fetched. Defaults to the broker of the current `with BundleBroker():` block.
+        :return: dict or Bundle
         """
         request = {
             'includeEntity': include_entity,
@@ -132,13 +301,330 @@ class SynapsisUtils(object):
             'includeThreadCount': include_thread_count,
             'includeRestrictionInformation': include_restriction_information
         }
+        entity_id = self.id_of(entity)
+        broker = broker or BundleBroker.current()
+        if broker is None:
+            bundle = self.__post_bundle__(entity_id, version, request)
+        else:
+            bundle = broker.get(entity_id,
+                                version,
+                                [flag for flag, value in request.items() if value],
+                                lambda flags: self.__post_bundle__(entity_id, version,
+                                                                   {flag: flag in flags for flag in request}))
+        return convert(bundle, record_type)
+
+    @helper
+    def get_version_bundles(self,
+                            entity: synapseclient.Entity | str,
+                            versions: t.Optional[str | list[int]] = 'all',
+                            include_annotations: t.Optional[bool] = False,
+                            include_file_handles: t.Optional[bool] = True,
+                            max_workers: t.Optional[int] = 8,
+                            record_type: t.Optional[type[dict | Bundle]] = dict,
+                            **get_bundle_kwargs: t.Optional[dict]
+                            ) -> t.Iterator[dict | Bundle]:
+        """
+        Gets the bundle of each version of an Entity.
+
+        The versions are listed a page at a time and the bundles are fetched concurrently and yielded in the order of
+        the versions, so only a few bundles are held in memory at once. File handles shared by nearby versions (the
+        last VERSION_FILE_HANDLE_CACHE_SIZE file handles yielded) are yielded as the same object. Call close() on the
+        iterator (e.g., with contextlib.closing) to stop the fetches in flight when not all the bundles are read.
+
+        :param entity: The Entity or ID.
+        :param versions: 'all' for all the versions (newest first) or a list of version numbers.
+        :param include_annotations: True to include the annotations.
+        :param include_file_handles: True to include the file handles.
+        :param max_workers: Max number of bundles to get at once.
+        :param record_type: dict to yield the JSON or Bundle to yield compact records.
+        :param get_bundle_kwargs: Keyword args for get_bundle() (e.g., include_permissions).
+        :return: Iterator of dict or Bundle. The version number is in the entity (versionNumber).
+        """
+        entity_id = self.id_of(entity)
+        if versions == 'all':
+            versions = (info['versionNumber']
+                        for info in self.__synapse__._GET_paginated('/entity/{0}/version'.format(entity_id),
+                                                                    limit=self.VERSION_PAGE_SIZE))
+        elif isinstance(versions, str):
+            raise ValueError('Invalid versions: {0}'.format(versions))
+        max_workers = max(1, max_workers)
+        # A small LRU so memory stays flat for Entities with many versions.
+        file_handles = collections.OrderedDict()
+
+        def _shared(file_handle_id: str, file_handle: dict | FileHandle) -> dict | FileHandle:
+            file_handle = file_handles.setdefault(file_handle_id, file_handle)
+            file_handles.move_to_end(file_handle_id)
+            if len(file_handles) > self.VERSION_FILE_HANDLE_CACHE_SIZE:
+                file_handles.popitem(last=False)
+            return file_handle
+
+        pending = collections.deque()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                         thread_name_prefix='synapsis-version-bundles')
+        try:
+            versions = iter(versions)
+            while True:
+                # Keep a bounded number of bundles in flight.
+                while len(pending) < max_workers * 2:
+                    version = next(versions, None)
+                    if version is None:
+                        break
+                    pending.append(executor.submit(contextvars.copy_context().run,
+                                                   self.get_bundle,
+                                                   entity_id,
+                                                   version=version,
+                                                   include_annotations=include_annotations,
+                                                   include_file_handles=include_file_handles,
+                                                   record_type=record_type,
+                                                   **get_bundle_kwargs))
+                if not pending:
+                    return
+                bundle = pending.popleft().result()
+                if record_type is dict:
+                    if bundle.get('fileHandles'):
+                        bundle['fileHandles'] = [_shared(str(f['id']), f) for f in bundle['fileHandles']]
+                elif bundle.file_handles:
+                    bundle.file_handles = [_shared(str(f.id), f) for f in bundle.file_handles]
+                yield bundle
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def __post_bundle__(self, entity_id: str, version: int | None, request: dict) -> dict:
         if version is not None:
-            return self.__synapse__.restPOST('/entity/{0}/version/{1}/bundle2'.format(self.id_of(entity), version),
-                                             body=json.dumps(request))
+            return self.__synapse__.restPOST('/entity/{0}/version/{1}/bundle2'.format(entity_id, version),
+                                             body=Codec.current().dumps(request))
         else:
-            return self.__synapse__.restPOST('/entity/{0}/bundle2'.format(self.id_of(entity)),
-                                             body=json.dumps(request))
+            return self.__synapse__.restPOST('/entity/{0}/bundle2'.format(entity_id),
+                                             body=Codec.current().dumps(request))
+
+    @helper
+    def set_annotations_many(self,
+                             updates: t.Mapping[str, dict] | t.Iterable[tuple[synapseclient.Entity | str, dict]],
+                             replace: bool = False,
+                             workers: t.Optional[int] = 8,
+                             max_retries: t.Optional[int] = 5,
+                             progress: t.Optional[t.Callable[[str, int], None]] = None
+                             ) -> list[dict]:
+        """
+        Sets the annotations of many Entities concurrently without storing the Entities.
+
+        The values are merged into each Entity's current annotations. If an Entity is changed by someone else while it
+        is being updated, its annotations are read again and the values are merged into them again.
+
+        :param updates: The values to set for each ID (e.g., {'syn123': {'key': 'value', 'other': [1, 2]}}), or
+                        (Entity or ID, values) pairs since Entities cannot be dict keys. Values can also be Synapse
+                        annotations v2 JSON ({'type': 'LONG', 'value': ['1']}). None removes the key.
+        :param replace: True to replace all the annotations with the values instead of merging them.
+        :param workers: Number of threads that update the annotations.
+        :param max_retries: Max number of times to retry an Entity that was changed while it was being updated.
+        :param progress: Called with ('update', count) as the Entities are updated.
+        :return: List of dicts for each Entity with: id, status (updated, unchanged, failed), etag, retries, and
+                 error.
+        """
+        return BulkAnnotations(self,
+                               updates,
+                               replace=replace,
+                               workers=workers,
+                               max_retries=max_retries,
+                               progress=progress).run()
+
+    @helper
+    def list_entity_metadata(self,
+                             container: synapseclient.Entity | str,
+                             include_types: t.Optional[list[str]] = None,
+                             columns: t.Optional[list[str]] = None,
+                             annotations: t.Optional[bool] = True,
+                             view: t.Optional[synapseclient.Entity | str] = None,
+                             keep_view: t.Optional[bool] = False,
+                             page_size: t.Optional[int] = None,
+                             format: t.Optional[str] = 'records',
+                             timeout: t.Optional[float] = None
+                             ) -> t.Iterator[dict | pyarrow.RecordBatch]:
+        """
+        Gets the metadata (and annotations) of all the Entities in a Project or Folder from an Entity View.
+
+        A temporary View is created for the Project or Folder and queried a page at a time, so listing thousands of
+        Entities takes a handful of requests instead of one per Entity. The View is deleted when the iterator finishes
+        or is closed.
+
+        :param container: The Project or Folder.
+        :param include_types: The types of Entities to include (file, folder, table, entityview, dockerrepo). Defaults
+                              to ['file'].
+        :param columns: The View columns to include. Defaults to: id, name, type, parentId, dataFileMD5Hex,
+                        dataFileSizeBytes.
+        :param annotations: True to include a column for each annotation.
+        :param view: An existing View to query instead of creating one. All of its columns are returned unless columns
+                     is set.
+        :param keep_view: True to keep the View that was created.
+        :param page_size: Max number of rows to get per request. None for the max rows per page.
+        :param format: 'records' to yield a dict per Entity or 'arrow' to yield a pyarrow.RecordBatch per page.
+        :param timeout: Seconds to wait for each query.
+        :return: Iterator of dicts or pyarrow.RecordBatches with the values typed from the column types.
+        """
+        yield from EntityViewListing(self,
+                                     container,
+                                     include_types=include_types,
+                                     columns=columns,
+                                     annotations=annotations,
+                                     view=view,
+                                     keep_view=keep_view,
+                                     page_size=page_size,
+                                     format=format,
+                                     timeout=timeout).run()
+
+    @helper
+    def query_table_batches(self,
+                            sql: str,
+                            batch_rows: t.Optional[int] = 10_000,
+                            format: t.Optional[str] = 'arrow',
+                            page_size: t.Optional[int] = None,
+                            prefetch: t.Optional[int] = 1,
+                            timeout: t.Optional[float] = None
+                            ) -> t.Iterator[pyarrow.RecordBatch | dict[str, numpy.ndarray]]:
+        """
+        Queries a Table or View and gets the results as columnar batches.
+
+        The results are queried a page at a time (with the next pages queried while a batch is being used) and the
+        values are typed from the column types, so a large table can be scanned without downloading a CSV or holding
+        more than a few pages in memory.
+
+        :param sql: The query (e.g., SELECT * FROM syn123 WHERE age > 30).
+        :param batch_rows: Number of rows per batch (the last batch may have fewer). None for a batch per page.
+        :param format: 'arrow' for pyarrow.RecordBatches (pip install synapsis[parquet]) or 'numpy' for dicts of
+                       column name to NumPy array (pip install synapsis[numpy]). NumPy columns with nulls are masked
+                       arrays.
+        :param page_size: Max number of rows to get per request. None for the max rows per page.
+        :param prefetch: Number of pages to query ahead.
+        :param timeout: Seconds to wait for each page.
+        :return: Iterator of batches.
+        """
+        yield from TableQuery(self.__synapse__,
+                              sql,
+                              page_size=page_size,
+                              prefetch=prefetch,
+                              timeout=timeout).batches(batch_rows=batch_rows, format=format)
+
+    @helper
+    def append_table_rows(self,
+                          table: synapseclient.Entity | str,
+                          rows_or_batches: t.Iterable,
+                          chunk_rows: t.Optional[int] = 5000,
+                          chunk_bytes: t.Optional[int] = 2 * 1024 * 1024,
+                          workers: t.Optional[int] = 4,
+                          journal: t.Optional[str] = None,
+                          timeout: t.Optional[float] = None,
+                          progress: t.Optional[t.Callable[[str, int], None]] = None
+                          ) -> dict:
+        """
+        Appends rows to a Table in chunks, without building a CSV.
+
+        The rows are read as they are appended and cut into chunks that are each appended by an asynchronous job, with
+        a few jobs running at a time. When a job fails, the chunks that were appended are in the journal and are
+        skipped when the same rows are appended again with the same journal.
+
+        :param table: The Table or its ID.
+        :param rows_or_batches: Iterable of rows (dicts of column name to value, or lists of values in the order of the
+                                columns) or columnar batches (pyarrow RecordBatches or Tables, or dicts of column name
+                                to NumPy array).
+        :param chunk_rows: Max number of rows per chunk.
+        :param chunk_bytes: Max approximate size of the values in a chunk.
+        :param workers: Number of chunks to append at a time. Rows are appended in order when 1.
+        :param journal: Path of a file the numbers of the appended chunks are written to. Chunks in the file are
+                        skipped on a rerun, so the rows and chunk sizes must be the same.
+        :param timeout: Seconds to wait for each chunk.
+        :param progress: Called with ('append', count) as the chunks are appended.
+        :return: dict with: rows (the number of rows appended), chunks (the number of chunks appended), and skipped
+                 (the number of chunks in the journal).
+        """
+        return TableWriter(self,
+                           table,
+                           chunk_rows=chunk_rows,
+                           chunk_bytes=chunk_bytes,
+                           workers=workers,
+                           journal=journal,
+                           timeout=timeout,
+                           progress=progress).write(rows_or_batches)
+
+    @helper
+    def migrate_storage(self,
+                        entities: t.Iterable[synapseclient.Entity | str],
+                        dest_storage_location: int | str,
+                        journal: t.Optional[str] = None,
+                        workers: t.Optional[int] = 8,
+                        part_workers: t.Optional[int] = 4,
+                        part_size: t.Optional[int] = None,
+                        progress: t.Optional[t.Callable[[str, int], None]] = None
+                        ) -> list[dict]:
+        """
+        Moves the files of File Entities to another storage location without downloading them.
+
+        Each file is copied by the storage service with a multipart upload-copy and the Entity is updated to the new
+        file handle (a new version of the Entity). Files that are already in the storage location are not copied.
+
+        :param entities: The File Entities or IDs.
+        :param dest_storage_location: The ID of the storage location to move the files to.
+        :param journal: Path of a file the IDs of the moved Entities are written to. IDs in the file are skipped on a
+                        rerun.
+        :param workers: Number of files to copy at a time.
+        :param part_workers: Number of parts of each file to copy at a time.
+        :param part_size: Bytes per part. None for a size that keeps large files under the max number of parts.
+        :param progress: Called with (stage, count) as the Entities are read, resolved, copied, and updated.
+        :return: List of dicts with: id, status (migrated, unchanged, skipped, or failed), file_handle_id,
+                 new_file_handle_id, version, and error.
+        """
+        return StorageMigration(self,
+                                entities,
+                                dest_storage_location,
+                                journal=journal,
+                                workers=workers,
+                                part_workers=part_workers,
+                                part_size=part_size,
+                                progress=progress).run()
 
+    @helper
+    def register_external_files(self,
+                                records: t.Iterable[tuple | dict],
+                                parent: synapseclient.Entity | str,
+                                storage_location_id: int | str,
+                                bucket_name: t.Optional[str] = None,
+                                prefix: t.Optional[str] = None,
+                                journal: t.Optional[str] = None,
+                                workers: t.Optional[int] = 8,
+                                replace_char: t.Optional[str] = '_',
+                                progress: t.Optional[t.Callable[[str, int], None]] = None
+                                ) -> dict:
+        """
+        Registers objects that are already in an S3 bucket or object store as File Entities without uploading them.
+
+        The path of each key (after the prefix) is created as Folders under the parent and the last part of the key is
+        the name of the File. Each object gets an external file handle in the storage location: an S3 file handle if
+        bucket_name is set, otherwise an external object store file handle.
+
+        :param records: The objects as (key, size, md5) tuples, or dicts with: key, size, md5, and content_type.
+        :param parent: The Project or Folder to create the Files in.
+        :param storage_location_id: The ID of the external storage location of the bucket.
+        :param bucket_name: The name of the S3 bucket. None for an object store.
+        :param prefix: The prefix of the keys that is not created as Folders.
+        :param journal: Path of a file the registered keys are written to. Keys in the file are skipped on a rerun.
+        :param workers: Number of Folders, file handles, and Files to create at a time (per stage).
+        :param replace_char: The character that replaces the characters that are not allowed in Entity names.
+        :param progress: Called with (stage, count) as the Folders, file handles, and Files are created.
+        :return: Dict with the number of Files registered, Files that already existed (exists), keys skipped from the
+                 journal (skipped), and Folders created (folders), and the keys that failed (failed) as a list of dicts
+                 with: key, status, and error.
+        """
+        return ExternalFileRegistrar(self,
+                                     records,
+                                     parent,
+                                     storage_location_id,
+                                     bucket_name=bucket_name,
+                                     prefix=prefix,
+                                     journal=journal,
+                                     workers=workers,
+                                     replace_char=replace_char,
+                                     progress=progress).run()
+
+    @helper
     def copy_file_handles_batch(self,
                                 file_handle_ids: list[str],
                                 obj_types: list[str],
@@ -164,7 +650,7 @@ class SynapsisUtils(object):
             copy_file_handle_request["copyRequests"].append(file_item)
 
         copy_response = self.__synapse__.restPOST('/filehandles/copy',
-                                                  body=json.dumps(copy_file_handle_request),
+                                                  body=Codec.current().dumps(copy_file_handle_request),
                                                   endpoint=self.__synapse__.fileHandleEndpoint)
         copy_results = copy_response.get("copyResults")
         for copy_result in copy_results:
@@ -177,29 +663,64 @@ class SynapsisUtils(object):
 
         return copy_results
 
+    @helper
     def get_project(self,
                     entity: synapseclient.Entity | str,
-                    id_only: bool = False
-                    ) -> synapseclient.Project | str:
+                    id_only: bool = False,
+                    header_only: bool = False
+                    ) -> synapseclient.Project | EntityHeader | str:
         """
         Gets the Project or ID for a child entity.
 
         :param entity: The Entity to get the Project for.
         :param id_only: True to only return the Project's ID.
-        :return: Project or ID
+        :param header_only: True to return the Project's EntityHeader (no etag) instead of the Project.
+        :return: Project, EntityHeader, or ID
         """
         if isinstance(entity, synapseclient.Project):
             if id_only:
                 return self.id_of(entity)
+            elif header_only:
+                return EntityHeader.from_json(entity)
             else:
                 return entity
 
         path = self.__synapse__.restGET('/entity/{0}/path'.format(self.id_of(entity))).get('path')[1:][0]
         if id_only:
             return path['id']
+        elif header_only:
+            return EntityHeader.from_json(path)
         else:
             return self.__synapse__.get(path['id'])
 
+    @helper
+    def get_projects(self,
+                     entities: list[synapseclient.Entity | str],
+                     id_only: bool = False,
+                     header_only: bool = False,
+                     max_workers: t.Optional[int] = 8
+                     ) -> list[synapseclient.Project | EntityHeader | str]:
+        """
+        Gets the Project or ID for many child entities. The paths are fetched concurrently.
+
+        :param entities: The Entities to get the Projects for.
+        :param id_only: True to only return the Projects' IDs.
+        :param header_only: True to return the Projects' EntityHeaders (no etag) instead of the Projects.
+        :param max_workers: Max number of requests to make at once.
+        :return: List of the Project, EntityHeader, or ID for each entity.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, self.get_project, entity,
+                                       id_only=not header_only, header_only=header_only)
+                       for entity in entities]
+            results = [future.result() for future in futures]
+
+        if id_only or header_only:
+            return results
+        projects = {id: self.__synapse__.get(id) for id in dict.fromkeys(results)}
+        return [projects[id] for id in results]
+
+    @helper
     def get_synapse_path(self,
                          entity: synapseclient.Entity | str
                          ) -> str:
@@ -214,29 +735,32 @@ class SynapsisUtils(object):
         return '/'.join(segments)
 
     def find_data_file_handle(self,
-                              source: list[dict] | synapseclient.File | dict,
-                              data_file_handle_id: t.Optional[str] = None
-                              ) -> dict:
+                              source: list[dict | FileHandle] | synapseclient.File | dict | Bundle,
+                              data_file_handle_id: t.Optional[str] = None,
+                              record_type: t.Optional[type[dict | FileHandle]] = dict
+                              ) -> dict | FileHandle | None:
         """
         Gets the fileHandle from an entity, bundle, or list of filehandles.
 
         :param source: List of bundle["fileHandles"], File, or File bundle to get the filehandle from.
         :param data_file_handle_id: The dataFileHandleId to find.
-        :return: dict or None
+        :param record_type: dict to return the JSON or FileHandle to return a compact record.
+        :return: dict, FileHandle, or None
         """
         file_handles = None
         if isinstance(source, synapseclient.File):
-            return source['_file_handle']
-        elif isinstance(source, dict):
+            return convert(source['_file_handle'], record_type)
+        elif isinstance(source, (dict, Record)):
             data_file_handle_id = source.get('entity', {}).get('dataFileHandleId', None)
             file_handles = source.get('fileHandles', [])
         elif isinstance(source, list):
             file_handles = source
 
         if data_file_handle_id is None:
-            return Utils.find(file_handles, lambda f: f['status'] == 'AVAILABLE' and not f['isPreview'])
+            file_handle = Utils.find(file_handles, lambda f: f['status'] == 'AVAILABLE' and not f['isPreview'])
         else:
-            return Utils.find(file_handles, lambda f: str(f['id']) == str(data_file_handle_id))
+            file_handle = Utils.find(file_handles, lambda f: str(f['id']) == str(data_file_handle_id))
+        return convert(file_handle, record_type)
 
     def find_acl_resource_access(self,
                                  acl: dict,
@@ -255,31 +779,37 @@ class SynapsisUtils(object):
                                      default=None)
         return resource_access
 
+    @helper
     def get_filehandle(self,
-                       file: synapseclient.File | str
-                       ) -> dict | None:
+                       file: synapseclient.File | str,
+                       record_type: t.Optional[type[dict | FileHandle]] = dict
+                       ) -> dict | FileHandle | None:
         """
         Gets the filehandle for an Entity.
 
         :param file: File Entity or ID
-        :return: dict
+        :param record_type: dict to return the JSON or FileHandle to return a compact record.
+        :return: dict or FileHandle
         """
         response = self.__synapse__.restGET('/entity/{0}/filehandles'.format(self.id_of(file)))
-        filehandle = self.find_data_file_handle(response['list'])
+        filehandle = self.find_data_file_handle(response['list'], record_type=record_type)
         return filehandle
 
+    @helper
     def get_filehandles(self,
                         files_and_file_handles: list[tuple],
                         include_pre_signed_urls: t.Optional[bool] = False,
-                        include_preview_pre_signed_urls: t.Optional[bool] = False
-                        ) -> list[dict]:
+                        include_preview_pre_signed_urls: t.Optional[bool] = False,
+                        record_type: t.Optional[type[dict | FileHandleResult]] = dict
+                        ) -> list[dict | FileHandleResult]:
         """
         Gets multiple filehandles at once.
 
         :param files_and_file_handles: List of tuples with (Entity File or ID, file_handle_id or dict with 'id')
         :param include_pre_signed_urls: True to include pre-signed URLs.
         :param include_preview_pre_signed_urls: True to include pre-signed URLs for preview.
-        :return: List of dict
+        :param record_type: dict to return the JSON or FileHandleResult to return compact records.
+        :return: List of dict or FileHandleResult
         """
         body = {
             'includeFileHandles': True,
@@ -296,12 +826,20 @@ class SynapsisUtils(object):
                 }
             )
 
-        response = self.__synapse__.restPOST('/fileHandle/batch',
-                                             endpoint=self.__synapse__.fileHandleEndpoint,
-                                             body=json.dumps(body))
+        if record_type is dict:
+            response = self.__synapse__.restPOST('/fileHandle/batch',
+                                                 endpoint=self.__synapse__.fileHandleEndpoint,
+                                                 body=Codec.current().dumps(body))
+            return response.get('requestedFiles', [])
 
-        return response.get('requestedFiles', [])
+        # Convert each file as it is decoded so the full list of dicts is never held in memory.
+        items = self.__synapse__.iter_rest_items('post', '/fileHandle/batch',
+                                                 key='requestedFiles',
+                                                 endpoint=self.__synapse__.fileHandleEndpoint,
+                                                 body=Codec.current().dumps(body))
+        return [convert(item, record_type) for item in items]
 
+    @helper
     def get_entity_permission(self,
                               entity: synapseclient.Entity | str,
                               principal: synapseclient.UserProfile | synapseclient.Team | str | numbers.Number
@@ -317,6 +855,7 @@ class SynapsisUtils(object):
         current_access_types = self.__synapse__.getPermissions(entity, principalId=principal_id)
         return SynapsePermission.get(current_access_types, SynapsePermission.NO_PERMISSION)
 
+    @helper
     def set_entity_permission(self,
                               entity: synapseclient.Entity | str,
                               principal: synapseclient.UserProfile | synapseclient.Team | str | numbers.Number,
@@ -339,6 +878,48 @@ class SynapsisUtils(object):
                                                accessType=permission.access_types,
                                                **set_permissions_kwargs)
 
+    @helper
+    def audit_permissions(self,
+                          root: synapseclient.Entity | str,
+                          principals: list[synapseclient.UserProfile | synapseclient.Team | str | numbers.Number],
+                          path: str,
+                          format: t.Optional[str] = None,
+                          expand_teams: bool = False,
+                          list_workers: t.Optional[int] = 8,
+                          membership_index: t.Optional[MembershipIndex] = None,
+                          progress: t.Optional[t.Callable[[int], None]] = None
+                          ) -> dict:
+        """
+        Writes the effective permission of each principal on each Entity in a Project or Folder to a CSV or Parquet
+        file.
+
+        Each row has the Entity's id, name, type, parent_id, and benefactor_id, and a column for each principal (named
+        by the principal's ID) with the SynapsePermission code. Each benefactor's ACL is fetched once and the
+        permissions include the access granted to the user's teams and to the public and authenticated users groups.
+        Rows are written as the tree is listed, in no particular order.
+
+        :param root: The Project, Folder, or Entity to audit.
+        :param principals: The UserProfiles, Teams, IDs, or user names to audit.
+        :param path: Path of the file to write.
+        :param format: 'csv' or 'parquet'. Defaults to 'parquet' if the path ends with '.parquet', otherwise 'csv'.
+                       Parquet requires pyarrow.
+        :param expand_teams: True to audit each member of the teams in principals instead of the teams.
+        :param list_workers: Number of threads that list the folders.
+        :param membership_index: MembershipIndex to reuse the team memberships from another audit.
+        :param progress: Called with the number of rows written after each row.
+        :return: dict with: path, format, entities, benefactors, and principals (id, name, is_team).
+        """
+        return PermissionAudit(self,
+                               root,
+                               principals,
+                               path,
+                               format=format,
+                               expand_teams=expand_teams,
+                               list_workers=list_workers,
+                               membership_index=membership_index,
+                               progress=progress).run()
+
+    @helper
     def invite_to_team(self,
                        team: synapseclient.Team | str | numbers.Number,
                        invitee: synapseclient.UserProfile | str | numbers.Number,
@@ -378,6 +959,7 @@ class SynapsisUtils(object):
         else:
             return invite
 
+    @helper
     def remove_from_team(self,
                          team: synapseclient.Team | str | numbers.Number,
                          user: synapseclient.UserProfile | str | numbers.Number
@@ -393,12 +975,14 @@ class SynapsisUtils(object):
         user_id = self.id_of(user)
         self.__synapse__.restDELETE(uri='/team/{0}/member/{1}'.format(team_id, user_id))
 
+    @helper
     def get_team_members(self,
                          team: synapseclient.Team | str | numbers.Number,
                          users: list[synapseclient.UserProfile | str | numbers.Number] |
                                 synapseclient.UserProfile | str | numbers.Number = None,
                          as_user_group_header: bool = False,
-                         team_members: list[dict] | None = None,
+                         team_members: list[dict | TeamMember] | None = None,
+                         record_type: t.Optional[type[dict | TeamMember]] = dict
                          ):
         """
         Gets the list of members on a team.
@@ -407,10 +991,11 @@ class SynapsisUtils(object):
         :param users: Optional. Only return results for these users.
         :param as_user_group_header: True to return the "member" (UserGroupHeader) instead of the TeamMember.
         :param team_members: Optional. List of dictionaries from syn.getTeamMembers().
+        :param record_type: dict to return the JSON or TeamMember to return compact records.
         :return: List of TeamMember objects or UserGroupHeader objects.
         """
         team_id = str(self.id_of(team))
-        team_members = team_members or list(self.__synapse__.getTeamMembers(team))
+        team_members = convert(team_members or list(self.__synapse__.getTeamMembers(team)), record_type)
         if users:
             users = users if isinstance(users, list) else [users]
             user_ids = Utils.map(users, lambda user: str(self.id_of(user)))
@@ -424,12 +1009,14 @@ class SynapsisUtils(object):
         else:
             return team_members
 
+    @helper
     def get_team_member(self,
                         team: synapseclient.Team | str | numbers.Number,
                         user: synapseclient.UserProfile | str | numbers.Number,
                         as_user_group_header: bool = False,
-                        team_members: list[dict] | None = None,
-                        ) -> dict | None:
+                        team_members: list[dict | TeamMember] | None = None,
+                        record_type: t.Optional[type[dict | TeamMember]] = dict
+                        ) -> dict | TeamMember | None:
         """
         Gets a member of a team.
 
@@ -437,13 +1024,16 @@ class SynapsisUtils(object):
         :param user: The UserProfile or ID to get.
         :param as_user_group_header: True to return the "member" (UserGroupHeader) instead of the TeamMember.
         :param team_members: Optional. List of dictionaries from syn.getTeamMembers().
+        :param record_type: dict to return the JSON or TeamMember to return a compact record.
         :return: List of TeamMember objects or UserGroupHeader objects.
         """
         return Utils.first(self.get_team_members(team,
                                                  users=user,
                                                  team_members=team_members,
-                                                 as_user_group_header=as_user_group_header))
+                                                 as_user_group_header=as_user_group_header,
+                                                 record_type=record_type))
 
+    @helper
     def get_team_permission(self,
                             team: synapseclient.Team | str | numbers.Number,
                             user: synapseclient.UserProfile | str | numbers.Number,
@@ -467,6 +1057,7 @@ class SynapsisUtils(object):
         else:
             return current_permission
 
+    @helper
     def set_team_permission(self,
                             team: synapseclient.Team | str | numbers.Number,
                             user: synapseclient.UserProfile | str | numbers.Number,
@@ -500,7 +1091,7 @@ class SynapsisUtils(object):
                 # Add a new permission for the user.
                 new_acl = {'principalId': self.id_of(user), 'accessType': permission.access_types}
                 team_acl['resourceAccess'].append(new_acl)
-            return self.__synapse__.restPUT("/team/acl", body=json.dumps(team_acl))
+            return self.__synapse__.restPUT("/team/acl", body=Codec.current().dumps(team_acl))
 
     def md5sum(self,
                filename: str,
@@ -524,10 +1115,90 @@ class SynapsisUtils(object):
         else:
             return md5.hexdigest()
 
+    @helper
+    def sync_up(self,
+                local_dir: str,
+                parent: synapseclient.Entity | str,
+                hash_workers: t.Optional[int] = 4,
+                upload_workers: t.Optional[int] = 4,
+                create_batch_size: t.Optional[int] = 50,
+                queue_size: t.Optional[int] = 100,
+                part_size: t.Optional[int] = None,
+                replace_char: t.Optional[str] = '_',
+                progress: t.Optional[t.Callable[[str, int], None]] = None
+                ) -> list[dict]:
+        """
+        Uploads the files in a local directory to a Project or Folder.
+
+        Folders are created for each local directory. Files are skipped if a remote file with the same name, size, and
+        MD5 exists, otherwise they are uploaded and the File is created or a new version is stored. Names are
+        sanitized with sanitize_entity_name and files whose names collide after sanitizing are failed.
+
+        :param local_dir: Path to the directory to upload.
+        :param parent: The Project or Folder to upload to.
+        :param hash_workers: Number of threads that calculate MD5s.
+        :param upload_workers: Number of threads that look up remote files and upload files.
+        :param create_batch_size: Max number of Files created per batch.
+        :param queue_size: Max number of files waiting between stages.
+        :param part_size: Multipart upload part size in bytes.
+        :param replace_char: The character to replace invalid name characters with.
+        :param progress: Called with (stage, count) as files complete each stage (scan, hash, lookup, upload, create).
+        :return: List of dicts for each file with: path, name, parent_id, id, md5, size, status
+                 (created, updated, skipped, failed), and error.
+        """
+        return SyncUp(self,
+                      local_dir,
+                      parent,
+                      hash_workers=hash_workers,
+                      upload_workers=upload_workers,
+                      create_batch_size=create_batch_size,
+                      queue_size=queue_size,
+                      part_size=part_size,
+                      replace_char=replace_char,
+                      progress=progress).run()
+
+    @helper
+    def sync_down(self,
+                  root: synapseclient.Entity | str,
+                  local_dir: str,
+                  resolve_workers: t.Optional[int] = 4,
+                  download_workers: t.Optional[int] = 4,
+                  url_batch_size: t.Optional[int] = 100,
+                  queue_size: t.Optional[int] = 100,
+                  progress: t.Optional[t.Callable[[str, int], None]] = None
+                  ) -> list[dict]:
+        """
+        Downloads the Files in a Project or Folder to a local directory.
+
+        Folders are created for each remote Folder and files are named after their Entity name. Files are skipped if
+        the local file has the same size and MD5. Partial downloads are resumed from their '.part' file.
+
+        :param root: The Project or Folder to download.
+        :param local_dir: Path to the directory to download to.
+        :param resolve_workers: Number of threads that get the file handle IDs.
+        :param download_workers: Number of threads that download files.
+        :param url_batch_size: Number of pre-signed URLs to get per request.
+        :param queue_size: Max number of files waiting between stages.
+        :param progress: Called with (stage, count) as files complete each stage (list, resolve, urls, download).
+        :return: List of dicts for each file with: path, name, parent_id, id, md5, size, status
+                 (downloaded, skipped, failed), and error.
+        """
+        return SyncDown(self,
+                        root,
+                        local_dir,
+                        resolve_workers=resolve_workers,
+                        download_workers=download_workers,
+                        url_batch_size=url_batch_size,
+                        queue_size=queue_size,
+                        progress=progress).run()
+
     __ENTITY_NAME_MAX_LEN__: t.Final[int] = 256
     __ENTITY_NAME_ALLOWED_CHARS__: t.Final[frozenset] = frozenset(
         list("'()+,-._ %s%s" % (string.ascii_letters, string.digits))
     )
+    __ENTITY_NAME_ALLOWED_BYTES__: t.Final[bytes] = bytes(sorted(ord(c) for c in __ENTITY_NAME_ALLOWED_CHARS__))
+    __ENTITY_NAME_DISALLOWED_BYTES__: t.Final[bytes] = bytes(
+        sorted(set(range(256)).difference(__ENTITY_NAME_ALLOWED_BYTES__)))
 
     def sanitize_entity_name(self,
                              name: str,
@@ -546,23 +1217,87 @@ class SynapsisUtils(object):
         :param return_replaced: True to return a list of the replaced characters with the sanitized name.
         :return: The sanitized string or the sanitized string and a list of replaced characters.
         """
-        cleaned = unicodedata.normalize('NFKD', name).encode('ASCII', 'ignore')
-        new_name = []
-        replaced = []
-        for char in [chr(c) for c in cleaned]:
-            if char in self.__ENTITY_NAME_ALLOWED_CHARS__:
-                new_name.append(char)
+        new_name, cleaned = self.__sanitize_entity_name__(name, self.__sanitize_table__(replace_char))
+        if return_replaced:
+            return new_name, self.__replaced_chars__(cleaned)
+        else:
+            return new_name
+
+    def sanitize_entity_name_many(self,
+                                  names: t.Iterable[str | tuple[t.Any, str]],
+                                  replace_char: t.Optional[str] = '_'
+                                  ) -> tuple[list[str], dict[tuple[t.Any, str], list[str]]]:
+        """
+        Sanitizes the names for Entities or Files and finds the names that collide after sanitizing.
+
+        :param names: The names to sanitize. Each item is either a name, or a tuple of (folder, name) where folder is
+                      any hashable value that identifies the folder the name will be stored in (e.g., the parent ID).
+                      Names that are not in a tuple are considered to be in the same folder (None).
+        :param replace_char: The character you use as a replacement.
+        :return: Tuple of the sanitized names (in the same order as names) and the collisions. The collisions are keyed
+                 by (folder, sanitized_name) and contain the different source names that sanitize to the same name.
+        """
+        table = self.__sanitize_table__(replace_char)
+        sanitize = self.__sanitize_entity_name__
+        sanitized = []
+        sources = {}
+        for item in names:
+            if isinstance(item, tuple):
+                folder, name = item
             else:
-                new_name.append(replace_char)
-                if char not in replaced:
-                    replaced.append(char)
-        new_name = ''.join(new_name)
+                folder, name = None, item
+            new_name = sanitize(name, table)[0]
+            sanitized.append(new_name)
+            key = (folder, new_name)
+            names_for_key = sources.get(key)
+            if names_for_key is None:
+                sources[key] = [name]
+            elif name not in names_for_key:
+                names_for_key.append(name)
+
+        collisions = {key: value for key, value in sources.items() if len(value) > 1}
+        return sanitized, collisions
+
+    def __sanitize_entity_name__(self, name: str, table: tuple[str, t.Any]) -> tuple[str, bytes]:
+        # NFKD normalization is a no-op on ASCII.
+        if name.isascii():
+            cleaned = name.encode('ascii')
+        else:
+            cleaned = unicodedata.normalize('NFKD', name).encode('ASCII', 'ignore')
+
+        kind, value = table
+        if kind == 'bytes':
+            new_name = cleaned.translate(value).decode('ascii')
+        elif kind == 'delete':
+            new_name = cleaned.translate(None, value).decode('ascii')
+        else:
+            new_name = cleaned.decode('ascii').translate(value)
 
         if len(new_name) > self.__ENTITY_NAME_MAX_LEN__:
             raise SynapsisError(
                 'Entity name exceeds limit of: {0}, Name: {1}'.format(self.__ENTITY_NAME_MAX_LEN__, new_name))
+        return new_name, cleaned
 
-        if return_replaced:
-            return new_name, replaced
+    def __replaced_chars__(self, cleaned: bytes) -> list[str]:
+        # Disallowed chars in order of first occurrence.
+        return list(dict.fromkeys(cleaned.translate(None, self.__ENTITY_NAME_ALLOWED_BYTES__).decode('ascii')))
+
+    @staticmethod
+    @functools.cache
+    def __sanitize_table__(replace_char: str) -> tuple[str, t.Any]:
+        """
+        Builds the translation table for a replace_char.
+
+        :return: ('bytes', table) for single byte replace chars, ('delete', bytes) for an empty replace_char, otherwise
+                 ('str', table) for str.translate.
+        """
+        disallowed = SynapsisUtils.__ENTITY_NAME_DISALLOWED_BYTES__
+        if isinstance(replace_char, str) and replace_char == '':
+            return 'delete', disallowed
+        elif isinstance(replace_char, str) and len(replace_char.encode('utf-8')) == 1:
+            table = bytearray(range(256))
+            for b in disallowed:
+                table[b] = ord(replace_char)
+            return 'bytes', bytes(table)
         else:
-            return new_name
+            return 'str', {b: replace_char for b in disallowed}
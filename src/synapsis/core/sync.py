@@ -0,0 +1,446 @@
+from __future__ import annotations
+import typing as t
+import hashlib
+import mimetypes
+import os
+import threading
+import requests
+import synapseclient
+from synapseclient.core.retry import with_retry
+from .codec import Codec
+from .exceptions import SynapsisError
+from .pipeline import Pipeline
+from .child_index import ChildIndex
+from ..synapse import SynapseConcreteType
+from ..synapse.multipart import Multipart
+
+if t.TYPE_CHECKING:
+    from .synapsis_utils import SynapsisUtils
+
+
+class SyncItem(object):
+    """A local file being synced and what happened to it."""
+    __slots__ = ('path', 'name', 'parent_id', 'size', 'md5', 'remote', 'entity', 'file_handle_id', 'id', 'status',
+                 'error', 'urls')
+
+    def __init__(self, path: str, name: str, parent_id: str | None, size: int = 0):
+        self.path: str = path
+        self.name: str = name
+        self.parent_id: str | None = parent_id
+        self.size: int = size
+        self.md5: str | None = None
+        self.remote: dict | None = None
+        self.entity: dict | None = None
+        self.file_handle_id: str | None = None
+        self.id: str | None = None
+        self.status: str | None = None
+        self.error: Exception | None = None
+        self.urls: PreSignedUrls | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            'path': self.path,
+            'name': self.name,
+            'parent_id': self.parent_id,
+            'id': self.id,
+            'md5': self.md5,
+            'size': self.size,
+            'status': self.status,
+            'error': self.error
+        }
+
+
+class Sync(object):
+    """Base class for syncing files between a local directory and Synapse."""
+    SKIPPED: t.Final[str] = 'skipped'
+    FAILED: t.Final[str] = 'failed'
+    # Max seconds a batch stage waits for its batch to fill.
+    BATCH_WAIT: t.Final[float] = 0.05
+
+    def __init__(self, utils: SynapsisUtils):
+        self.utils = utils
+        self.synapse = utils.__synapse__
+        self.__finished__: list[SyncItem] = []
+
+    def __results__(self, items: list[SyncItem]) -> list[dict]:
+        items = self.__finished__ + items
+        items.sort(key=lambda i: i.path)
+        return [item.to_dict() for item in items]
+
+    def __finish__(self, item: SyncItem, status: str, error: t.Optional[Exception] = None) -> None:
+        item.status = status
+        item.error = error
+        self.__finished__.append(item)
+
+    def __on_error__(self, stage: str, item: SyncItem, error: Exception) -> None:
+        self.__finish__(item, self.FAILED, error)
+
+
+class SyncUp(Sync):
+    """
+    Uploads a local directory to a Synapse Project or Folder.
+
+    Stages:
+        - scan: Walks the local directory, creates missing remote folders, and lists the remote children.
+        - hash: Calculates the MD5 of each file.
+        - lookup: Skips files whose remote file has the same name, size, and MD5.
+        - upload: Uploads the new and changed files with multipart uploads.
+        - create: Creates or updates the File entities in batches.
+    """
+    CREATED: t.Final[str] = 'created'
+    UPDATED: t.Final[str] = 'updated'
+    STAGES: t.Final[list[str]] = ['scan', 'hash', 'lookup', 'upload', 'create']
+
+    def __init__(self,
+                 utils: SynapsisUtils,
+                 local_dir: str,
+                 parent: synapseclient.Entity | str,
+                 hash_workers: int = 4,
+                 upload_workers: int = 4,
+                 create_batch_size: int = 50,
+                 queue_size: int = 100,
+                 part_size: t.Optional[int] = None,
+                 replace_char: str = '_',
+                 progress: t.Optional[t.Callable[[str, int], None]] = None):
+        super().__init__(utils)
+        self.local_dir = os.path.abspath(os.path.expanduser(local_dir))
+        self.parent_id = utils.id_of(parent)
+        self.hash_workers = hash_workers
+        self.upload_workers = upload_workers
+        self.create_batch_size = create_batch_size
+        self.queue_size = queue_size
+        self.part_size = part_size
+        self.replace_char = replace_char
+        self.progress = progress
+
+    def run(self) -> list[dict]:
+        if not os.path.isdir(self.local_dir):
+            raise SynapsisError('Directory does not exist: {0}'.format(self.local_dir))
+
+        self.__finished__ = []
+        pipeline = Pipeline(queue_size=self.queue_size,
+                            progress=self.progress,
+                            on_error=self.__on_error__,
+                            source_name='scan')
+        pipeline \
+            .stage('hash', self.__hash_file__, workers=self.hash_workers) \
+            .stage('lookup', self.__lookup_file__, workers=self.upload_workers) \
+            .stage('upload', self.__upload_file__, workers=self.upload_workers) \
+            .stage('create', self.__create_files__, workers=self.upload_workers, batch_size=self.create_batch_size,
+                   batch_wait=self.BATCH_WAIT)
+        return self.__results__(pipeline.run(self.__scan__()))
+
+    def __scan__(self) -> t.Iterator[SyncItem]:
+        folder_ids = {self.local_dir: self.parent_id}
+        for dirpath, dirnames, filenames in os.walk(self.local_dir):
+            dirnames.sort()
+            parent_id = folder_ids.get(dirpath)
+            if parent_id is None:
+                # The folder could not be created, its files were already failed.
+                dirnames.clear()
+                continue
+
+            children = self.__list_children__(parent_id)
+            entries = [(name, True) for name in dirnames] + [(name, False) for name in sorted(filenames)]
+            sanitized, collisions = self.utils.sanitize_entity_name_many([e[0] for e in entries],
+                                                                         replace_char=self.replace_char)
+            collided = {name for names in collisions.values() for name in names}
+
+            for (local_name, is_dir), name in zip(entries, sanitized):
+                path = os.path.join(dirpath, local_name)
+                if local_name in collided:
+                    error = SynapsisError(
+                        'Name collides with another file or folder after sanitizing: {0}'.format(name))
+                    self.__fail_path__(path, name, parent_id, is_dir, error)
+                    continue
+
+                remote = children.get(name)
+                if is_dir:
+                    try:
+                        folder_ids[path] = self.__ensure_folder__(name, parent_id, remote)
+                    except Exception as ex:
+                        self.__fail_path__(path, name, parent_id, is_dir, ex)
+                else:
+                    item = SyncItem(path, name, parent_id, size=os.path.getsize(path))
+                    item.remote = remote
+                    yield item
+
+    def __fail_path__(self, path: str, name: str, parent_id: str, is_dir: bool, error: Exception) -> None:
+        if not is_dir:
+            self.__finish__(SyncItem(path, name, parent_id, size=os.path.getsize(path)), self.FAILED, error)
+            return
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                file_path = os.path.join(dirpath, filename)
+                self.__finish__(SyncItem(file_path, filename, None, size=os.path.getsize(file_path)),
+                                self.FAILED, error)
+
+    def __list_children__(self, parent_id: str) -> ChildIndex:
+        return ChildIndex(parent_id, synapse=self.synapse)
+
+    def __ensure_folder__(self, name: str, parent_id: str, remote: dict | None) -> str:
+        if remote is not None:
+            if not SynapseConcreteType.get(remote['type']).is_folder:
+                raise SynapsisError('A non-folder entity named: {0} already exists in: {1}'.format(name, parent_id))
+            return remote['id']
+        folder = self.synapse.restPOST('/entity', body=Codec.current().dumps({
+            'concreteType': SynapseConcreteType.FOLDER_ENTITY.code,
+            'name': name,
+            'parentId': parent_id
+        }))
+        return folder['id']
+
+    def __hash_file__(self, item: SyncItem) -> SyncItem:
+        item.md5 = self.utils.md5sum(item.path)
+        return item
+
+    def __lookup_file__(self, item: SyncItem) -> SyncItem | None:
+        if item.remote is None:
+            return item
+        if not SynapseConcreteType.get(item.remote['type']).is_file:
+            raise SynapsisError(
+                'A non-file entity named: {0} already exists in: {1}'.format(item.name, item.parent_id))
+
+        bundle = self.utils.get_bundle(item.remote['id'], include_entity=True, include_file_handles=True)
+        item.entity = bundle['entity']
+        item.id = item.entity['id']
+        file_handle = self.utils.find_data_file_handle(bundle)
+        if file_handle and file_handle.get('contentMd5') == item.md5 and file_handle.get('contentSize') == item.size:
+            self.__finish__(item, self.SKIPPED)
+            return None
+        return item
+
+    def __upload_file__(self, item: SyncItem) -> SyncItem:
+        content_type = mimetypes.guess_type(item.path, strict=False)[0] or 'application/octet-stream'
+        part_size = Multipart.part_size(self.part_size, item.size)
+        upload_request = {
+            'concreteType': synapseclient.core.constants.concrete_types.MULTIPART_UPLOAD_REQUEST,
+            'contentType': content_type,
+            'contentMD5Hex': item.md5,
+            'fileName': item.name,
+            'fileSizeBytes': item.size,
+            'generatePreview': False,
+            'partSizeBytes': part_size,
+            'storageLocationId': None
+        }
+
+        def part_fn(part_number):
+            return Multipart.file_chunk(item.path, part_number, part_size)
+
+        def md5_fn(part, _):
+            return hashlib.md5(part).hexdigest()
+
+        # Files are uploaded in parallel by the stage workers, so each file's parts are uploaded on one thread.
+        item.file_handle_id = Multipart.upload(self.synapse, item.name, upload_request, part_fn, md5_fn, max_threads=1)
+        return item
+
+    def __create_files__(self, items: list[SyncItem]) -> list[SyncItem]:
+        # Synapse does not have a bulk create endpoint for entities so each batch is sent back to back on the
+        # worker's connection.
+        for item in items:
+            try:
+                if item.entity is None:
+                    entity = self.synapse.restPOST('/entity', body=Codec.current().dumps({
+                        'concreteType': SynapseConcreteType.FILE_ENTITY.code,
+                        'name': item.name,
+                        'parentId': item.parent_id,
+                        'dataFileHandleId': item.file_handle_id
+                    }))
+                    item.status = self.CREATED
+                else:
+                    entity = self.synapse.restPUT('/entity/{0}'.format(item.entity['id']),
+                                                  body=Codec.current().dumps({**item.entity,
+                                                                              'dataFileHandleId': item.file_handle_id}))
+                    item.status = self.UPDATED
+                item.id = entity['id']
+            except Exception as ex:
+                item.status = self.FAILED
+                item.error = ex
+        return items
+
+
+class PreSignedUrls(object):
+    """The pre-signed URLs for a batch of files. Expired URLs are refetched for the whole batch at once."""
+
+    def __init__(self, utils: SynapsisUtils, items: list[SyncItem]):
+        self.utils = utils
+        self.items = items
+        self.__lock__ = threading.Lock()
+        self.__urls__: dict[str, str] = {}
+        self.fetches = 0
+
+    def fetch(self) -> dict[str, dict]:
+        """
+        Fetches the pre-signed URLs for the items that are not done.
+
+        :return: The file handles keyed by file handle ID.
+        """
+        pending = [i for i in self.items if i.status is None]
+        requested = self.utils.get_filehandles([(i.id, i.file_handle_id) for i in pending],
+                                               include_pre_signed_urls=True)
+        self.fetches += 1
+        file_handles = {}
+        for result in requested:
+            file_handle_id = str(result['fileHandleId'])
+            if result.get('failureCode'):
+                continue
+            self.__urls__[file_handle_id] = result['preSignedURL']
+            file_handles[file_handle_id] = result['fileHandle']
+        return file_handles
+
+    def get(self, item: SyncItem) -> str:
+        url = self.__urls__.get(str(item.file_handle_id))
+        if url is None:
+            raise SynapsisError('Could not get the pre-signed URL for: {0}'.format(item.id))
+        return url
+
+    def refresh(self, item: SyncItem, expired_url: str) -> str:
+        """Gets a new URL for the item. Refetches the URLs for the batch unless another thread already has."""
+        with self.__lock__:
+            if self.get(item) == expired_url:
+                self.fetch()
+            return self.get(item)
+
+
+class SyncDown(Sync):
+    """
+    Downloads the Files in a Synapse Project or Folder to a local directory.
+
+    Stages:
+        - list: Walks the remote folders and creates the local directories.
+        - resolve: Gets the file handle ID for each File.
+        - urls: Gets the file handles and pre-signed URLs in batches.
+        - download: Skips files that match the remote MD5, otherwise downloads them with resumable ranged GETs.
+    """
+    DOWNLOADED: t.Final[str] = 'downloaded'
+    STAGES: t.Final[list[str]] = ['list', 'resolve', 'urls', 'download']
+    PART_SUFFIX: t.Final[str] = '.part'
+    CHUNK_SIZE: t.Final[int] = 1024 * 1024
+
+    def __init__(self,
+                 utils: SynapsisUtils,
+                 root: synapseclient.Entity | str,
+                 local_dir: str,
+                 resolve_workers: int = 4,
+                 download_workers: int = 4,
+                 url_batch_size: int = 100,
+                 queue_size: int = 100,
+                 progress: t.Optional[t.Callable[[str, int], None]] = None):
+        super().__init__(utils)
+        self.root_id = utils.id_of(root)
+        self.local_dir = os.path.abspath(os.path.expanduser(local_dir))
+        self.resolve_workers = resolve_workers
+        self.download_workers = download_workers
+        self.url_batch_size = url_batch_size
+        self.queue_size = queue_size
+        self.progress = progress
+
+    def run(self) -> list[dict]:
+        os.makedirs(self.local_dir, exist_ok=True)
+        self.__finished__ = []
+        pipeline = Pipeline(queue_size=self.queue_size,
+                            progress=self.progress,
+                            on_error=self.__on_error__,
+                            source_name='list')
+        pipeline \
+            .stage('resolve', self.__resolve_file__, workers=self.resolve_workers) \
+            .stage('urls', self.__fetch_urls__, batch_size=self.url_batch_size, batch_wait=self.BATCH_WAIT) \
+            .stage('download', self.__download_file__, workers=self.download_workers)
+        return self.__results__(pipeline.run(self.__list__()))
+
+    def __list__(self) -> t.Iterator[SyncItem]:
+        folders = [(self.root_id, self.local_dir)]
+        while folders:
+            parent_id, local_dir = folders.pop(0)
+            os.makedirs(local_dir, exist_ok=True)
+            for child in self.synapse.getChildren(parent_id, includeTypes=['folder', 'file']):
+                path = os.path.join(local_dir, child['name'])
+                if SynapseConcreteType.get(child['type']).is_folder:
+                    folders.append((child['id'], path))
+                else:
+                    item = SyncItem(path, child['name'], parent_id)
+                    item.id = child['id']
+                    item.remote = child
+                    yield item
+
+    def __resolve_file__(self, item: SyncItem) -> SyncItem:
+        item.entity = self.synapse.restGET('/entity/{0}'.format(item.id))
+        item.file_handle_id = item.entity['dataFileHandleId']
+        return item
+
+    def __fetch_urls__(self, items: list[SyncItem]) -> list[SyncItem]:
+        urls = PreSignedUrls(self.utils, items)
+        file_handles = urls.fetch()
+        for item in items:
+            file_handle = file_handles.get(str(item.file_handle_id))
+            if file_handle is None:
+                self.__finish__(item, self.FAILED,
+                                SynapsisError('Cannot download file handle: {0} for: {1}'.format(item.file_handle_id,
+                                                                                                 item.id)))
+                continue
+            item.urls = urls
+            item.size = file_handle['contentSize']
+            item.md5 = file_handle['contentMd5']
+        return [item for item in items if item.status is None]
+
+    def __download_file__(self, item: SyncItem) -> SyncItem | None:
+        if os.path.isfile(item.path) and os.path.getsize(item.path) == item.size and \
+                self.utils.md5sum(item.path) == item.md5:
+            self.__finish__(item, self.SKIPPED)
+            return None
+
+        part_path = item.path + self.PART_SUFFIX
+        md5 = hashlib.md5()
+        # Resume from a partial download.
+        offset = 0
+        if os.path.isfile(part_path):
+            with open(part_path, mode='rb') as f:
+                while chunk := f.read(self.CHUNK_SIZE):
+                    md5.update(chunk)
+                    offset += len(chunk)
+            if offset > item.size:
+                os.remove(part_path)
+                md5 = hashlib.md5()
+                offset = 0
+
+        if offset < item.size:
+            md5 = self.__download_range__(item, part_path, offset, md5)
+        elif item.size == 0:
+            open(part_path, mode='wb').close()
+
+        if md5.hexdigest() != item.md5:
+            os.remove(part_path)
+            raise SynapsisError('MD5 does not match for: {0}, {1}'.format(item.id, item.path))
+        os.replace(part_path, item.path)
+        item.status = self.DOWNLOADED
+        return item
+
+    def __download_range__(self, item: SyncItem, part_path: str, offset: int, md5) -> t.Any:
+        url = item.urls.get(item)
+        for attempt in range(2):
+            headers = {'Range': 'bytes={0}-'.format(offset)} if offset else {}
+            response = with_retry(
+                lambda: self.synapse._requests_session.get(url, headers=headers, stream=True),
+                retry_exceptions=[requests.exceptions.ConnectionError]
+            )
+            if response.status_code == 403 and attempt == 0:
+                # The pre-signed URL expired.
+                response.close()
+                url = item.urls.refresh(item, url)
+                continue
+            break
+
+        with response:
+            if response.status_code == 200 and offset:
+                # The server ignored the range so start over.
+                offset = 0
+                md5 = hashlib.md5()
+            elif response.status_code not in (200, 206):
+                raise SynapsisError('Error downloading: {0}, HTTP {1}: {2}'.format(item.id,
+                                                                                  response.status_code,
+                                                                                  response.reason))
+            with open(part_path, mode='ab' if offset else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                    f.write(chunk)
+                    md5.update(chunk)
+        return md5
@@ -0,0 +1,197 @@
+from __future__ import annotations
+import typing as t
+import hashlib
+import json
+import synapseclient
+from .async_job import AsyncJob
+from .exceptions import SynapsisError
+from .journal import Journal
+from .pipeline import Pipeline
+from .tables import ColumnTypes
+from ..synapse import SynapseConcreteType
+
+try:
+    import pyarrow
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+if t.TYPE_CHECKING:
+    from .synapsis_utils import SynapsisUtils
+
+
+class TableChunk(object):
+    """A chunk of rows to append, the number of the chunk in the input, and the digest of its values."""
+    __slots__ = ('number', 'rows', 'size', 'digest')
+
+    def __init__(self, number: int, rows: list[dict], size: int, digest: t.Optional[str] = None):
+        self.number: int = number
+        self.rows: list[dict] = rows
+        self.size: int = size
+        self.digest: str | None = digest
+
+
+class TableWriter(object):
+    """
+    Appends rows to a Table in chunks.
+
+    The rows are cut into chunks of at most chunk_rows rows and about chunk_bytes bytes of values, and each chunk is
+    appended by an asynchronous AppendableRowSetRequest job. Up to `workers` jobs run at a time and the chunks are
+    built while the jobs run. The number and the digest of the values of each appended chunk are written to the
+    journal, so rerunning with the same rows and journal skips the chunks that were appended. The journal starts with
+    the table ID and chunk sizes, and a rerun with different ones, or with a chunk whose values changed, raises a
+    SynapsisError instead of skipping or appending the wrong rows.
+
+    Rows can be dicts of column name to value or lists of values in the order of the columns. Columnar batches can be
+    pyarrow RecordBatches or Tables, or dicts of column name to NumPy array (as from query_table_batches).
+    """
+    # Approximate JSON size of a value, other than the column ID and value (e.g., "123":"",).
+    VALUE_OVERHEAD: t.Final[int] = 6
+    ROW_OVERHEAD: t.Final[int] = 14
+
+    def __init__(self,
+                 utils: SynapsisUtils,
+                 table: synapseclient.Entity | str,
+                 chunk_rows: int = 5000,
+                 chunk_bytes: int = 2 * 1024 * 1024,
+                 workers: int = 4,
+                 journal: t.Optional[str] = None,
+                 timeout: t.Optional[float] = None,
+                 progress: t.Optional[t.Callable[[str, int], None]] = None):
+        if chunk_rows < 1 or chunk_bytes < 1:
+            raise ValueError('chunk_rows and chunk_bytes must be greater than 0.')
+        self.utils = utils
+        self.synapse = utils.__synapse__
+        self.table_id = utils.id_of(table)
+        self.chunk_rows = chunk_rows
+        self.chunk_bytes = chunk_bytes
+        self.workers = max(1, workers)
+        self.journal_path = journal
+        self.timeout = timeout
+        self.progress = progress
+        self.columns: list[dict] = []
+        self.__columns_by_name__: dict[str, dict] = {}
+        self.__skipped__: int = 0
+        # The digests of the appended chunks by chunk number, from the journal.
+        self.__appended__: dict[str, str] = {}
+        self.__journal__: Journal | None = None
+
+    def write(self, rows_or_batches: t.Iterable) -> dict:
+        """
+        Appends the rows.
+
+        :param rows_or_batches: Iterable of rows or columnar batches.
+        :return: dict with: rows (the number of rows appended), chunks (the number of chunks appended), and skipped
+                 (the number of chunks in the journal).
+        """
+        self.columns = self.synapse.restGET('/entity/{0}/column'.format(self.table_id))['results']
+        self.__columns_by_name__ = {c['name']: c for c in self.columns}
+        self.__skipped__ = 0
+        self.__journal__ = Journal(self.journal_path, header={
+            'table': self.table_id,
+            'chunk_rows': self.chunk_rows,
+            'chunk_bytes': self.chunk_bytes
+        })
+        self.__appended__ = dict(key.split(' ', 1) for key in self.__journal__)
+        try:
+            # The queue only holds a chunk per worker, so the rows are read as the chunks are appended.
+            chunks = Pipeline(queue_size=self.workers, progress=self.progress) \
+                .stage('append', self.__append__, workers=self.workers) \
+                .run(self.chunks(rows_or_batches))
+            return {
+                'rows': sum(chunk.size for chunk in chunks),
+                'chunks': len(chunks),
+                'skipped': self.__skipped__
+            }
+        finally:
+            self.__journal__.close()
+
+    def chunks(self, rows_or_batches: t.Iterable) -> t.Iterator[TableChunk]:
+        """Cuts the rows into chunks of PartialRows (dicts of column ID to value string). Skips appended chunks."""
+        number = 0
+        rows = []
+        size = 0
+        for row in self.__rows__(rows_or_batches):
+            values = self.__values__(row)
+            row_size = self.ROW_OVERHEAD + sum(len(k) + len(v) + self.VALUE_OVERHEAD for k, v in values.items())
+            if rows and (len(rows) >= self.chunk_rows or size + row_size > self.chunk_bytes):
+                yield from self.__chunk__(number, rows)
+                number += 1
+                rows = []
+                size = 0
+            rows.append(values)
+            size += row_size
+        if rows:
+            yield from self.__chunk__(number, rows)
+
+    def __chunk__(self, number: int, rows: list[dict]) -> t.Iterator[TableChunk]:
+        # The digest is only needed to check the chunk on a rerun.
+        digest = self.__digest__(rows) if self.journal_path is not None else None
+        appended = self.__appended__.get(str(number))
+        if appended is not None:
+            if appended != digest:
+                raise SynapsisError('Chunk {0} does not match the journal: {1}. The rows changed since it was written.'
+                                    .format(number, self.journal_path))
+            self.__skipped__ += 1
+            return
+        yield TableChunk(number, [{'values': values} for values in rows], len(rows), digest=digest)
+
+    @staticmethod
+    def __digest__(rows: list[dict]) -> str:
+        """Gets the SHA-256 of the values of the rows by column ID."""
+        return hashlib.sha256(json.dumps(rows, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+    def __rows__(self, rows_or_batches: t.Iterable) -> t.Iterator[dict | list]:
+        for item in rows_or_batches:
+            if pyarrow is not None and isinstance(item, (pyarrow.RecordBatch, pyarrow.Table)):
+                yield from item.to_pylist()
+            elif numpy is not None and isinstance(item, dict) and item and \
+                    all(isinstance(v, numpy.ndarray) for v in item.values()):
+                names = list(item)
+                # tolist() converts masked values to None.
+                yield from (dict(zip(names, values)) for values in zip(*(v.tolist() for v in item.values())))
+            else:
+                yield item
+
+    def __values__(self, row: dict | list) -> dict[str, str]:
+        """Gets the value strings of a row by column ID. None values are left out."""
+        if isinstance(row, dict):
+            by_name = self.__columns_by_name__
+            unknown = [name for name in row if name not in by_name]
+            if unknown:
+                raise ValueError('Unknown columns: {0}'.format(', '.join(str(name) for name in unknown)))
+            pairs = ((by_name[name], value) for name, value in row.items())
+        else:
+            if len(row) > len(self.columns):
+                raise ValueError('Row has {0} values but the table has {1} columns.'.format(len(row),
+                                                                                           len(self.columns)))
+            pairs = zip(self.columns, row)
+        values = {}
+        for column, value in pairs:
+            cell = ColumnTypes.cell(column['columnType'], value)
+            if cell is not None:
+                values[column['id']] = cell
+        return values
+
+    def __append__(self, chunk: TableChunk) -> TableChunk:
+        request = {
+            'concreteType': SynapseConcreteType.APPENDABLE_ROWSET_REQUEST.code,
+            'entityId': self.table_id,
+            'toAppend': {
+                'concreteType': SynapseConcreteType.PARTIAL_ROW_SET.code,
+                'tableId': self.table_id,
+                'rows': chunk.rows
+            }
+        }
+        AsyncJob(self.synapse,
+                 '/entity/{0}/table/append'.format(self.table_id),
+                 request,
+                 timeout=self.timeout).start().wait()
+        self.__journal__.add('{0} {1}'.format(chunk.number, chunk.digest))
+        # The rows are not needed after the chunk is appended.
+        chunk.rows = []
+        return chunk
@@ -0,0 +1,326 @@
+from __future__ import annotations
+import typing as t
+import collections
+import concurrent.futures
+import datetime
+import re
+from .async_job import AsyncJob
+from .codec import Codec
+from .exceptions import SynapsisError
+from .job_scheduler import JobScheduler
+
+try:
+    import pyarrow
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+if t.TYPE_CHECKING:
+    from ..synapse import Synapse
+
+QUERY_BUNDLE_REQUEST: t.Final[str] = 'org.sagebionetworks.repo.model.table.QueryBundleRequest'
+
+
+class ColumnTypes(object):
+    """Converts the values of table query results (which are strings) to the Python and Arrow types of the columns."""
+    INTEGER: t.Final[frozenset[str]] = frozenset({'INTEGER', 'DATE'})
+    DOUBLE: t.Final[frozenset[str]] = frozenset({'DOUBLE'})
+    BOOLEAN: t.Final[frozenset[str]] = frozenset({'BOOLEAN'})
+    LIST_SUFFIX: t.Final[str] = '_LIST'
+    EPOCH: t.Final[datetime.datetime] = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+    @classmethod
+    def base_type(cls, column_type: str) -> str:
+        """Gets the type of the items of a list column type (e.g., STRING_LIST -> STRING)."""
+        return column_type.removesuffix(cls.LIST_SUFFIX)
+
+    @classmethod
+    def is_list(cls, column_type: str) -> bool:
+        return column_type.endswith(cls.LIST_SUFFIX)
+
+    @classmethod
+    def converter(cls, column_type: str) -> t.Callable[[t.Any], t.Any]:
+        """
+        Gets the function that converts a value of a column type.
+
+        INTEGER and DATE (epoch milliseconds) values are converted to int, DOUBLE to float, BOOLEAN to bool, and list
+        types to lists of their item type. Other types (e.g., STRING, ENTITYID, USERID) are kept as strings.
+
+        :param column_type: The columnType of the column.
+        :return: Function that takes a value (or None) and returns the converted value (or None).
+        """
+        if cls.is_list(column_type):
+            item_converter = cls.converter(cls.base_type(column_type))
+
+            def _convert_list(value):
+                if value is None:
+                    return None
+                if isinstance(value, str):
+                    value = Codec.current().loads(value)
+                return [item_converter(v) for v in value]
+
+            return _convert_list
+        elif column_type in cls.INTEGER:
+            return cls.__nullable__(int)
+        elif column_type in cls.DOUBLE:
+            return cls.__nullable__(float)
+        elif column_type in cls.BOOLEAN:
+            return cls.__nullable__(lambda v: v if isinstance(v, bool) else v.lower() == 'true')
+        return cls.__nullable__(str)
+
+    @classmethod
+    def arrow_type(cls, column_type: str) -> pyarrow.DataType:
+        """Gets the Arrow type of a column type."""
+        if pyarrow is None:
+            raise SynapsisError('pyarrow is required for Arrow batches: pip install synapsis[parquet]')
+        if cls.is_list(column_type):
+            return pyarrow.list_(cls.arrow_type(cls.base_type(column_type)))
+        elif column_type == 'DATE':
+            return pyarrow.timestamp('ms', tz='UTC')
+        elif column_type in cls.INTEGER:
+            return pyarrow.int64()
+        elif column_type in cls.DOUBLE:
+            return pyarrow.float64()
+        elif column_type in cls.BOOLEAN:
+            return pyarrow.bool_()
+        return pyarrow.string()
+
+    @classmethod
+    def numpy_array(cls, column_type: str, values: list) -> numpy.ndarray:
+        """
+        Creates a NumPy array of converted values.
+
+        INTEGER is int64, DATE is datetime64[ms], DOUBLE is float64, BOOLEAN is bool, and other types (including lists)
+        are object arrays. Columns with None values are masked arrays.
+
+        :param column_type: The columnType of the column.
+        :param values: The converted values.
+        :return: numpy.ndarray or numpy.ma.MaskedArray
+        """
+        if numpy is None:
+            raise SynapsisError('numpy is required for NumPy batches: pip install synapsis[numpy]')
+        if cls.is_list(column_type):
+            dtype = object
+        elif column_type == 'DATE':
+            dtype = 'datetime64[ms]'
+        elif column_type in cls.INTEGER:
+            dtype = numpy.int64
+        elif column_type in cls.DOUBLE:
+            dtype = numpy.float64
+        elif column_type in cls.BOOLEAN:
+            dtype = numpy.bool_
+        else:
+            dtype = object
+        if dtype is object:
+            array = numpy.empty(len(values), dtype=object)
+            array[:] = values
+            return array
+        mask = [value is None for value in values]
+        if not any(mask):
+            return numpy.array(values, dtype=dtype)
+        filled = [0 if value is None else value for value in values]
+        return numpy.ma.masked_array(numpy.array(filled, dtype=dtype), mask=mask)
+
+    @classmethod
+    def cell(cls, column_type: str, value: t.Any) -> str | None:
+        """
+        Formats a value as the string Synapse expects for a column type (the inverse of converter).
+
+        datetime (naive datetimes are UTC) and numpy.datetime64 values are converted to epoch milliseconds, NumPy
+        scalars to their Python values, and list values to JSON arrays.
+
+        :param column_type: The columnType of the column.
+        :param value: The value.
+        :return: The value as a string, or None.
+        """
+        if value is None:
+            return None
+        if cls.is_list(column_type):
+            if isinstance(value, str):
+                return value
+            item_type = cls.base_type(column_type)
+            data = Codec.current().dumps([cls.__plain__(item_type, item) for item in value])
+            return data.decode('utf-8') if isinstance(data, bytes) else data
+        value = cls.__plain__(column_type, value)
+        if isinstance(value, bool):
+            return 'true' if value else 'false'
+        return str(value)
+
+    @classmethod
+    def __plain__(cls, column_type: str, value: t.Any) -> t.Any:
+        if numpy is not None and isinstance(value, numpy.generic):
+            value = value.item()
+        if isinstance(value, datetime.datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=datetime.timezone.utc)
+            return (value - cls.EPOCH) // datetime.timedelta(milliseconds=1)
+        if column_type in cls.BOOLEAN and isinstance(value, str):
+            return value.lower() == 'true'
+        return value
+
+    @staticmethod
+    def __nullable__(func: t.Callable[[t.Any], t.Any]) -> t.Callable[[t.Any], t.Any]:
+        def _convert(value):
+            return None if value is None else func(value)
+
+        return _convert
+
+
+class TableQuery(object):
+    """
+    Runs a query on a Table or View and gets the results a page at a time.
+
+    Each page is a query job with the offset and limit of the page. The page size is capped at the max rows per page
+    that Synapse reports for the query. After the first page, the query jobs of the next pages can be started while the
+    current page is being used (prefetch), and are polled by the shared JobScheduler.
+    """
+    ARROW: t.Final[str] = 'arrow'
+    NUMPY: t.Final[str] = 'numpy'
+    FORMATS: t.Final[list[str]] = [ARROW, NUMPY]
+    # QueryBundleRequest.partMask bits.
+    QUERY_RESULTS: t.Final[int] = 0x1
+    SELECT_COLUMNS: t.Final[int] = 0x4
+    MAX_ROWS_PER_PAGE: t.Final[int] = 0x8
+    TABLE_ID_PATTERN: t.Final[t.Pattern] = re.compile(r'\bfrom\s+(syn\d+)', re.IGNORECASE)
+
+    def __init__(self,
+                 synapse: Synapse,
+                 sql: str,
+                 page_size: t.Optional[int] = None,
+                 prefetch: int = 0,
+                 timeout: t.Optional[float] = None):
+        """
+        :param synapse: The Synapse client.
+        :param sql: The query (e.g., SELECT id, name FROM syn123).
+        :param page_size: Max number of rows to get per request. None for the max rows per page.
+        :param prefetch: Number of pages to query ahead of the page being used.
+        :param timeout: Seconds to wait for each query job.
+        """
+        match = self.TABLE_ID_PATTERN.search(sql)
+        if match is None:
+            raise SynapsisError('Query must select from a Synapse ID: {0}'.format(sql))
+        self.synapse = synapse
+        self.sql = sql
+        self.table_id = match.group(1)
+        self.page_size = page_size
+        self.prefetch = prefetch
+        self.timeout = timeout
+        self.select_columns: list[dict] | None = None
+        self.requests: int = 0
+
+    def pages(self) -> t.Iterator[list[list]]:
+        """
+        Gets the rows of the results a page at a time.
+
+        :return: Iterator of the list of row values for each page. The column of each value is in select_columns.
+        """
+        bundle = self.__query__(0, self.page_size, self.QUERY_RESULTS | self.SELECT_COLUMNS | self.MAX_ROWS_PER_PAGE)
+        self.select_columns = bundle.get('selectColumns') or []
+        limit = self.page_size
+        max_rows = bundle.get('maxRowsPerPage')
+        if max_rows:
+            limit = min(limit or max_rows, max_rows)
+        rows = self.__rows__(bundle)
+        if rows:
+            yield rows
+        if not rows or limit is None or len(rows) < limit:
+            return
+
+        offset = len(rows)
+        pending = collections.deque()
+        try:
+            while True:
+                # Keep the query jobs of the next pages running while the current page is used.
+                while len(pending) < max(1, self.prefetch):
+                    pending.append(self.__submit__(offset, limit, self.QUERY_RESULTS))
+                    offset += limit
+                rows = self.__rows__(pending.popleft().result())
+                if rows:
+                    yield rows
+                if len(rows) < limit:
+                    return
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def records(self) -> t.Iterator[dict]:
+        """Gets the rows as dicts of the column names and typed values."""
+        converters = None
+        names = None
+        for rows in self.pages():
+            if converters is None:
+                names = [c['name'] for c in self.select_columns]
+                converters = [ColumnTypes.converter(c['columnType']) for c in self.select_columns]
+            for values in rows:
+                yield {name: convert(value) for name, convert, value in zip(names, converters, values)}
+
+    def arrow_batches(self) -> t.Iterator[pyarrow.RecordBatch]:
+        """Gets each page as an Arrow RecordBatch typed from the column types."""
+        return self.batches(format=self.ARROW)
+
+    def batches(self,
+                batch_rows: t.Optional[int] = None,
+                format: str = ARROW) -> t.Iterator[pyarrow.RecordBatch | dict[str, numpy.ndarray]]:
+        """
+        Gets the results as columnar batches typed from the column types.
+
+        :param batch_rows: Number of rows per batch (the last batch may have fewer). None for a batch per page.
+        :param format: 'arrow' for pyarrow.RecordBatches or 'numpy' for dicts of column name to NumPy array.
+        :return: Iterator of batches.
+        """
+        if format not in self.FORMATS:
+            raise ValueError('Invalid format: {0}. Must be one of: {1}'.format(format, ', '.join(self.FORMATS)))
+        if format == self.ARROW and pyarrow is None:
+            raise SynapsisError('pyarrow is required for Arrow batches: pip install synapsis[parquet]')
+        if format == self.NUMPY and numpy is None:
+            raise SynapsisError('numpy is required for NumPy batches: pip install synapsis[numpy]')
+        pending = []
+        for rows in self.pages():
+            if batch_rows is None:
+                yield self.__batch__(rows, format)
+                continue
+            pending.extend(rows)
+            while len(pending) >= batch_rows:
+                yield self.__batch__(pending[:batch_rows], format)
+                del pending[:batch_rows]
+        if pending:
+            yield self.__batch__(pending, format)
+
+    def __batch__(self, rows: list[list], format: str) -> pyarrow.RecordBatch | dict[str, numpy.ndarray]:
+        columns = []
+        for index, column in enumerate(self.select_columns):
+            convert = ColumnTypes.converter(column['columnType'])
+            columns.append([convert(values[index]) for values in rows])
+        if format == self.NUMPY:
+            return {column['name']: ColumnTypes.numpy_array(column['columnType'], values)
+                    for column, values in zip(self.select_columns, columns)}
+        schema = pyarrow.schema([(c['name'], ColumnTypes.arrow_type(c['columnType'])) for c in self.select_columns])
+        return pyarrow.RecordBatch.from_arrays([pyarrow.array(values, type=field.type)
+                                               for values, field in zip(columns, schema)], schema=schema)
+
+    def __rows__(self, bundle: dict) -> list[list]:
+        return [row.get('values') or [] for row in bundle['queryResult']['queryResults'].get('rows') or []]
+
+    def __query__(self, offset: int, limit: int | None, part_mask: int) -> dict:
+        return self.__submit__(offset, limit, part_mask).result()
+
+    def __submit__(self, offset: int, limit: int | None, part_mask: int) -> concurrent.futures.Future:
+        """Starts the query job of a page and gets the future of its response from the shared JobScheduler."""
+        query = {'sql': self.sql, 'offset': offset}
+        if limit is not None:
+            query['limit'] = limit
+        request = {
+            'concreteType': QUERY_BUNDLE_REQUEST,
+            'entityId': self.table_id,
+            'partMask': part_mask,
+            'query': query
+        }
+        self.requests += 1
+        return JobScheduler.shared().submit(AsyncJob(self.synapse,
+                                                     '/entity/{0}/table/query'.format(self.table_id),
+                                                     request,
+                                                     timeout=self.timeout))
@@ -0,0 +1,104 @@
+from __future__ import annotations
+import typing as t
+import inspect
+import threading
+import synapseclient
+from synapseclient.core.upload import multipart_upload
+from ..core.exceptions import SynapsisError
+
+
+class Multipart(object):
+    """
+    Wraps the synapseclient multipart upload functions used by Synapsis, some of which are private.
+
+    Private functions can change in any synapseclient release. On first use, the parameters Synapsis passes are
+    checked against the installed functions (unless synapseclient is the tested version). A mismatch raises a
+    SynapsisError that names the tested version, instead of failing partway through an upload.
+
+    Usage:
+        part_size = Multipart.part_size(None, file_size)
+        file_handle_id = Multipart.upload(synapse, 'file.txt', upload_request, part_fn, md5_fn)
+        file_handle_id = Multipart.copy(synapse, association, 'file.txt', part_size, storage_location_id)
+    """
+    # The synapseclient version the private functions were tested with.
+    TESTED_VERSION: t.Final[str] = '2.7.2'
+    # The parameters passed to each function.
+    PARAMETERS: t.Final[dict[str, tuple[str, ...]]] = {
+        '_get_part_size': ('part_size', 'file_size'),
+        '_get_file_chunk': ('file_path', 'part_number', 'chunk_size'),
+        '_multipart_upload': ('syn', 'dest_file_name', 'upload_request', 'part_fn', 'md5_fn', 'max_threads'),
+        'multipart_copy': ('syn', 'source_file_handle_association', 'dest_file_name', 'part_size',
+                           'storage_location_id', 'preview', 'max_threads')
+    }
+    __CHECKED__: t.ClassVar[bool] = False
+    __LOCK__: t.Final[threading.Lock] = threading.Lock()
+
+    @classmethod
+    def part_size(cls, part_size: int | None, file_size: int) -> int:
+        """Gets the part size for a file: part_size if set and large enough, otherwise the smallest allowed."""
+        return cls.__function__('_get_part_size')(part_size=part_size, file_size=file_size)
+
+    @classmethod
+    def file_chunk(cls, path: str, part_number: int, part_size: int) -> bytes:
+        """Reads a part of a file. Part numbers start at 1."""
+        return cls.__function__('_get_file_chunk')(file_path=path, part_number=part_number, chunk_size=part_size)
+
+    @classmethod
+    def upload(cls,
+               synapse: synapseclient.Synapse,
+               name: str,
+               upload_request: dict,
+               part_fn: t.Callable[[int], bytes],
+               md5_fn: t.Callable[[bytes, t.Any], str],
+               max_threads: t.Optional[int] = None) -> str:
+        """Uploads the parts from part_fn and gets the ID of the new file handle."""
+        return cls.__function__('_multipart_upload')(syn=synapse,
+                                                     dest_file_name=name,
+                                                     upload_request=upload_request,
+                                                     part_fn=part_fn,
+                                                     md5_fn=md5_fn,
+                                                     max_threads=max_threads)
+
+    @classmethod
+    def copy(cls,
+             synapse: synapseclient.Synapse,
+             association: dict,
+             name: str,
+             part_size: int,
+             storage_location_id: int,
+             max_threads: t.Optional[int] = None) -> str:
+        """Copies the file of a file handle association with upload-copies and gets the ID of the new file handle."""
+        return cls.__function__('multipart_copy')(syn=synapse,
+                                                  source_file_handle_association=association,
+                                                  dest_file_name=name,
+                                                  part_size=part_size,
+                                                  storage_location_id=storage_location_id,
+                                                  preview=False,
+                                                  max_threads=max_threads)
+
+    @classmethod
+    def check(cls) -> None:
+        """Raises a SynapsisError if the installed synapseclient does not have the functions and parameters used."""
+        if cls.__CHECKED__:
+            return
+        with cls.__LOCK__:
+            if cls.__CHECKED__:
+                return
+            if synapseclient.__version__ != cls.TESTED_VERSION:
+                changed = []
+                for name, parameters in cls.PARAMETERS.items():
+                    func = getattr(multipart_upload, name, None)
+                    if func is None or not set(parameters) <= set(inspect.signature(func).parameters):
+                        changed.append(name)
+                if changed:
+                    raise SynapsisError(
+                        'synapseclient {0} is not supported, these multipart upload functions changed: {1}. '
+                        'Synapsis was tested with synapseclient {2}.'.format(synapseclient.__version__,
+                                                                              ', '.join(changed),
+                                                                              cls.TESTED_VERSION))
+            cls.__CHECKED__ = True
+
+    @classmethod
+    def __function__(cls, name: str) -> t.Callable:
+        cls.check()
+        return getattr(multipart_upload, name)
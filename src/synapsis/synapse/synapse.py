@@ -1,10 +1,19 @@
 from __future__ import annotations
 import typing as t
 import os
+import re
 import tempfile
+import time
 import synapseclient
 from synapseclient.core.exceptions import SynapseError
+from synapseclient.core.retry import with_retry
+from synapseclient.core.utils import is_json
+from ..core.codec import Codec
 from ..core.exceptions import LoginError
+from ..core.hooks import Hooks, RequestEvent
+from ..core.instrumentation import current_helper
+from ..core.single_flight import SingleFlight
+from ..core.rate_limiter import RateLimiter
 
 
 class Synapse(synapseclient.Synapse):
@@ -19,15 +28,41 @@ class Synapse(synapseclient.Synapse):
         'forced': True
     }
     __CONFIG_DEFAULT__: t.ClassVar[t.Final[dict]] = {
-        "multi_threaded": __SYNAPSE_INIT_ARGS_DEFAULT__['multi_threaded']
+        "multi_threaded": __SYNAPSE_INIT_ARGS_DEFAULT__['multi_threaded'],
+        "endpoint": None,
+        "coalesce_requests": True,
+        "rate_limit": True
     }
+    # POST endpoints that only read and can be coalesced like GETs.
+    __READ_POST_URIS__: t.ClassVar[t.Final[t.Pattern]] = re.compile(
+        r'/(entity/syn\d+(/version/\d+)?/bundle2|entity/children|entity/child|entity/header|fileHandle/batch)$')
     __synapse_init_args__: dict = {}
     __synapse_login_args__: dict = {}
     __config__: dict = {}
+    __hooks__: Hooks | None = None
+    __single_flight__: SingleFlight | None = None
 
-    def __init__(self, **kwargs):
+    def __init__(self, hooks: t.Optional[Hooks] = None, **kwargs):
+        self.__hooks__ = hooks
+        self.__single_flight__ = SingleFlight()
         self.__init_self__(init_kwargs=kwargs)
 
+    @property
+    def single_flight(self) -> SingleFlight:
+        """Gets the SingleFlight that coalesces concurrent identical read requests."""
+        return self.__single_flight__
+
+    @property
+    def rate_limiter(self) -> RateLimiter | None:
+        """
+        Gets the RateLimiter for the REST calls. Defaults to the limiter shared by the process.
+        Set with synapse_args={'rate_limit': RateLimiter(...)} or disable with synapse_args={'rate_limit': False}.
+        """
+        rate_limit = self.__config__.get('rate_limit', self.__CONFIG_DEFAULT__['rate_limit'])
+        if isinstance(rate_limit, RateLimiter):
+            return rate_limit
+        return RateLimiter.shared() if rate_limit else None
+
     def __init_self__(self, init_kwargs: dict):
         init_kwargs = self.__build_init_args__(init_kwargs=init_kwargs)
         super().__init__(**init_kwargs)
@@ -55,6 +90,12 @@ class Synapse(synapseclient.Synapse):
                 value = init_args.pop(attr)
             self.__config__[attr] = value
 
+        # Point all the Synapse services at a single host (e.g., synapsis.testing.FakeSynapse).
+        endpoint = self.__config__.get('endpoint', None)
+        if endpoint:
+            for key, value in self.__build_endpoints__(endpoint).items():
+                init_args.setdefault(key, value)
+
         if 'cache_root_dir' not in init_args:
             cache_root_dir = os.path.expandvars(os.path.expanduser((synapseclient.core.cache.CACHE_ROOT_DIR)))
             if not os.access(cache_root_dir, os.W_OK):
@@ -62,6 +103,15 @@ class Synapse(synapseclient.Synapse):
 
         return init_args
 
+    def __build_endpoints__(self, endpoint: str) -> dict:
+        endpoint = endpoint.rstrip('/')
+        return {
+            'repoEndpoint': '{0}/repo/v1'.format(endpoint),
+            'authEndpoint': '{0}/auth/v1'.format(endpoint),
+            'fileHandleEndpoint': '{0}/file/v1'.format(endpoint),
+            'portalEndpoint': '{0}/'.format(endpoint)
+        }
+
     def __build_login_args__(self):
         login_args = {**Synapse.__SYNAPSE_LOGIN_ARGS_DEFAULT__, **self.__synapse_login_args__}
         self.__from_arg_or_env__(login_args, 'authToken', 'SYNAPSE_AUTH_TOKEN')
@@ -99,6 +149,164 @@ class Synapse(synapseclient.Synapse):
         self.__synapse_init_args__ = {}
         self.__synapse_login_args__ = {}
 
+    def _rest_call(self, method, uri, data, endpoint, headers, retryPolicy, requests_session, **kwargs):
+        single_flight = self.__single_flight__
+        if single_flight is None or not self.__config__.get('coalesce_requests',
+                                                            self.__CONFIG_DEFAULT__['coalesce_requests']):
+            return self.__rest_call__(method, uri, data, endpoint, headers, retryPolicy, requests_session, **kwargs)
+
+        if not self.__is_read__(method, uri):
+            # Callers must not get a read that started before their write finished.
+            single_flight.invalidate()
+            try:
+                return self.__rest_call__(method, uri, data, endpoint, headers, retryPolicy, requests_session,
+                                          **kwargs)
+            finally:
+                single_flight.invalidate()
+
+        if kwargs or requests_session is not None or not isinstance(data, (str, bytes, type(None))):
+            # Streamed and customized requests are not shared.
+            return self.__rest_call__(method, uri, data, endpoint, headers, retryPolicy, requests_session, **kwargs)
+
+        # Callers share the response, each decodes its own copy of the body.
+        key = (method, endpoint, uri, data, tuple(sorted(headers.items())) if headers else None)
+        sent = []
+
+        def _call():
+            sent.append(True)
+            return self.__rest_call__(method, uri, data, endpoint, headers, retryPolicy, requests_session)
+
+        hooks = self.__hooks__
+        if hooks is None or not hooks.has_hook(Hooks.AFTER_REQUEST):
+            return single_flight.do(key, _call)
+
+        start = time.perf_counter()
+        response = None
+        error = None
+        try:
+            response = single_flight.do(key, _call)
+            return response
+        except Exception as ex:
+            error = ex
+            raise
+        finally:
+            if not sent:
+                # The call was not sent, it is reported as shared so it is still counted.
+                event = RequestEvent(method.upper(),
+                                     self._build_uri_and_headers(uri, endpoint=endpoint, headers=headers)[0],
+                                     endpoint or self.repoEndpoint,
+                                     helper=current_helper())
+                event.shared = True
+                event.status = getattr(response if error is None else getattr(error, 'response', None),
+                                       'status_code', None)
+                event.error = error
+                event.latency = time.perf_counter() - start
+                hooks.__call_hook__(Hooks.AFTER_REQUEST, request=event)
+
+    def __is_read__(self, method: str, uri: str) -> bool:
+        method = method.lower()
+        return method == 'get' or (method == 'post' and
+                                   self.__READ_POST_URIS__.search(uri.split('?', 1)[0]) is not None)
+
+    def __rest_call__(self, method, uri, data, endpoint, headers, retryPolicy, requests_session, **kwargs):
+        hooks = self.__hooks__
+        if hooks is not None and not hooks.has_hook(*Hooks.REQUEST_HOOKS):
+            hooks = None
+        limiter = self.rate_limiter
+        if hooks is None and limiter is None:
+            return super()._rest_call(method, uri, data, endpoint, headers, retryPolicy, requests_session, **kwargs)
+
+        uri, headers = self._build_uri_and_headers(uri, endpoint=endpoint, headers=headers)
+        retryPolicy = self._build_retry_policy(retryPolicy)
+        requests_session = requests_session or self._requests_session
+
+        auth = kwargs.pop('auth', self.credentials)
+        requests_method_fn = getattr(requests_session, method)
+        event = None
+        if hooks is not None:
+            event = RequestEvent(method.upper(),
+                                 uri,
+                                 endpoint or self.repoEndpoint,
+                                 helper=current_helper(),
+                                 request_bytes=self.__count_bytes__(data))
+            hooks.__call_hook__(Hooks.BEFORE_REQUEST, request=event)
+
+        def _send():
+            if event is not None and (event.status is not None or event.error is not None):
+                event.attempt += 1
+                hooks.__call_hook__(Hooks.ON_RETRY, request=event)
+            if limiter is not None:
+                # Retries wait here too, so a Retry-After or a cut rate holds back every worker.
+                limiter.acquire()
+            try:
+                response = requests_method_fn(uri, data=data, headers=headers, auth=auth, **kwargs)
+            except Exception as ex:
+                if event is not None:
+                    event.error = ex
+                raise
+            if limiter is not None:
+                limiter.observe(response.status_code, response.headers.get('Retry-After'))
+            if event is not None:
+                event.status = response.status_code
+                event.error = None
+            return response
+
+        if event is None:
+            response = with_retry(_send, verbose=self.debug, **retryPolicy)
+            self._handle_synapse_http_error(response)
+            return response
+
+        start = time.perf_counter()
+        try:
+            response = with_retry(_send, verbose=self.debug, **retryPolicy)
+            if kwargs.get('stream', False):
+                event.response_bytes = int(response.headers.get('Content-Length', 0) or 0)
+            else:
+                event.response_bytes = len(response.content)
+        finally:
+            event.latency = time.perf_counter() - start
+            hooks.__call_hook__(Hooks.AFTER_REQUEST, request=event)
+        self._handle_synapse_http_error(response)
+        return response
+
+    def _return_rest_body(self, response):
+        """Returns either a dictionary or a string depending on the 'content-type' of the response."""
+        if is_json(response.headers.get('content-type', None)):
+            return Codec.current().loads(response.content)
+        return response.text
+
+    def iter_rest_items(self,
+                        method: str,
+                        uri: str,
+                        key: t.Optional[str] = None,
+                        body: t.Optional[str | bytes] = None,
+                        endpoint: t.Optional[str] = None,
+                        headers: t.Optional[dict] = None,
+                        retryPolicy: t.Optional[dict] = None,
+                        requests_session=None,
+                        **kwargs) -> t.Iterator[t.Any]:
+        """
+        Makes a REST call and decodes the items of a JSON array in the response one at a time.
+
+        :param method: The HTTP method (e.g., 'get' or 'post').
+        :param uri: URI of the request.
+        :param key: The key of the array in the response object. None if the response is an array.
+        :param body: The payload to send.
+        :param endpoint: Server endpoint, defaults to self.repoEndpoint.
+        :return: Iterator of the decoded items.
+        """
+        response = self._rest_call(method.lower(), uri, body, endpoint, headers, retryPolicy or {}, requests_session,
+                                   **kwargs)
+        return Codec.current().iter_items(response.content, key=key)
+
+    @staticmethod
+    def __count_bytes__(data) -> int:
+        if isinstance(data, bytes):
+            return len(data)
+        elif isinstance(data, str):
+            return len(data) if data.isascii() else len(data.encode('utf-8'))
+        return 0
+
     def __logged_in__(self) -> bool:
         """Gets if the synapseclient is logged into Synapse.
 
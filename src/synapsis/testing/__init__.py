@@ -0,0 +1 @@
+from .fake_synapse import FakeSynapse, FakeSynapseError
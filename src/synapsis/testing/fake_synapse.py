@@ -0,0 +1,1534 @@
+from __future__ import annotations
+import typing as t
+import base64
+import copy
+import datetime
+import hashlib
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PROJECT: t.Final[str] = 'org.sagebionetworks.repo.model.Project'
+FOLDER: t.Final[str] = 'org.sagebionetworks.repo.model.Folder'
+FILE: t.Final[str] = 'org.sagebionetworks.repo.model.FileEntity'
+S3_FILE_HANDLE: t.Final[str] = 'org.sagebionetworks.repo.model.file.S3FileHandle'
+EXTERNAL_OBJECT_STORE_FILE_HANDLE: t.Final[str] = 'org.sagebionetworks.repo.model.file.ExternalObjectStoreFileHandle'
+TABLE: t.Final[str] = 'org.sagebionetworks.repo.model.table.TableEntity'
+ENTITY_VIEW: t.Final[str] = 'org.sagebionetworks.repo.model.table.EntityView'
+MULTIPART_UPLOAD_COPY_REQUEST: t.Final[str] = 'org.sagebionetworks.repo.model.file.MultipartUploadCopyRequest'
+ROOT_ID: t.Final[str] = 'syn4489'
+PUBLIC_ID: t.Final[int] = 273949
+AUTHENTICATED_USERS_ID: t.Final[int] = 273948
+ADMIN_ACCESS: t.Final[list[str]] = ['CHANGE_PERMISSIONS', 'CHANGE_SETTINGS', 'CREATE', 'DELETE', 'DOWNLOAD',
+                                    'MODERATE', 'READ', 'UPDATE']
+TEAM_MANAGER_ACCESS: t.Final[list[str]] = ['DELETE', 'READ', 'SEND_MESSAGE', 'TEAM_MEMBERSHIP_UPDATE', 'UPDATE']
+ENTITY_TYPES: t.Final[dict[str, str]] = {
+    PROJECT: 'project',
+    FOLDER: 'folder',
+    FILE: 'file',
+    'org.sagebionetworks.repo.model.Link': 'link',
+    TABLE: 'table',
+    ENTITY_VIEW: 'entityview'
+}
+VIEW_TYPE_MASKS: t.Final[dict[str, int]] = {
+    FILE: 0x01,
+    PROJECT: 0x02,
+    TABLE: 0x04,
+    FOLDER: 0x08,
+    ENTITY_VIEW: 0x10
+}
+# The default columns of an Entity View and the Entity values they hold.
+VIEW_COLUMNS: t.Final[list[tuple[str, str, t.Callable[[FakeSynapse, dict], t.Any]]]] = [
+    ('id', 'ENTITYID', lambda fake, e: e['id']),
+    ('name', 'STRING', lambda fake, e: e['name']),
+    ('createdOn', 'DATE', lambda fake, e: fake.__epoch_ms__(e['createdOn'])),
+    ('createdBy', 'USERID', lambda fake, e: e['createdBy']),
+    ('etag', 'STRING', lambda fake, e: e['etag']),
+    ('type', 'STRING', lambda fake, e: ENTITY_TYPES.get(e['concreteType'])),
+    ('currentVersion', 'INTEGER', lambda fake, e: e.get('versionNumber')),
+    ('parentId', 'ENTITYID', lambda fake, e: e['parentId']),
+    ('benefactorId', 'ENTITYID', lambda fake, e: fake.__benefactor_id__(e['id'])),
+    ('projectId', 'ENTITYID', lambda fake, e: fake.__entity_path__(e['id'])[1]['id']),
+    ('modifiedOn', 'DATE', lambda fake, e: fake.__epoch_ms__(e['modifiedOn'])),
+    ('modifiedBy', 'USERID', lambda fake, e: e['modifiedBy']),
+    ('dataFileHandleId', 'FILEHANDLEID', lambda fake, e: e.get('dataFileHandleId')),
+    ('dataFileSizeBytes', 'INTEGER', lambda fake, e: fake.__file_handle_value__(e, 'contentSize')),
+    ('dataFileMD5Hex', 'STRING', lambda fake, e: fake.__file_handle_value__(e, 'contentMd5')),
+    ('dataFileConcreteType', 'STRING', lambda fake, e: fake.__file_handle_value__(e, 'concreteType')),
+    ('dataFileBucket', 'STRING', lambda fake, e: fake.__file_handle_value__(e, 'bucketName')),
+    ('dataFileKey', 'STRING', lambda fake, e: fake.__file_handle_value__(e, 'key'))
+]
+# The column type for each annotation type.
+ANNOTATION_COLUMN_TYPES: t.Final[dict[str, str]] = {
+    'STRING': 'STRING',
+    'LONG': 'INTEGER',
+    'DOUBLE': 'DOUBLE',
+    'BOOLEAN': 'BOOLEAN',
+    'TIMESTAMP_MS': 'DATE'
+}
+CONTAINER_TYPES: t.Final[tuple[str, ...]] = (PROJECT, FOLDER)
+
+
+class FakeSynapseError(Exception):
+    """Raised by a route to return an error response."""
+
+    def __init__(self, status: int, reason: str, headers: t.Optional[dict] = None):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.headers = headers or {}
+
+
+class FakeSynapse(object):
+    """
+    An in-process, in-memory stand-in for the Synapse REST services used by synapsis.
+
+    Usage:
+
+        with FakeSynapse() as fake:
+            Synapsis.configure(synapse_args=fake.synapse_args, authToken=fake.auth_token).login()
+    """
+    USERNAME: t.Final[str] = 'synapsis-fake-user'
+    PASSWORD: t.Final[str] = 'synapsis-fake-password'
+    AUTH_TOKEN: t.Final[str] = 'synapsis-fake-auth-token'
+
+    def __init__(self,
+                 host: str = '127.0.0.1',
+                 port: int = 0,
+                 latency: float | tuple[float, float] = 0,
+                 page_size: int = 50,
+                 pre_signed_url_ttl: float = 900,
+                 max_rows_per_page: int = 1000,
+                 job_duration: float = 0):
+        """
+        :param host: Host to bind the server to.
+        :param port: Port to bind the server to. 0 picks a free port.
+        :param latency: Seconds to delay every response, or a (min, max) range to pick a random delay from.
+        :param page_size: Number of results returned per page from paginated endpoints.
+        :param pre_signed_url_ttl: Seconds before a pre-signed URL expires.
+        :param max_rows_per_page: Max number of rows returned per page of a table query.
+        :param job_duration: Seconds before an asynchronous job finishes.
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.page_size = page_size
+        self.pre_signed_url_ttl = pre_signed_url_ttl
+        self.max_rows_per_page = max_rows_per_page
+        self.job_duration = job_duration
+        self._lock = threading.RLock()
+        self._server: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+        self._routes = self.__build_routes__()
+        self.reset()
+
+    def __enter__(self) -> t.Self:
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            raise RuntimeError('FakeSynapse is not running.')
+        return 'http://{0}:{1}'.format(*self._server.server_address[:2])
+
+    @property
+    def synapse_args(self) -> dict:
+        """Args for Synapsis.configure(synapse_args=...) to point the client at this server."""
+        return {'endpoint': self.url}
+
+    @property
+    def auth_token(self) -> str:
+        return self.AUTH_TOKEN
+
+    @property
+    def username(self) -> str:
+        return self.USERNAME
+
+    @property
+    def password(self) -> str:
+        return self.PASSWORD
+
+    @property
+    def user_id(self) -> str:
+        return self._default_user_id
+
+    def start(self) -> t.Self:
+        if self._server is None:
+            handler = type('FakeSynapseRequestHandler', (FakeSynapseRequestHandler,), {'fake': self})
+            self._server = ThreadingHTTPServer((self.host, self.port), handler)
+            self._server.daemon_threads = True
+            self._thread = threading.Thread(target=self._server.serve_forever, name='FakeSynapse', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
+    def reset(self) -> None:
+        """Clears all data, injected errors, and the request log."""
+        with self._lock:
+            self._ids = itertools.count(1000001)
+            self.entities: dict[str, dict] = {}
+            self.versions: dict[str, list[dict]] = {}
+            self.annotations: dict[str, dict] = {}
+            self.acls: dict[str, dict] = {}
+            self.file_handles: dict[str, dict] = {}
+            self.file_contents: dict[str, bytes] = {}
+            self.uploads: dict[str, dict] = {}
+            self.upload_parts: dict[str, dict[int, bytes]] = {}
+            self.users: dict[str, dict] = {}
+            self.tokens: dict[str, str] = {}
+            self.teams: dict[str, dict] = {}
+            self.team_acls: dict[str, dict] = {}
+            self.team_members: dict[str, list[str]] = {}
+            self.columns: dict[str, dict] = {}
+            self.table_rows: dict[str, list[dict]] = {}
+            self.jobs: dict[str, dict] = {}
+            self.request_log: list[tuple[str, str]] = []
+            self._errors: list[dict] = []
+            self._default_user_id = self.create_user(self.USERNAME,
+                                                     password=self.PASSWORD,
+                                                     auth_token=self.AUTH_TOKEN)['ownerId']
+
+    # ==================================================================================================================
+    # Error Injection and Inspection
+    # ==================================================================================================================
+
+    def inject_error(self,
+                     status: int,
+                     path: t.Optional[str] = None,
+                     method: t.Optional[str] = None,
+                     times: t.Optional[int] = 1,
+                     reason: t.Optional[str] = None,
+                     headers: t.Optional[dict] = None) -> None:
+        """
+        Makes matching requests fail.
+
+        :param status: The HTTP status code to respond with.
+        :param path: Regex matched against the request path (without the service prefix). None matches all paths.
+        :param method: The HTTP method to match. None matches all methods.
+        :param times: Number of requests to fail. None to fail every matching request.
+        :param reason: The error message to respond with.
+        :param headers: Extra response headers (e.g., Retry-After).
+        :return: None
+        """
+        with self._lock:
+            self._errors.append({
+                'status': status,
+                'path': re.compile(path) if path else None,
+                'method': method.upper() if method else None,
+                'times': times,
+                'reason': reason or 'Injected error: {0}'.format(status),
+                'headers': headers or {}
+            })
+
+    def clear_errors(self) -> None:
+        with self._lock:
+            self._errors.clear()
+
+    def count_requests(self, method: t.Optional[str] = None, path: t.Optional[str] = None) -> int:
+        """
+        Gets the number of requests received.
+
+        :param method: Only count requests with this HTTP method.
+        :param path: Only count requests with a path matching this regex.
+        :return: int
+        """
+        with self._lock:
+            pattern = re.compile(path) if path else None
+            return sum(1 for req_method, req_path in self.request_log
+                       if (method is None or req_method == method.upper()) and
+                       (pattern is None or pattern.search(req_path)))
+
+    def __next_error__(self, method: str, path: str) -> dict | None:
+        with self._lock:
+            for error in self._errors:
+                if error['method'] not in (None, method):
+                    continue
+                if error['path'] is not None and not error['path'].search(path):
+                    continue
+                if error['times'] is not None:
+                    error['times'] -= 1
+                    if error['times'] <= 0:
+                        self._errors.remove(error)
+                return error
+        return None
+
+    def __delay__(self) -> None:
+        latency = self.latency
+        if isinstance(latency, (tuple, list)):
+            latency = random.uniform(*latency)
+        if latency and latency > 0:
+            time.sleep(latency)
+
+    # ==================================================================================================================
+    # Data Helpers
+    # ==================================================================================================================
+
+    def create_user(self,
+                    username: str,
+                    password: t.Optional[str] = None,
+                    auth_token: t.Optional[str] = None) -> dict:
+        with self._lock:
+            owner_id = str(next(self._ids))
+            user = {
+                'ownerId': owner_id,
+                'userName': username,
+                'displayName': username,
+                'emails': ['{0}@synapsis.fake'.format(username)],
+                'etag': str(uuid.uuid4()),
+                '_password': password,
+                '_api_key': base64.b64encode(uuid.uuid4().bytes).decode()
+            }
+            self.users[owner_id] = user
+            if auth_token:
+                self.tokens[auth_token] = owner_id
+            return self.__public__(user)
+
+    def create_project(self, name: t.Optional[str] = None, user_id: t.Optional[str] = None) -> dict:
+        return self.create_entity(PROJECT, name or 'Project-{0}'.format(uuid.uuid4().hex), None, user_id=user_id)
+
+    def create_folder(self, name: str, parent: str | dict, user_id: t.Optional[str] = None) -> dict:
+        return self.create_entity(FOLDER, name, parent, user_id=user_id)
+
+    def create_file(self,
+                    name: str,
+                    parent: str | dict,
+                    content: bytes = b'',
+                    content_type: str = 'application/octet-stream',
+                    user_id: t.Optional[str] = None) -> dict:
+        file_handle = self.create_file_handle(name, content, content_type=content_type, user_id=user_id)
+        return self.create_entity(FILE, name, parent, user_id=user_id, dataFileHandleId=file_handle['id'])
+
+    def create_file_version(self, file: str | dict, content: t.Optional[bytes] = None, **properties) -> dict:
+        """Stores a new version of a File. A new file handle is created if content is set."""
+        with self._lock:
+            entity = self.__get_entity__(self.__id_of__(file))
+            if content is not None:
+                properties['dataFileHandleId'] = self.create_file_handle(entity['name'], content)['id']
+            entity.update(properties)
+            entity['versionNumber'] += 1
+            entity.update({'versionLabel': str(entity['versionNumber']), 'etag': str(uuid.uuid4()),
+                           'modifiedOn': self.__now__()})
+            self.versions[entity['id']].append(copy.deepcopy(entity))
+            return copy.deepcopy(entity)
+
+    def create_file_handle(self,
+                           file_name: str,
+                           content: bytes = b'',
+                           content_type: str = 'application/octet-stream',
+                           user_id: t.Optional[str] = None,
+                           **properties) -> dict:
+        with self._lock:
+            file_handle_id = str(next(self._ids))
+            file_handle = {
+                'id': file_handle_id,
+                'etag': str(uuid.uuid4()),
+                'createdBy': user_id or self.user_id,
+                'createdOn': self.__now__(),
+                'concreteType': S3_FILE_HANDLE,
+                'contentType': content_type,
+                'contentMd5': hashlib.md5(content).hexdigest(),
+                'fileName': file_name,
+                'storageLocationId': 1,
+                'contentSize': len(content),
+                'status': 'AVAILABLE',
+                'bucketName': 'synapsis-fake',
+                'key': '{0}/{1}/{2}'.format(user_id or self.user_id, uuid.uuid4(), file_name),
+                'isPreview': False,
+                **properties
+            }
+            self.file_handles[file_handle_id] = file_handle
+            self.file_contents[file_handle_id] = content
+            return copy.deepcopy(file_handle)
+
+    def create_entity(self,
+                      concrete_type: str,
+                      name: str,
+                      parent: str | dict | None,
+                      user_id: t.Optional[str] = None,
+                      **properties) -> dict:
+        with self._lock:
+            user_id = user_id or self.user_id
+            parent_id = self.__id_of__(parent) if parent else ROOT_ID
+            if parent_id != ROOT_ID and parent_id not in self.entities:
+                raise FakeSynapseError(404, 'Parent does not exist: {0}'.format(parent_id))
+            if self.__find_child__(parent_id, name) is not None:
+                raise FakeSynapseError(409, 'An entity with the name: {0} already exists.'.format(name))
+
+            entity_id = 'syn{0}'.format(next(self._ids))
+            now = self.__now__()
+            entity = {
+                **properties,
+                'id': entity_id,
+                'name': name,
+                'parentId': parent_id,
+                'concreteType': concrete_type,
+                'etag': str(uuid.uuid4()),
+                'createdOn': now,
+                'modifiedOn': now,
+                'createdBy': user_id,
+                'modifiedBy': user_id
+            }
+            for key in [k for k, v in entity.items() if v is None]:
+                entity.pop(key)
+            if concrete_type == FILE:
+                entity.update({'versionNumber': 1, 'versionLabel': '1', 'isLatestVersion': True})
+                if entity.get('dataFileHandleId') not in self.file_handles:
+                    raise FakeSynapseError(400, 'dataFileHandleId is required.')
+            self.entities[entity_id] = entity
+            self.versions[entity_id] = [copy.deepcopy(entity)]
+            self.annotations[entity_id] = {}
+            if concrete_type == PROJECT:
+                self.acls[entity_id] = self.__new_acl__(entity_id, [{'principalId': int(user_id),
+                                                                     'accessType': list(ADMIN_ACCESS)}])
+            return copy.deepcopy(entity)
+
+    def create_columns(self, columns: list[dict]) -> list[dict]:
+        """Creates column models (e.g., {'name': 'age', 'columnType': 'INTEGER'}). Identical models share an ID."""
+        with self._lock:
+            results = []
+            for column in columns:
+                model = {k: v for k, v in column.items() if k != 'id'}
+                existing = next((c for c in self.columns.values()
+                                 if {k: v for k, v in c.items() if k != 'id'} == model), None)
+                if existing is None:
+                    column_id = str(next(self._ids))
+                    existing = self.columns[column_id] = {**copy.deepcopy(model), 'id': column_id}
+                results.append(copy.deepcopy(existing))
+            return results
+
+    def create_table(self,
+                     name: str,
+                     parent: str | dict,
+                     columns: list[dict],
+                     rows: t.Optional[list[list]] = None,
+                     user_id: t.Optional[str] = None) -> dict:
+        """
+        Creates a Table.
+
+        :param columns: The column models (e.g., {'name': 'age', 'columnType': 'INTEGER'}).
+        :param rows: The rows as lists of values in the order of the columns.
+        """
+        with self._lock:
+            columns = self.create_columns(columns)
+            table = self.create_entity(TABLE, name, parent, user_id=user_id, columnIds=[c['id'] for c in columns])
+            self.table_rows[table['id']] = []
+            if rows:
+                self.append_rows(table, [{c['id']: value for c, value in zip(columns, row)} for row in rows])
+            return copy.deepcopy(self.entities[table['id']])
+
+    def append_rows(self, table: str | dict, rows: list[dict]) -> list[int]:
+        """
+        Appends rows to a Table.
+
+        :param rows: The rows as dicts of column ID to value.
+        :return: The IDs of the new rows.
+        """
+        with self._lock:
+            table_id = self.__id_of__(table)
+            entity = self.__get_entity__(table_id)
+            table_rows = self.table_rows.setdefault(table_id, [])
+            row_id = table_rows[-1]['rowId'] if table_rows else 0
+            row_ids = []
+            for row in rows:
+                unknown = [str(column_id) for column_id in row if str(column_id) not in entity.get('columnIds', [])]
+                if unknown:
+                    raise FakeSynapseError(400, 'Column: {0} is not a column of: {1}'.format(unknown[0], table_id))
+                row_id += 1
+                table_rows.append({'rowId': row_id,
+                                   'versionNumber': 1,
+                                   'values': {str(k): self.__cell__(v) for k, v in row.items()}})
+                row_ids.append(row_id)
+            entity['etag'] = str(uuid.uuid4())
+            return row_ids
+
+    def create_team(self, name: t.Optional[str] = None, user_id: t.Optional[str] = None) -> dict:
+        with self._lock:
+            user_id = user_id or self.user_id
+            team_id = str(next(self._ids))
+            team = {'id': team_id, 'name': name or 'Team-{0}'.format(uuid.uuid4().hex), 'etag': str(uuid.uuid4()),
+                    'createdBy': user_id, 'createdOn': self.__now__()}
+            self.teams[team_id] = team
+            self.team_acls[team_id] = self.__new_acl__(team_id, [{'principalId': int(user_id),
+                                                                  'accessType': list(TEAM_MANAGER_ACCESS)}])
+            self.team_members[team_id] = [user_id]
+            return copy.deepcopy(team)
+
+    def add_team_member(self, team: str | dict, user: str | dict) -> None:
+        with self._lock:
+            team_id = self.__id_of__(team)
+            user_id = self.__id_of__(user, key='ownerId')
+            if user_id not in self.team_members[team_id]:
+                self.team_members[team_id].append(user_id)
+
+    def set_acl(self, entity: str | dict, resource_access: list[dict]) -> dict:
+        """Gives an Entity its own ACL (it becomes its own benefactor)."""
+        with self._lock:
+            entity_id = self.__id_of__(entity)
+            self.acls[entity_id] = self.__new_acl__(entity_id, self.__resource_access__(resource_access))
+            return copy.deepcopy(self.acls[entity_id])
+
+    def children_of(self, parent: str | dict) -> list[dict]:
+        parent_id = self.__id_of__(parent)
+        with self._lock:
+            children = [e for e in self.entities.values() if e['parentId'] == parent_id]
+            return sorted(children, key=lambda e: e['name'])
+
+    def descendants_of(self, parent: str | dict) -> list[dict]:
+        results = []
+        for child in self.children_of(parent):
+            results.append(child)
+            results.extend(self.descendants_of(child))
+        return results
+
+    def __id_of__(self, obj: str | int | dict, key: str = 'id') -> str:
+        if isinstance(obj, dict):
+            obj = obj.get(key, obj.get('id'))
+        return str(obj)
+
+    def __now__(self) -> str:
+        return datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+    def __new_acl__(self, id: str, resource_access: list[dict]) -> dict:
+        return {'id': id, 'etag': str(uuid.uuid4()), 'creationDate': self.__now__(),
+                'resourceAccess': resource_access}
+
+    def __resource_access__(self, resource_access: list[dict]) -> list[dict]:
+        return [{**copy.deepcopy(a), 'principalId': int(a['principalId'])} for a in resource_access]
+
+    def __public__(self, obj: dict) -> dict:
+        return {k: copy.deepcopy(v) for k, v in obj.items() if not k.startswith('_')}
+
+    def __find_child__(self, parent_id: str | None, name: str) -> dict | None:
+        for entity in self.entities.values():
+            if entity['parentId'] == (parent_id or ROOT_ID) and entity['name'] == name:
+                return entity
+        return None
+
+    def __get_entity__(self, entity_id: str, version: t.Optional[int] = None) -> dict:
+        entity = self.entities.get(entity_id)
+        if entity is None:
+            raise FakeSynapseError(404, 'The resource you are attempting to access cannot be found')
+        if version is not None:
+            versions = self.versions.get(entity_id, [])
+            entity = next((v for v in versions if v.get('versionNumber', 1) == int(version)), None)
+            if entity is None:
+                raise FakeSynapseError(404, 'Version: {0} of {1} does not exist.'.format(version, entity_id))
+        return entity
+
+    def __get_file_handle__(self, file_handle_id: str) -> dict:
+        file_handle = self.file_handles.get(str(file_handle_id))
+        if file_handle is None:
+            raise FakeSynapseError(404, 'FileHandle not found: {0}'.format(file_handle_id))
+        return file_handle
+
+    def __entity_path__(self, entity_id: str) -> list[dict]:
+        path = []
+        current = self.__get_entity__(entity_id)
+        while current is not None:
+            path.insert(0, {'name': current['name'], 'id': current['id'], 'type': current['concreteType']})
+            current = self.entities.get(current['parentId'])
+        path.insert(0, {'name': 'root', 'id': ROOT_ID, 'type': FOLDER})
+        return path
+
+    def __benefactor_id__(self, entity_id: str) -> str:
+        current = self.__get_entity__(entity_id)
+        while current is not None:
+            if current['id'] in self.acls:
+                return current['id']
+            current = self.entities.get(current['parentId'])
+        return ROOT_ID
+
+    def __access_types__(self, acl: dict | None, user_id: str) -> set[str]:
+        if acl is None:
+            return set()
+        principal_ids = {int(user_id), PUBLIC_ID, AUTHENTICATED_USERS_ID}
+        principal_ids.update(int(team_id) for team_id, members in self.team_members.items() if user_id in members)
+        access_types = set()
+        for resource_access in acl['resourceAccess']:
+            if int(resource_access['principalId']) in principal_ids:
+                access_types.update(resource_access['accessType'])
+        return access_types
+
+    def __check_access__(self, entity_id: str, user_id: str, access_type: str) -> None:
+        acl = self.acls.get(self.__benefactor_id__(entity_id))
+        if access_type not in self.__access_types__(acl, user_id):
+            raise FakeSynapseError(403, 'You lack {0} access to the requested entity.'.format(access_type))
+
+    def __entity_header__(self, entity: dict) -> dict:
+        return {
+            'name': entity['name'],
+            'id': entity['id'],
+            'type': entity['concreteType'],
+            'versionNumber': entity.get('versionNumber', 1),
+            'versionLabel': entity.get('versionLabel', '1'),
+            'benefactorId': int(self.__benefactor_id__(entity['id']).replace('syn', '')),
+            'createdOn': entity['createdOn'],
+            'modifiedOn': entity['modifiedOn'],
+            'createdBy': entity['createdBy'],
+            'modifiedBy': entity['modifiedBy']
+        }
+
+    def __pre_signed_url__(self, file_handle_id: str) -> str:
+        expires = time.time() + self.pre_signed_url_ttl
+        return '{0}/fake/file/{1}?expires={2}'.format(self.url, file_handle_id, expires)
+
+    def __epoch_ms__(self, timestamp: str) -> int:
+        return int(datetime.datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp() * 1000)
+
+    def __file_handle_value__(self, entity: dict, key: str) -> t.Any:
+        file_handle = self.file_handles.get(str(entity.get('dataFileHandleId')))
+        return file_handle.get(key) if file_handle else None
+
+    def __delete_entity__(self, entity_id: str) -> None:
+        for child in self.children_of(entity_id):
+            self.__delete_entity__(child['id'])
+        for store in [self.entities, self.versions, self.annotations, self.acls, self.table_rows]:
+            store.pop(entity_id, None)
+
+    # ==================================================================================================================
+    # Routes
+    # ==================================================================================================================
+
+    def __build_routes__(self) -> list[tuple[str, t.Pattern, t.Callable]]:
+        routes = [
+            ('POST', r'/session', self._post_session, False),
+            ('GET', r'/secretKey', self._get_secret_key, False),
+            ('GET', r'/userProfile/?', self._get_user_profile, True),
+            ('GET', r'/userProfile/(?P<id>[^/]+)', self._get_user_profile, True),
+            ('GET', r'/userGroupHeaders', self._get_user_group_headers, True),
+            ('GET', r'/user/(?P<id>\d+)/team', self._get_user_teams, True),
+            ('POST', r'/entity', self._post_entity, True),
+            ('POST', r'/entity/child', self._post_entity_child, True),
+            ('POST', r'/entity/children', self._post_entity_children, True),
+            ('POST', r'/entity/header', self._post_entity_header, True),
+            ('GET', r'/entity/(?P<id>syn\d+)', self._get_entity, True),
+            ('GET', r'/entity/(?P<id>syn\d+)/version/(?P<version>\d+)', self._get_entity, True),
+            ('GET', r'/entity/(?P<id>syn\d+)/version', self._get_entity_versions, True),
+            ('PUT', r'/entity/(?P<id>syn\d+)', self._put_entity, True),
+            ('DELETE', r'/entity/(?P<id>syn\d+)', self._delete_entity, True),
+            ('POST', r'/entity/(?P<id>syn\d+)/bundle2', self._post_bundle2, True),
+            ('POST', r'/entity/(?P<id>syn\d+)/version/(?P<version>\d+)/bundle2', self._post_bundle2, True),
+            ('GET', r'/entity/(?P<id>syn\d+)/path', self._get_entity_path, True),
+            ('GET', r'/entity/(?P<id>syn\d+)/filehandles', self._get_entity_filehandles, True),
+            ('GET', r'/entity/(?P<id>syn\d+)/annotations2', self._get_annotations, True),
+            ('PUT', r'/entity/(?P<id>syn\d+)/annotations2', self._put_annotations, True),
+            ('GET', r'/entity/(?P<id>syn\d+)/benefactor', self._get_benefactor, True),
+            ('GET', r'/entity/(?P<id>syn\d+)/acl', self._get_entity_acl, True),
+            ('PUT', r'/entity/(?P<id>syn\d+)/acl', self._put_entity_acl, True),
+            ('POST', r'/entity/(?P<id>syn\d+)/acl', self._post_entity_acl, True),
+            ('DELETE', r'/entity/(?P<id>syn\d+)/acl', self._delete_entity_acl, True),
+            ('GET', r'/team/(?P<id>\d+)', self._get_team, True),
+            ('GET', r'/team/(?P<id>\d+)/acl', self._get_team_acl, True),
+            ('PUT', r'/team/acl', self._put_team_acl, True),
+            ('GET', r'/teamMembers/(?P<id>\d+)', self._get_team_members, True),
+            ('DELETE', r'/team/(?P<id>\d+)/member/(?P<user_id>\d+)', self._delete_team_member, True),
+            ('GET', r'/column/tableview/defaults', self._get_view_default_columns, True),
+            ('POST', r'/column/batch', self._post_column_batch, True),
+            ('GET', r'/column/(?P<id>\d+)', self._get_column, True),
+            ('POST', r'/column/view/scope/async/start', self._post_view_scope_job, True),
+            ('GET', r'/column/view/scope/async/get/(?P<token>\d+)', self._get_async_job, True),
+            ('GET', r'/entity/(?P<id>syn\d+)/column', self._get_table_columns, True),
+            ('POST', r'/entity/(?P<id>syn\d+)/table/query/async/start', self._post_query_job, True),
+            ('POST', r'/entity/(?P<id>syn\d+)/table/append/async/start', self._post_append_job, True),
+            ('GET', r'/entity/(?P<id>syn\d+)/table/append/async/get/(?P<token>\d+)', self._get_async_job, True),
+            ('GET', r'/entity/(?P<id>syn\d+)/table/query/async/get/(?P<token>\d+)', self._get_async_job, True),
+            ('GET', r'/asynchronous/job/(?P<token>\d+)', self._get_async_job_status, True),
+            ('GET', r'/fileHandle/(?P<id>\d+)', self._get_file_handle, True),
+            ('POST', r'/fileHandle/batch', self._post_file_handle_batch, True),
+            ('POST', r'/filehandles/copy', self._post_file_handles_copy, True),
+            ('POST', r'/externalFileHandle/s3', self._post_external_s3_file_handle, True),
+            ('POST', r'/externalFileHandle', self._post_external_file_handle, True),
+            ('POST', r'/file/multipart', self._post_multipart, True),
+            ('POST', r'/file/multipart/(?P<id>\d+)/presigned/url/batch', self._post_multipart_urls, True),
+            ('PUT', r'/file/multipart/(?P<id>\d+)/add/(?P<part>\d+)', self._put_multipart_add, True),
+            ('PUT', r'/file/multipart/(?P<id>\d+)/complete', self._put_multipart_complete, True),
+            ('GET', r'/fake/file/(?P<id>\d+)', self._get_file_content, False),
+            ('PUT', r'/fake/upload/(?P<id>\d+)/(?P<part>\d+)', self._put_upload_part, False),
+            ('PUT', r'/fake/copy/(?P<id>\d+)/(?P<part>\d+)', self._put_copy_part, False)
+        ]
+        return [(method, re.compile('^{0}$'.format(path)), func, auth) for method, path, func, auth in routes]
+
+    def __dispatch__(self, method: str, path: str, query: dict, headers: t.Mapping, body: bytes) -> tuple:
+        with self._lock:
+            self.request_log.append((method, path))
+
+        self.__delay__()
+
+        error = self.__next_error__(method, path)
+        if error:
+            return error['status'], {'reason': error['reason']}, error['headers']
+
+        for route_method, pattern, func, requires_auth in self._routes:
+            match = pattern.match(path)
+            if route_method == method and match:
+                try:
+                    user_id = self.__authenticate__(headers) if requires_auth else None
+                    request = {
+                        'user_id': user_id,
+                        'query': query,
+                        'headers': headers,
+                        'body': body,
+                        'json': json.loads(body) if body and 'json' in headers.get('Content-Type', '') else None
+                    }
+                    with self._lock:
+                        return func(request, **match.groupdict())
+                except FakeSynapseError as ex:
+                    return ex.status, {'reason': ex.reason}, ex.headers
+        return 404, {'reason': 'No fake route for: {0} {1}'.format(method, path)}, {}
+
+    def __authenticate__(self, headers: t.Mapping) -> str:
+        authorization = headers.get('Authorization', '')
+        if authorization.startswith('Bearer '):
+            user_id = self.tokens.get(authorization.removeprefix('Bearer ').strip())
+            if user_id is not None:
+                return user_id
+        elif headers.get('userId') and headers.get('signature'):
+            user = next((u for u in self.users.values() if u['userName'] == headers.get('userId')), None)
+            if user is not None:
+                return user['ownerId']
+        raise FakeSynapseError(401, 'Invalid access token.')
+
+    # Auth
+
+    def _post_session(self, request):
+        body = request['json'] or {}
+        user = next((u for u in self.users.values()
+                     if body.get('email') in [u['userName']] + u['emails'] and
+                     u['_password'] is not None and u['_password'] == body.get('password')), None)
+        if user is None:
+            raise FakeSynapseError(401, 'Invalid username or password.')
+        session_token = str(uuid.uuid4())
+        user['_session_token'] = session_token
+        return 201, {'sessionToken': session_token, 'acceptsTermsOfUse': True}
+
+    def _get_secret_key(self, request):
+        session_token = request['headers'].get('sessionToken')
+        user = next((u for u in self.users.values() if session_token and u.get('_session_token') == session_token),
+                    None)
+        if user is None:
+            raise FakeSynapseError(401, 'Invalid session token.')
+        return 200, {'secretKey': user['_api_key']}
+
+    # Users
+
+    def _get_user_profile(self, request, id=None):
+        user = self.users.get(id or request['user_id'])
+        if user is None:
+            user = next((u for u in self.users.values() if u['userName'] == id), None)
+        if user is None:
+            raise FakeSynapseError(404, 'User not found: {0}'.format(id))
+        return 200, self.__public__(user)
+
+    def _get_user_group_headers(self, request):
+        prefix = request['query'].get('prefix', '')
+        limit = int(request['query'].get('limit', self.page_size))
+        offset = int(request['query'].get('offset', 0))
+        children = [{'ownerId': u['ownerId'], 'userName': u['userName'], 'isIndividual': True}
+                    for u in self.users.values() if u['userName'].startswith(prefix)]
+        return 200, {'children': children[offset:offset + limit], 'prefixFilter': prefix,
+                     'totalNumberOfResults': len(children)}
+
+    def _get_user_teams(self, request, id):
+        limit = int(request['query'].get('limit', self.page_size))
+        offset = int(request['query'].get('offset', 0))
+        teams = [copy.deepcopy(self.teams[team_id])
+                 for team_id, members in self.team_members.items() if id in members]
+        return 200, {'results': teams[offset:offset + limit], 'totalNumberOfResults': len(teams)}
+
+    # Entities
+
+    def _post_entity(self, request):
+        body = request['json']
+        properties = {k: v for k, v in body.items()
+                      if k not in ['id', 'name', 'parentId', 'concreteType', 'etag', 'entityType']}
+        parent_id = body.get('parentId')
+        if parent_id:
+            self.__check_access__(parent_id, request['user_id'], 'CREATE')
+        entity = self.create_entity(body['concreteType'],
+                                    body['name'],
+                                    parent_id,
+                                    user_id=request['user_id'],
+                                    **properties)
+        return 201, entity
+
+    def _post_entity_child(self, request):
+        body = request['json']
+        entity = self.__find_child__(body.get('parentId'), body.get('entityName'))
+        if entity is None:
+            raise FakeSynapseError(404, 'Entity not found.')
+        return 200, {'id': entity['id']}
+
+    def _post_entity_children(self, request):
+        body = request['json']
+        parent_id = body.get('parentId') or ROOT_ID
+        include_types = body.get('includeTypes') or list(ENTITY_TYPES.values())
+        children = [e for e in self.children_of(parent_id)
+                    if ENTITY_TYPES.get(e['concreteType']) in include_types]
+        if body.get('sortBy') == 'CREATED_ON':
+            children.sort(key=lambda e: e['createdOn'])
+        if body.get('sortDirection') == 'DESC':
+            children.reverse()
+        offset = int(body.get('nextPageToken') or 0)
+        page = children[offset:offset + self.page_size]
+        response = {'page': [self.__entity_header__(e) for e in page]}
+        if body.get('includeSumFileSizes'):
+            response['sumFileSizesBytes'] = sum(self.__file_handle_value__(e, 'contentSize') or 0
+                                                for e in self.children_of(parent_id) if e['concreteType'] == FILE)
+        if offset + self.page_size < len(children):
+            response['nextPageToken'] = str(offset + self.page_size)
+        return 200, response
+
+    def _post_entity_header(self, request):
+        # Entities that do not exist or cannot be read are excluded.
+        results = []
+        for reference in request['json'].get('references', []):
+            entity = self.entities.get(reference.get('targetId'))
+            if entity is None:
+                continue
+            try:
+                self.__check_access__(entity['id'], request['user_id'], 'READ')
+            except FakeSynapseError:
+                continue
+            results.append(self.__entity_header__(entity))
+        return 200, {'results': results, 'totalNumberOfResults': len(results)}
+
+    def _get_entity(self, request, id, version=None):
+        self.__check_access__(id, request['user_id'], 'READ')
+        return 200, copy.deepcopy(self.__get_entity__(id, version=version))
+
+    def _get_entity_versions(self, request, id):
+        self.__check_access__(id, request['user_id'], 'READ')
+        limit = int(request['query'].get('limit', self.page_size))
+        offset = int(request['query'].get('offset', 0))
+        versions = list(reversed(self.versions.get(id, [])))
+        results = []
+        for version in versions[offset:offset + limit]:
+            file_handle = self.file_handles.get(str(version.get('dataFileHandleId')), {})
+            results.append({'id': id,
+                            'versionNumber': version.get('versionNumber', 1),
+                            'versionLabel': version.get('versionLabel', '1'),
+                            'modifiedBy': version['modifiedBy'],
+                            'modifiedOn': version['modifiedOn'],
+                            'contentMd5': file_handle.get('contentMd5'),
+                            'contentSize': file_handle.get('contentSize')})
+        return 200, {'results': results, 'totalNumberOfResults': len(versions)}
+
+    def _put_entity(self, request, id):
+        entity = self.__get_entity__(id)
+        self.__check_access__(id, request['user_id'], 'UPDATE')
+        body = request['json']
+        if body.get('etag') != entity['etag']:
+            raise FakeSynapseError(412, 'Object: {0} was updated since you last fetched it.'.format(id))
+        if body.get('name') != entity['name'] or body.get('parentId', entity['parentId']) != entity['parentId']:
+            existing = self.__find_child__(body.get('parentId', entity['parentId']), body.get('name'))
+            if existing is not None and existing['id'] != id:
+                raise FakeSynapseError(409, 'An entity with the name: {0} already exists.'.format(body.get('name')))
+
+        new_version = request['query'].get('newVersion') == 'true'
+        file_changed = entity.get('dataFileHandleId') != body.get('dataFileHandleId', entity.get('dataFileHandleId'))
+        readonly = ['id', 'concreteType', 'createdOn', 'createdBy', 'versionNumber', 'isLatestVersion']
+        entity.update({k: v for k, v in body.items() if k not in readonly})
+        entity.update({'etag': str(uuid.uuid4()), 'modifiedOn': self.__now__(), 'modifiedBy': request['user_id']})
+        if entity['concreteType'] == FILE:
+            if new_version or file_changed:
+                entity['versionNumber'] += 1
+                entity['versionLabel'] = (new_version and body.get('versionLabel')) or str(entity['versionNumber'])
+                self.versions[id].append(copy.deepcopy(entity))
+            else:
+                self.versions[id][-1] = copy.deepcopy(entity)
+        return 200, copy.deepcopy(entity)
+
+    def _delete_entity(self, request, id):
+        self.__get_entity__(id)
+        self.__check_access__(id, request['user_id'], 'DELETE')
+        self.__delete_entity__(id)
+        return 200, None
+
+    def _post_bundle2(self, request, id, version=None):
+        self.__check_access__(id, request['user_id'], 'READ')
+        entity = self.__get_entity__(id, version=version)
+        body = request['json'] or {}
+        user_id = request['user_id']
+        bundle = {}
+        if body.get('includeEntity'):
+            bundle['entity'] = copy.deepcopy(entity)
+        bundle['entityType'] = ENTITY_TYPES.get(entity['concreteType'])
+        if body.get('includeAnnotations'):
+            bundle['annotations'] = {'id': id, 'etag': self.entities[id]['etag'],
+                                     'annotations': copy.deepcopy(self.annotations.get(id, {}))}
+        if body.get('includePermissions'):
+            access_types = self.__access_types__(self.acls.get(self.__benefactor_id__(id)), user_id)
+            bundle['permissions'] = {
+                'canView': 'READ' in access_types,
+                'canEdit': 'UPDATE' in access_types,
+                'canMove': 'UPDATE' in access_types,
+                'canAddChild': 'CREATE' in access_types,
+                'canCertifiedUserEdit': 'UPDATE' in access_types,
+                'canCertifiedUserAddChild': 'CREATE' in access_types,
+                'isCertifiedUser': True,
+                'canChangePermissions': 'CHANGE_PERMISSIONS' in access_types,
+                'canChangeSettings': 'CHANGE_SETTINGS' in access_types,
+                'canDelete': 'DELETE' in access_types,
+                'canDownload': 'DOWNLOAD' in access_types,
+                'canUpload': True,
+                'canEnableInheritance': id in self.acls and entity['concreteType'] != PROJECT,
+                'ownerPrincipalId': int(entity['createdBy']),
+                'canPublicRead': 'READ' in self.__access_types__(self.acls.get(self.__benefactor_id__(id)),
+                                                                 str(PUBLIC_ID)),
+                'canModerate': 'MODERATE' in access_types,
+                'isCertificationRequired': False,
+                'isEntityOpenData': False
+            }
+        if body.get('includeEntityPath'):
+            bundle['path'] = {'path': self.__entity_path__(id)}
+        if body.get('includeHasChildren'):
+            bundle['hasChildren'] = len(self.children_of(id)) > 0
+        if body.get('includeAccessControlList') and id in self.acls:
+            bundle['accessControlList'] = copy.deepcopy(self.acls[id])
+        if body.get('includeFileHandles'):
+            file_handle = self.file_handles.get(str(entity.get('dataFileHandleId')))
+            bundle['fileHandles'] = [copy.deepcopy(file_handle)] if file_handle else []
+        if body.get('includeBenefactorACL'):
+            bundle['benefactorAcl'] = copy.deepcopy(self.acls.get(self.__benefactor_id__(id)))
+        if body.get('includeFileName') and entity.get('dataFileHandleId'):
+            bundle['fileName'] = self.file_handles[str(entity['dataFileHandleId'])]['fileName']
+        if body.get('includeThreadCount'):
+            bundle['threadCount'] = 0
+        if body.get('includeRestrictionInformation'):
+            bundle['restrictionInformation'] = {'objectId': int(id.replace('syn', '')),
+                                                'restrictionLevel': 'OPEN',
+                                                'hasUnmetAccessRequirement': False}
+        return 200, bundle
+
+    def _get_entity_path(self, request, id):
+        self.__check_access__(id, request['user_id'], 'READ')
+        return 200, {'path': self.__entity_path__(id)}
+
+    def _get_entity_filehandles(self, request, id):
+        self.__check_access__(id, request['user_id'], 'READ')
+        entity = self.__get_entity__(id)
+        file_handle = self.file_handles.get(str(entity.get('dataFileHandleId')))
+        return 200, {'list': [copy.deepcopy(file_handle)] if file_handle else []}
+
+    def _get_annotations(self, request, id):
+        self.__check_access__(id, request['user_id'], 'READ')
+        entity = self.__get_entity__(id)
+        return 200, {'id': id, 'etag': entity['etag'], 'annotations': copy.deepcopy(self.annotations.get(id, {}))}
+
+    def _put_annotations(self, request, id):
+        self.__check_access__(id, request['user_id'], 'UPDATE')
+        entity = self.__get_entity__(id)
+        body = request['json']
+        if body.get('etag') != entity['etag']:
+            raise FakeSynapseError(412, 'Object: {0} was updated since you last fetched it.'.format(id))
+        self.annotations[id] = copy.deepcopy(body.get('annotations', {}))
+        entity['etag'] = str(uuid.uuid4())
+        return 200, {'id': id, 'etag': entity['etag'], 'annotations': copy.deepcopy(self.annotations[id])}
+
+    # ACLs
+
+    def _get_benefactor(self, request, id):
+        benefactor_id = self.__benefactor_id__(id)
+        benefactor = self.entities.get(benefactor_id, {'id': benefactor_id, 'name': 'root', 'concreteType': FOLDER})
+        return 200, {'id': benefactor['id'], 'name': benefactor['name'], 'type': benefactor['concreteType']}
+
+    def _get_entity_acl(self, request, id):
+        self.__get_entity__(id)
+        acl = self.acls.get(id)
+        if acl is None:
+            raise FakeSynapseError(404, 'The requested ACL does not exist. This entity inherits its permissions from: '
+                                        '/entity/{0}/acl'.format(self.__benefactor_id__(id)))
+        return 200, copy.deepcopy(acl)
+
+    def _put_entity_acl(self, request, id):
+        self.__check_access__(id, request['user_id'], 'CHANGE_PERMISSIONS')
+        acl = self.acls.get(id)
+        if acl is None:
+            raise FakeSynapseError(404, 'ACL does not exist for: {0}'.format(id))
+        acl.update({'resourceAccess': self.__resource_access__(request['json']['resourceAccess']),
+                    'etag': str(uuid.uuid4())})
+        return 200, copy.deepcopy(acl)
+
+    def _post_entity_acl(self, request, id):
+        self.__check_access__(id, request['user_id'], 'CHANGE_PERMISSIONS')
+        if id in self.acls:
+            raise FakeSynapseError(403, 'Entity: {0} already has an ACL.'.format(id))
+        self.acls[id] = self.__new_acl__(id, self.__resource_access__(request['json']['resourceAccess']))
+        return 201, copy.deepcopy(self.acls[id])
+
+    def _delete_entity_acl(self, request, id):
+        self.__check_access__(id, request['user_id'], 'CHANGE_PERMISSIONS')
+        if self.__get_entity__(id)['concreteType'] == PROJECT:
+            raise FakeSynapseError(403, 'Cannot delete the ACL of a Project.')
+        self.acls.pop(id, None)
+        return 200, None
+
+    # Teams
+
+    def _get_team(self, request, id):
+        team = self.teams.get(id)
+        if team is None:
+            raise FakeSynapseError(404, 'Team not found: {0}'.format(id))
+        return 200, copy.deepcopy(team)
+
+    def _get_team_acl(self, request, id):
+        self._get_team(request, id)
+        return 200, copy.deepcopy(self.team_acls[id])
+
+    def _put_team_acl(self, request):
+        body = request['json']
+        team_id = str(body['id'])
+        self._get_team(request, team_id)
+        if 'UPDATE' not in self.__access_types__(self.team_acls[team_id], request['user_id']):
+            raise FakeSynapseError(403, 'You lack UPDATE access to team: {0}'.format(team_id))
+        self.team_acls[team_id].update({'resourceAccess': self.__resource_access__(body['resourceAccess']),
+                                        'etag': str(uuid.uuid4())})
+        return 200, copy.deepcopy(self.team_acls[team_id])
+
+    def _get_team_members(self, request, id):
+        self._get_team(request, id)
+        limit = int(request['query'].get('limit', self.page_size))
+        offset = int(request['query'].get('offset', 0))
+        managers = {str(a['principalId']) for a in self.team_acls[id]['resourceAccess']
+                    if 'TEAM_MEMBERSHIP_UPDATE' in a['accessType']}
+        members = self.team_members[id]
+        results = []
+        for user_id in members[offset:offset + limit]:
+            user = self.users[user_id]
+            results.append({'teamId': id,
+                            'member': {'ownerId': user_id, 'userName': user['userName'], 'isIndividual': True},
+                            'isAdmin': user_id in managers})
+        return 200, {'results': results, 'totalNumberOfResults': len(members)}
+
+    def _delete_team_member(self, request, id, user_id):
+        self._get_team(request, id)
+        if user_id in self.team_members[id]:
+            self.team_members[id].remove(user_id)
+        return 200, None
+
+    # Tables
+
+    def _get_view_default_columns(self, request):
+        columns = [{'name': name, 'columnType': column_type} for name, column_type, _ in VIEW_COLUMNS]
+        for column in columns:
+            if column['columnType'] == 'STRING':
+                column['maximumSize'] = 256
+        return 200, {'concreteType': 'org.sagebionetworks.repo.model.ListWrapper', 'list': columns}
+
+    def _post_column_batch(self, request):
+        return 201, {'concreteType': 'org.sagebionetworks.repo.model.ListWrapper',
+                     'list': self.create_columns(request['json'].get('list', []))}
+
+    def _get_column(self, request, id):
+        column = self.columns.get(id)
+        if column is None:
+            raise FakeSynapseError(404, 'ColumnModel not found: {0}'.format(id))
+        return 200, copy.deepcopy(column)
+
+    def _post_view_scope_job(self, request):
+        return self.__start_job__(request, self.__view_scope_columns__)
+
+    def _post_query_job(self, request, id):
+        return self.__start_job__(request, self.__query__, id)
+
+    def _post_append_job(self, request, id):
+        return self.__start_job__(request, self.__append__, id)
+
+    def _get_table_columns(self, request, id):
+        self.__check_access__(id, request['user_id'], 'READ')
+        entity = self.__get_entity__(id)
+        columns = [copy.deepcopy(self.columns[column_id]) for column_id in entity.get('columnIds', [])]
+        return 200, {'results': columns, 'totalNumberOfResults': len(columns)}
+
+    def _get_async_job(self, request, token, id=None):
+        job = self.__get_job__(request, token)
+        if job['jobState'] == 'PROCESSING':
+            return 202, self.__job_status__(job)
+        elif job['jobState'] == 'FAILED':
+            raise FakeSynapseError(job['_error'].status, job['errorMessage'])
+        return 200, copy.deepcopy(job['responseBody'])
+
+    def _get_async_job_status(self, request, token):
+        return 200, self.__job_status__(self.__get_job__(request, token))
+
+    def __start_job__(self, request, func: t.Callable, *args) -> tuple:
+        """Runs a job and keeps its response until job_duration has passed."""
+        token = str(next(self._ids))
+        job = {'jobId': token,
+               'jobState': 'PROCESSING',
+               'startedByUserId': int(request['user_id']),
+               'requestBody': copy.deepcopy(request['json']),
+               'startedOn': self.__now__(),
+               'changedOn': self.__now__(),
+               '_done_at': time.monotonic() + self.job_duration}
+        try:
+            job['responseBody'] = func(request, *args)
+        except FakeSynapseError as ex:
+            job.update({'errorMessage': ex.reason, '_error': ex})
+        self.jobs[token] = job
+        return 201, {'token': token}
+
+    def __get_job__(self, request, token: str) -> dict:
+        job = self.jobs.get(token)
+        if job is None or job['startedByUserId'] != int(request['user_id']):
+            raise FakeSynapseError(404, 'Asynchronous job not found: {0}'.format(token))
+        if job['jobState'] == 'PROCESSING' and time.monotonic() >= job['_done_at']:
+            job.update({'jobState': 'FAILED' if '_error' in job else 'COMPLETE', 'changedOn': self.__now__()})
+        return job
+
+    def __job_status__(self, job: dict) -> dict:
+        status = self.__public__(job)
+        if job['jobState'] != 'COMPLETE':
+            status.pop('responseBody', None)
+        return status
+
+    def __view_entities__(self, scope_ids: list, view_type_mask: int) -> list[dict]:
+        """Gets the Entities in a View's scope. Projects include all their Entities, Folders their children."""
+        scope_ids = {'syn{0}'.format(str(s).removeprefix('syn')) for s in scope_ids}
+        project_ids = {s for s in scope_ids if s in self.entities and self.entities[s]['concreteType'] == PROJECT}
+        results = []
+        for entity in self.entities.values():
+            if not VIEW_TYPE_MASKS.get(entity['concreteType'], 0) & view_type_mask:
+                continue
+            in_project = project_ids and self.__entity_path__(entity['id'])[1]['id'] in project_ids
+            if entity['parentId'] in scope_ids or in_project:
+                results.append(entity)
+        return sorted(results, key=lambda e: int(e['id'].removeprefix('syn')))
+
+    def __view_scope_columns__(self, request) -> dict:
+        body = request['json']
+        scope = body['viewScope']
+        columns = {}
+        for entity in self.__view_entities__(scope['scope'], scope.get('viewTypeMask', VIEW_TYPE_MASKS[FILE])):
+            for key, annotation in self.annotations.get(entity['id'], {}).items():
+                column = columns.setdefault(key, {'name': key,
+                                                  'columnType': ANNOTATION_COLUMN_TYPES[annotation['type']]})
+                values = annotation['value']
+                if len(values) > 1:
+                    column['columnType'] = ANNOTATION_COLUMN_TYPES[annotation['type']] + '_LIST'
+                    column['maximumListLength'] = max(column.get('maximumListLength', 0), len(values))
+                if annotation['type'] == 'STRING':
+                    column['maximumSize'] = max([column.get('maximumSize', 0)] + [len(v) for v in values])
+        results = list(columns.values())
+        offset = int(body.get('nextPageToken') or 0)
+        response = {'concreteType': 'org.sagebionetworks.repo.model.table.ViewColumnModelResponse',
+                    'results': results[offset:offset + self.page_size]}
+        if offset + self.page_size < len(results):
+            response['nextPageToken'] = str(offset + self.page_size)
+        return response
+
+    def __query__(self, request, id) -> dict:
+        self.__check_access__(id, request['user_id'], 'READ')
+        entity = self.__get_entity__(id)
+        body = request['json']
+        query = body['query']
+        match = re.match(r'^\s*select\s+(?P<select>.+?)\s+from\s+(?P<table>syn\d+)\s*$', query['sql'],
+                         re.IGNORECASE | re.DOTALL)
+        if match is None or match.group('table') != id:
+            raise FakeSynapseError(400, 'Unsupported query: {0}'.format(query['sql']))
+        columns = [self.columns[column_id] for column_id in entity.get('columnIds', [])]
+        by_name = {c['name']: c for c in columns}
+        names = [quoted.replace('""', '"') if quoted else bare
+                 for quoted, bare in re.findall(r'"((?:[^"]|"")*)"|([^\s,]+)', match.group('select'))]
+        if names == ['*']:
+            names = list(by_name)
+        unknown = [name for name in names if name not in by_name]
+        if unknown:
+            raise FakeSynapseError(400, 'Column does not exist: {0}'.format(unknown[0]))
+        select_columns = [{'name': name, 'columnType': by_name[name]['columnType'], 'id': by_name[name]['id']}
+                          for name in names]
+        rows = self.__table_rows__(entity)
+        offset = int(query.get('offset') or 0)
+        limit = min(int(query.get('limit') or self.max_rows_per_page), self.max_rows_per_page)
+        page = [{'rowId': row_id, 'versionNumber': version, 'values': [values(by_name[name]) for name in names]}
+                for row_id, version, values in rows[offset:offset + limit]]
+        bundle = {
+            'concreteType': 'org.sagebionetworks.repo.model.table.QueryResultBundle',
+            'queryResult': {
+                'concreteType': 'org.sagebionetworks.repo.model.table.QueryResult',
+                'queryResults': {'concreteType': 'org.sagebionetworks.repo.model.table.RowSet',
+                                 'tableId': id,
+                                 'etag': entity['etag'],
+                                 'headers': select_columns,
+                                 'rows': page}
+            }
+        }
+        part_mask = int(body.get('partMask', 0x1))
+        if part_mask & 0x2:
+            bundle['queryCount'] = len(rows)
+        if part_mask & 0x4:
+            bundle['selectColumns'] = select_columns
+        if part_mask & 0x8:
+            bundle['maxRowsPerPage'] = self.max_rows_per_page
+        if part_mask & 0x10:
+            bundle['columnModels'] = copy.deepcopy(columns)
+        return bundle
+
+    def __append__(self, request, id) -> dict:
+        self.__check_access__(id, request['user_id'], 'UPDATE')
+        entity = self.__get_entity__(id)
+        body = request['json']
+        row_set = body.get('toAppend') or {}
+        if entity['concreteType'] != TABLE or body.get('entityId') != id or row_set.get('tableId') != id:
+            raise FakeSynapseError(400, 'Invalid append request for: {0}'.format(id))
+        if row_set.get('concreteType') != 'org.sagebionetworks.repo.model.table.PartialRowSet':
+            raise FakeSynapseError(400, 'Unsupported rows: {0}'.format(row_set.get('concreteType')))
+        row_ids = self.append_rows(id, [row.get('values') or {} for row in row_set.get('rows') or []])
+        return {
+            'concreteType': 'org.sagebionetworks.repo.model.table.RowReferenceSetResults',
+            'rowReferenceSet': {
+                'concreteType': 'org.sagebionetworks.repo.model.table.RowReferenceSet',
+                'tableId': id,
+                'etag': self.entities[id]['etag'],
+                'headers': [{'id': column_id} for column_id in entity.get('columnIds', [])],
+                'rows': [{'rowId': row_id, 'versionNumber': 1} for row_id in row_ids]
+            }
+        }
+
+    def __table_rows__(self, entity: dict) -> list[tuple[int, int, t.Callable[[dict], str | None]]]:
+        """
+        Gets the rows of a Table or View.
+
+        :return: List of (row ID, version, function that gets the value of a column) for each row.
+        """
+        if entity['concreteType'] == TABLE:
+            return [(row['rowId'], row['versionNumber'], lambda c, row=row: row['values'].get(c['id']))
+                    for row in self.table_rows.get(entity['id'], [])]
+        elif entity['concreteType'] != ENTITY_VIEW:
+            raise FakeSynapseError(400, 'Not a table or view: {0}'.format(entity['id']))
+        view_values = {name: func for name, _, func in VIEW_COLUMNS}
+
+        def _view_value(view_entity, column):
+            if column['name'] in view_values:
+                return self.__cell__(view_values[column['name']](self, view_entity))
+            return self.__cell__(self.__annotation_cell__(view_entity['id'], column))
+
+        return [(int(e['id'].removeprefix('syn')), e.get('versionNumber', 1), lambda c, e=e: _view_value(e, c))
+                for e in self.__view_entities__(entity.get('scopeIds', []),
+                                                entity.get('viewTypeMask', VIEW_TYPE_MASKS[FILE]))]
+
+    def __annotation_cell__(self, entity_id: str, column: dict) -> t.Any:
+        annotation = self.annotations.get(entity_id, {}).get(column['name'])
+        if annotation is None:
+            return None
+        values = annotation['value']
+        if not column['columnType'].endswith('_LIST'):
+            return values[0] if values else None
+        converters = {'LONG': int, 'TIMESTAMP_MS': int, 'DOUBLE': float, 'BOOLEAN': lambda v: v == 'true'}
+        return [converters.get(annotation['type'], str)(v) for v in values]
+
+    def __cell__(self, value: t.Any) -> str | None:
+        """Formats a value as a query result value (query results are strings)."""
+        if value is None:
+            return None
+        elif isinstance(value, bool):
+            return 'true' if value else 'false'
+        elif isinstance(value, list):
+            return json.dumps(value)
+        return str(value)
+
+    # File Handles
+
+    def _get_file_handle(self, request, id):
+        return 200, copy.deepcopy(self.__get_file_handle__(id))
+
+    def _post_file_handle_batch(self, request):
+        body = request['json']
+        results = []
+        for requested in body.get('requestedFiles', []):
+            file_handle_id = str(requested['fileHandleId'])
+            result = {'fileHandleId': file_handle_id}
+            entity = self.entities.get(str(requested.get('associateObjectId')))
+            file_handle = self.file_handles.get(file_handle_id)
+            entity_versions = self.versions.get(entity['id'], []) if entity else []
+            if entity is None or file_handle is None:
+                result['failureCode'] = 'NOT_FOUND'
+            elif not any(str(v.get('dataFileHandleId')) == file_handle_id for v in entity_versions):
+                result['failureCode'] = 'UNAUTHORIZED'
+            elif 'DOWNLOAD' not in self.__access_types__(self.acls.get(self.__benefactor_id__(entity['id'])),
+                                                         request['user_id']):
+                result['failureCode'] = 'UNAUTHORIZED'
+            else:
+                if body.get('includeFileHandles'):
+                    result['fileHandle'] = copy.deepcopy(file_handle)
+                if body.get('includePreSignedURLs'):
+                    result['preSignedURL'] = self.__pre_signed_url__(file_handle_id)
+            results.append(result)
+        return 201, {'requestedFiles': results}
+
+    def _post_file_handles_copy(self, request):
+        results = []
+        for copy_request in request['json'].get('copyRequests', []):
+            original = copy_request['originalFile']
+            file_handle_id = str(original['fileHandleId'])
+            result = {'originalFileHandleId': file_handle_id}
+            entity = self.entities.get(str(original.get('associateObjectId')))
+            file_handle = self.file_handles.get(file_handle_id)
+            if entity is None or file_handle is None:
+                result['failureCode'] = 'NOT_FOUND'
+            elif not any(str(v.get('dataFileHandleId')) == file_handle_id for v in self.versions[entity['id']]):
+                result['failureCode'] = 'UNAUTHORIZED'
+            else:
+                properties = {k: v for k, v in file_handle.items()
+                              if k not in ['id', 'etag', 'createdBy', 'createdOn', 'fileName', 'contentType']}
+                result['newFileHandle'] = self.create_file_handle(
+                    copy_request.get('newFileName') or file_handle['fileName'],
+                    self.file_contents.get(file_handle_id, b''),
+                    content_type=copy_request.get('newContentType') or file_handle['contentType'],
+                    user_id=request['user_id'],
+                    **properties
+                )
+            results.append(result)
+        return 201, {'copyResults': results}
+
+    def _post_external_s3_file_handle(self, request):
+        # The object is already in the bucket, so the file handle has no content here.
+        body = request['json']
+        for name in ['bucketName', 'key', 'fileName', 'storageLocationId']:
+            if not body.get(name):
+                raise FakeSynapseError(400, '{0} is required.'.format(name))
+        return 201, self.__create_external_file_handle__(request, S3_FILE_HANDLE, bucketName=body['bucketName'],
+                                                         key=body['key'])
+
+    def _post_external_file_handle(self, request):
+        body = request['json']
+        if body.get('concreteType') != EXTERNAL_OBJECT_STORE_FILE_HANDLE:
+            raise FakeSynapseError(400, 'Unsupported file handle type: {0}'.format(body.get('concreteType')))
+        for name in ['fileKey', 'fileName', 'storageLocationId']:
+            if not body.get(name):
+                raise FakeSynapseError(400, '{0} is required.'.format(name))
+        return 201, self.__create_external_file_handle__(request, EXTERNAL_OBJECT_STORE_FILE_HANDLE,
+                                                         fileKey=body['fileKey'])
+
+    def __create_external_file_handle__(self, request, concrete_type: str, **properties) -> dict:
+        body = request['json']
+        file_handle = self.create_file_handle(body['fileName'],
+                                              content_type=body.get('contentType') or 'application/octet-stream',
+                                              user_id=request['user_id'],
+                                              concreteType=concrete_type,
+                                              contentMd5=body.get('contentMd5'),
+                                              contentSize=body.get('contentSize'),
+                                              storageLocationId=int(body['storageLocationId']),
+                                              **properties)
+        if concrete_type != S3_FILE_HANDLE:
+            for name in ['bucketName', 'key']:
+                file_handle.pop(name)
+                self.file_handles[file_handle['id']].pop(name)
+        return file_handle
+
+    def _get_file_content(self, request, id):
+        if float(request['query'].get('expires', 0)) < time.time():
+            raise FakeSynapseError(403, 'Request has expired')
+        content = self.file_contents.get(id)
+        if content is None:
+            raise FakeSynapseError(404, 'NoSuchKey')
+        range_header = request['headers'].get('Range')
+        if range_header:
+            match = re.match(r'bytes=(\d+)-(\d*)', range_header)
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(content) - 1
+            if start >= len(content):
+                raise FakeSynapseError(416, 'Requested Range Not Satisfiable')
+            headers = {'Content-Range': 'bytes {0}-{1}/{2}'.format(start, end, len(content))}
+            return 206, content[start:end + 1], headers
+        return 200, content
+
+
+    # Multipart Uploads
+
+    def _post_multipart(self, request):
+        body = request['json']
+        force_restart = request['query'].get('forceRestart') == 'true'
+        if body.get('concreteType') == MULTIPART_UPLOAD_COPY_REQUEST:
+            source = self.__copy_source__(request, body.get('sourceFileHandleAssociation') or {})
+            size = source['contentSize']
+            key = (request['user_id'], source['id'], str(body.get('storageLocationId')), body['partSizeBytes'])
+        else:
+            size = int(body['fileSizeBytes'])
+            key = (request['user_id'], body['fileName'], body['contentMD5Hex'], body['fileSizeBytes'])
+        part_count = max(1, -(-size // int(body['partSizeBytes'])))
+        upload = next((u for u in self.uploads.values() if u['_key'] == key and u['state'] == 'UPLOADING'), None)
+        if upload is None or force_restart:
+            upload_id = str(next(self._ids))
+            upload = {
+                'uploadId': upload_id,
+                'startedBy': request['user_id'],
+                'updatedOn': self.__now__(),
+                'state': 'UPLOADING',
+                'partsState': '0' * part_count,
+                '_key': key,
+                '_request': copy.deepcopy(body)
+            }
+            self.uploads[upload_id] = upload
+            self.upload_parts[upload_id] = {}
+        return 201, self.__public__(upload)
+
+    def _post_multipart_urls(self, request, id):
+        upload = self.__get_upload__(id, request['user_id'])
+        expires = time.time() + self.pre_signed_url_ttl
+        if upload['_request'].get('concreteType') == MULTIPART_UPLOAD_COPY_REQUEST:
+            # The storage service copies the part (UploadPartCopy), so no content is sent.
+            source_id = upload['_key'][1]
+            headers = {'x-amz-copy-source': '{0}/{1}'.format(self.file_handles[source_id]['bucketName'],
+                                                             self.file_handles[source_id]['key'])}
+            path = 'copy'
+        else:
+            headers = {'Content-Type': 'application/octet-stream'}
+            path = 'upload'
+        urls = [{'partNumber': part,
+                 'uploadPresignedUrl': '{0}/fake/{1}/{2}/{3}?expires={4}'.format(self.url, path, id, part, expires),
+                 'signedHeaders': headers}
+                for part in request['json']['partNumbers']]
+        return 201, {'partPresignedUrls': urls}
+
+    def _put_upload_part(self, request, id, part):
+        if float(request['query'].get('expires', 0)) < time.time():
+            raise FakeSynapseError(403, 'Request has expired')
+        if id not in self.upload_parts:
+            raise FakeSynapseError(404, 'NoSuchUpload')
+        self.upload_parts[id][int(part)] = request['body']
+        return 200, None
+
+    def _put_copy_part(self, request, id, part):
+        if float(request['query'].get('expires', 0)) < time.time():
+            raise FakeSynapseError(403, 'Request has expired')
+        if id not in self.upload_parts:
+            raise FakeSynapseError(404, 'NoSuchUpload')
+        upload = self.uploads[id]
+        part_size = int(upload['_request']['partSizeBytes'])
+        start = (int(part) - 1) * part_size
+        content = self.file_contents.get(upload['_key'][1], b'')[start:start + part_size]
+        self.upload_parts[id][int(part)] = content
+        etag = hashlib.md5(content).hexdigest()
+        return 200, '<CopyPartResult><ETag>&quot;{0}&quot;</ETag></CopyPartResult>'.format(etag).encode('utf-8')
+
+    def _put_multipart_add(self, request, id, part):
+        upload = self.__get_upload__(id, request['user_id'])
+        content = self.upload_parts[id].get(int(part))
+        if content is None or hashlib.md5(content).hexdigest() != request['query'].get('partMD5Hex'):
+            return 201, {'uploadId': id, 'partNumber': int(part), 'addPartState': 'ADD_FAILED',
+                         'errorMessage': 'Part MD5 does not match.'}
+        parts_state = list(upload['partsState'])
+        parts_state[int(part) - 1] = '1'
+        upload['partsState'] = ''.join(parts_state)
+        return 201, {'uploadId': id, 'partNumber': int(part), 'addPartState': 'ADD_SUCCESS'}
+
+    def _put_multipart_complete(self, request, id):
+        upload = self.__get_upload__(id, request['user_id'])
+        if upload['state'] != 'COMPLETED':
+            if '0' in upload['partsState']:
+                raise FakeSynapseError(400, 'Missing parts for upload: {0}'.format(id))
+            parts = self.upload_parts.pop(id)
+            content = b''.join(parts[part] for part in sorted(parts))
+            upload_request = upload['_request']
+            properties = {}
+            if upload_request.get('concreteType') == MULTIPART_UPLOAD_COPY_REQUEST:
+                source = self.file_handles[upload['_key'][1]]
+                expected_md5 = source['contentMd5']
+                file_name = upload_request.get('fileName') or source['fileName']
+                content_type = source.get('contentType')
+                properties['storageLocationId'] = upload_request.get('storageLocationId') or 1
+            else:
+                expected_md5 = upload_request['contentMD5Hex']
+                file_name = upload_request['fileName']
+                content_type = upload_request.get('contentType')
+            if hashlib.md5(content).hexdigest() != expected_md5:
+                raise FakeSynapseError(400, 'The MD5 of the upload does not match: {0}'.format(id))
+            file_handle = self.create_file_handle(file_name,
+                                                  content,
+                                                  content_type=content_type or 'application/octet-stream',
+                                                  user_id=request['user_id'],
+                                                  **properties)
+            upload.update({'state': 'COMPLETED', 'resultFileHandleId': file_handle['id'],
+                           'updatedOn': self.__now__()})
+        return 201, self.__public__(upload)
+
+    def __copy_source__(self, request, association: dict) -> dict:
+        """Gets the file handle to copy. The user must be able to download it from the associated File."""
+        file_handle_id = str(association.get('fileHandleId'))
+        entity = self.entities.get(str(association.get('associateObjectId')))
+        file_handle = self.file_handles.get(file_handle_id)
+        if entity is None or file_handle is None:
+            raise FakeSynapseError(404, 'File handle not found: {0}'.format(file_handle_id))
+        if not any(str(v.get('dataFileHandleId')) == file_handle_id for v in self.versions.get(entity['id'], [])) or \
+                'DOWNLOAD' not in self.__access_types__(self.acls.get(self.__benefactor_id__(entity['id'])),
+                                                        request['user_id']):
+            raise FakeSynapseError(403, 'You lack DOWNLOAD access to: {0}'.format(file_handle_id))
+        return file_handle
+
+    def __get_upload__(self, upload_id: str, user_id: str) -> dict:
+        upload = self.uploads.get(upload_id)
+        if upload is None or upload['startedBy'] != user_id:
+            raise FakeSynapseError(404, 'Upload not found: {0}'.format(upload_id))
+        return upload
+
+
+class FakeSynapseRequestHandler(BaseHTTPRequestHandler):
+    fake: FakeSynapse
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    SERVICE_PREFIXES: t.Final[tuple[str, ...]] = ('/repo/v1', '/auth/v1', '/file/v1')
+
+    def log_message(self, format: str, *args: t.Any) -> None:
+        pass
+
+    def do_GET(self):
+        self.__handle__('GET')
+
+    def do_POST(self):
+        self.__handle__('POST')
+
+    def do_PUT(self):
+        self.__handle__('PUT')
+
+    def do_DELETE(self):
+        self.__handle__('DELETE')
+
+    def __handle__(self, method: str) -> None:
+        parsed = urllib.parse.urlparse(self.path)
+        path = parsed.path
+        for prefix in self.SERVICE_PREFIXES:
+            if path.startswith(prefix):
+                path = path.removeprefix(prefix)
+                break
+        query = dict(urllib.parse.parse_qsl(parsed.query))
+        length = int(self.headers.get('Content-Length', 0) or 0)
+        body = self.rfile.read(length) if length else b''
+
+        status, payload, *rest = self.fake.__dispatch__(method, path, query, self.headers, body)
+        headers = rest[0] if rest else {}
+        if isinstance(payload, bytes):
+            content = payload
+            content_type = 'application/octet-stream'
+        elif payload is None:
+            content = b''
+            content_type = None
+        else:
+            content = json.dumps(payload).encode('utf-8')
+            content_type = 'application/json;charset=UTF-8'
+
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        for key, value in headers.items():
+            self.send_header(key, str(value))
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if method != 'HEAD':
+            self.wfile.write(content)
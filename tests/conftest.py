@@ -9,6 +9,8 @@ from dotenv import load_dotenv
 from synapse_test_helper import SynapseTestHelper
 from synapsis import Synapsis
 from synapsis.core import Utils
+from synapsis.core.rate_limiter import RateLimiter
+from synapsis.testing import FakeSynapse
 
 load_dotenv(override=True)
 
@@ -72,15 +74,44 @@ def other_test_credentials():
 
 
 @pytest.fixture(autouse=True)
-def login(test_credentials, clear_env_vars):
+def login(request, clear_env_vars):
     clear_env_vars()
-    syn_user, syn_pass, syn_auth_token = test_credentials
+    if request.node.get_closest_marker('fake_synapse'):
+        fake_synapse = request.getfixturevalue('fake_synapse')
+        assert Synapsis.configure(synapse_args=fake_synapse.synapse_args,
+                                  authToken=fake_synapse.auth_token).login().logged_in()
+        assert Synapsis.Synapse.credentials.username == fake_synapse.username
+        yield Synapsis
+        Synapsis.configure()
+        return
+
+    syn_user, syn_pass, syn_auth_token = request.getfixturevalue('test_credentials')
     if not Synapsis.logged_in() or Synapsis.Synapse.credentials.username != syn_user:
         assert Synapsis.configure(authToken=syn_auth_token).login().logged_in()
     assert Synapsis.Synapse.credentials.username == syn_user
     yield Synapsis
 
 
+@pytest.fixture(scope='session')
+def fake_synapse_server():
+    with FakeSynapse() as fake_synapse:
+        yield fake_synapse
+
+
+@pytest.fixture
+def fake_synapse(fake_synapse_server):
+    """
+    A FakeSynapse server with empty data. Tests marked with "fake_synapse" are logged into this server.
+    """
+    fake_synapse_server.reset()
+    fake_synapse_server.latency = 0
+    fake_synapse_server.job_duration = 0
+    RateLimiter.shared().reset()
+    yield fake_synapse_server
+    fake_synapse_server.reset()
+    RateLimiter.shared().reset()
+
+
 @pytest.fixture
 def test_user(synapse_test_helper, test_credentials):
     username = test_credentials[0]
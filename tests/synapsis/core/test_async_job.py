@@ -0,0 +1,41 @@
+import pytest
+from synapseclient.core.exceptions import SynapseHTTPError
+from synapsis import Synapsis
+from synapsis.core.async_job import AsyncJob
+from synapsis.core.exceptions import SynapsisError
+
+pytestmark = pytest.mark.fake_synapse
+
+
+@pytest.fixture
+def scope_request(fake_synapse):
+    project = fake_synapse.create_project()
+    yield {'concreteType': 'org.sagebionetworks.repo.model.table.ViewColumnModelRequest',
+           'viewScope': {'scope': [project['id']], 'viewEntityType': 'entityview', 'viewTypeMask': 1}}
+
+
+def test_it_polls_until_the_job_finishes(fake_synapse, scope_request):
+    AsyncJob.__durations__.clear()
+    fake_synapse.job_duration = 0.5
+    job = AsyncJob(Synapsis.Synapse, '/column/view/scope', scope_request).start()
+    assert job.poll() is None
+    assert job.wait()['results'] == []
+    # The delay grows, so the job is not polled every MIN_DELAY.
+    assert 2 < job.polls < 0.5 / AsyncJob.MIN_DELAY
+    assert job.expected_duration() >= 0.5
+
+    # The next job of the same kind is first polled when it is expected to finish.
+    job = AsyncJob(Synapsis.Synapse, '/column/view/scope', scope_request)
+    job.wait()
+    assert job.polls <= 2
+
+
+def test_it_raises_failures_and_timeouts(fake_synapse, scope_request):
+    AsyncJob.__durations__.clear()
+    request = {**scope_request, 'viewScope': {'scope': ['syn0'], 'viewTypeMask': 1}}
+    with pytest.raises(SynapseHTTPError):
+        AsyncJob(Synapsis.Synapse, '/entity/syn0/table/query', {'query': {'sql': 'SELECT * FROM syn0'}}).wait()
+
+    fake_synapse.job_duration = 5
+    with pytest.raises(SynapsisError, match='Timed out'):
+        AsyncJob(Synapsis.Synapse, '/column/view/scope', request, timeout=0.2).wait()
@@ -0,0 +1,90 @@
+import pytest
+import synapseclient
+from synapseclient.core.exceptions import SynapseHTTPError
+from synapsis import Synapsis
+from synapsis.core import BundleBroker
+
+pytestmark = pytest.mark.fake_synapse
+
+
+@pytest.fixture
+def files(fake_synapse):
+    project = fake_synapse.create_project()
+    files = [fake_synapse.create_file('file-{0}.txt'.format(i), project, content=b'x') for i in range(3)]
+    for file in files:
+        fake_synapse.annotations[file['id']] = {'keep': {'type': 'STRING', 'value': ['a']},
+                                               'drop': {'type': 'STRING', 'value': ['b']}}
+    yield files
+
+
+def put_requests(fake_synapse):
+    return fake_synapse.count_requests('PUT', r'/annotations2$')
+
+
+def test_it_merges_the_annotations(fake_synapse, files):
+    requests = put_requests(fake_synapse)
+    results = Synapsis.Utils.set_annotations_many({
+        f['id']: {'count': i, 'tags': ['x', 'y'], 'score': 1.5, 'drop': None, 'raw': {'type': 'LONG', 'value': ['7']}}
+        for i, f in enumerate(files)
+    })
+    assert [r['id'] for r in results] == [f['id'] for f in files]
+    assert {r['status'] for r in results} == {'updated'}
+    assert put_requests(fake_synapse) == requests + 3
+    assert fake_synapse.count_requests('PUT', r'/entity/syn\d+$') == 0
+    assert fake_synapse.annotations[files[2]['id']] == {
+        'keep': {'type': 'STRING', 'value': ['a']},
+        'count': {'type': 'LONG', 'value': ['2']},
+        'tags': {'type': 'STRING', 'value': ['x', 'y']},
+        'score': {'type': 'DOUBLE', 'value': ['1.5']},
+        'raw': {'type': 'LONG', 'value': ['7']}
+    }
+    assert results[0]['etag'] == fake_synapse.entities[files[0]['id']]['etag']
+
+    # Nothing is sent when the values are already set.
+    results = Synapsis.Utils.set_annotations_many({files[0]['id']: {'count': 0, 'drop': None}})
+    assert results[0]['status'] == 'unchanged'
+    assert put_requests(fake_synapse) == requests + 3
+
+
+def test_it_replaces_the_annotations(fake_synapse, files):
+    Synapsis.Utils.set_annotations_many({files[0]['id']: {'new': 'value'}}, replace=True)
+    assert fake_synapse.annotations[files[0]['id']] == {'new': {'type': 'STRING', 'value': ['value']}}
+
+
+def test_it_takes_entity_and_values_pairs(fake_synapse, files):
+    # Entities are not hashable so they cannot be dict keys.
+    entity = synapseclient.Folder(name=files[1]['name'], parentId=files[1]['parentId'], id=files[1]['id'])
+    results = Synapsis.Utils.set_annotations_many(iter([(entity, {'new': 'value'}), (files[2]['id'], {'new': 1})]))
+    assert [(r['id'], r['status']) for r in results] == [(files[1]['id'], 'updated'), (files[2]['id'], 'updated')]
+    assert fake_synapse.annotations[files[1]['id']]['new'] == {'type': 'STRING', 'value': ['value']}
+
+
+def test_it_retries_conflicts(fake_synapse, files):
+    fake_synapse.inject_error(412, path=r'/entity/{0}/annotations2$'.format(files[1]['id']), method='PUT', times=2)
+    results = Synapsis.Utils.set_annotations_many({f['id']: {'new': 'value'} for f in files})
+    assert [r['retries'] for r in results] == [0, 2, 0]
+    assert {r['status'] for r in results} == {'updated'}
+    assert fake_synapse.annotations[files[1]['id']]['new'] == {'type': 'STRING', 'value': ['value']}
+
+    fake_synapse.inject_error(412, path=r'/entity/{0}/annotations2$'.format(files[1]['id']), method='PUT', times=2)
+    results = Synapsis.Utils.set_annotations_many({files[1]['id']: {'new': 'other'}}, max_retries=1)
+    assert results[0]['status'] == 'failed'
+    assert results[0]['retries'] == 1
+    assert isinstance(results[0]['error'], SynapseHTTPError)
+
+
+def test_it_reports_failures(fake_synapse, files):
+    fake_synapse.inject_error(403, path=r'/entity/{0}/annotations2$'.format(files[0]['id']), method='PUT')
+    results = Synapsis.Utils.set_annotations_many({f['id']: {'new': 'value'} for f in files}, workers=2)
+    assert [r['status'] for r in results] == ['failed', 'updated', 'updated']
+    assert results[0]['error'] is not None
+    assert 'new' not in fake_synapse.annotations[files[0]['id']]
+
+
+def test_it_invalidates_the_bundle_broker(fake_synapse, files):
+    with BundleBroker():
+        assert 'new' not in Synapsis.Utils.get_bundle(files[0]['id'], include_annotations=True)['annotations'][
+            'annotations']
+        Synapsis.Utils.set_annotations_many({files[0]['id']: {'new': 'value'}})
+        assert 'new' in Synapsis.Utils.get_bundle(files[0]['id'], include_annotations=True)['annotations'][
+            'annotations']
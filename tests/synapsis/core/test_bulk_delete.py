@@ -0,0 +1,96 @@
+import pytest
+from synapsis import Synapsis
+from synapsis.core.journal import Journal
+
+pytestmark = pytest.mark.fake_synapse
+
+
+@pytest.fixture
+def tree(fake_synapse):
+    project = fake_synapse.create_project()
+    folder = fake_synapse.create_folder('folder', project)
+    sub = fake_synapse.create_folder('sub', folder)
+    files = [fake_synapse.create_file('file-{0}.txt'.format(i), parent, content=b'x' * (i + 1))
+             for i, parent in enumerate([project, folder, sub, sub])]
+    yield {'project': project, 'folder': folder, 'sub': sub, 'files': files}
+
+
+def test_it_cascades(fake_synapse, tree):
+    deletes = fake_synapse.count_requests('DELETE', r'/entity/syn\d+$')
+    result = Synapsis.Utils.delete_many_skip_trash([tree['files'][2]['id'], tree['folder']['id']])
+    assert result['deleted'] + result['not_found'] == 2
+    assert result['failed'] == []
+    assert result['requests'] == 2
+    assert fake_synapse.count_requests('DELETE', r'/entity/syn\d+$') == deletes + 2
+    assert [c['id'] for c in fake_synapse.children_of(tree['project'])] == [tree['files'][0]['id']]
+
+
+def test_it_keeps_the_root(fake_synapse, tree):
+    result = Synapsis.Utils.delete_many_skip_trash(tree['project']['id'], keep_root=True)
+    assert result['deleted'] == 2
+    assert tree['project']['id'] in fake_synapse.entities
+    assert fake_synapse.children_of(tree['project']) == []
+
+
+def test_it_deletes_from_the_leaves_up(fake_synapse, tree):
+    deleted = []
+    delete_entity = fake_synapse.__delete_entity__
+
+    def _delete_entity(entity_id):
+        deleted.append(entity_id)
+        delete_entity(entity_id)
+
+    fake_synapse.__delete_entity__ = _delete_entity
+    try:
+        result = Synapsis.Utils.delete_many_skip_trash(tree['project'], cascade=False, workers=2)
+    finally:
+        del fake_synapse.__delete_entity__
+    assert result['deleted'] == 7
+    assert result['requests'] == 7
+    assert set(deleted[:4]) == {f['id'] for f in tree['files']}
+    assert deleted[4:] == [tree['sub']['id'], tree['folder']['id'], tree['project']['id']]
+    assert fake_synapse.entities == {}
+
+
+def test_it_skips_the_journal(fake_synapse, tree, tmp_path):
+    journal = str(tmp_path / 'journal.txt')
+    fake_synapse.inject_error(403, path=r'/entity/{0}$'.format(tree['folder']['id']), method='DELETE')
+    result = Synapsis.Utils.delete_many_skip_trash(tree['folder'], cascade=False, journal=journal)
+    assert [f['id'] for f in result['failed']] == [tree['folder']['id']]
+    assert result['deleted'] == 4
+    assert len(Journal(journal, read_only=True)) == 4
+
+    # The rerun only deletes what is left.
+    deletes = fake_synapse.count_requests('DELETE', r'/entity/syn\d+$')
+    result = Synapsis.Utils.delete_many_skip_trash(tree['folder'], cascade=False, journal=journal)
+    assert result['failed'] == []
+    assert result['deleted'] == 1
+    assert fake_synapse.count_requests('DELETE', r'/entity/syn\d+$') == deletes + 1
+
+    result = Synapsis.Utils.delete_many_skip_trash(tree['folder'], journal=journal)
+    assert result['skipped'] == 1
+    assert result['requests'] == 0
+
+
+def test_it_reports_a_dry_run(fake_synapse, tree, tmp_path):
+    journal = str(tmp_path / 'journal.txt')
+    deletes = fake_synapse.count_requests('DELETE', r'/entity/syn\d+$')
+    file_handles = fake_synapse.count_requests('GET', r'/filehandles$')
+    result = Synapsis.Utils.delete_many_skip_trash(tree['project'], dry_run=True, journal=journal)
+    assert result['entities'] == 7
+    assert result['containers'] == 3
+    assert result['files'] == 4
+    assert result['bytes'] == 1 + 2 + 3 + 4
+    # The sizes come from the listings, not from a request per file.
+    assert fake_synapse.count_requests('GET', r'/filehandles$') == file_handles
+    assert result['requests'] == 1
+    assert sum(result['types'].values()) == 7
+
+    result = Synapsis.Utils.delete_many_skip_trash(tree['project'], dry_run=True, keep_root=True, cascade=False)
+    assert result['entities'] == 6
+    assert result['requests'] == 6
+    assert fake_synapse.count_requests('DELETE', r'/entity/syn\d+$') == deletes
+    assert len(fake_synapse.entities) == 7
+
+    result = Synapsis.Utils.delete_many_skip_trash([tree['files'][0], tree['sub']], dry_run=True)
+    assert (result['files'], result['bytes']) == (3, 1 + 3 + 4)
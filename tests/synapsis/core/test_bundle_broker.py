@@ -0,0 +1,136 @@
+import concurrent.futures
+import contextvars
+import threading
+import pytest
+from synapseclient.core.exceptions import SynapseHTTPError
+from synapsis import Synapsis
+from synapsis.core import BundleBroker
+
+pytestmark = pytest.mark.fake_synapse
+
+
+@pytest.fixture
+def file(fake_synapse):
+    project = fake_synapse.create_project()
+    yield fake_synapse.create_file('file.txt', project, content=b'x')
+
+
+def bundle_requests(fake_synapse):
+    return fake_synapse.count_requests('POST', r'/bundle2$')
+
+
+def test_it_answers_subsets_from_the_cache(fake_synapse, file):
+    broker = BundleBroker()
+    requests = bundle_requests(fake_synapse)
+    bundle = Synapsis.Utils.get_bundle(file['id'], include_annotations=True, include_file_handles=True,
+                                       broker=broker)
+    assert {'entity', 'annotations', 'fileHandles'} <= set(bundle)
+
+    bundle = Synapsis.Utils.get_bundle(file['id'], include_entity=False, include_annotations=True, broker=broker)
+    assert 'annotations' in bundle
+    assert 'entity' not in bundle
+    assert 'fileHandles' not in bundle
+    assert bundle['entityType'] == 'file'
+    assert bundle_requests(fake_synapse) == requests + 1
+
+    # A flag that is not cached is requested with the cached flags.
+    bundle = Synapsis.Utils.get_bundle(file['id'], include_permissions=True, broker=broker)
+    assert set(bundle) == {'entity', 'entityType', 'permissions'}
+    assert bundle_requests(fake_synapse) == requests + 2
+    Synapsis.Utils.get_bundle(file['id'], include_annotations=True, include_file_handles=True,
+                              include_permissions=True, broker=broker)
+    assert bundle_requests(fake_synapse) == requests + 2
+    assert broker.stats == {'requests': 2, 'merged': 0, 'cached': 2}
+
+    # The cached bundles are copies.
+    bundle['entity']['name'] = 'changed'
+    assert Synapsis.Utils.get_bundle(file['id'], broker=broker)['entity']['name'] == 'file.txt'
+
+    broker.invalidate(file['id'])
+    Synapsis.Utils.get_bundle(file['id'], broker=broker)
+    assert bundle_requests(fake_synapse) == requests + 3
+
+
+def test_it_merges_concurrent_requests(fake_synapse, file):
+    fake_synapse.latency = 0.05
+    flags = [{'include_annotations': True}, {'include_file_handles': True}, {'include_permissions': True},
+             {'include_entity_path': True}, {'include_annotations': True, 'include_file_handles': True}]
+    requests = bundle_requests(fake_synapse)
+
+    with BundleBroker(window=0.02) as broker:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(flags)) as executor:
+            futures = [executor.submit(contextvars.copy_context().run, Synapsis.Utils.get_bundle, file['id'], **f)
+                       for f in flags]
+            bundles = [future.result() for future in futures]
+    assert BundleBroker.current() is None
+    assert bundle_requests(fake_synapse) == requests + 1
+    assert broker.stats['requests'] == 1
+    assert broker.stats['merged'] == len(flags) - 1
+    assert 'annotations' in bundles[0] and 'fileHandles' not in bundles[0]
+    assert 'fileHandles' in bundles[1] and 'annotations' not in bundles[1]
+    assert 'permissions' in bundles[2]
+    assert 'path' in bundles[3]
+    assert {'annotations', 'fileHandles'} <= set(bundles[4])
+
+
+def test_it_does_not_cache_errors(fake_synapse, file):
+    broker = BundleBroker()
+    fake_synapse.inject_error(403, path=r'/bundle2$')
+    with pytest.raises(SynapseHTTPError):
+        Synapsis.Utils.get_bundle(file['id'], broker=broker)
+    assert Synapsis.Utils.get_bundle(file['id'], broker=broker)['entity']['id'] == file['id']
+
+
+def test_it_gives_each_waiter_its_own_error(fake_synapse, file):
+    fake_synapse.inject_error(403, path=r'/bundle2$')
+    requests = bundle_requests(fake_synapse)
+
+    def _get():
+        try:
+            Synapsis.Utils.get_bundle(file['id'], broker=broker)
+        except SynapseHTTPError as ex:
+            return ex
+
+    broker = BundleBroker(window=0.05)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+        errors = [future.result() for future in [executor.submit(_get) for _ in range(3)]]
+    assert bundle_requests(fake_synapse) == requests + 1
+    assert all(isinstance(e, SynapseHTTPError) and e.response.status_code == 403 for e in errors)
+    assert len({id(e) for e in errors}) == 3
+
+
+def test_it_learns_the_flags(fake_synapse, file):
+    other = fake_synapse.create_file('other.txt', file['parentId'], content=b'x')
+    requests = bundle_requests(fake_synapse)
+    with BundleBroker(learn_flags=True):
+        for entity_id in [file['id'], other['id']]:
+            Synapsis.Utils.get_bundle(entity_id, include_annotations=True)
+            Synapsis.Utils.get_bundle(entity_id, include_file_handles=True)
+    # The second file is requested with the flags used for the first.
+    assert bundle_requests(fake_synapse) == requests + 3
+
+    requests = bundle_requests(fake_synapse)
+    with BundleBroker():
+        for entity_id in [file['id'], other['id']]:
+            Synapsis.Utils.get_bundle(entity_id, include_annotations=True)
+            Synapsis.Utils.get_bundle(entity_id, include_file_handles=True)
+        # Flags are not learned by default.
+        assert set(Synapsis.Utils.get_bundle(file['parentId'], include_entity=False)) == {'entityType'}
+    assert bundle_requests(fake_synapse) == requests + 5
+
+
+def test_it_can_be_entered_from_many_threads(fake_synapse, file):
+    broker = BundleBroker()
+    barrier = threading.Barrier(4)
+
+    def _enter_and_get():
+        with broker:
+            barrier.wait(5)
+            bundle = Synapsis.Utils.get_bundle(file['id'])
+            barrier.wait(5)
+        return bundle, BundleBroker.current()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        results = [f.result() for f in [executor.submit(_enter_and_get) for _ in range(4)]]
+    assert all(bundle['entity']['id'] == file['id'] and current is None for bundle, current in results)
+    assert broker.stats['requests'] == 1
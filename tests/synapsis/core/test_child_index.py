@@ -0,0 +1,89 @@
+import time
+import pytest
+from synapsis import Synapsis
+from synapsis.core import ChildIndex
+from synapsis.core.exceptions import SynapsisError
+
+pytestmark = pytest.mark.fake_synapse
+
+
+@pytest.fixture
+def small_pages(fake_synapse):
+    page_size = fake_synapse.page_size
+    fake_synapse.page_size = 2
+    yield fake_synapse
+    fake_synapse.page_size = page_size
+
+
+@pytest.fixture
+def project(fake_synapse):
+    project = fake_synapse.create_project()
+    fake_synapse.create_folder('folder', project)
+    for i in range(4):
+        time.sleep(0.002)  # Distinct createdOn values.
+        fake_synapse.create_file('file-{0}.txt'.format(i), project, content=b'x')
+    yield project
+
+
+def test_it_indexes_the_children(fake_synapse, small_pages, project):
+    requests = fake_synapse.count_requests('POST', r'/entity/children$')
+    index = ChildIndex(project['id'])
+    assert fake_synapse.count_requests('POST', r'/entity/children$') == requests + 3
+    assert len(index) == 5
+    assert 'folder' in index
+    assert index.id_of('file-2.txt') == fake_synapse.__find_child__(project['id'], 'file-2.txt')['id']
+    assert index.get('nope') is None
+    assert sorted(index.names()) == sorted(c['name'] for c in fake_synapse.children_of(project))
+    assert [c['name'] for c in index] == index.names()
+
+    folder = index.remove('folder')
+    assert 'folder' not in index
+    index.add(folder)
+    assert index.get('folder') == folder
+
+
+def test_it_lazy_loads(fake_synapse, project):
+    requests = fake_synapse.count_requests('POST', r'/entity/children$')
+    index = ChildIndex(project, load=False, include_types=['folder'])
+    assert 'not loaded' in repr(index)
+    assert fake_synapse.count_requests('POST', r'/entity/children$') == requests
+    assert index.names() == ['folder']
+    assert fake_synapse.count_requests('POST', r'/entity/children$') == requests + 1
+
+
+def test_it_refreshes_incrementally(fake_synapse, small_pages, project):
+    index = ChildIndex(project['id'])
+    time.sleep(0.002)
+    new_file = fake_synapse.create_file('new.txt', project, content=b'x')
+    fake_synapse.__delete_entity__(index.id_of('file-0.txt'))
+
+    requests = fake_synapse.count_requests('POST', r'/entity/children$')
+    index.refresh()
+    # Listing stops at the first page with a child older than the newest indexed child.
+    assert fake_synapse.count_requests('POST', r'/entity/children$') == requests + 2
+    assert index.id_of('new.txt') == new_file['id']
+    assert 'file-0.txt' in index
+
+    index.refresh(full=True)
+    assert 'file-0.txt' not in index
+    assert len(index) == 5
+
+
+def test_find_entity_with_an_index(fake_synapse, project):
+    index = ChildIndex(project['id'])
+    requests = fake_synapse.count_requests('POST', r'/entity/child$')
+    entity = Synapsis.Utils.find_entity('file-1.txt', parent=project['id'], index=index, downloadFile=False)
+    assert entity.id == index.id_of('file-1.txt')
+    assert Synapsis.Utils.find_entity('nope', index=index) is None
+    assert fake_synapse.count_requests('POST', r'/entity/child$') == requests
+
+    other = fake_synapse.create_project()
+    with pytest.raises(SynapsisError):
+        Synapsis.Utils.find_entity('file-1.txt', parent=other['id'], index=index)
+
+
+def test_find_entities(fake_synapse, project):
+    names = ['file-3.txt', 'nope', 'folder', 'file-0.txt']
+    entities = Synapsis.Utils.find_entities(names, parent=project, downloadFile=False)
+    assert [e and e.name for e in entities] == ['file-3.txt', None, 'folder', 'file-0.txt']
+    assert fake_synapse.count_requests('POST', r'/entity/child$') == 0
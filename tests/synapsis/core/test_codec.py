@@ -0,0 +1,70 @@
+import pytest
+from synapsis import Synapsis
+from synapsis.core.codec import Codec
+
+pytestmark = pytest.mark.fake_synapse
+
+DATA = {'results': [{'id': 'syn1', 'name': 'ü ☃ "]",', 'n': 1.5}, [], None, True], 'total': 4}
+
+
+@pytest.fixture
+def restore_codec():
+    codec = Codec.current()
+    yield
+    Codec.use(codec)
+
+
+@pytest.mark.parametrize('name', Codec.available())
+def test_it_encodes_and_decodes(name, restore_codec):
+    codec = Codec.use(name)
+    assert Codec.current() is codec
+    encoded = codec.dumps(DATA)
+    assert isinstance(encoded, (str, bytes))
+    if isinstance(encoded, str):
+        assert encoded.isascii()
+    assert codec.loads(encoded) == DATA
+    assert list(codec.iter_items(encoded, key='results')) == DATA['results']
+
+
+def test_it_uses_the_fastest_codec(restore_codec):
+    assert Codec.available()[-1] == 'json'
+    assert Codec.use().NAME == Codec.available()[0]
+    with pytest.raises(ValueError):
+        Codec.use('nope')
+    with pytest.raises(ValueError):
+        Codec.use(object())
+
+
+def test_iter_items():
+    codec = Codec()
+    assert list(codec.iter_items(' [ 1 , {"a": [2, "]"]} ,"x" ] ')) == [1, {'a': [2, ']']}, 'x']
+    assert list(codec.iter_items(b'{"a": {"results": [0]}, "results": [1, 2], "b": 3}', key='results')) == [1, 2]
+    assert list(codec.iter_items('{"results": []}', key='results')) == []
+    assert list(codec.iter_items('{"a": 1}', key='results')) == []
+    with pytest.raises(ValueError):
+        list(codec.iter_items('{"results": 1}', key='results'))
+    with pytest.raises(ValueError):
+        list(codec.iter_items('[1 2]'))
+
+
+def test_it_decodes_the_rest_calls(fake_synapse, restore_codec):
+    class CountingCodec(Codec):
+        NAME = 'counting'
+        PRIORITY = -1
+        calls = 0
+
+        def loads(self, data):
+            CountingCodec.calls += 1
+            return super().loads(data)
+
+    try:
+        Codec.use(CountingCodec())
+        project = fake_synapse.create_project()
+        file = fake_synapse.create_file('file.txt', project, content=b'x')
+        assert Synapsis.Utils.get_bundle(file['id'])['entity']['id'] == file['id']
+        assert CountingCodec.calls == 1
+        items = list(Synapsis.Synapse.iter_rest_items('post', '/entity/children', key='page',
+                                                      body=Codec.current().dumps({'parentId': project['id']})))
+        assert [i['id'] for i in items] == [file['id']]
+    finally:
+        Codec.CODECS.pop(CountingCodec.NAME)
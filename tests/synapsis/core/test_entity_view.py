@@ -0,0 +1,93 @@
+import pytest
+from synapsis import Synapsis
+
+pytestmark = pytest.mark.fake_synapse
+
+
+@pytest.fixture
+def tree(fake_synapse):
+    project = fake_synapse.create_project()
+    folder = fake_synapse.create_folder('folder', project)
+    sub = fake_synapse.create_folder('sub', folder)
+    files = [fake_synapse.create_file('file-{0}.txt'.format(i), parent, content=b'x' * (i + 1))
+             for i, parent in enumerate([project, folder, sub, sub])]
+    fake_synapse.annotations[files[0]['id']] = {'study': {'type': 'STRING', 'value': ['abc']},
+                                                'visits': {'type': 'LONG', 'value': ['1', '2']}}
+    fake_synapse.annotations[files[2]['id']] = {'score': {'type': 'DOUBLE', 'value': ['1.5']},
+                                                'visits': {'type': 'LONG', 'value': ['3']}}
+    yield {'project': project, 'folder': folder, 'sub': sub, 'files': files}
+
+
+def test_it_lists_the_files_in_a_project(fake_synapse, tree):
+    files = tree['files']
+    bundles = fake_synapse.count_requests('POST', r'/bundle2$')
+    rows = list(Synapsis.Utils.list_entity_metadata(tree['project']))
+    assert fake_synapse.count_requests('POST', r'/bundle2$') == bundles
+    assert [row['id'] for row in rows] == [f['id'] for f in files]
+    assert rows[0] == {
+        'id': files[0]['id'],
+        'name': 'file-0.txt',
+        'type': 'file',
+        'parentId': tree['project']['id'],
+        'dataFileMD5Hex': fake_synapse.file_handles[files[0]['dataFileHandleId']]['contentMd5'],
+        'dataFileSizeBytes': 1,
+        'study': 'abc',
+        'visits': [1, 2],
+        'score': None
+    }
+    assert rows[2]['score'] == 1.5
+    assert rows[2]['visits'] == [3]
+    assert rows[3]['dataFileSizeBytes'] == 4
+
+    # The View is deleted.
+    assert not any(e['concreteType'].endswith('EntityView') for e in fake_synapse.entities.values())
+
+
+def test_it_lists_the_entities_under_a_folder(fake_synapse, tree):
+    rows = list(Synapsis.Utils.list_entity_metadata(tree['folder'],
+                                                    include_types=['file', 'folder'],
+                                                    columns=['id', 'name'],
+                                                    annotations=False))
+    assert {row['id'] for row in rows} == {tree['sub']['id']} | {f['id'] for f in tree['files'][1:]}
+    assert set(rows[0]) == {'id', 'name'}
+
+    with pytest.raises(ValueError, match='Invalid columns'):
+        list(Synapsis.Utils.list_entity_metadata(tree['folder'], columns=['id', 'nope']))
+    with pytest.raises(ValueError, match='Invalid include_types'):
+        list(Synapsis.Utils.list_entity_metadata(tree['folder'], include_types=['nope']))
+
+
+def test_it_pages_the_query(fake_synapse, tree):
+    fake_synapse.job_duration = 0.05
+    query_jobs = fake_synapse.count_requests('POST', r'/table/query/async/start$')
+    rows = list(Synapsis.Utils.list_entity_metadata(tree['project'], page_size=3))
+    assert len(rows) == 4
+    assert fake_synapse.count_requests('POST', r'/table/query/async/start$') == query_jobs + 2
+
+
+def test_it_keeps_and_reuses_the_view(fake_synapse, tree):
+    rows = Synapsis.Utils.list_entity_metadata(tree['project'], keep_view=True)
+    next(rows)
+    rows.close()
+    view = next(e for e in fake_synapse.entities.values() if e['concreteType'].endswith('EntityView'))
+    assert view['parentId'] == tree['project']['id']
+
+    rows = list(Synapsis.Utils.list_entity_metadata(tree['project'], view=view['id']))
+    assert len(rows) == 4
+    assert set(rows[0]) == {'id', 'name', 'type', 'parentId', 'dataFileMD5Hex', 'dataFileSizeBytes', 'study',
+                            'visits', 'score'}
+    assert view['id'] in fake_synapse.entities
+
+    rows = list(Synapsis.Utils.list_entity_metadata(tree['project'], view=view['id'], columns=['id']))
+    assert rows[0] == {'id': tree['files'][0]['id']}
+
+
+def test_it_yields_arrow_batches(fake_synapse, tree):
+    pyarrow = pytest.importorskip('pyarrow')
+    batches = list(Synapsis.Utils.list_entity_metadata(tree['project'], format='arrow', page_size=2))
+    assert [batch.num_rows for batch in batches] == [2, 2]
+    table = pyarrow.Table.from_batches(batches)
+    assert table.schema.field('dataFileSizeBytes').type == pyarrow.int64()
+    assert table.schema.field('visits').type == pyarrow.list_(pyarrow.int64())
+    assert table.column('dataFileSizeBytes').to_pylist() == [1, 2, 3, 4]
+    assert table.column('score').to_pylist() == [None, None, 1.5, None]
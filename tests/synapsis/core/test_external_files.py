@@ -0,0 +1,120 @@
+import pytest
+from synapsis import Synapsis
+from synapsis.core.exceptions import SynapsisError
+
+pytestmark = pytest.mark.fake_synapse
+
+STORAGE_LOCATION: int = 5
+
+
+@pytest.fixture
+def project(fake_synapse):
+    yield fake_synapse.create_project()
+
+
+def _children(fake_synapse, parent_id):
+    return {e['name']: e for e in fake_synapse.children_of(parent_id)}
+
+
+def test_it_registers_objects_as_files(fake_synapse, project):
+    records = [('data/a/one.txt', 10, 'md5-1'),
+               ('data/a/b/two.csv', 20, 'md5-2'),
+               {'key': 'data/a/b/three', 'size': 30, 'md5': 'md5-3', 'content_type': 'text/plain'},
+               ('data/top=1.txt', 40, 'md5-4')]
+    progress = []
+    result = Synapsis.Utils.register_external_files(records, project, STORAGE_LOCATION, bucket_name='bucket',
+                                                    prefix='data/', workers=2,
+                                                    progress=lambda stage, count: progress.append((stage, count)))
+    assert result == {'registered': 4, 'exists': 0, 'skipped': 0, 'folders': 2, 'failed': []}
+    assert max(count for stage, count in progress if stage == 'create') == 4
+    # No content is uploaded.
+    assert fake_synapse.count_requests('POST', r'/file/multipart') == 0
+
+    folder_a = _children(fake_synapse, project['id'])['a']
+    folder_b = _children(fake_synapse, folder_a['id'])['b']
+    assert set(_children(fake_synapse, folder_b['id'])) == {'two.csv', 'three'}
+    top = _children(fake_synapse, project['id'])['top_1.txt']
+    file_handle = fake_synapse.file_handles[top['dataFileHandleId']]
+    assert file_handle['concreteType'] == 'org.sagebionetworks.repo.model.file.S3FileHandle'
+    assert (file_handle['bucketName'], file_handle['key'], file_handle['fileName']) == \
+           ('bucket', 'data/top=1.txt', 'top=1.txt')
+    assert (file_handle['contentSize'], file_handle['contentMd5'], file_handle['storageLocationId']) == \
+           (40, 'md5-4', STORAGE_LOCATION)
+    three = _children(fake_synapse, folder_b['id'])['three']
+    assert fake_synapse.file_handles[three['dataFileHandleId']]['contentType'] == 'text/plain'
+
+
+def test_it_registers_object_store_files(fake_synapse, project):
+    result = Synapsis.Utils.register_external_files([('x/one.txt', 1, 'md5-1')], project, STORAGE_LOCATION)
+    assert result['registered'] == 1
+    one = _children(fake_synapse, _children(fake_synapse, project['id'])['x']['id'])['one.txt']
+    file_handle = fake_synapse.file_handles[one['dataFileHandleId']]
+    assert file_handle['concreteType'] == 'org.sagebionetworks.repo.model.file.ExternalObjectStoreFileHandle'
+    assert file_handle['fileKey'] == 'x/one.txt'
+    assert 'bucketName' not in file_handle
+
+
+def test_it_skips_existing_files_and_resumes_from_the_journal(fake_synapse, project, tmp_path):
+    journal = str(tmp_path / 'journal.txt')
+    folder = fake_synapse.create_folder('a', project)
+    one = fake_synapse.create_file('one.txt', folder, content=b'1')
+    fake_synapse.file_handles[one['dataFileHandleId']].update(bucketName='bucket', key='a/one.txt')
+    fake_synapse.create_file('b', folder, content=b'2')
+    records = [('a/one.txt', 1, 'md5-1'), ('a/two.txt', 2, 'md5-2'), ('a/b/three.txt', 3, 'md5-3'), ('a/', 0, None)]
+    file_handles = fake_synapse.count_requests('POST', r'/externalFileHandle/s3')
+
+    result = Synapsis.Utils.register_external_files(records, project, STORAGE_LOCATION, bucket_name='bucket',
+                                                    journal=journal)
+    failed = {r['key']: str(r['error']) for r in result['failed']}
+    assert sorted(failed) == ['a/', 'a/b/three.txt']
+    assert 'non-folder' in failed['a/b/three.txt']
+    assert 'does not name a file' in failed['a/']
+    assert (result['registered'], result['exists'], result['folders']) == (1, 1, 0)
+    # A file handle is only created for the new File.
+    assert fake_synapse.count_requests('POST', r'/externalFileHandle/s3') == file_handles + 1
+
+    # The File that blocked the Folder is renamed.
+    fake_synapse.entities[_children(fake_synapse, folder['id'])['b']['id']]['name'] = 'b.txt'
+    result = Synapsis.Utils.register_external_files(records[:3], project, STORAGE_LOCATION, bucket_name='bucket',
+                                                    journal=journal)
+    assert result == {'registered': 1, 'exists': 0, 'skipped': 2, 'folders': 1, 'failed': []}
+    assert 'three.txt' in _children(fake_synapse, _children(fake_synapse, folder['id'])['b']['id'])
+
+    # The keys in the journal were registered under another parent.
+    other = fake_synapse.create_project()
+    with pytest.raises(SynapsisError, match='different run'):
+        Synapsis.Utils.register_external_files(records, other, STORAGE_LOCATION, bucket_name='bucket', journal=journal)
+
+
+def test_it_fails_keys_whose_name_is_taken_by_a_different_object(fake_synapse, project, tmp_path):
+    journal = str(tmp_path / 'journal.txt')
+    folder = fake_synapse.create_folder('a', project)
+    fake_synapse.create_file('old.txt', folder, content=b'1')
+    records = [('a/x=1.txt', 1, 'md5-1'), ('a/x_1.txt', 2, 'md5-2'), ('a/old.txt', 3, 'md5-3')]
+
+    result = Synapsis.Utils.register_external_files(records, project, STORAGE_LOCATION, bucket_name='bucket',
+                                                    workers=1, journal=journal)
+    failed = {r['key']: str(r['error']) for r in result['failed']}
+    assert sorted(failed) == ['a/old.txt', 'a/x_1.txt']
+    assert all('different object' in error for error in failed.values())
+    assert (result['registered'], result['exists']) == (1, 0)
+    x_1 = _children(fake_synapse, folder['id'])['x_1.txt']
+    assert fake_synapse.file_handles[x_1['dataFileHandleId']]['key'] == 'a/x=1.txt'
+
+    # The failed keys are not in the journal.
+    result = Synapsis.Utils.register_external_files(records, project, STORAGE_LOCATION, bucket_name='bucket',
+                                                    workers=1, journal=journal)
+    assert (result['skipped'], len(result['failed'])) == (1, 2)
+
+
+def test_it_lists_each_existing_folder_once(fake_synapse, project, mocker):
+    for i in range(3):
+        fake_synapse.create_folder('f{0}'.format(i), project)
+    records = [('f{0}/{1}.txt'.format(i, j), 1, None) for i in range(3) for j in range(4)]
+    mocker.patch('synapsis.core.external_files.ExternalFileRegistrar.FOLDER_INDEX_CACHE_SIZE', 2)
+    listings = fake_synapse.count_requests('POST', r'/entity/children')
+
+    result = Synapsis.Utils.register_external_files(records, project, STORAGE_LOCATION, workers=4)
+    assert result['registered'] == 12
+    # The Project and each Folder are listed once when the keys are in order.
+    assert fake_synapse.count_requests('POST', r'/entity/children') == listings + 4
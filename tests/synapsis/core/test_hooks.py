@@ -1,4 +1,6 @@
 import pytest
+import asyncio
+import threading
 from synapsis.core.hooks import Hooks
 from synapsis import Synapsis
 
@@ -37,3 +39,238 @@ def test_it_calls_a_hook():
     hooks.after_login(lambda hook: callbacks.append(2))
     hooks.__call_hook__(hooks.AFTER_LOGIN)
     assert callbacks == [1, 2]
+
+
+@pytest.mark.fake_synapse
+def test_it_raises_on_invalid_hooks():
+    hooks = Hooks()
+    with pytest.raises(ValueError):
+        hooks.__add_hook__('NOPE', lambda hook: True)
+
+
+@pytest.mark.fake_synapse
+def test_it_removes_a_hook():
+    hooks = Hooks()
+
+    def callback(hook, request): pass
+
+    hooks.after_request(callback)
+    assert hooks.has_hook(*Hooks.REQUEST_HOOKS)
+    assert not hooks.has_hook(Hooks.AFTER_LOGIN, Hooks.ON_RETRY)
+    hooks.remove(Hooks.AFTER_REQUEST, callback)
+    assert not hooks.has_hook(*Hooks.REQUEST_HOOKS)
+    assert len(hooks.__hooks__) == 0
+
+
+@pytest.mark.fake_synapse
+def test_it_calls_a_hook_with_kwargs():
+    hooks = Hooks()
+    events = []
+    hooks.before_request(lambda hook, request: events.append((hook, request)))
+    hooks.__call_hook__(hooks.BEFORE_REQUEST, request='req')
+    assert events == [(hooks.BEFORE_REQUEST, 'req')]
+
+
+@pytest.fixture
+def request_events():
+    events = []
+
+    def callback(hook, request):
+        events.append((hook, request.method, request.uri, request.status, request.attempt, request.helper))
+
+    for hook in Hooks.REQUEST_HOOKS:
+        Synapsis.hooks.__add_hook__(hook, callback)
+    yield events
+    for hook in Hooks.REQUEST_HOOKS:
+        Synapsis.hooks.remove(hook, callback)
+
+
+@pytest.mark.fake_synapse
+def test_it_calls_the_request_hooks(fake_synapse, request_events):
+    project = fake_synapse.create_project()
+    captured = []
+
+    def capture(hook, request):
+        captured.append(request)
+
+    Synapsis.hooks.after_request(capture)
+    try:
+        Synapsis.Utils.get_synapse_path(project['id'])
+    finally:
+        Synapsis.hooks.remove(Hooks.AFTER_REQUEST, capture)
+
+    uri = '{0}/entity/{1}/path'.format(Synapsis.Synapse.repoEndpoint, project['id'])
+    helper = 'SynapsisUtils.get_synapse_path'
+    assert request_events == [
+        (Hooks.BEFORE_REQUEST, 'GET', uri, None, 1, helper),
+        (Hooks.AFTER_REQUEST, 'GET', uri, 200, 1, helper)
+    ]
+    event = captured[0]
+    assert event.endpoint == Synapsis.Synapse.repoEndpoint
+    assert event.latency > 0
+    assert event.request_bytes == 0
+    assert event.response_bytes > 0
+
+    # Nested helpers are attributed to the outermost helper and direct calls are not attributed.
+    request_events.clear()
+    Synapsis.Utils.is_synapse_id(project['id'], exists=True)
+    list(Synapsis.getChildren(project['id']))
+    assert [e[5] for e in request_events] == ['SynapsisUtils.is_synapse_id'] * 2 + [None] * 2
+
+
+@pytest.mark.fake_synapse
+def test_it_calls_the_retry_hook(fake_synapse, request_events):
+    project = fake_synapse.create_project()
+    fake_synapse.inject_error(503, path=r'/path$', method='GET')
+    Synapsis.Utils.get_synapse_path(project['id'])
+    assert [(e[0], e[3], e[4]) for e in request_events] == [
+        (Hooks.BEFORE_REQUEST, None, 1),
+        (Hooks.ON_RETRY, 503, 2),
+        (Hooks.AFTER_REQUEST, 200, 2)
+    ]
+
+
+@pytest.mark.fake_synapse
+def test_it_calls_the_after_request_hook_on_errors(fake_synapse, request_events):
+    fake_synapse.inject_error(404, path=r'/path$', method='GET')
+    with pytest.raises(Exception):
+        Synapsis.Utils.get_synapse_path('syn123')
+    assert request_events[-1][0] == Hooks.AFTER_REQUEST
+    assert request_events[-1][3] == 404
+
+
+@pytest.mark.fake_synapse
+def test_it_isolates_and_times_hook_errors():
+    hooks = Hooks()
+    callbacks = []
+
+    def fails(hook):
+        raise Exception('hook error')
+
+    hooks.after_login(fails, dispatch=Hooks.BACKGROUND)
+    hooks.after_login(lambda hook: callbacks.append(hook))
+    hooks.__call_hook__(hooks.AFTER_LOGIN)
+    hooks.__call_hook__(hooks.AFTER_LOGIN)
+    assert hooks.wait(timeout=5)
+    assert callbacks == [hooks.AFTER_LOGIN, hooks.AFTER_LOGIN]
+
+    stats = hooks.stats[hooks.AFTER_LOGIN]
+    assert stats[fails.__qualname__]['calls'] == 2
+    assert stats[fails.__qualname__]['errors'] == 2
+    assert stats[fails.__qualname__]['total_s'] >= stats[fails.__qualname__]['max_s'] > 0
+    hooks.reset_stats()
+    assert hooks.stats == {}
+
+
+@pytest.mark.fake_synapse
+def test_it_raises_the_errors_of_inline_hooks():
+    hooks = Hooks()
+    callbacks = []
+
+    def fails(hook):
+        raise ValueError('hook error')
+
+    async def fails_async(hook):
+        raise KeyError('async hook error')
+
+    hooks.after_login(fails)
+    hooks.after_login(lambda hook: callbacks.append(hook))
+    with pytest.raises(ValueError, match='hook error'):
+        hooks.__call_hook__(hooks.AFTER_LOGIN)
+    # The hooks after the one that failed are not called.
+    assert callbacks == []
+    assert hooks.stats[hooks.AFTER_LOGIN][fails.__qualname__]['errors'] == 1
+
+    hooks.clear()
+    hooks.after_login(fails_async)
+    with pytest.raises(KeyError, match='async hook error'):
+        hooks.__call_hook__(hooks.AFTER_LOGIN)
+    assert hooks.stats[hooks.AFTER_LOGIN][fails_async.__qualname__]['errors'] == 1
+
+
+@pytest.mark.fake_synapse
+def test_it_calls_coroutine_hooks_inline():
+    hooks = Hooks()
+    callbacks = []
+
+    async def callback(hook):
+        await asyncio.sleep(0)
+        callbacks.append(hook)
+
+    hooks.after_login(callback)
+    hooks.__call_hook__(hooks.AFTER_LOGIN)
+    assert callbacks == [hooks.AFTER_LOGIN]
+
+    with pytest.raises(ValueError):
+        hooks.after_login(callback, dispatch='NOPE')
+
+
+@pytest.mark.fake_synapse
+def test_it_calls_hooks_in_the_background():
+    hooks = Hooks()
+    started = threading.Event()
+    release = threading.Event()
+    threads = []
+
+    def slow(hook):
+        started.set()
+        release.wait(5)
+        threads.append(threading.current_thread().name)
+
+    async def slow_async(hook):
+        threads.append(threading.current_thread().name)
+
+    hooks.after_login(slow, dispatch=Hooks.BACKGROUND)
+    hooks.after_login(slow_async, dispatch=Hooks.BACKGROUND)
+    hooks.__call_hook__(hooks.AFTER_LOGIN)
+    # Does not block the caller.
+    assert started.wait(5)
+    assert not hooks.wait(timeout=0.01)
+    release.set()
+    assert hooks.wait(timeout=5)
+    assert len(threads) == 2
+    assert all(name.startswith('synapsis-hooks') for name in threads)
+    hooks.shutdown()
+
+
+@pytest.mark.fake_synapse
+async def test_it_schedules_hooks_on_the_running_loop(fake_synapse):
+    loop = asyncio.get_running_loop()
+    calls = []
+
+    async def callback(hook):
+        calls.append((hook, asyncio.get_running_loop(), threading.current_thread()))
+
+    Synapsis.hooks.after_login(callback, dispatch=Hooks.LOOP)
+    try:
+        await Synapsis.Chain.configure(synapse_args=fake_synapse.synapse_args,
+                                       authToken=fake_synapse.auth_token).login()
+        for _ in range(100):
+            if calls:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        Synapsis.hooks.remove(Hooks.AFTER_LOGIN, callback)
+
+    assert calls == [(Hooks.AFTER_LOGIN, loop, threading.current_thread())]
+
+
+@pytest.mark.fake_synapse
+async def test_it_waits_for_the_hooks_on_the_loop():
+    hooks = Hooks()
+    calls = []
+
+    def callback(hook):
+        calls.append(hook)
+
+    async def callback_async(hook):
+        await asyncio.sleep(0.01)
+        calls.append(hook)
+
+    hooks.after_login(callback, dispatch=Hooks.LOOP)
+    hooks.after_login(callback_async, dispatch=Hooks.LOOP)
+    hooks.__call_hook__(hooks.AFTER_LOGIN)
+    # The hooks have not run since the loop has not been yielded to.
+    assert not await asyncio.to_thread(hooks.wait, 0)
+    assert await asyncio.to_thread(hooks.wait, 5)
+    assert calls == [hooks.AFTER_LOGIN, hooks.AFTER_LOGIN]
@@ -0,0 +1,68 @@
+import asyncio
+import time
+import pytest
+from synapseclient.core.exceptions import SynapseHTTPError
+from synapsis import Synapsis
+from synapsis.core.async_job import AsyncJob
+from synapsis.core.exceptions import SynapsisError
+from synapsis.core.job_scheduler import JobScheduler
+
+pytestmark = pytest.mark.fake_synapse
+
+
+@pytest.fixture
+def scope_request(fake_synapse):
+    project = fake_synapse.create_project()
+    yield {'concreteType': 'org.sagebionetworks.repo.model.table.ViewColumnModelRequest',
+           'viewScope': {'scope': [project['id']], 'viewEntityType': 'entityview', 'viewTypeMask': 1}}
+
+
+@pytest.fixture
+def scheduler():
+    AsyncJob.__durations__.clear()
+    scheduler = JobScheduler(max_poll_rate=20, poll_workers=4)
+    yield scheduler
+    scheduler.close()
+
+
+def test_it_polls_many_jobs_at_a_bounded_rate(fake_synapse, scope_request, scheduler):
+    fake_synapse.job_duration = 0.5
+    jobs = [AsyncJob(Synapsis.Synapse, '/column/view/scope', scope_request).start() for _ in range(40)]
+    started = time.monotonic()
+    futures = [scheduler.submit(job) for job in jobs]
+    assert all(future.result()['results'] == [] for future in futures)
+    elapsed = time.monotonic() - started
+    stats = scheduler.stats
+    assert stats['finished'] == 40
+    assert stats['pending'] == 0
+    # Every job is polled at least once, and no more than the rate (and the burst) allows.
+    assert 40 <= stats['polls'] <= 20 * elapsed + 4
+    assert sum(job.polls for job in jobs) == stats['polls']
+
+
+def test_it_resolves_failures_timeouts_and_cancellations(fake_synapse, scope_request, scheduler):
+    failed = scheduler.submit(AsyncJob(Synapsis.Synapse, '/entity/syn0/table/query',
+                                       {'query': {'sql': 'SELECT * FROM syn0'}}).start())
+    with pytest.raises(SynapseHTTPError):
+        failed.result()
+
+    fake_synapse.job_duration = 5
+    timed_out = scheduler.submit(AsyncJob(Synapsis.Synapse, '/column/view/scope', scope_request, timeout=0.2))
+    with pytest.raises(SynapsisError, match='Timed out'):
+        timed_out.result()
+
+    cancelled = scheduler.submit(AsyncJob(Synapsis.Synapse, '/column/view/scope', scope_request))
+    assert cancelled.cancel()
+    scheduler.close()
+    with pytest.raises(SynapsisError, match='closed'):
+        scheduler.submit(AsyncJob(Synapsis.Synapse, '/column/view/scope', scope_request))
+
+
+def test_it_waits_without_blocking_the_event_loop(fake_synapse, scope_request, scheduler):
+    fake_synapse.job_duration = 0.2
+
+    async def _wait():
+        jobs = [AsyncJob(Synapsis.Synapse, '/column/view/scope', scope_request) for _ in range(3)]
+        return await asyncio.gather(*(scheduler.wait_async(job) for job in jobs))
+
+    assert [response['results'] for response in asyncio.run(_wait())] == [[], [], []]
@@ -0,0 +1,47 @@
+import pytest
+from synapsis.core.exceptions import SynapsisError
+from synapsis.core.journal import Journal
+
+pytestmark = pytest.mark.fake_synapse
+
+
+def test_it_skips_the_keys_in_the_file(tmp_path):
+    path = str(tmp_path / 'journal.txt')
+    journal = Journal(path)
+    journal.add('syn1')
+    journal.add('syn1')
+    journal.close()
+
+    journal = Journal(path, read_only=True)
+    assert 'syn1' in journal
+    assert list(journal) == ['syn1']
+
+
+def test_it_checks_the_header(tmp_path):
+    path = str(tmp_path / 'journal.txt')
+    journal = Journal(path, header={'table': 'syn1'})
+    journal.add('0')
+    journal.close()
+
+    assert list(Journal(path, header={'table': 'syn1'}, read_only=True)) == ['0']
+    with pytest.raises(SynapsisError, match='different run'):
+        Journal(path, header={'table': 'syn2'})
+
+
+def test_it_does_not_add_a_header_to_a_journal_without_one(tmp_path):
+    path = tmp_path / 'journal.txt'
+    path.write_text('0\n')
+    with pytest.raises(SynapsisError, match='no header'):
+        Journal(str(path), header={'table': 'syn1'})
+
+
+def test_it_does_not_keep_the_added_keys(tmp_path):
+    path = str(tmp_path / 'journal.txt')
+    journal = Journal(path, keep_added=False)
+    journal.add('a')
+    journal.add('b')
+    assert 'a' not in journal
+    assert len(journal) == 2
+    journal.close()
+
+    assert set(Journal(path, read_only=True)) == {'a', 'b'}
@@ -0,0 +1,112 @@
+import csv
+import pytest
+from synapseclient.core.exceptions import SynapseHTTPError
+from synapsis import Synapsis
+from synapsis.core import MembershipIndex
+from synapsis.core import permission_audit
+from synapsis.core.exceptions import SynapsisError
+
+pytestmark = pytest.mark.fake_synapse
+
+
+@pytest.fixture
+def tree(fake_synapse):
+    fake_synapse.page_size = 2
+    user = fake_synapse.create_user('audit-user')
+    other_user = fake_synapse.create_user('audit-other')
+    team = fake_synapse.create_team('audit-team')
+    fake_synapse.add_team_member(team, user)
+
+    project = fake_synapse.create_project()
+    shared = fake_synapse.create_folder('shared', project)
+    fake_synapse.set_acl(shared, [{'principalId': team['id'], 'accessType': ['READ', 'DOWNLOAD']},
+                                  {'principalId': 273949, 'accessType': ['READ']}])
+    sub = fake_synapse.create_folder('sub', shared)
+    private = fake_synapse.create_folder('private', project)
+    files = [fake_synapse.create_file('file-{0}.txt'.format(i), parent, content=b'x')
+             for i, parent in enumerate([project, shared, sub, sub, private])]
+    yield {'user': user, 'other_user': other_user, 'team': team, 'project': project, 'shared': shared, 'sub': sub,
+           'private': private, 'files': files}
+    fake_synapse.page_size = 50
+
+
+def read_csv(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def test_it_writes_the_permission_matrix(fake_synapse, tree, tmp_path):
+    path = str(tmp_path / 'audit.csv')
+    user, other_user, team = tree['user'], tree['other_user'], tree['team']
+    acl_requests = fake_synapse.count_requests('GET', r'/acl$')
+
+    result = Synapsis.Utils.audit_permissions(tree['project']['id'],
+                                              [fake_synapse.user_id, 'audit-user', other_user['ownerId'], team['id']],
+                                              path)
+    assert fake_synapse.count_requests('GET', r'/acl$') == acl_requests + 2
+    assert result['entities'] == 9
+    assert result['benefactors'] == 2
+    assert result['format'] == 'csv'
+    assert [p['id'] for p in result['principals']] == [int(fake_synapse.user_id), int(user['ownerId']),
+                                                       int(other_user['ownerId']), int(team['id'])]
+    assert [p['is_team'] for p in result['principals']] == [False, False, False, True]
+
+    rows = {row['id']: row for row in read_csv(path)}
+    assert len(rows) == 9
+    assert set(rows) == {tree[key]['id'] for key in ['project', 'shared', 'sub', 'private']} | \
+           {f['id'] for f in tree['files']}
+
+    def row_of(key):
+        return rows[key if key.startswith('syn') else tree[key]['id']]
+
+    def permissions(key):
+        return [row_of(key)[str(p['id'])] for p in result['principals']]
+
+    for key in ['project', 'private', tree['files'][0]['id'], tree['files'][4]['id']]:
+        assert permissions(key) == ['ADMIN', 'NO_PERMISSION', 'NO_PERMISSION', 'NO_PERMISSION']
+        assert row_of(key)['benefactor_id'] == tree['project']['id']
+    for key in ['shared', 'sub', tree['files'][1]['id'], tree['files'][2]['id']]:
+        # The default user is in the team (as its creator).
+        assert permissions(key) == ['CAN_DOWNLOAD', 'CAN_DOWNLOAD', 'CAN_VIEW', 'CAN_DOWNLOAD']
+        assert row_of(key)['benefactor_id'] == tree['shared']['id']
+    assert rows[tree['sub']['id']]['parent_id'] == tree['shared']['id']
+    assert rows[tree['sub']['id']]['name'] == 'sub'
+
+
+def test_it_expands_teams(fake_synapse, tree, tmp_path):
+    path = str(tmp_path / 'audit.csv')
+    index = MembershipIndex(Synapsis.Synapse)
+    result = Synapsis.Utils.audit_permissions(tree['shared']['id'], [tree['team']['id']], path,
+                                              expand_teams=True, membership_index=index)
+    assert [p['id'] for p in result['principals']] == [int(fake_synapse.user_id), int(tree['user']['ownerId'])]
+    assert result['entities'] == 5
+    assert {row[str(fake_synapse.user_id)] for row in read_csv(path)} == {'CAN_DOWNLOAD'}
+
+    # The memberships are cached.
+    requests = fake_synapse.count_requests('GET', r'/(team|teamMembers|user/\d+/team)')
+    Synapsis.Utils.audit_permissions(tree['shared']['id'], [tree['team']['id']], path,
+                                     expand_teams=True, membership_index=index)
+    assert fake_synapse.count_requests('GET', r'/(team|teamMembers|user/\d+/team)') == requests
+
+
+def test_it_audits_a_file(fake_synapse, tree, tmp_path):
+    path = str(tmp_path / 'audit.csv')
+    result = Synapsis.Utils.audit_permissions(tree['files'][2]['id'], [tree['other_user']['ownerId']], path)
+    assert result['entities'] == 1
+    assert read_csv(path)[0][tree['other_user']['ownerId']] == 'CAN_VIEW'
+
+
+def test_it_raises_listing_errors(fake_synapse, tree, tmp_path):
+    fake_synapse.inject_error(403, path=r'/entity/children', times=100)
+    with pytest.raises(SynapseHTTPError):
+        Synapsis.Utils.audit_permissions(tree['project']['id'], [fake_synapse.user_id], str(tmp_path / 'a.csv'),
+                                         list_workers=2)
+
+
+def test_it_validates_the_format(fake_synapse, tree, tmp_path, monkeypatch):
+    with pytest.raises(ValueError):
+        Synapsis.Utils.audit_permissions(tree['project']['id'], [fake_synapse.user_id], str(tmp_path / 'a.txt'),
+                                         format='xlsx')
+    monkeypatch.setattr(permission_audit, 'pyarrow', None)
+    with pytest.raises(SynapsisError, match='pyarrow'):
+        Synapsis.Utils.audit_permissions(tree['project']['id'], [fake_synapse.user_id], str(tmp_path / 'a.parquet'))
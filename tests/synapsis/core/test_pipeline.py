@@ -0,0 +1,60 @@
+import pytest
+import threading
+from synapsis.core.pipeline import Pipeline
+from synapsis.core.instrumentation import helper, current_helper
+
+pytestmark = pytest.mark.fake_synapse
+
+
+def test_it_runs_items_through_the_stages():
+    progress = {}
+    batches = []
+
+    def record(stage, count):
+        progress[stage] = max(progress.get(stage, 0), count)
+
+    def batch(items):
+        batches.append(len(items))
+        return [i * 10 for i in items]
+
+    results = Pipeline(queue_size=2, progress=record) \
+        .stage('add', lambda i: i + 1, workers=3) \
+        .stage('drop', lambda i: None if i % 2 else i, workers=2) \
+        .stage('batch', batch, batch_size=4) \
+        .run(range(20))
+
+    assert sorted(results) == [i * 10 for i in range(2, 21, 2)]
+    assert all(size <= 4 for size in batches)
+    assert progress == {'source': 20, 'add': 20, 'drop': 20, 'batch': 10}
+
+
+def test_it_handles_errors():
+    def fail(item):
+        if item == 3:
+            raise ValueError(item)
+        return item
+
+    failed = []
+    results = Pipeline(on_error=lambda stage, item, ex: failed.append((stage, item, str(ex)))) \
+        .stage('fail', fail, workers=2) \
+        .run(range(5))
+    assert sorted(results) == [0, 1, 2, 4]
+    assert failed == [('fail', 3, '3')]
+
+    with pytest.raises(ValueError):
+        Pipeline(queue_size=1).stage('fail', fail, workers=2).stage('next', lambda i: i).run(range(100))
+
+
+def test_it_runs_the_stages_in_the_callers_context():
+    names = set()
+
+    def record(item):
+        names.add((current_helper(), threading.current_thread().name.startswith('synapsis-record')))
+        return item
+
+    @helper
+    def run():
+        return Pipeline().stage('record', record, workers=2).run(range(10))
+
+    assert len(run()) == 10
+    assert names == {(run.__wrapped__.__qualname__, True)}
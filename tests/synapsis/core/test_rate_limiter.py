@@ -0,0 +1,107 @@
+import email.utils
+import threading
+import time
+import pytest
+from synapsis import Synapsis
+from synapsis.core.rate_limiter import RateLimiter
+
+pytestmark = pytest.mark.fake_synapse
+
+
+def timed(func, *args):
+    start = time.monotonic()
+    func(*args)
+    return time.monotonic() - start
+
+
+def test_it_does_not_limit_until_throttled():
+    limiter = RateLimiter()
+    assert limiter.rate is None
+    assert timed(lambda: [limiter.acquire() for _ in range(1000)]) < 0.5
+    assert limiter.stats['acquired'] == 1000
+    assert limiter.stats['waited_s'] == 0
+
+
+def test_it_limits_the_rate():
+    limiter = RateLimiter(rate=100, burst=1)
+    assert timed(lambda: [limiter.acquire() for _ in range(11)]) >= 0.09
+
+    limiter = RateLimiter(rate=10, burst=5)
+    assert timed(lambda: [limiter.acquire() for _ in range(5)]) < 0.05
+    assert 0.05 < limiter.acquire() <= 0.1
+
+
+def test_it_adapts_the_rate():
+    limiter = RateLimiter(rate=10, increase=1, cooldown=10)
+    limiter.observe(429)
+    limiter.observe(503)
+    assert limiter.rate == 5
+    assert limiter.stats['throttled'] == 2
+    assert limiter.stats['decreases'] == 1
+
+    for _ in range(5):
+        limiter.observe(200)
+    assert limiter.rate == pytest.approx(6, abs=0.1)
+    limiter.observe(500)
+    assert limiter.rate == pytest.approx(6, abs=0.1)
+
+    limiter = RateLimiter(rate=2, min_rate=1.5, max_rate=2.5, cooldown=0)
+    limiter.throttled()
+    limiter.throttled()
+    assert limiter.rate == 1.5
+    for _ in range(100):
+        limiter.succeeded()
+    assert limiter.rate == 2.5
+
+    limiter = RateLimiter(min_rate=3)
+    limiter.acquire()
+    limiter.throttled()
+    assert limiter.rate >= 3
+    limiter.reset()
+    assert limiter.rate is None
+
+
+def test_it_pauses_for_retry_after():
+    limiter = RateLimiter()
+    limiter.throttled(retry_after='0.2')
+    assert limiter.stats['paused_s'] > 0.1
+
+    waits = []
+    threads = [threading.Thread(target=lambda: waits.append(limiter.acquire())) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while limiter.stats['waiting'] < 3 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert limiter.stats['waiting'] == 3
+    for thread in threads:
+        thread.join()
+    assert min(waits) >= 0.15
+    assert limiter.stats['waiting'] == 0
+
+
+def test_parse_retry_after():
+    assert RateLimiter.parse_retry_after('5') == 5
+    assert RateLimiter.parse_retry_after(1.5) == 1.5
+    assert RateLimiter.parse_retry_after(None) is None
+    assert RateLimiter.parse_retry_after('nope') is None
+    retry_at = email.utils.formatdate(time.time() + 30, usegmt=True)
+    assert 25 < RateLimiter.parse_retry_after(retry_at) <= 30
+
+
+def test_it_throttles_all_rest_calls(fake_synapse):
+    project = fake_synapse.create_project()
+    limiter = Synapsis.Synapse.rate_limiter
+    assert limiter is RateLimiter.shared()
+    fake_synapse.inject_error(429, path=r'/path$', method='GET', headers={'Retry-After': '1.6'})
+
+    thread = threading.Thread(target=Synapsis.Utils.get_synapse_path, args=(project['id'],))
+    thread.start()
+    deadline = time.monotonic() + 5
+    while limiter.stats['throttled'] == 0 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    # Other calls wait for the Retry-After.
+    assert timed(Synapsis.Utils.get_bundle, project['id']) >= 1.4
+    thread.join()
+    assert limiter.rate is not None
+    assert fake_synapse.count_requests('GET', r'/path$') == 2
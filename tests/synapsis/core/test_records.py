@@ -0,0 +1,97 @@
+import pickle
+import sys
+import pytest
+from synapsis.core.records import Record, EntityHeader, FileHandle, FileHandleResult, Bundle, TeamMember, \
+    UserGroupHeader, ResourceAccess, convert
+
+pytestmark = pytest.mark.fake_synapse
+
+FILE_HANDLE = {
+    'id': '123',
+    'etag': 'abc',
+    'concreteType': 'org.sagebionetworks.repo.model.file.S3FileHandle',
+    'contentType': 'text/plain',
+    'contentMd5': 'd41d8cd98f00b204e9800998ecf8427e',
+    'contentSize': 10,
+    'fileName': 'file.txt',
+    'status': 'AVAILABLE',
+    'isPreview': False,
+    'storageLocationId': 1,
+    'bucketName': 'bucket',
+    'key': 'a/b/file.txt',
+    'createdBy': '1',
+    'createdOn': '2024-01-01T00:00:00.000Z',
+    'previewId': '124',
+    'externalURL': None
+}
+
+
+def test_it_reads_like_the_json():
+    file_handle = FileHandle.from_json(FILE_HANDLE)
+    assert file_handle.id == '123'
+    assert file_handle.content_md5 == FILE_HANDLE['contentMd5']
+    assert file_handle['contentSize'] == 10
+    assert file_handle.get('previewId') == '124'
+    assert file_handle.get('nope', 'default') == 'default'
+    assert 'previewId' in file_handle
+    assert 'nope' not in file_handle
+    with pytest.raises(KeyError):
+        file_handle['nope']
+    assert file_handle.extra == {'previewId': '124', 'externalURL': None}
+    assert file_handle.to_dict() == FILE_HANDLE
+    assert FileHandle.from_json(FILE_HANDLE) == file_handle
+    assert pickle.loads(pickle.dumps(file_handle)) == file_handle
+    with pytest.raises(AttributeError):
+        file_handle.nope = 1
+
+
+def test_it_interns_repeated_strings():
+    a = FileHandle.from_json(dict(FILE_HANDLE, concreteType=''.join(['org.', FILE_HANDLE['concreteType'][4:]])))
+    b = FileHandle.from_json(FILE_HANDLE)
+    assert a.concrete_type is b.concrete_type
+    access = ResourceAccess.from_json({'principalId': 1, 'accessType': ['READ', 'DOWNLOAD']})
+    assert access.access_type == ('READ', 'DOWNLOAD')
+    assert access.to_dict() == {'principalId': 1, 'accessType': ['READ', 'DOWNLOAD']}
+
+
+def test_it_converts_nested_records():
+    result = FileHandleResult.from_json({'fileHandleId': '123', 'fileHandle': FILE_HANDLE, 'preSignedURL': 'url'})
+    assert isinstance(result.file_handle, FileHandle)
+    assert result.failure_code is None
+    assert result.to_dict() == {'fileHandleId': '123', 'fileHandle': FILE_HANDLE, 'preSignedURL': 'url'}
+
+    bundle = Bundle.from_json({'entity': {'id': 'syn1', 'dataFileHandleId': '123'},
+                               'fileHandles': [FILE_HANDLE],
+                               'accessControlList': {'id': 'syn1', 'resourceAccess': [
+                                   {'principalId': 1, 'accessType': ['READ']}]},
+                               'annotations': {'annotations': {}}})
+    assert bundle.file_handles[0].id == '123'
+    assert bundle.access_control_list.resource_access[0].access_type == ('READ',)
+    assert bundle['annotations'] == {'annotations': {}}
+
+    member = TeamMember.from_json({'teamId': '1', 'member': {'ownerId': '2', 'userName': 'user'}, 'isAdmin': False})
+    assert isinstance(member.member, UserGroupHeader)
+    assert member.get('member').get('ownerId') == '2'
+
+
+def test_it_uses_less_memory_than_dicts():
+    def deep_size(obj):
+        size = sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            size += sum(deep_size(v) for v in obj.values())
+        elif isinstance(obj, Record):
+            size += sum(deep_size(getattr(obj, attr)) for attr in obj.FIELDS) + deep_size(obj.__extra__)
+        return size
+
+    assert deep_size(FileHandle.from_json(FILE_HANDLE)) < deep_size(dict(FILE_HANDLE))
+
+
+def test_convert():
+    assert convert(FILE_HANDLE, dict) is FILE_HANDLE
+    assert convert(None, FileHandle) is None
+    file_handles = convert([FILE_HANDLE], FileHandle)
+    assert isinstance(file_handles[0], FileHandle)
+    assert convert(file_handles, FileHandle)[0] is file_handles[0]
+    assert convert({'id': 'syn1', 'name': 'a', 'concreteType': 'x'}, EntityHeader).type == 'x'
+    with pytest.raises(ValueError):
+        convert(FILE_HANDLE, list)
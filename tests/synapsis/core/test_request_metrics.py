@@ -0,0 +1,58 @@
+import pytest
+from synapsis import Synapsis
+from synapsis.core import RequestMetrics, RequestEvent
+
+
+def make_event(helper='helper', latency=0.02, status=200):
+    event = RequestEvent('GET', '/uri', 'endpoint', helper=helper, request_bytes=3)
+    event.status = status
+    event.latency = latency
+    event.response_bytes = 10
+    return event
+
+
+@pytest.mark.fake_synapse
+def test_it_records_requests():
+    metrics = RequestMetrics(buckets=[0.1, 0.01])
+    assert metrics.buckets == (0.01, 0.1)
+    metrics.record(make_event(latency=0.005))
+    metrics.record(make_event(latency=0.05))
+    metrics.record(make_event(latency=5, status=500))
+    metrics.record(make_event(helper=None))
+
+    exported = metrics.export()
+    assert exported['helper'] == {
+        'requests': 3,
+        'errors': 1,
+        'retries': 0,
+        'shared': 0,
+        'latency_s': pytest.approx(5.055),
+        'request_bytes': 9,
+        'response_bytes': 30,
+        'histogram': {'0.01': 1, '0.1': 2, 'inf': 3}
+    }
+    assert exported[RequestMetrics.NO_HELPER]['requests'] == 1
+
+    metrics.reset()
+    assert metrics.export() == {}
+
+
+@pytest.mark.fake_synapse
+def test_it_aggregates_the_request_hooks(fake_synapse):
+    project = fake_synapse.create_project()
+    fake_synapse.inject_error(503, path=r'/path$', method='GET')
+    metrics = RequestMetrics().install(Synapsis.hooks)
+    try:
+        Synapsis.Utils.get_synapse_path(project['id'])
+        Synapsis.Utils.get_bundle(project['id'])
+    finally:
+        metrics.uninstall(Synapsis.hooks)
+    Synapsis.Utils.get_bundle(project['id'])
+    assert not Synapsis.hooks.has_hook(*Synapsis.hooks.REQUEST_HOOKS)
+
+    exported = metrics.export()
+    assert set(exported.keys()) == {'SynapsisUtils.get_synapse_path', 'SynapsisUtils.get_bundle'}
+    assert exported['SynapsisUtils.get_synapse_path']['requests'] == 1
+    assert exported['SynapsisUtils.get_synapse_path']['retries'] == 1
+    assert exported['SynapsisUtils.get_bundle']['requests'] == 1
+    assert exported['SynapsisUtils.get_bundle']['histogram']['inf'] == 1
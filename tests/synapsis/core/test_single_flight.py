@@ -0,0 +1,97 @@
+import threading
+import time
+import pytest
+from synapsis.core.single_flight import SingleFlight
+
+pytestmark = pytest.mark.fake_synapse
+
+
+def run_concurrently(count, func):
+    results = [None] * count
+    errors = [None] * count
+
+    def _run(index):
+        try:
+            results[index] = func()
+        except Exception as ex:
+            errors[index] = ex
+
+    threads = [threading.Thread(target=_run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_it_shares_the_call():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def _call():
+        calls.append(1)
+        release.wait()
+        return object()
+
+    threads, results, errors = run_concurrently(5, lambda: single_flight.do('key', _call))
+    wait_until(lambda: single_flight.stats['shared'] == 4)
+    assert single_flight.stats['in_flight'] == 1
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(r is results[0] for r in results)
+    assert single_flight.stats == {'calls': 1, 'shared': 4, 'in_flight': 0}
+
+    # Calls after the first one returns are run again.
+    single_flight.do('key', _call)
+    assert len(calls) == 2
+    single_flight.reset_stats()
+    assert single_flight.stats == {'calls': 0, 'shared': 0, 'in_flight': 0}
+
+
+def test_it_shares_the_error():
+    single_flight = SingleFlight()
+    release = threading.Event()
+
+    def _call():
+        release.wait()
+        raise ValueError('failed')
+
+    threads, results, errors = run_concurrently(3, lambda: single_flight.do('key', _call))
+    wait_until(lambda: single_flight.stats['shared'] == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert all(isinstance(e, ValueError) and str(e) == 'failed' for e in errors)
+    # Each caller raises its own exception.
+    assert len({id(e) for e in errors}) == 3
+
+
+def test_invalidate_starts_a_new_call():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def _call():
+        calls.append(1)
+        release.wait()
+        return len(calls)
+
+    threads, results, _ = run_concurrently(1, lambda: single_flight.do('key', _call))
+    wait_until(lambda: calls)
+    single_flight.invalidate()
+    more_threads, more_results, _ = run_concurrently(1, lambda: single_flight.do('key', _call))
+    wait_until(lambda: len(calls) == 2)
+    release.set()
+    for thread in threads + more_threads:
+        thread.join()
+    assert single_flight.stats['calls'] == 2
+    assert single_flight.stats['in_flight'] == 0
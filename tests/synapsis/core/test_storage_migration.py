@@ -0,0 +1,69 @@
+import pytest
+from synapsis import Synapsis
+from synapsis.core.exceptions import SynapsisError
+
+pytestmark = pytest.mark.fake_synapse
+
+DEST: int = 2
+
+
+@pytest.fixture
+def files(fake_synapse):
+    project = fake_synapse.create_project()
+    files = [fake_synapse.create_file('file-{0}.txt'.format(i), project, content=b'abcdefghij'[:i * 4 + 1])
+             for i in range(3)]
+    # Already in the destination.
+    fake_synapse.file_handles[files[2]['dataFileHandleId']]['storageLocationId'] = DEST
+    yield files
+
+
+def test_it_moves_the_files_without_downloading_them(fake_synapse, files):
+    downloads = fake_synapse.count_requests('GET', r'/fake/file/')
+    copies = fake_synapse.count_requests('PUT', r'/fake/copy/')
+    results = Synapsis.Utils.migrate_storage(files, DEST, part_size=2)
+    assert [r['status'] for r in results] == ['migrated', 'migrated', 'unchanged']
+    # 1 part + 3 parts, copied by the storage service.
+    assert fake_synapse.count_requests('PUT', r'/fake/copy/') == copies + 4
+    assert fake_synapse.count_requests('GET', r'/fake/file/') == downloads
+
+    for file, result in zip(files[:2], results):
+        entity = fake_synapse.entities[file['id']]
+        assert entity['dataFileHandleId'] == result['new_file_handle_id']
+        assert entity['versionNumber'] == result['version'] == 2
+        new_file_handle = fake_synapse.file_handles[result['new_file_handle_id']]
+        assert new_file_handle['storageLocationId'] == DEST
+        assert new_file_handle['fileName'] == file['name']
+        assert fake_synapse.file_contents[result['new_file_handle_id']] == \
+               fake_synapse.file_contents[file['dataFileHandleId']]
+    assert fake_synapse.entities[files[2]['id']]['dataFileHandleId'] == files[2]['dataFileHandleId']
+
+
+def test_it_resumes_from_the_journal(fake_synapse, files, tmp_path):
+    journal = str(tmp_path / 'journal.txt')
+    folder = fake_synapse.create_folder('folder', files[0]['parentId'])
+    results = Synapsis.Utils.migrate_storage([files[0], folder, 'syn0'], DEST, journal=journal)
+    assert [r['status'] for r in results] == ['migrated', 'failed', 'failed']
+    assert 'Not a File' in str(results[1]['error'])
+
+    results = Synapsis.Utils.migrate_storage(files, DEST, journal=journal)
+    assert [r['status'] for r in results] == ['skipped', 'migrated', 'unchanged']
+    assert fake_synapse.entities[files[0]['id']]['versionNumber'] == 2
+
+    with pytest.raises(SynapsisError, match='different run'):
+        Synapsis.Utils.migrate_storage(files, DEST + 1, journal=journal)
+
+
+def test_it_retries_conflicts(fake_synapse, files):
+    fake_synapse.inject_error(412, path=r'/entity/{0}$'.format(files[0]['id']), method='PUT')
+    results = Synapsis.Utils.migrate_storage(files[:1], DEST)
+    assert results[0]['status'] == 'migrated'
+
+    # A file that is changed after it is read is not replaced.
+    def _change_after_read(stage, count):
+        if stage == 'read':
+            fake_synapse.create_file_version(files[1], content=b'changed')
+
+    results = Synapsis.Utils.migrate_storage(files[1:2], DEST, progress=_change_after_read)
+    assert results[0]['status'] == 'failed'
+    assert 'changed while' in str(results[0]['error'])
+    assert fake_synapse.file_contents[fake_synapse.entities[files[1]['id']]['dataFileHandleId']] == b'changed'
@@ -286,3 +286,48 @@ def test_is_synapse_id():
 def test_id_of():
     assert Synapsis.id_of('syn123') == 'syn123'
     assert Synapsis.id_of(synapseclient.Project(id='syn123')) == 'syn123'
+
+
+@pytest.mark.fake_synapse
+def test_it_caches_delegated_synapse_methods():
+    Synapsis.clear_delegates(reset_stats=True)
+    assert Synapsis.delegation_stats == {'lookups': 0, 'hits': 0, 'misses': 0, 'resolve_ns': 0}
+
+    method = Synapsis.getUserProfile
+    assert method.__self__ == Synapsis.Synapse
+    assert Synapsis.getUserProfile is method
+    stats = Synapsis.delegation_stats
+    assert stats['lookups'] == 2
+    assert stats['hits'] == 1
+    assert stats['misses'] == 1
+
+    # Data attributes are not cached.
+    assert Synapsis.credentials == Synapsis.Synapse.credentials
+    assert 'credentials' not in Synapsis.__delegates__
+
+    # Missing attributes are not cached.
+    with pytest.raises(AttributeError):
+        Synapsis.NOPE
+    assert 'NOPE' not in Synapsis.__delegates__
+
+    # Configuring invalidates the cache.
+    assert 'getUserProfile' in Synapsis.__delegates__
+    Synapsis.configure()
+    assert Synapsis.__delegates__ == {}
+
+
+@pytest.mark.fake_synapse
+def test_it_does_not_cache_patched_synapse_methods(mocker):
+    Synapsis.clear_delegates()
+    method = Synapsis.restGET
+    assert Synapsis.restGET is method
+
+    patched = mocker.patch.object(Synapsis.Synapse, 'restGET')
+    assert Synapsis.restGET is patched
+    mocker.stopall()
+    assert Synapsis.restGET == method
+
+    patched = mocker.patch.object(type(Synapsis.Synapse), 'restGET')
+    assert Synapsis.restGET is patched
+    mocker.stopall()
+    assert Synapsis.restGET == method
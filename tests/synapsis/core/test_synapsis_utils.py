@@ -1,8 +1,13 @@
 import pytest
 import os
+import threading
+import time
 import synapseclient
 from synapsis import Synapsis
 from synapsis.core.exceptions import SynapsisError
+from synapsis.core.synapsis_utils import SynapsisUtils
+from synapsis.core.records import EntityHeader, Bundle, FileHandle, FileHandleResult, TeamMember, \
+    UserGroupHeader
 import synapseclient as syn
 
 
@@ -67,6 +72,31 @@ def test_sanitize_entity_name(synapse_test_helper):
     assert name == 'abc.)((.txt'
 
 
+@pytest.mark.fake_synapse
+def test_sanitize_entity_name_fast_path():
+    name, replaced = Synapsis.Utils.sanitize_entity_name('abc.)(%&^%$^(*&.txt', return_replaced=True)
+    assert name == 'abc.)(______(__.txt'
+    assert replaced == ['%', '&', '^', '$', '*']
+    assert Synapsis.Utils.sanitize_entity_name('abc%.txt', replace_char='--') == 'abc--.txt'
+    assert Synapsis.Utils.sanitize_entity_name('abc%.txt', replace_char='é') == 'abcé.txt'
+    assert Synapsis.Utils.sanitize_entity_name('café ﬁle ☃.txt', return_replaced=True) == ('cafe file .txt', [])
+    assert Synapsis.Utils.sanitize_entity_name('a/b\\c', return_replaced=True) == ('a_b_c', ['/', '\\'])
+    with pytest.raises(SynapsisError):
+        Synapsis.Utils.sanitize_entity_name('a' * 257)
+
+
+@pytest.mark.fake_synapse
+def test_sanitize_entity_name_many():
+    sanitized, collisions = Synapsis.Utils.sanitize_entity_name_many(['a%.txt', 'a&.txt', 'b.txt', 'a_.txt'])
+    assert sanitized == ['a_.txt', 'a_.txt', 'b.txt', 'a_.txt']
+    assert collisions == {(None, 'a_.txt'): ['a%.txt', 'a&.txt', 'a_.txt']}
+
+    sanitized, collisions = Synapsis.Utils.sanitize_entity_name_many(
+        [('syn1', 'a%.txt'), ('syn2', 'a&.txt'), ('syn1', 'a*.txt'), ('syn1', 'a%.txt')], replace_char='')
+    assert sanitized == ['a.txt', 'a.txt', 'a.txt', 'a.txt']
+    assert collisions == {('syn1', 'a.txt'): ['a%.txt', 'a*.txt']}
+
+
 async def test_find_entity(synapse_test_helper, syn_project, syn_folder, syn_file):
     for entity in [syn_project, syn_folder, syn_file]:
         items = [
@@ -86,6 +116,119 @@ async def test_find_entity(synapse_test_helper, syn_project, syn_folder, syn_fil
     assert len(file.files) == 0
 
 
+@pytest.mark.fake_synapse
+def test_find_entity_header_only(fake_synapse, mocker):
+    project = fake_synapse.create_project()
+    folder = fake_synapse.create_folder('folder', project)
+    file = fake_synapse.create_file('file.txt', folder, content=b'x')
+    get = mocker.spy(Synapsis.Synapse, 'get')
+
+    header = Synapsis.Utils.find_entity('file.txt', parent=folder, header_only=True)
+    assert isinstance(header, EntityHeader)
+    assert header.id == file['id']
+    assert header.name == 'file.txt'
+    assert header.type == file['concreteType']
+    assert header.etag == file['etag']
+    assert header.version_number == 1
+    assert header.parent_id == folder['id']
+    assert Synapsis.Utils.find_entity('nope', parent=folder, header_only=True) is None
+
+    headers = Synapsis.Utils.find_entities(['file.txt', 'nope'], parent=folder, header_only=True)
+    assert headers[0].id == file['id']
+    assert headers[0].etag is None
+    assert headers[1] is None
+
+    headers = Synapsis.Utils.get_entity_headers([file['id'], 'syn0', folder['id'], file['id']])
+    assert [h and h.id for h in headers] == [file['id'], None, folder['id'], file['id']]
+    assert headers[2].type == folder['concreteType']
+
+    assert Synapsis.Utils.get_project(file['id'], header_only=True).id == project['id']
+    assert [h.name for h in Synapsis.Utils.get_projects([file['id'], folder['id']], header_only=True)] == \
+           [project['name'], project['name']]
+    assert Synapsis.Utils.get_projects([file['id'], folder['id']], id_only=True) == [project['id'], project['id']]
+    assert get.call_count == 0
+
+    projects = Synapsis.Utils.get_projects([file['id'], folder['id']])
+    assert all(isinstance(p, syn.Project) and p.id == project['id'] for p in projects)
+    assert get.call_count == 1
+
+
+@pytest.mark.fake_synapse
+def test_record_type(fake_synapse):
+    project = fake_synapse.create_project()
+    file = fake_synapse.create_file('file.txt', project, content=b'x')
+
+    bundle = Synapsis.Utils.get_bundle(file['id'], include_file_handles=True, record_type=Bundle)
+    assert isinstance(bundle, Bundle)
+    assert bundle.entity['id'] == file['id']
+    file_handle = Synapsis.Utils.find_data_file_handle(bundle, record_type=FileHandle)
+    assert isinstance(file_handle, FileHandle)
+    assert file_handle == Synapsis.Utils.get_filehandle(file['id'], record_type=FileHandle)
+    assert file_handle.to_dict() == Synapsis.Utils.get_filehandle(file['id'])
+    assert file_handle.id == str(file['dataFileHandleId'])
+
+    results = Synapsis.Utils.get_filehandles([(file['id'], file['dataFileHandleId'])],
+                                             include_pre_signed_urls=True, record_type=FileHandleResult)
+    assert results[0].file_handle == file_handle
+    assert results[0].pre_signed_url
+
+    team = fake_synapse.create_team()
+    members = Synapsis.Utils.get_team_members(team['id'], record_type=TeamMember)
+    assert isinstance(members[0], TeamMember)
+    assert members[0].member.owner_id == fake_synapse.user_id
+    member = Synapsis.Utils.get_team_member(team['id'], fake_synapse.user_id, as_user_group_header=True,
+                                            record_type=TeamMember)
+    assert isinstance(member, UserGroupHeader)
+
+    with pytest.raises(ValueError):
+        Synapsis.Utils.get_bundle(file['id'], record_type=list)
+
+
+@pytest.mark.fake_synapse
+def test_get_version_bundles(fake_synapse, mocker):
+    project = fake_synapse.create_project()
+    file = fake_synapse.create_file('file.txt', project, content=b'v1')
+    fake_synapse.create_file_version(file, description='same file')
+    fake_synapse.create_file_version(file, content=b'v3')
+    fake_synapse.create_file_version(file, description='same file again')
+    fake_synapse.create_file_version(file, content=b'v5')
+
+    bundles = list(Synapsis.Utils.get_version_bundles(file['id'], max_workers=2))
+    assert [b['entity']['versionNumber'] for b in bundles] == [5, 4, 3, 2, 1]
+    # One page and the empty page that ends the listing.
+    assert fake_synapse.count_requests('GET', r'/entity/{0}/version$'.format(file['id'])) == 2
+    file_handles = [b['fileHandles'][0] for b in bundles]
+    assert len({f['id'] for f in file_handles}) == 3
+    # Versions that share a file handle share the object.
+    assert file_handles[1] is file_handles[2]
+    assert file_handles[3] is file_handles[4]
+
+    bundles = list(Synapsis.Utils.get_version_bundles(file, versions=[1, 3], include_annotations=True,
+                                                      record_type=Bundle))
+    assert [b.entity['versionNumber'] for b in bundles] == [1, 3]
+    assert bundles[1].file_handles[0].content_size == 2
+    assert 'annotations' in bundles[0]
+
+    with pytest.raises(ValueError):
+        list(Synapsis.Utils.get_version_bundles(file, versions='latest'))
+
+    # Closing the iterator stops the fetches.
+    bundles = Synapsis.Utils.get_version_bundles(file['id'], max_workers=2)
+    assert next(bundles)['entity']['versionNumber'] == 5
+    bundles.close()
+    for _ in range(100):
+        if not any(t.name.startswith('synapsis-version-bundles') for t in threading.enumerate()):
+            break
+        time.sleep(0.01)
+    assert not any(t.name.startswith('synapsis-version-bundles') for t in threading.enumerate())
+
+    # Only the most recent file handles are shared.
+    mocker.patch.object(SynapsisUtils, 'VERSION_FILE_HANDLE_CACHE_SIZE', 1)
+    file_handles = [b['fileHandles'][0] for b in Synapsis.Utils.get_version_bundles(file['id'], versions=[1, 3, 2])]
+    assert file_handles[0]['id'] == file_handles[2]['id']
+    assert file_handles[0] is not file_handles[2]
+
+
 async def test_delete_skip_trash(synapse_test_helper):
     project = synapse_test_helper.create_project()
     Synapsis.Utils.delete_skip_trash(project)
@@ -0,0 +1,164 @@
+import pytest
+import os
+from synapsis import Synapsis
+from synapsis.core.sync import SyncUp, SyncDown
+
+pytestmark = pytest.mark.fake_synapse
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode='wb') as f:
+        f.write(content)
+
+
+@pytest.fixture
+def local_dir(tmp_path):
+    write(os.path.join(tmp_path, 'a.txt'), b'a')
+    write(os.path.join(tmp_path, 'b?.txt'), b'b')
+    write(os.path.join(tmp_path, 'sub', 'c.txt'), b'c')
+    write(os.path.join(tmp_path, 'sub', 'deeper', 'd.txt'), b'd')
+    yield str(tmp_path)
+
+
+def by_name(results):
+    return {os.path.basename(r['path']): r for r in results}
+
+
+def test_sync_up(fake_synapse, local_dir):
+    project = fake_synapse.create_project()
+    progress = {}
+
+    def record(stage, count):
+        progress[stage] = max(progress.get(stage, 0), count)
+
+    results = by_name(Synapsis.Utils.sync_up(local_dir, project['id'], create_batch_size=2, progress=record))
+    assert {name: r['status'] for name, r in results.items()} == {
+        'a.txt': SyncUp.CREATED, 'b?.txt': SyncUp.CREATED, 'c.txt': SyncUp.CREATED, 'd.txt': SyncUp.CREATED
+    }
+    assert progress == {'scan': 4, 'hash': 4, 'lookup': 4, 'upload': 4, 'create': 4}
+
+    remote = {e['name']: e for e in fake_synapse.descendants_of(project)}
+    assert set(remote.keys()) == {'a.txt', 'b_.txt', 'sub', 'c.txt', 'deeper', 'd.txt'}
+    assert remote['d.txt']['parentId'] == remote['deeper']['id']
+    assert remote['deeper']['parentId'] == remote['sub']['id']
+    assert fake_synapse.file_contents[remote['c.txt']['dataFileHandleId']] == b'c'
+    assert results['b?.txt']['id'] == remote['b_.txt']['id']
+    assert results['b?.txt']['md5'] == fake_synapse.file_handles[remote['b_.txt']['dataFileHandleId']]['contentMd5']
+
+    # Unchanged files are skipped and changed files get a new version.
+    write(os.path.join(local_dir, 'sub', 'c.txt'), b'changed')
+    uploads = fake_synapse.count_requests('POST', r'/file/multipart$')
+    results = by_name(Synapsis.Utils.sync_up(local_dir, project))
+    assert {name: r['status'] for name, r in results.items()} == {
+        'a.txt': SyncUp.SKIPPED, 'b?.txt': SyncUp.SKIPPED, 'c.txt': SyncUp.UPDATED, 'd.txt': SyncUp.SKIPPED
+    }
+    assert fake_synapse.count_requests('POST', r'/file/multipart$') == uploads + 1
+    entity = fake_synapse.entities[remote['c.txt']['id']]
+    assert entity['versionNumber'] == 2
+    assert fake_synapse.file_contents[entity['dataFileHandleId']] == b'changed'
+
+
+def test_sync_up_fails_collisions_and_errors(fake_synapse, local_dir):
+    project = fake_synapse.create_project()
+    write(os.path.join(local_dir, 'b*.txt'), b'collides with b?.txt')
+    fake_synapse.create_file('a.txt', project, content=b'different')
+    fake_synapse.create_folder('sub', project)
+    fake_synapse.inject_error(400, path=r'/entity/syn\d+/bundle2$', method='POST')
+
+    results = by_name(Synapsis.Utils.sync_up(local_dir, project))
+    assert results['a.txt']['status'] == SyncUp.FAILED
+    assert results['a.txt']['error'].response.status_code == 400
+    assert results['b?.txt']['status'] == SyncUp.FAILED
+    assert results['b*.txt']['status'] == SyncUp.FAILED
+    assert 'collides' in str(results['b*.txt']['error'])
+    assert results['c.txt']['status'] == SyncUp.CREATED
+    assert results['d.txt']['status'] == SyncUp.CREATED
+    assert len(fake_synapse.children_of(project)) == 2
+
+
+def test_sync_up_uploads_multiple_parts(fake_synapse, tmp_path):
+    project = fake_synapse.create_project()
+    content = os.urandom(11 * 1024 * 1024)
+    write(os.path.join(tmp_path, 'big.bin'), content)
+    results = Synapsis.Utils.sync_up(str(tmp_path), project, part_size=5 * 1024 * 1024)
+    assert results[0]['status'] == SyncUp.CREATED
+    assert fake_synapse.count_requests('PUT', r'/file/multipart/\d+/add/\d+$') == 3
+    file_handle_id = fake_synapse.entities[results[0]['id']]['dataFileHandleId']
+    assert fake_synapse.file_contents[file_handle_id] == content
+
+
+@pytest.fixture
+def remote_tree(fake_synapse):
+    project = fake_synapse.create_project()
+    folder = fake_synapse.create_folder('folder', project)
+    files = {
+        'a.txt': fake_synapse.create_file('a.txt', project, content=b'a' * 100),
+        'b.txt': fake_synapse.create_file('b.txt', folder, content=b'b' * 100),
+        'empty.txt': fake_synapse.create_file('empty.txt', folder, content=b'')
+    }
+    yield project, folder, files
+
+
+def read(path):
+    with open(path, mode='rb') as f:
+        return f.read()
+
+
+def test_sync_down(fake_synapse, remote_tree, tmp_path):
+    project, folder, files = remote_tree
+    progress = {}
+
+    def record(stage, count):
+        progress[stage] = max(progress.get(stage, 0), count)
+
+    results = by_name(Synapsis.Utils.sync_down(project, str(tmp_path), url_batch_size=2, progress=record))
+    assert {name: r['status'] for name, r in results.items()} == {
+        'a.txt': SyncDown.DOWNLOADED, 'b.txt': SyncDown.DOWNLOADED, 'empty.txt': SyncDown.DOWNLOADED
+    }
+    assert progress == {'list': 3, 'resolve': 3, 'urls': 3, 'download': 3}
+    assert 2 <= fake_synapse.count_requests('POST', r'/fileHandle/batch$') <= 3
+    assert read(os.path.join(tmp_path, 'a.txt')) == b'a' * 100
+    assert read(os.path.join(tmp_path, 'folder', 'b.txt')) == b'b' * 100
+    assert read(os.path.join(tmp_path, 'folder', 'empty.txt')) == b''
+    assert results['b.txt']['id'] == files['b.txt']['id']
+
+    # Files that match are skipped.
+    write(os.path.join(tmp_path, 'a.txt'), b'changed')
+    downloads = fake_synapse.count_requests('GET', r'/fake/file/')
+    results = by_name(Synapsis.Utils.sync_down(project['id'], str(tmp_path)))
+    assert {name: r['status'] for name, r in results.items()} == {
+        'a.txt': SyncDown.DOWNLOADED, 'b.txt': SyncDown.SKIPPED, 'empty.txt': SyncDown.SKIPPED
+    }
+    assert fake_synapse.count_requests('GET', r'/fake/file/') == downloads + 1
+    assert read(os.path.join(tmp_path, 'a.txt')) == b'a' * 100
+
+
+def test_sync_down_resumes_partial_downloads(fake_synapse, remote_tree, tmp_path, mocker):
+    project, folder, files = remote_tree
+    write(os.path.join(tmp_path, 'a.txt.part'), b'a' * 40)
+    spy = mocker.spy(Synapsis.Synapse._requests_session, 'get')
+    results = by_name(Synapsis.Utils.sync_down(project, str(tmp_path)))
+    assert results['a.txt']['status'] == SyncDown.DOWNLOADED
+    assert read(os.path.join(tmp_path, 'a.txt')) == b'a' * 100
+    assert not os.path.exists(os.path.join(tmp_path, 'a.txt.part'))
+    ranges = [c.kwargs['headers'].get('Range') for c in spy.call_args_list if '/fake/file/' in c.args[0]]
+    assert sorted(ranges, key=str) == [None, 'bytes=40-']
+
+    # A corrupt partial download fails the MD5 check and is removed.
+    write(os.path.join(tmp_path, 'a.txt.part'), b'x' * 40)
+    os.remove(os.path.join(tmp_path, 'a.txt'))
+    results = by_name(Synapsis.Utils.sync_down(project, str(tmp_path)))
+    assert results['a.txt']['status'] == SyncDown.FAILED
+    assert 'MD5' in str(results['a.txt']['error'])
+    assert not os.path.exists(os.path.join(tmp_path, 'a.txt.part'))
+
+
+def test_sync_down_refetches_expired_urls(fake_synapse, remote_tree, tmp_path):
+    project, folder, files = remote_tree
+    fake_synapse.inject_error(403, path=r'/fake/file/', method='GET', times=1)
+    results = by_name(Synapsis.Utils.sync_down(project, str(tmp_path), download_workers=1, url_batch_size=1))
+    assert all(r['status'] == SyncDown.DOWNLOADED for r in results.values())
+    # One request per batch plus one to refresh the expired URL.
+    assert fake_synapse.count_requests('POST', r'/fileHandle/batch$') == 4
+    assert fake_synapse.count_requests('GET', r'/fake/file/') == 3
@@ -0,0 +1,110 @@
+import datetime
+import pytest
+from synapseclient.core.exceptions import SynapseHTTPError
+from synapsis import Synapsis
+from synapsis.core.exceptions import SynapsisError
+from synapsis.core.tables import ColumnTypes
+
+pytestmark = pytest.mark.fake_synapse
+
+
+@pytest.fixture
+def table(fake_synapse):
+    project = fake_synapse.create_project()
+    columns = [{'name': 'name', 'columnType': 'STRING', 'maximumSize': 50},
+               {'name': 'age', 'columnType': 'INTEGER'},
+               {'name': 'score', 'columnType': 'DOUBLE'},
+               {'name': 'active', 'columnType': 'BOOLEAN'},
+               {'name': 'born', 'columnType': 'DATE'},
+               {'name': 'tags', 'columnType': 'STRING_LIST'}]
+    yield fake_synapse.create_table('table', project, columns)
+
+
+def _records(table):
+    return list(Synapsis.Utils.query_table_batches('SELECT * FROM {0}'.format(table['id']), batch_rows=None,
+                                                   format='numpy'))
+
+
+def test_it_formats_the_column_values():
+    assert ColumnTypes.cell('INTEGER', 12) == '12'
+    assert ColumnTypes.cell('BOOLEAN', False) == 'false'
+    assert ColumnTypes.cell('DATE', datetime.datetime(1970, 1, 1, 0, 0, 1)) == '1000'
+    assert ColumnTypes.cell('STRING_LIST', ['a', 'b']) == '["a","b"]'
+    assert ColumnTypes.cell('STRING', None) is None
+
+
+def test_it_appends_rows_in_chunks(fake_synapse, table):
+    progress = []
+    jobs = fake_synapse.count_requests('POST', r'/table/append/async/start$')
+    rows = [{'name': 'name-{0}'.format(i), 'age': i, 'active': i % 2 == 0} for i in range(5)]
+    rows += [['name-5', 5, 2.5, True, 1700000000000, ['a', 'b']]]
+    result = Synapsis.Utils.append_table_rows(table, iter(rows), chunk_rows=2, workers=2,
+                                              progress=lambda stage, count: progress.append((stage, count)))
+    assert result == {'rows': 6, 'chunks': 3, 'skipped': 0}
+    assert fake_synapse.count_requests('POST', r'/table/append/async/start$') == jobs + 3
+    assert max(count for stage, count in progress if stage == 'append') == 3
+    values = sorted(fake_synapse.table_rows[table['id']], key=lambda r: int(r['values'][table['columnIds'][1]]))
+    assert [v['values'].get(table['columnIds'][3]) for v in values] == ['true', 'false', 'true', 'false', 'true',
+                                                                          'true']
+    assert values[5]['values'][table['columnIds'][5]] == '["a","b"]'
+
+    # Chunks are also cut by size.
+    result = Synapsis.Utils.append_table_rows(table, [{'name': 'x' * 40}] * 4, chunk_bytes=100)
+    assert result == {'rows': 4, 'chunks': 4, 'skipped': 0}
+
+    with pytest.raises(ValueError, match='Unknown columns: nope'):
+        Synapsis.Utils.append_table_rows(table, [{'nope': 1}])
+
+
+def test_it_appends_columnar_batches(fake_synapse, table):
+    pyarrow = pytest.importorskip('pyarrow')
+    numpy = pytest.importorskip('numpy')
+    born = datetime.datetime(2023, 11, 14, 22, 13, 20, tzinfo=datetime.timezone.utc)
+    batch = pyarrow.RecordBatch.from_pydict({'name': ['a', 'b'], 'age': [1, 2], 'born': [born, None],
+                                             'tags': [['x'], None]})
+    result = Synapsis.Utils.append_table_rows(table, [batch, {'age': numpy.ma.masked_array([3, 4], mask=[False, True]),
+                                                              'score': numpy.array([0.5, 1.5])}])
+    assert result['rows'] == 4
+    records = _records(table)[0]
+    assert records['name'].tolist() == ['a', 'b', None, None]
+    assert records['age'].tolist() == [1, 2, 3, None]
+    assert records['score'].tolist() == [None, None, 0.5, 1.5]
+    assert records['born'][0] == numpy.datetime64(1700000000000, 'ms')
+    assert records['tags'].tolist() == [['x'], None, None, None]
+
+    # Query results can be appended as they are.
+    Synapsis.Utils.append_table_rows(table, Synapsis.Utils.query_table_batches(
+        'SELECT * FROM {0}'.format(table['id']), format='numpy'))
+    assert len(fake_synapse.table_rows[table['id']]) == 8
+
+
+def test_it_resumes_from_the_journal(fake_synapse, table, tmp_path):
+    journal = str(tmp_path / 'journal.txt')
+    rows = [['name-{0}'.format(i), i] for i in range(7)]
+
+    def _fail_after_two_chunks(stage, count):
+        if stage == 'append' and count == 2:
+            fake_synapse.inject_error(400, path=r'/table/append/async/start$', method='POST')
+
+    with pytest.raises(SynapseHTTPError):
+        Synapsis.Utils.append_table_rows(table, rows, chunk_rows=2, workers=1, journal=journal,
+                                         progress=_fail_after_two_chunks)
+    assert len(fake_synapse.table_rows[table['id']]) == 4
+
+    result = Synapsis.Utils.append_table_rows(table, rows, chunk_rows=2, workers=1, journal=journal)
+    assert result == {'rows': 3, 'chunks': 2, 'skipped': 2}
+    ages = [int(row['values'][table['columnIds'][1]]) for row in fake_synapse.table_rows[table['id']]]
+    assert ages == list(range(7))
+
+
+def test_it_does_not_resume_from_a_different_journal(fake_synapse, table, tmp_path):
+    journal = str(tmp_path / 'journal.txt')
+    rows = [['name-{0}'.format(i), i] for i in range(4)]
+    Synapsis.Utils.append_table_rows(table, rows, chunk_rows=2, workers=1, journal=journal)
+
+    with pytest.raises(SynapsisError, match='different run'):
+        Synapsis.Utils.append_table_rows(table, rows, chunk_rows=3, workers=1, journal=journal)
+    rows[2][1] = 20
+    with pytest.raises(SynapsisError, match='Chunk 1 does not match'):
+        Synapsis.Utils.append_table_rows(table, rows, chunk_rows=2, workers=1, journal=journal)
+    assert len(fake_synapse.table_rows[table['id']]) == 4
@@ -0,0 +1,78 @@
+import datetime
+import pytest
+from synapsis import Synapsis
+from synapsis.core import tables
+from synapsis.core.exceptions import SynapsisError
+from synapsis.core.tables import ColumnTypes
+
+pytestmark = pytest.mark.fake_synapse
+
+
+def test_it_converts_the_column_types():
+    assert ColumnTypes.converter('INTEGER')('12') == 12
+    assert ColumnTypes.converter('DATE')('1700000000000') == 1700000000000
+    assert ColumnTypes.converter('DOUBLE')('NaN') != ColumnTypes.converter('DOUBLE')('NaN')
+    assert ColumnTypes.converter('BOOLEAN')('true') is True
+    assert ColumnTypes.converter('ENTITYID')('syn1') == 'syn1'
+    assert ColumnTypes.converter('INTEGER_LIST')('[1, "2"]') == [1, 2]
+    assert ColumnTypes.converter('STRING_LIST')('["a", "b"]') == ['a', 'b']
+    assert ColumnTypes.converter('INTEGER')(None) is None
+
+
+@pytest.fixture
+def table(fake_synapse):
+    fake_synapse.max_rows_per_page = 3
+    project = fake_synapse.create_project()
+    columns = [{'name': 'name', 'columnType': 'STRING', 'maximumSize': 50},
+               {'name': 'age', 'columnType': 'INTEGER'},
+               {'name': 'score', 'columnType': 'DOUBLE'},
+               {'name': 'active', 'columnType': 'BOOLEAN'},
+               {'name': 'born', 'columnType': 'DATE'},
+               {'name': 'tags', 'columnType': 'STRING_LIST'}]
+    rows = [['name-{0}'.format(i), i, i / 2 if i % 3 else None, i % 2 == 0, 1700000000000 + i, ['t{0}'.format(i)]]
+            for i in range(8)]
+    yield fake_synapse.create_table('table', project, columns, rows)
+    fake_synapse.max_rows_per_page = 1000
+
+
+def test_it_yields_arrow_batches(fake_synapse, table):
+    pyarrow = pytest.importorskip('pyarrow')
+    query_jobs = fake_synapse.count_requests('POST', r'/table/query/async/start$')
+    batches = list(Synapsis.Utils.query_table_batches('SELECT * FROM {0}'.format(table['id']), batch_rows=5,
+                                                      prefetch=0))
+    # 3 rows per page.
+    assert fake_synapse.count_requests('POST', r'/table/query/async/start$') == query_jobs + 3
+    assert [batch.num_rows for batch in batches] == [5, 3]
+    result = pyarrow.Table.from_batches(batches)
+    assert result.schema.field('age').type == pyarrow.int64()
+    assert result.schema.field('tags').type == pyarrow.list_(pyarrow.string())
+    assert result.column('age').to_pylist() == list(range(8))
+    assert result.column('score').to_pylist() == [None, 0.5, 1.0, None, 2.0, 2.5, None, 3.5]
+    assert result.column('active').to_pylist()[:2] == [True, False]
+    assert result.column('born').to_pylist()[1] == datetime.datetime(2023, 11, 14, 22, 13, 20, 1000,
+                                                                      tzinfo=datetime.timezone.utc)
+    assert result.column('tags').to_pylist()[7] == ['t7']
+
+
+def test_it_yields_numpy_batches(fake_synapse, table):
+    numpy = pytest.importorskip('numpy')
+    batches = list(Synapsis.Utils.query_table_batches('SELECT name, age, score, born FROM {0}'.format(table['id']),
+                                                      batch_rows=None, format='numpy', prefetch=3))
+    assert [len(batch['age']) for batch in batches] == [3, 3, 2]
+    assert list(batches[0]) == ['name', 'age', 'score', 'born']
+    assert batches[0]['age'].dtype == numpy.int64
+    assert batches[0]['born'].dtype == numpy.dtype('datetime64[ms]')
+    assert list(batches[2]['name']) == ['name-6', 'name-7']
+    assert isinstance(batches[0]['score'], numpy.ma.MaskedArray)
+    assert batches[0]['score'].mask.tolist() == [True, False, False]
+    assert numpy.concatenate([b['age'] for b in batches]).tolist() == list(range(8))
+
+
+def test_it_validates_the_format(fake_synapse, table, monkeypatch):
+    with pytest.raises(ValueError, match='Invalid format'):
+        next(Synapsis.Utils.query_table_batches('SELECT * FROM {0}'.format(table['id']), format='csv'))
+    with pytest.raises(SynapsisError, match='Synapse ID'):
+        next(Synapsis.Utils.query_table_batches('SELECT 1'))
+    monkeypatch.setattr(tables, 'pyarrow', None)
+    with pytest.raises(SynapsisError, match='pyarrow'):
+        next(Synapsis.Utils.query_table_batches('SELECT * FROM {0}'.format(table['id'])))
@@ -0,0 +1,24 @@
+import pytest
+import synapseclient
+from synapseclient.core.upload import multipart_upload
+from synapsis.core.exceptions import SynapsisError
+from synapsis.synapse.multipart import Multipart
+
+pytestmark = pytest.mark.fake_synapse
+
+
+def test_it_wraps_the_multipart_functions():
+    assert Multipart.part_size(None, 1) == multipart_upload._get_part_size(None, 1)
+
+
+def test_it_checks_the_functions_of_other_versions(mocker):
+    mocker.patch.object(Multipart, '__CHECKED__', False)
+    mocker.patch.object(synapseclient, '__version__', '2.99.0')
+    Multipart.check()
+    assert Multipart.__CHECKED__ is True
+
+    mocker.patch.object(Multipart, '__CHECKED__', False)
+    mocker.patch.object(multipart_upload, '_get_file_chunk', lambda path, number, size: b'')
+    with pytest.raises(SynapsisError, match='_get_file_chunk'):
+        Multipart.part_size(None, 1)
+    assert Multipart.__CHECKED__ is False
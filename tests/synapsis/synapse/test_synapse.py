@@ -16,3 +16,52 @@ def test_it_fixes_cache_root_dir(mocker):
     synapse = Synapse()
     assert synapse.cache.cache_root_dir != expected_path
     assert os.path.dirname(synapse.cache.cache_root_dir) == tempfile.gettempdir()
+
+
+@pytest.mark.fake_synapse
+async def test_it_coalesces_concurrent_reads(fake_synapse):
+    import asyncio
+    import concurrent.futures
+    from synapsis import Synapsis
+    from synapsis.core import RequestMetrics
+    project = fake_synapse.create_project()
+    file = fake_synapse.create_file('file.txt', project, content=b'x')
+    fake_synapse.latency = 0.2
+    Synapsis.Synapse.single_flight.reset_stats()
+    metrics = RequestMetrics().install(Synapsis.hooks)
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            bundles = list(executor.map(lambda _: Synapsis.Utils.get_bundle(file['id']), range(8)))
+    finally:
+        metrics.uninstall(Synapsis.hooks)
+    assert fake_synapse.count_requests('POST', r'/bundle2$') == 1
+    # The calls that shared the response are counted separately.
+    assert {k: metrics.export()['SynapsisUtils.get_bundle'][k] for k in ['requests', 'shared']} == \
+           {'requests': 1, 'shared': 7}
+    assert all(b == bundles[0] for b in bundles)
+    # Each caller gets its own copy.
+    assert len({id(b) for b in bundles}) == 8
+    assert Synapsis.Synapse.single_flight.stats['shared'] == 7
+
+    paths = await asyncio.gather(*[Synapsis.Chain.Utils.get_synapse_path(file['id']) for _ in range(4)])
+    assert len(set(paths)) == 1
+    assert fake_synapse.count_requests('GET', r'/entity/syn\d+/path$') == 1
+
+
+@pytest.mark.fake_synapse
+def test_it_does_not_coalesce_writes(fake_synapse):
+    import concurrent.futures
+    from synapsis import Synapsis
+    project = fake_synapse.create_project()
+    fake_synapse.latency = 0.1
+
+    def _create(i):
+        return Synapsis.Synapse.restPOST('/entity', body='{{"name": "folder-{0}", "parentId": "{1}", '
+                                                        '"concreteType": "{2}"}}'.format(
+            i, project['id'], 'org.sagebionetworks.repo.model.Folder'))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        folders = list(executor.map(_create, range(4)))
+    assert len({f['id'] for f in folders}) == 4
+    assert fake_synapse.count_requests('POST', r'/entity$') == 4
@@ -0,0 +1,135 @@
+import pytest
+import time
+import synapseclient as syn
+from synapseclient.core.exceptions import SynapseHTTPError
+from synapsis import Synapsis
+from synapsis.testing import FakeSynapse
+
+pytestmark = pytest.mark.fake_synapse
+
+
+@pytest.fixture
+def fake_tree(fake_synapse):
+    project = fake_synapse.create_project()
+    folder = fake_synapse.create_folder('folder', project)
+    file = fake_synapse.create_file('file.txt', folder, content=b'1234567890')
+    yield project, folder, file
+
+
+def test_it_points_the_client_at_the_fake(fake_synapse):
+    assert Synapsis.logged_in()
+    assert Synapsis.Synapse.repoEndpoint == '{0}/repo/v1'.format(fake_synapse.url)
+    assert Synapsis.Synapse.authEndpoint == '{0}/auth/v1'.format(fake_synapse.url)
+    assert Synapsis.Synapse.fileHandleEndpoint == '{0}/file/v1'.format(fake_synapse.url)
+    assert Synapsis.Synapse.__config__['endpoint'] == fake_synapse.url
+    assert Synapsis.getUserProfile()['userName'] == fake_synapse.username
+
+
+def test_it_logs_in_with_username_and_password(fake_synapse):
+    Synapsis.configure(synapse_args=fake_synapse.synapse_args,
+                       email=fake_synapse.username,
+                       password=fake_synapse.password).login()
+    assert Synapsis.logged_in()
+    assert Synapsis.Synapse.credentials.username == fake_synapse.username
+
+
+def test_it_fails_to_login_with_bad_credentials(fake_synapse):
+    from synapsis.core.exceptions import LoginError
+    with pytest.raises(LoginError):
+        Synapsis.configure(synapse_args=fake_synapse.synapse_args, authToken='NOPE').login()
+
+
+def test_it_stores_and_gets_entities(fake_synapse):
+    project = Synapsis.store(syn.Project(name='project'))
+    folder = Synapsis.store(syn.Folder(name='folder', parent=project, annotations={'a': 1}))
+    assert project.id in fake_synapse.entities
+    assert fake_synapse.entities[folder.id]['parentId'] == project.id
+    assert Synapsis.get(folder.id).annotations == {'a': [1]}
+    assert Synapsis.findEntityId('folder', parent=project) == folder.id
+    assert [c['id'] for c in Synapsis.getChildren(project)] == [folder.id]
+
+
+async def test_it_serves_the_synapsis_utils_endpoints(fake_synapse, fake_tree):
+    project, folder, file = fake_tree
+    assert Synapsis.Utils.get_synapse_path(file['id']) == '{0}/folder/file.txt'.format(project['name'])
+    assert await Synapsis.Chain.Utils.get_project(file['id'], id_only=True) == project['id']
+
+    bundle = Synapsis.Utils.get_bundle(file['id'], include_file_handles=True, include_permissions=True)
+    assert Synapsis.ConcreteTypes.get(bundle) == Synapsis.ConcreteTypes.FILE_ENTITY
+    assert Synapsis.Utils.find_data_file_handle(bundle)['id'] == file['dataFileHandleId']
+    assert bundle['permissions']['canDownload'] is True
+    assert Synapsis.Utils.get_filehandle(file['id'])['contentMd5'] == 'e807f1fcf82d132f9bb018ca6738a19f'
+
+    requested = Synapsis.Utils.get_filehandles([(file['id'], file['dataFileHandleId'])],
+                                               include_pre_signed_urls=True)
+    assert requested[0]['fileHandle']['id'] == file['dataFileHandleId']
+    content = Synapsis.Synapse._requests_session.get(requested[0]['preSignedURL'], headers={'Range': 'bytes=2-4'})
+    assert content.status_code == 206
+    assert content.content == b'345'
+
+    copy_results = Synapsis.Utils.copy_file_handles_batch([file['dataFileHandleId']], ['FileEntity'], [file['id']])
+    assert copy_results[0]['newFileHandle']['contentMd5'] == 'e807f1fcf82d132f9bb018ca6738a19f'
+
+    Synapsis.Utils.delete_skip_trash(folder['id'])
+    assert folder['id'] not in fake_synapse.entities
+    assert file['id'] not in fake_synapse.entities
+
+
+def test_it_serves_permissions_and_teams(fake_synapse, fake_tree):
+    project, folder, file = fake_tree
+    user = fake_synapse.create_user('other')
+    team = fake_synapse.create_team()
+    fake_synapse.add_team_member(team, user)
+
+    assert Synapsis.Utils.get_entity_permission(project['id'], fake_synapse.user_id) == Synapsis.Permissions.ADMIN
+    Synapsis.Utils.set_entity_permission(folder['id'], user['ownerId'], Synapsis.Permissions.CAN_EDIT,
+                                         warn_if_inherits=False)
+    assert Synapsis.Utils.get_entity_permission(file['id'], user['ownerId']) == Synapsis.Permissions.CAN_EDIT
+
+    member = Synapsis.Utils.get_team_member(team['id'], user['ownerId'], as_user_group_header=True)
+    assert member['userName'] == 'other'
+    assert Synapsis.Utils.set_team_permission(team['id'], user['ownerId'], Synapsis.Permissions.TEAM_MANAGER)
+    assert Synapsis.Utils.get_team_permission(team['id'], user['ownerId']) == Synapsis.Permissions.TEAM_MANAGER
+    Synapsis.Utils.remove_from_team(team['id'], user['ownerId'])
+    assert Synapsis.Utils.get_team_member(team['id'], user['ownerId']) is None
+
+
+def test_it_injects_errors(fake_synapse, fake_tree):
+    project, folder, file = fake_tree
+    fake_synapse.inject_error(404, path=r'/path$', method='GET')
+    with pytest.raises(SynapseHTTPError) as ex:
+        Synapsis.Utils.get_synapse_path(project['id'])
+    assert ex.value.response.status_code == 404
+    assert Synapsis.Utils.get_synapse_path(project['id']) == project['name']
+    assert fake_synapse.count_requests('GET', r'/path$') == 2
+
+
+def test_it_injects_latency(fake_synapse, fake_tree):
+    project, folder, file = fake_tree
+    fake_synapse.latency = 0.1
+    start = time.perf_counter()
+    Synapsis.Utils.get_synapse_path(project['id'])
+    assert time.perf_counter() - start >= 0.1
+
+
+def test_it_expires_pre_signed_urls(fake_synapse, fake_tree):
+    project, folder, file = fake_tree
+    fake_synapse.pre_signed_url_ttl = -1
+    try:
+        requested = Synapsis.Utils.get_filehandles([(file['id'], file['dataFileHandleId'])],
+                                                   include_pre_signed_urls=True)
+        response = Synapsis.Synapse._requests_session.get(requested[0]['preSignedURL'])
+        assert response.status_code == 403
+    finally:
+        fake_synapse.pre_signed_url_ttl = 900
+
+
+def test_it_runs_standalone():
+    with FakeSynapse(latency=(0, 0.01)) as fake:
+        project = fake.create_project('standalone')
+        client = syn.Synapse(skip_checks=True, silent=True, configPath='',
+                             repoEndpoint='{0}/repo/v1'.format(fake.url))
+        client.login(authToken=fake.auth_token, silent=True, forced=True)
+        assert client.get(project['id'])['name'] == 'standalone'
+    with pytest.raises(RuntimeError):
+        fake.url